@@ -0,0 +1,239 @@
+# MIT No Attribution
+#
+# Copyright 2025 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Recall of the image search of generate_recommendations_fn against exact brute force search, on a synthetic catalog.
+
+The catalog has clustered embeddings and a node and objective per image, drawn with skewed frequencies so some
+campaigns match a large share of the catalog and others a fraction of a percent. The embeddings index is an HNSW graph
+(hnswlib, with the m and ef_construction of the embeddings index) behind a local stand-in of the OpenSearch client,
+which answers the requests of search_images as the k-NN plugin does:
+  - post_filter: the previous query, k neighbours from the graph and the filter applied to them afterwards (nmslib
+    engine, ef_search of the index)
+  - filtered: the filter inside the knn clause, with k candidates (MIN_KNN_K = MAX_KNN_K = k)
+  - filtered adaptive: search_images as deployed, at least MIN_KNN_K candidates and more for selective filters
+  - post_filter adaptive: search_images on an index of the nmslib engine not migrated yet, the post_filter query with
+    the candidates of filtered adaptive
+For the filtered queries the stand-in follows the efficient filtering of the lucene engine: the graph is searched
+with k candidates skipping the images outside the filter, and the search is exact when no more than k images match.
+Run from the backend directory:
+
+    python benchmarks/bench_filtered_search.py [--images 20000] [--queries 300] [--dimension 256] [--k 5]
+"""
+
+import argparse
+import os
+import time
+
+import hnswlib
+import numpy as np
+
+from harness import LAMBDA_DIR, load_lambda
+
+INDEX_NAME = "embeddings"
+NODES = {"followers": 0.7, "customers": 0.25, "new_customers": 0.05}
+OBJECTIVES = {"clicks": 0.7, "awareness": 0.25, "likes": 0.05}
+# Parameters of the embeddings index, see create_oss_embeddings_index
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 512
+NMSLIB_EF_SEARCH = 512
+
+
+class LocalEmbeddingsIndex:
+    """
+    Stand-in of the OpenSearch client for the requests of search_images: the mapping of the index, the filter count and
+    the k-NN query, with the filter in the knn clause or as a post_filter
+    """
+
+    def __init__(self, embeddings, nodes, objectives):
+        self.indices = self
+        self.engine = "lucene"
+        self.embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        self.nodes = nodes
+        self.objectives = objectives
+        self.requests = 0
+
+        self.graph = hnswlib.Index(space="cosine", dim=embeddings.shape[1])
+        self.graph.init_index(max_elements=len(embeddings), ef_construction=HNSW_EF_CONSTRUCTION, M=HNSW_M)
+        self.graph.add_items(self.embeddings, np.arange(len(embeddings)))
+
+    def get_mapping(self, index):
+        return {index: {"mappings": {"properties": {"embeddings": {"method": {"engine": self.engine}}}}}}
+
+    def matching(self, query_filter):
+        terms = {field: value for term in query_filter["bool"]["filter"] for field, value in term["term"].items()}
+        return np.flatnonzero((self.nodes == terms["node"]) & (self.objectives == terms["objective"]))
+
+    def exact(self, vector, candidates, k):
+        scores = self.embeddings[candidates] @ (vector / np.linalg.norm(vector))
+        return candidates[np.argsort(-scores)[:k]]
+
+    def approximate(self, vector, k, ef, allowed=None):
+        self.graph.set_ef(max(ef, k))
+        accept = None if allowed is None else (lambda label: label in allowed)
+        try:
+            labels, _ = self.graph.knn_query(np.asarray(vector, dtype=np.float32), k=k, num_threads=1, filter=accept)
+        except RuntimeError:
+            # hnswlib raises when fewer than k images are reachable
+            return np.array([], dtype=int)
+        return labels[0]
+
+    def search(self, index, body):
+        self.requests += 1
+
+        if body.get("size") == 0:
+            return {
+                "hits": {"total": {"value": len(self.embeddings)}},
+                "aggregations": {"matching": {"doc_count": len(self.matching(body["aggs"]["matching"]["filter"]))}},
+            }
+
+        knn = body["query"]["knn"]["embeddings"]
+        vector, k = np.asarray(knn["vector"], dtype=np.float32), knn["k"]
+
+        if "filter" in knn:
+            candidates = self.matching(knn["filter"])
+            if len(candidates) <= k:
+                images = self.exact(vector, candidates, k)
+            else:
+                images = self.approximate(vector, k, k, allowed=set(candidates.tolist()))
+        else:
+            images = self.approximate(vector, k, NMSLIB_EF_SEARCH)
+            allowed = set(self.matching(body["post_filter"]).tolist())
+            images = [image for image in images if image in allowed]
+
+        return {"hits": {"hits": [self.hit(image) for image in list(images)[:body["size"]]]}}
+
+    def hit(self, image):
+        return {"_source": {
+            "results": 0,
+            "image_s3_uri": f"s3://images/original/img{image}.jpg",
+            "img_element_list": [],
+            "image_description": "",
+        }}
+
+
+def post_filter_search(index_name, embedding, oss_client, node, objective, k=3):
+    """The search of generate_recommendations_fn before the filter was moved into the knn clause"""
+
+    body = {
+        "size": k,
+        "_source": {"exclude": ["embeddings"]},
+        "query": {"knn": {"embeddings": {"vector": embedding, "k": k}}},
+        "post_filter": {
+            "bool": {"filter": [{"term": {"node": node}}, {"term": {"objective": objective}}]}
+        },
+    }
+
+    res = oss_client.search(index=index_name, body=body)
+    return [(hit["_source"]["results"], hit["_source"]["image_s3_uri"], hit["_source"]["img_element_list"],
+             hit["_source"]["image_description"]) for hit in res["hits"]["hits"]]
+
+
+def synthetic_catalog(n_images, dimension, n_clusters, rng):
+    centroids = rng.normal(size=(n_clusters, dimension))
+    embeddings = centroids[rng.integers(n_clusters, size=n_images)] + 0.5 * rng.normal(size=(n_images, dimension))
+    nodes = rng.choice(list(NODES), size=n_images, p=list(NODES.values()))
+    objectives = rng.choice(list(OBJECTIVES), size=n_images, p=list(OBJECTIVES.values()))
+    return embeddings.astype(np.float32), nodes, objectives, centroids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=20000, help="Images in the catalog")
+    parser.add_argument("--queries", type=int, default=300, help="Searches, spread evenly over the campaigns")
+    parser.add_argument("--dimension", type=int, default=256, help="Dimension of the embeddings (1024 in the index)")
+    parser.add_argument("--clusters", type=int, default=50, help="Clusters of the synthetic embeddings")
+    parser.add_argument("--k", type=int, default=5, help="Images per search, as generate_recommendations_fn")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.environ.update({
+        "OSS_HOST": "https://localhost",
+        "OSS_EMBEDDINGS_INDEX_NAME": INDEX_NAME,
+        "CAMPAIGN_TABLE_NAME": "campaigns",
+        "HISTORIC_TABLE_NAME": "historic",
+        "REGION": os.environ["AWS_DEFAULT_REGION"],
+    })
+    recommendations_fn = load_lambda(os.path.join(LAMBDA_DIR, "generate_recommendations_fn"))
+    deployed_k = (recommendations_fn.MIN_KNN_K, recommendations_fn.MAX_KNN_K)
+
+    rng = np.random.default_rng(args.seed)
+
+    started_at = time.perf_counter()
+    embeddings, nodes, objectives, centroids = synthetic_catalog(args.images, args.dimension, args.clusters, rng)
+    index = LocalEmbeddingsIndex(embeddings, nodes, objectives)
+    print(f"{args.images} images of dimension {args.dimension}, HNSW graph built in "
+          f"{time.perf_counter() - started_at:.1f} s, k={args.k}")
+
+    campaigns = [(node, objective) for node in NODES for objective in OBJECTIVES]
+
+    def search_filtered(min_k, max_k, engine="lucene"):
+        def search(*search_args, **search_kwargs):
+            recommendations_fn.MIN_KNN_K, recommendations_fn.MAX_KNN_K = min_k, max_k
+            recommendations_fn.embeddings_engines.clear()
+            index.engine = engine
+            return recommendations_fn.search_images(*search_args, **search_kwargs)
+        return search
+
+    modes = {
+        "post_filter": post_filter_search,
+        "filtered": search_filtered(args.k, args.k),
+        "filtered adaptive": search_filtered(*deployed_k),
+        "post_filter adaptive": search_filtered(*deployed_k, engine="nmslib"),
+    }
+    # recall, returned images and requests per mode and campaign
+    totals = {(mode, campaign): [0.0, 0, 0, 0] for mode in modes for campaign in campaigns}
+
+    for query in range(args.queries):
+        node, objective = campaigns[query % len(campaigns)]
+        vector = centroids[rng.integers(len(centroids))] + 0.5 * rng.normal(size=args.dimension)
+
+        candidates = np.flatnonzero((nodes == node) & (objectives == objective))
+        expected = {f"s3://images/original/img{image}.jpg" for image in index.exact(vector, candidates, args.k)}
+
+        for mode, search in modes.items():
+            index.requests = 0
+            images = search(INDEX_NAME, vector.tolist(), index, node, objective, k=args.k)
+            found = {image[1] for image in images}
+
+            total = totals[(mode, (node, objective))]
+            total[0] += len(found & expected) / len(expected) if expected else 1
+            total[1] += len(images)
+            total[2] += index.requests
+            total[3] += 1
+
+    print(f"  {'':35}" + "".join(f"{mode:>27}" for mode in modes))
+    print(f"  {'campaign':26} {'share':>7}  " + f"{'recall':>11} {'returned':>8} {'requests':>8}" * len(modes))
+    overall = {mode: [0.0, 0, 0, 0] for mode in modes}
+    for campaign in sorted(campaigns, key=lambda c: -NODES[c[0]] * OBJECTIVES[c[1]]):
+        share = NODES[campaign[0]] * OBJECTIVES[campaign[1]]
+        row = f"  {'/'.join(campaign):26} {share:7.2%}  "
+        for mode in modes:
+            recall, returned, requests, queries = totals[(mode, campaign)]
+            overall[mode] = [a + b for a, b in zip(overall[mode], totals[(mode, campaign)])]
+            row += f"{recall / queries:11.3f} {returned / queries:8.1f} {requests / queries:8.1f}"
+        print(row)
+
+    row = f"  {'all':26} {'':7}  "
+    for mode in modes:
+        recall, returned, requests, queries = overall[mode]
+        row += f"{recall / queries:11.3f} {returned / queries:8.1f} {requests / queries:8.1f}"
+    print(row)
+
+
+if __name__ == "__main__":
+    main()
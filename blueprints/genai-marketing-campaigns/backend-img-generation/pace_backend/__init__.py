@@ -24,6 +24,7 @@ from aws_cdk import (
     aws_dynamodb as dynamodb,
     aws_lambda_python_alpha as lambda_python,
     aws_lambda as lambda_,
+    aws_lambda_destinations as lambda_destinations,
     aws_s3 as s3,
     aws_s3_notifications as s3n,
     aws_iam as iam,
@@ -152,6 +153,28 @@ class PACEBackendStack(Stack):
             partition_key=dynamodb.Attribute(name="id", type=dynamodb.AttributeType.STRING),
         )
 
+        # Indexes to list the campaigns newest first, all of them or by objective or node, without scanning the table.
+        # Only the attributes shown in the campaigns list are projected.
+        # DynamoDB creates one index per table update, an existing stack is updated in three deploys with the
+        # campaign_index_stage context: 1 adds CreatedAtIndex (objective and node filtered on it), 2 adds
+        # ObjectiveCreatedAtIndex, 3 (default) adds NodeCreatedAtIndex
+        campaign_index_stage = int(self.node.try_get_context("campaign_index_stage") or 3)
+        campaign_indexes = [
+            ("CreatedAtIndex", "record_type"),
+            ("ObjectiveCreatedAtIndex", "objective"),
+            ("NodeCreatedAtIndex", "node"),
+        ][:campaign_index_stage]
+        campaign_index_names = [index_name for index_name, _ in campaign_indexes]
+
+        for index_name, partition_key in campaign_indexes:
+            self.campaignsTable.add_global_secondary_index(
+                index_name=index_name,
+                partition_key=dynamodb.Attribute(name=partition_key, type=dynamodb.AttributeType.STRING),
+                sort_key=dynamodb.Attribute(name="created_at", type=dynamodb.AttributeType.STRING),
+                projection_type=dynamodb.ProjectionType.INCLUDE,
+                non_key_attributes=[attribute for attribute in ["name", "objective", "node"] if attribute != partition_key],
+            )
+
         self.historicCampaignsTable = pace.PACETable(
             self,
             "HistoricCampaignsTable",
@@ -162,6 +185,31 @@ class PACEBackendStack(Stack):
            sort_key=dynamodb.Attribute(name='objetivo', type=dynamodb.AttributeType.STRING),
            index_name='search_key')
 
+        # Cache of the embeddings of the image descriptions used to search the reference images
+        self.embeddingsCacheTable = pace.PACETable(
+            self,
+            "EmbeddingsCacheTable",
+            partition_key=dynamodb.Attribute(name="id", type=dynamodb.AttributeType.STRING),
+            time_to_live_attribute="expires_at",
+        )
+
+
+        # Shared Lambda layer with the campaigns repository, used by every function that writes campaigns
+        self.campaign_repository_layer = lambda_python.PythonLayerVersion(
+            self,
+            "CampaignRepositoryLayer",
+            entry=os.path.join(os.path.dirname(__file__), "shared"),
+            compatible_runtimes=[lambda_.Runtime.PYTHON_3_13],
+        )
+
+        # Image generation jobs, kept for a week once submitted
+        self.imgGenerationJobsTable = pace.PACETable(
+            self,
+            "ImgGenerationJobsTable",
+            partition_key=dynamodb.Attribute(name="id", type=dynamodb.AttributeType.STRING),
+            time_to_live_attribute="expires_at",
+        )
+
 
         self.presign_s3_fn = lambda_python.PythonFunction(
             self,
@@ -239,6 +287,9 @@ class PACEBackendStack(Stack):
                 "HISTORIC_TABLE_NAME": self.historicCampaignsTable.table_name,
                 "PROCESSED_BUCKET": self.processedBucket.bucket_name,
                 "RAW_IMG_BUCKET": self.rawImgBucket.bucket_name,
+                "CREATED_AT_INDEX_NAME": "CreatedAtIndex",
+                "OBJECTIVE_CREATED_AT_INDEX_NAME": "ObjectiveCreatedAtIndex" if "ObjectiveCreatedAtIndex" in campaign_index_names else "",
+                "NODE_CREATED_AT_INDEX_NAME": "NodeCreatedAtIndex" if "NodeCreatedAtIndex" in campaign_index_names else "",
             },
         )
         self.campaignsTable.grant_read_data(self.get_campaign_fn.role)
@@ -296,6 +347,7 @@ class PACEBackendStack(Stack):
             entry=os.path.join(os.path.dirname(__file__), "lambda", "generate_campaign_fn"),
             index="index.py",
             handler="handler",
+            layers=[self.campaign_repository_layer],
             runtime=lambda_.Runtime.PYTHON_3_13,
             timeout=Duration.seconds(90),
             memory_size=128,
@@ -341,6 +393,7 @@ class PACEBackendStack(Stack):
             entry=os.path.join(os.path.dirname(__file__), "lambda", "generate_recommendations_fn"),
             index="index.py",
             handler="handler",
+            layers=[self.campaign_repository_layer],
             runtime=lambda_.Runtime.PYTHON_3_13,
             timeout=Duration.seconds(90),
             memory_size=128,
@@ -351,10 +404,12 @@ class PACEBackendStack(Stack):
                 "HISTORIC_TABLE_NAME": self.historicCampaignsTable.table_name,
                 "OSS_HOST": oss_collection_host.value_as_string,
                 "OSS_EMBEDDINGS_INDEX_NAME": oss_embeddings_index_name.value_as_string,
+                "EMBEDDINGS_CACHE_TABLE_NAME": self.embeddingsCacheTable.table_name,
                 "REGION": Stack.of(self).region
             },
         )
         self.campaignsTable.grant_read_data(self.generate_recommendations_fn.role)
+        self.embeddingsCacheTable.grant_read_write_data(self.generate_recommendations_fn.role)
         self.campaignsTable.grant_write_data(self.generate_recommendations_fn.role)
         self.historicCampaignsTable.grant_read_data(self.generate_recommendations_fn.role)
         self.processedBucket.grant_read(self.generate_recommendations_fn.role)
@@ -401,6 +456,7 @@ class PACEBackendStack(Stack):
             entry=os.path.join(os.path.dirname(__file__), "lambda", "generate_prompt_fn"),
             index="index.py",
             handler="handler",
+            layers=[self.campaign_repository_layer],
             runtime=lambda_.Runtime.PYTHON_3_13,
             timeout=Duration.seconds(90),
             memory_size=128,
@@ -454,6 +510,7 @@ class PACEBackendStack(Stack):
             entry=os.path.join(os.path.dirname(__file__), "lambda", "update_prompt_fn"),
             index="index.py",
             handler="handler",
+            layers=[self.campaign_repository_layer],
             runtime=lambda_.Runtime.PYTHON_3_13,
             timeout=Duration.seconds(30),
             memory_size=128,
@@ -482,21 +539,62 @@ class PACEBackendStack(Stack):
             True
         )
 
-        self.generate_new_images_fn = lambda_python.PythonFunction(
+        # Fails the jobs whose worker invocation failed before recording its error, e.g. out of time or memory
+        self.generate_new_images_worker_failure_fn = lambda_python.PythonFunction(
             self,
-            "GenerateNewImagesFunction",
+            "GenerateNewImagesWorkerFailureFunction",
             entry=os.path.join(os.path.dirname(__file__), "lambda", "generate_new_images_fn"),
             index="index.py",
-            handler="handler",
+            handler="failure_handler",
+            layers=[self.campaign_repository_layer],
             runtime=lambda_.Runtime.PYTHON_3_13,
             timeout=Duration.seconds(30),
             memory_size=128,
             environment={
                 "LOG_LEVEL": "DEBUG",
                 "CAMPAIGN_TABLE_NAME": self.campaignsTable.table_name,
-                "HISTORIC_TABLE_NAME": self.historicCampaignsTable.table_name,
+                "JOBS_TABLE_NAME": self.imgGenerationJobsTable.table_name,
+                "REGION": Stack.of(self).region
+            },
+        )
+        self.imgGenerationJobsTable.grant_read_write_data(self.generate_new_images_worker_failure_fn.role)
+        NagSuppressions.add_resource_suppressions(
+            self.generate_new_images_worker_failure_fn,
+            [
+                {
+                    "id": "AwsSolutions-IAM4",
+                    "reason": """Service role created by CDK""",
+                },
+                {
+                    "id": "AwsSolutions-IAM5",
+                    "reason": """Service role created by CDK""",
+                },
+            ],
+            True
+        )
+
+        # Worker generating the images of the jobs submitted to the image generation API
+        self.generate_new_images_worker_fn = lambda_python.PythonFunction(
+            self,
+            "GenerateNewImagesWorkerFunction",
+            entry=os.path.join(os.path.dirname(__file__), "lambda", "generate_new_images_fn"),
+            index="index.py",
+            handler="worker_handler",
+            layers=[self.campaign_repository_layer],
+            runtime=lambda_.Runtime.PYTHON_3_13,
+            timeout=Duration.seconds(300),
+            memory_size=512,
+            # The worker records its errors in the job, a retry would generate and append the images again. When the
+            # invocation fails before it can, e.g. out of time or memory, the on failure destination does
+            retry_attempts=0,
+            on_failure=lambda_destinations.LambdaDestination(
+                self.generate_new_images_worker_failure_fn, response_only=False
+            ),
+            environment={
+                "LOG_LEVEL": "DEBUG",
+                "CAMPAIGN_TABLE_NAME": self.campaignsTable.table_name,
+                "JOBS_TABLE_NAME": self.imgGenerationJobsTable.table_name,
                 "PROCESSED_BUCKET": self.processedBucket.bucket_name,
-                "RAW_IMG_BUCKET": self.rawImgBucket.bucket_name,
                 "IMG_MODEL_ID": "amazon.nova-canvas-v1:0",
                 "REGION": Stack.of(self).region
             },
@@ -508,9 +606,47 @@ class PACEBackendStack(Stack):
                 ),
             ],
         )
+        self.campaignsTable.grant_read_write_data(self.generate_new_images_worker_fn.role)
+        self.imgGenerationJobsTable.grant_read_write_data(self.generate_new_images_worker_fn.role)
+        self.processedBucket.grant_write(self.generate_new_images_worker_fn.role)
+        NagSuppressions.add_resource_suppressions(
+            self.generate_new_images_worker_fn,
+            [
+                {
+                    "id": "AwsSolutions-IAM4",
+                    "reason": """Service role created by CDK""",
+                },
+                {
+                    "id": "AwsSolutions-IAM5",
+                    "reason": """Service role created by CDK""",
+                },
+            ],
+            True
+        )
+
+        # Submits image generation jobs and returns their status
+        self.generate_new_images_fn = lambda_python.PythonFunction(
+            self,
+            "GenerateNewImagesFunction",
+            entry=os.path.join(os.path.dirname(__file__), "lambda", "generate_new_images_fn"),
+            index="index.py",
+            handler="handler",
+            layers=[self.campaign_repository_layer],
+            runtime=lambda_.Runtime.PYTHON_3_13,
+            timeout=Duration.seconds(30),
+            memory_size=128,
+            environment={
+                "LOG_LEVEL": "DEBUG",
+                "CAMPAIGN_TABLE_NAME": self.campaignsTable.table_name,
+                "JOBS_TABLE_NAME": self.imgGenerationJobsTable.table_name,
+                "PROCESSED_BUCKET": self.processedBucket.bucket_name,
+                "WORKER_FUNCTION_NAME": self.generate_new_images_worker_fn.function_name,
+                "REGION": Stack.of(self).region
+            },
+        )
         self.campaignsTable.grant_read_data(self.generate_new_images_fn.role)
-        self.campaignsTable.grant_write_data(self.generate_new_images_fn.role)
-        self.processedBucket.grant_read_write(self.generate_new_images_fn.role)
+        self.imgGenerationJobsTable.grant_read_write_data(self.generate_new_images_fn.role)
+        self.generate_new_images_worker_fn.grant_invoke(self.generate_new_images_fn.role)
         NagSuppressions.add_resource_suppressions(
             self.generate_new_images_fn,
             [
@@ -634,6 +770,13 @@ class PACEBackendStack(Stack):
             request_validator=self.apigw.request_body_validator,
         )
 
+        self.apigw.add_method(
+            resource_path="/generate_images/{id}/{job_id}",
+            http_method="GET",
+            lambda_function=self.generate_new_images_fn,
+            request_validator=self.apigw.request_body_validator,
+        )
+
         CfnOutput(
             self,
             "RegionName",
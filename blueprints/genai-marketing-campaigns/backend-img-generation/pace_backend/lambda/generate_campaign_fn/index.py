@@ -28,6 +28,8 @@ from langchain_aws import ChatBedrockConverse
 from prompts.create_campaign_concept_prompt_selector import get_ad_concept_prompt_selector
 from structured_output.ad_concept import AdConcept
 
+from campaign_repository_layer.campaign_repository import create_campaign
+
 
 template = {
    "id": "", #<uuid/cuid/guid>
@@ -144,7 +146,7 @@ def handler(event, context):
     template["objective"] = body["objective"].lower()
     template["node"] = body["node"].lower()
 
-    resp = campaignTable.put_item(Item=template)
+    create_campaign(campaignTable, template)
 
     answer = {"id" :uid,
               "name": template["name"],
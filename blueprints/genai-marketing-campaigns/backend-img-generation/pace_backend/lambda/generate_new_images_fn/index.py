@@ -18,15 +18,20 @@
 import os
 import logging
 import base64
-import io
+import time
 import uuid
-import tempfile
 import json
 
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
 import boto3
-from PIL import Image
 import random
 
+from botocore.exceptions import ClientError
+
+from campaign_repository_layer.campaign_repository import get_campaign, update_campaign, CampaignNotFoundError
+
 lambda_response = {
     "statusCode": 200,
     "headers": {
@@ -43,22 +48,32 @@ logger.setLevel(os.getenv("LOG_LEVEL"))
 CAMPAIGN_TABLE_NAME = os.getenv("CAMPAIGN_TABLE_NAME")
 campaignTable = boto3.resource("dynamodb").Table(CAMPAIGN_TABLE_NAME)
 
+JOBS_TABLE_NAME = os.getenv("JOBS_TABLE_NAME")
+jobsTable = boto3.resource("dynamodb").Table(JOBS_TABLE_NAME)
+
 PROCESSED_BUCKET = os.getenv("PROCESSED_BUCKET")
 REGION = os.getenv("REGION")
 MODEL_ID = os.getenv("IMG_MODEL_ID")
+WORKER_FUNCTION_NAME = os.getenv("WORKER_FUNCTION_NAME")
+# Images per model call, Titan and Nova Canvas generate up to 5 images per request
+MAX_IMAGES_PER_JOB = 5
+JOBS_TTL_DAYS = int(os.getenv("JOBS_TTL_DAYS", 7))
 
 logger.info(f"REGION: {REGION}")
 
-s3 = boto3.resource("s3")
-processed_bucket = s3.Bucket(PROCESSED_BUCKET)
+s3_client = boto3.client("s3")
+lambda_client = boto3.client("lambda")
 
 bedrock_runtime = boto3.client(
     service_name="bedrock-runtime",
     region_name=REGION
 )
 
-def genImgCanvas(prompt: str):
-    """Generate an image from a prompt using Amazon Titan models"""
+def build_response(status_code: int, body: dict):
+    return {**lambda_response, "statusCode": status_code, "body": json.dumps(body)}
+
+def genImgsCanvas(prompt: str, number_of_images: int = 1):
+    """Generate images from a prompt with a single request to Amazon Titan or Nova Canvas models"""
 
     negative_prompts = "poorly rendered, poor background details, poorly facial details"
 
@@ -74,7 +89,7 @@ def genImgCanvas(prompt: str):
                 "negativeText": negative_prompts   # Optional
             },
             "imageGenerationConfig": {
-                "numberOfImages": 1,  # Range: 1 to 5
+                "numberOfImages": number_of_images,  # Range: 1 to 5
                 "quality": "standard",  # Options: standard or premium
                 "height": 720,  # Supported height list in the docs
                 "width": 1280,  # Supported width list in the docs
@@ -92,16 +107,80 @@ def genImgCanvas(prompt: str):
     )
     response_body = json.loads(response.get("body").read())
 
-    base_64_img_str = response_body["images"][0]
+    # The images are returned as base64 encoded PNG files
+    return [base64.b64decode(base_64_img_str) for base_64_img_str in response_body["images"]]
+
+def upload_image(campaign_id: str, image_bytes: bytes):
+    """Upload a generated image from memory to the processed images bucket"""
+
+    fileKey = campaign_id + "/" + str(uuid.uuid4()) + ".png"
+    s3_client.put_object(Bucket=PROCESSED_BUCKET, Key=fileKey, Body=image_bytes, ContentType="image/png")
+
+    return "s3://" + PROCESSED_BUCKET + "/" + fileKey
+
+def submit_job(uid: str, event):
+    """Register an image generation job and start its worker asynchronously"""
+
+    try:
+        body = json.loads(event["body"])
+        prompt = body["prompt"]
+        number_of_images = int(body.get("number_of_images", 1))
+        if not 1 <= number_of_images <= MAX_IMAGES_PER_JOB:
+            raise ValueError(f"number_of_images must be between 1 and {MAX_IMAGES_PER_JOB}")
+    except Exception as e:
+        logger.warning(e)
+        return build_response(400, {"message": "Bad Request. Bad body"})
+
+    try:
+        get_campaign(campaignTable, uid, ["id"])
+    except CampaignNotFoundError:
+        return build_response(404, {"message": "Campaign not found"})
+
+    job_id = str(uuid.uuid4())
+
+    jobsTable.put_item(
+        Item={
+            "id": job_id,
+            "campaign_id": uid,
+            "prompt": prompt,
+            "number_of_images": number_of_images,
+            "status": "PENDING",
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "expires_at": int(time.time()) + JOBS_TTL_DAYS * 24 * 3600,
+        }
+    )
+
+    try:
+        lambda_client.invoke(
+            FunctionName=WORKER_FUNCTION_NAME,
+            InvocationType="Event",
+            Payload=json.dumps({"job_id": job_id}),
+        )
+    except Exception as e:
+        logger.error(f"Could not start the worker of job {job_id}: {e}")
+        fail_job(job_id, "Could not start the job")
 
-    tmpdir = tempfile.mkdtemp()
-    image_file = str(uuid.uuid4()) + ".jpg"
-    image_path = tmpdir + "/" + image_file
-    image_1 = Image.open(io.BytesIO(base64.decodebytes(bytes(base_64_img_str, "utf-8"))))
+        return build_response(503, {"job_id": job_id, "status": "FAILED", "message": "Could not start the job"})
 
-    # save
-    image_1.save(image_path)
-    return image_path, image_file
+    logger.info(f"Submitted job {job_id} to generate {number_of_images} images for campaign {uid}")
+
+    return build_response(202, {"job_id": job_id, "status": "PENDING"})
+
+def get_job(uid: str, job_id: str):
+    """Status of an image generation job and the urls of its images once completed"""
+
+    ans = jobsTable.get_item(Key={'id': job_id})
+    if 'Item' not in ans or ans['Item']['campaign_id'] != uid:
+        return build_response(404, {"message": "Job not found"})
+
+    job = ans['Item']
+
+    return build_response(200, {
+        "job_id": job_id,
+        "status": job["status"],
+        "urls": job.get("urls", []),
+        "message": job.get("message", ""),
+    })
 
 def handler(event, context):
     logger.debug("Received event: " + json.dumps(event))
@@ -109,61 +188,124 @@ def handler(event, context):
     path = event["path"]
     pathParts = path.split('/')
 
-    if method != "POST" or len(pathParts) != 3 or pathParts[1] != "generate_images":
+    if len(pathParts) < 3 or pathParts[1] != "generate_images":
+        return build_response(400, {"message": "Bad Request. Malformed URL"})
 
-        lambda_response["statusCode"] = 400
-        lambda_response["body"]["message"] = "Bad Request. Malformed URL"
+    uid = pathParts[2]
 
-        return lambda_response
+    if method == "POST" and len(pathParts) == 3:
+        return submit_job(uid, event)
 
-    uid = pathParts[-1]
+    if method == "GET" and len(pathParts) == 4:
+        return get_job(uid, pathParts[3])
 
-    # Get attributes for campaign
+    return build_response(400, {"message": "Bad Request. Malformed URL"})
+
+def fail_job(job_id: str, message: str) -> bool:
+    """
+    Mark a job failed, unless it was completed
+    @param job_id: Id of the job
+    @param message: Message of the error returned with the status of the job
+    @return: Whether the job was failed, False if it doesn't exist or was completed
+    """
 
     try:
-        body = json.loads(event["body"])
-        prompt = body["prompt"]
-    except:
-        lambda_response["statusCode"] = 400
-        lambda_response["body"]["message"] = "Bad Request. Bad body"
+        jobsTable.update_item(
+            Key={'id': job_id},
+            UpdateExpression="SET #status = :failed, message = :message",
+            ConditionExpression="attribute_exists(id) AND #status <> :completed",
+            ExpressionAttributeNames={"#status": "status"},
+            ExpressionAttributeValues={":failed": "FAILED", ":message": message, ":completed": "COMPLETED"},
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return False
+        raise
+
+    return True
+
+def claim_job(job_id: str) -> bool:
+    """
+    Move a pending job to running, only one invocation can claim a job
+    @param job_id: Id of the job
+    @return: Whether the job was claimed, False if another invocation already started it
+    """
+
+    try:
+        jobsTable.update_item(
+            Key={'id': job_id},
+            UpdateExpression="SET #status = :running",
+            ConditionExpression="#status = :pending",
+            ExpressionAttributeNames={"#status": "status"},
+            ExpressionAttributeValues={":running": "RUNNING", ":pending": "PENDING"},
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return False
+        raise
+
+    return True
+
+def worker_handler(event, context):
+    """
+    Generate the images of a job with a single model call and upload them concurrently. Asynchronous invocations can be
+    delivered more than once, only the first one generates the images, so they are appended once to the campaign. Errors
+    are recorded in the job instead of raised, the job is not retried
+    """
+
+    logger.debug("Received event: " + json.dumps(event))
 
-        return lambda_response
+    job_id = event["job_id"]
+    job = jobsTable.get_item(Key={'id': job_id})['Item']
+    uid = job["campaign_id"]
 
-    #Generate an image based on the prompt
-    image_path, image_file = genImgCanvas(prompt)
+    if not claim_job(job_id):
+        logger.warning(f"Job {job_id} was already started, skipping the invocation")
+        return {"job_id": job_id, "status": job["status"]}
+
+    try:
+        images = genImgsCanvas(job["prompt"], int(job["number_of_images"]))
 
-    #Read dynamo table
-    ans = campaignTable.get_item(Key={'id':uid})
-    if 'Item' in ans:
-        campaign = ans['Item']
-    else:
-        lambda_response["statusCode"] = 500
-        lambda_response["body"]["message"] = "Campaign not found"
+        with ThreadPoolExecutor(max_workers=len(images)) as executor:
+            urls = list(executor.map(lambda image_bytes: upload_image(uid, image_bytes), images))
 
-        return lambda_response
+        #Update dynamo table
+        update_campaign(campaignTable, uid, append_attributes={"generated_images": [{"url": url} for url in urls]})
+    except Exception as e:
+        logger.exception(f"Error generating images for job {job_id}: {e}")
+
+        fail_job(job_id, "Could not generate images")
+
+        return {"job_id": job_id, "status": "FAILED"}
+
+    jobsTable.update_item(
+        Key={'id': job_id},
+        UpdateExpression="SET #status = :status, urls = :urls",
+        ExpressionAttributeNames={"#status": "status"},
+        ExpressionAttributeValues={":status": "COMPLETED", ":urls": urls},
+    )
 
-    fileKey = campaign["id"] + "/" + image_file
-    processed_bucket.upload_file(image_path,fileKey)
+    logger.info(f"Generated {len(urls)} images for job {job_id}")
 
-    url = "s3://" + PROCESSED_BUCKET + "/" + fileKey
+    return {"job_id": job_id, "status": "COMPLETED", "urls": urls}
 
+def failure_handler(event, context):
+    """
+    On failure destination of the asynchronous invocations of worker_handler. An invocation that ran out of time or
+    memory never records its error, the job is failed here instead of staying RUNNING until it expires
+    @param event: Invocation record of the failed invocation, with the original event in requestPayload
+    @param context:
+    @return: Id and status of the job
+    """
 
-    #Update dynamo table
-    ans = campaignTable.get_item(Key={'id':uid})
-    if 'Item' in ans:
-        campaign = ans['Item']
-    else:
-        lambda_response["statusCode"] = 500
-        lambda_response["body"]["message"] = "Campaign not found"
+    job_id = event["requestPayload"]["job_id"]
+    condition = event.get("requestContext", {}).get("condition")
+    error_message = (event.get("responsePayload") or {}).get("errorMessage")
 
-        return lambda_response
-      
-    if not "generated_images" in campaign:
-      campaign["generated_images"] = []
-    campaign["generated_images"].append({"url":url})
-    campaignTable.put_item(Item=campaign)
+    logger.error(f"Worker of job {job_id} failed ({condition}): {error_message}")
 
-    lambda_response["statusCode"] = 200
-    lambda_response["body"] = json.dumps({"url":url})
+    if not fail_job(job_id, "Could not generate images"):
+        logger.warning(f"Job {job_id} was completed or doesn't exist, not failing it")
+        return {"job_id": job_id}
 
-    return lambda_response
+    return {"job_id": job_id, "status": "FAILED"}
@@ -28,6 +28,10 @@ from prompts.generate_text_to_image_metaprompt import get_meta_prompt_prompt_sel
 from structured_output.meta_prompt import MetaPrompt
 import langchain_core
 
+from campaign_repository_layer.campaign_repository import (
+    get_campaign, update_campaign, CampaignNotFoundError, CampaignVersionConflictError
+)
+
 lambda_response = {
     "statusCode": 200,
     "headers": {
@@ -48,6 +52,9 @@ MODEL_ID = os.getenv("MODEL_ID")
 
 campaignTable = boto3.resource("dynamodb").Table(CAMPAIGN_TABLE_NAME)
 
+def build_response(status_code: int, body):
+    return {**lambda_response, "statusCode": status_code, "body": json.dumps(body)}
+
 def generate_text_to_image_meta_prompt(campaign_details, with_reference_images=False, reference_image_descriptions=[]):
 
     meta_prompt_llm = ChatBedrockConverse(
@@ -110,10 +117,7 @@ def handler(event, context):
 
     if method != "POST":
 
-        lambda_response["statusCode"] = 400
-        lambda_response["body"]["message"] = "Bad Request. Malformed URL"
-
-        return lambda_response
+        return build_response(400, {"message": "Bad Request. Malformed URL"})
 
     body = event["body"]
     logger.debug("the body")
@@ -121,22 +125,14 @@ def handler(event, context):
 
     #Read dynamo table and obtain current campaign
     logger.debug("Querying DynamoDB")
-    ans = campaignTable.get_item(Key={'id':uid})
-    logger.debug("Loaded item")
-    logger.debug(ans)
-
-    if 'Item' in ans:
-        campaign = ans["Item"]
-
-        #campaign_json = pace_utils.dynamodb_to_json(ans['Item'])
-        #campaign = json.loads(campaign_json)
-    else:
+    try:
+        campaign = get_campaign(campaignTable, uid, ["campaign_description", "image_references"])
+        logger.debug("Loaded item")
+        logger.debug(campaign)
+    except CampaignNotFoundError:
         logger.error("No id: " + uid)
 
-        lambda_response["statusCode"] = 400
-        lambda_response["body"]["message"] = "Campaign not found"
-
-        return lambda_response
+        return build_response(404, {"message": "Campaign not found"})
 
     # Get attributes for campaign
     campaign_description = campaign['campaign_description']
@@ -145,10 +141,7 @@ def handler(event, context):
 
     if not campaign_description:
 
-        lambda_response["statusCode"] = 400
-        lambda_response["body"]["message"] = "No campaign description"
-
-        return lambda_response
+        return build_response(400, {"message": "No campaign description"})
 
     logger.debug("Campaign description")
     logger.debug(campaign_description)
@@ -173,17 +166,26 @@ def handler(event, context):
     logger.debug("Generated meta prompt")
     logger.debug(img_meta_prompt)
 
-    #Update dynamo table
-    if not "image_prompt" in campaign:
-      campaign["image_prompt"] = {}
-    campaign["image_prompt"]["ai_prompt"]= img_meta_prompt.prompt
-    campaign["image_prompt"]["ai_reasoning"] = img_meta_prompt.reasoning
-    campaignTable.put_item(Item=campaign)
+    #Update dynamo table, the prompt is only valid for the description and references it was generated from
+    try:
+        update_campaign(
+            campaignTable,
+            uid,
+            set_attributes={
+                "image_prompt.ai_prompt": img_meta_prompt.prompt,
+                "image_prompt.ai_reasoning": img_meta_prompt.reasoning,
+            },
+            unchanged_attributes={
+                "campaign_description": campaign.get("campaign_description"),
+                "image_references": campaign.get("image_references"),
+            },
+        )
+    except (CampaignNotFoundError, CampaignVersionConflictError) as e:
+        logger.error(f"Campaign {uid} changed while generating the prompt: {e}")
 
-    lambda_response["statusCode"] = 200
-    lambda_response["body"] = json.dumps({
+        return build_response(409, {"message": "Campaign changed while generating the prompt"})
+
+    return build_response(200, {
         "ai_image_prompt": img_meta_prompt.prompt,
         "ai_reasoning":img_meta_prompt.reasoning
     })
-
-    return lambda_response
@@ -18,10 +18,19 @@
 import os
 import logging
 import json
+import math
+import time
+import hashlib
 import boto3
 
+from collections import OrderedDict
+
 from opensearchpy import OpenSearch, RequestsHttpConnection, AWSV4SignerAuth
 
+from campaign_repository_layer.campaign_repository import (
+    get_campaign, update_campaign, CampaignNotFoundError, CampaignVersionConflictError
+)
+
 lambda_response = {
     "statusCode": 200,
     "headers": {
@@ -40,9 +49,24 @@ HISTORIC_TABLE_NAME = os.getenv("HISTORIC_TABLE_NAME")
 OSS_HOST = os.getenv("OSS_HOST").replace("https://", "")
 OSS_EMBEDDINGS_INDEX_NAME = os.getenv("OSS_EMBEDDINGS_INDEX_NAME")
 REGION = os.getenv("REGION")
+# Minimum k of the k-NN query, the lucene engine explores k candidates of the graph and recall drops with a small k
+MIN_KNN_K = int(os.getenv("MIN_KNN_K", 20))
+# Maximum k of the k-NN query when oversampling for selective filters
+MAX_KNN_K = int(os.getenv("MAX_KNN_K", 100))
+EMBEDDINGS_CACHE_TABLE_NAME = os.getenv("EMBEDDINGS_CACHE_TABLE_NAME")
+EMBEDDINGS_CACHE_TTL_DAYS = int(os.getenv("EMBEDDINGS_CACHE_TTL_DAYS", 30))
+EMBEDDINGS_CACHE_MAX_SIZE = int(os.getenv("EMBEDDINGS_CACHE_MAX_SIZE", 256))
 
 campaignTable = boto3.resource("dynamodb").Table(CAMPAIGN_TABLE_NAME)
 historicTable = boto3.resource("dynamodb").Table(HISTORIC_TABLE_NAME)
+embeddingsCacheTable = boto3.resource("dynamodb").Table(EMBEDDINGS_CACHE_TABLE_NAME) if EMBEDDINGS_CACHE_TABLE_NAME else None
+
+# Engine of the embeddings field of each index, read from the live mapping once per container
+embeddings_engines = {}
+
+# In memory tier of the embeddings cache, kept by the warm container
+embeddings_cache = OrderedDict()
+embeddings_cache_stats = {"memory_hits": 0, "table_hits": 0, "misses": 0}
 
 bedrock_runtime = boto3.client(
     service_name="bedrock-runtime",
@@ -51,6 +75,9 @@ bedrock_runtime = boto3.client(
 
 oss_client = boto3.client('opensearchserverless')
 
+def build_response(status_code: int, body):
+    return {**lambda_response, "statusCode": status_code, "body": json.dumps(body)}
+
 def encode_description(img_description: str = None, # Max 77 characters
                     dimension: int = 1024,  # 1,024 (default), 384, 256
                     model_id: str = "amazon.titan-embed-image-v1"
@@ -84,40 +111,193 @@ def encode_description(img_description: str = None, # Max 77 characters
     return feature_vector
 
 
-def search_images(index_name, embedding, oss_client, node, objective, k=3):
-    matched_images = []
+def get_embeddings_cache_key(text: str, dimension: int, model_id: str) -> str:
+    """Key of a text embedding in the cache, texts that only differ in whitespace share their embedding"""
 
-    body = {
-        "size": k,
-        "_source": {
-            "exclude": ["embeddings"],
-        },
-        "query":
-            {
-                "knn":
-                    {
-                        "embeddings": {
-                            "vector": embedding,
-                            "k": k,
+    normalized_text = " ".join(text.split())
+    text_hash = hashlib.sha256(normalized_text.encode("utf-8")).hexdigest()
+
+    return f"{model_id}#{dimension}#{text_hash}"
+
+
+def encode_description_cached(img_description: str,
+                              dimension: int = 1024,
+                              model_id: str = "amazon.titan-embed-image-v1"
+                              ):
+    """
+    Get the text embedding from the cache, the in memory tier first and the table afterwards. The embedding is only
+    requested to Bedrock when it is not in any of them
+    """
+
+    key = get_embeddings_cache_key(img_description, dimension, model_id)
+
+    if key in embeddings_cache:
+        embeddings_cache.move_to_end(key)
+        embeddings_cache_stats["memory_hits"] += 1
+        source = "memory"
+        feature_vector = embeddings_cache[key]
+    else:
+        feature_vector = None
+
+        if embeddingsCacheTable is not None:
+            try:
+                item = embeddingsCacheTable.get_item(Key={"id": key}).get("Item")
+                if item is not None:
+                    feature_vector = json.loads(item["embedding"])
+            except Exception as e:
+                logger.warning(f"Error reading the embeddings cache: {e}")
+
+        if feature_vector is not None:
+            embeddings_cache_stats["table_hits"] += 1
+            source = "table"
+        else:
+            embeddings_cache_stats["misses"] += 1
+            source = "bedrock"
+            feature_vector = encode_description(img_description, dimension=dimension, model_id=model_id)
+
+            if embeddingsCacheTable is not None:
+                try:
+                    # Stored as a JSON string, DynamoDB doesn't accept floats
+                    embeddingsCacheTable.put_item(
+                        Item={
+                            "id": key,
+                            "embedding": json.dumps(feature_vector),
+                            "expires_at": int(time.time()) + EMBEDDINGS_CACHE_TTL_DAYS * 24 * 3600,
                         }
-                    }
-            },
-        "post_filter": {
-            "bool": {
-                "filter": [
-                    {"term": {"node": node}},
-                    {"term": {"objective": objective}}
-                ]
-            }
+                    )
+                except Exception as e:
+                    logger.warning(f"Error writing the embeddings cache: {e}")
+
+        embeddings_cache[key] = feature_vector
+        if len(embeddings_cache) > EMBEDDINGS_CACHE_MAX_SIZE:
+            embeddings_cache.popitem(last=False)
+
+    requests = sum(embeddings_cache_stats.values())
+    hits = embeddings_cache_stats["memory_hits"] + embeddings_cache_stats["table_hits"]
+    logger.info(
+        f"Embedding of the image description from {source}, cache hit rate {hits / requests:.2%} "
+        f"({embeddings_cache_stats['memory_hits']} memory hits, {embeddings_cache_stats['table_hits']} table hits, "
+        f"{embeddings_cache_stats['misses']} misses)"
+    )
+
+    return feature_vector
+
+
+def get_filter_selectivity(index_name, oss_client, knn_filter):
+    """
+    Fraction of the indexed images that match the filter, obtained with a single request that doesn't return documents
+    @param index_name: Name of the embeddings index
+    @param oss_client: OpenSearch client
+    @param knn_filter: Filter of the search
+    @return: Number of images matching the filter and fraction of the indexed images they represent
+    """
+
+    body = {
+        "size": 0,
+        "track_total_hits": True,
+        "aggs": {
+            "matching": {"filter": knn_filter}
         }
     }
 
     res = oss_client.search(index=index_name, body=body)
 
-    logger.debug("The results")
-    logger.debug(res)
+    total = res["hits"]["total"]["value"]
+    matching = res["aggregations"]["matching"]["doc_count"]
+
+    return matching, matching / total if total > 0 else 0
+
+
+def get_embeddings_engine(index_name, oss_client):
+    """
+    Engine of the embeddings field of the index. Indexes created before the filter was moved into the k-NN query use
+    the nmslib engine, which rejects it, until they are migrated to a new index (see the indexing stack README)
+    @param index_name: Name of the embeddings index
+    @param oss_client: OpenSearch client
+    @return: Engine of the embeddings field, nmslib when the mapping doesn't name one
+    """
+
+    if index_name not in embeddings_engines:
+        mapping = oss_client.indices.get_mapping(index=index_name)
+        # The response is keyed by the concrete name of the index
+        properties = next(iter(mapping.values()))["mappings"]["properties"]
+        embeddings_engines[index_name] = properties["embeddings"].get("method", {}).get("engine", "nmslib")
+
+        if embeddings_engines[index_name] == "nmslib":
+            logger.warning(f"Index {index_name} uses the nmslib engine, searching with a post filter")
+
+    return embeddings_engines[index_name]
 
-    for hit in res["hits"]["hits"]:
+
+def search_images(index_name, embedding, oss_client, node, objective, k=3):
+    """
+    Search the k nearest images to the embedding among the images of the given node and objective. The filter is
+    applied inside the k-NN query (efficient filtering), so the search looks for k neighbours that match it instead of
+    filtering k neighbours afterwards. The more selective the filter, the more neighbours are requested to keep recall.
+    On indexes of the nmslib engine the filter is applied after the k-NN query, with the same oversampling
+    """
+
+    matched_images = []
+
+    knn_filter = {
+        "bool": {
+            "filter": [
+                {"term": {"node": node}},
+                {"term": {"objective": objective}}
+            ]
+        }
+    }
+
+    matching, selectivity = get_filter_selectivity(index_name, oss_client, knn_filter)
+
+    logger.debug(f"{matching} images match the filter, selectivity {selectivity:.4f}")
+
+    if matching == 0:
+        return matched_images
+
+    efficient_filtering = get_embeddings_engine(index_name, oss_client) != "nmslib"
+
+    expected = min(k, matching)
+    k_search = min(MAX_KNN_K, max(k, MIN_KNN_K, math.ceil(k / max(selectivity, 1e-6) ** 0.5)))
+
+    while True:
+        body = {
+            "size": k,
+            "_source": {
+                "exclude": ["embeddings"],
+            },
+            "query":
+                {
+                    "knn":
+                        {
+                            "embeddings": {
+                                "vector": embedding,
+                                "k": k_search,
+                            }
+                        }
+                },
+        }
+
+        if efficient_filtering:
+            body["query"]["knn"]["embeddings"]["filter"] = knn_filter
+        else:
+            body["post_filter"] = knn_filter
+
+        res = oss_client.search(index=index_name, body=body)
+
+        logger.debug("The results")
+        logger.debug(res)
+
+        hits = res["hits"]["hits"]
+
+        # Fewer neighbours than matching images means the approximate search missed some, oversample and retry
+        if len(hits) >= expected or k_search >= MAX_KNN_K:
+            break
+
+        k_search = min(MAX_KNN_K, k_search * 4)
+        logger.debug(f"Found {len(hits)} of {expected} images, searching again with k={k_search}")
+
+    for hit in hits:
         matched_images.append((hit["_source"]["results"], hit["_source"]["image_s3_uri"], hit["_source"]["img_element_list"], hit["_source"]["image_description"]))
 
     return matched_images
@@ -131,22 +311,18 @@ def handler(event, context):
     uid = event["uid"]
 
     if method != "POST":
-        lambda_response["statusCode"] = 400
-        lambda_response["body"]["message"] = "Bad Request. Malformed URL"
-
-        return lambda_response
+        return build_response(400, {"message": "Bad Request. Malformed URL"})
 
     logger.debug("Searching campaign")
 
-    ans = campaignTable.get_item(Key={'id':uid})
-    logger.debug(ans)
-    if 'Item' in ans:
-        campaign = ans['Item']
-    else:
-        lambda_response["statusCode"] = 400
-        lambda_response["body"]["message"] = "Campaign not found"
-
-        return lambda_response
+    try:
+        campaign = get_campaign(
+            campaignTable,
+            uid,
+            ["campaign_description", "visual_concept", "image_description", "node", "objective"]
+        )
+    except CampaignNotFoundError:
+        return build_response(404, {"message": "Campaign not found"})
 
     logger.debug("Retrieved campaign: ")
     logger.debug(campaign)
@@ -180,7 +356,7 @@ def handler(event, context):
 
     #Embed img description
     #TODO: Investigate if the visual concept or the image description are better to perform the search of the images
-    img_desc_embedding = encode_description(image_description)
+    img_desc_embedding = encode_description_cached(image_description)
     #img_desc_embedding = encode_description(visual_concept)
 
     #Search for the images that match the criteria
@@ -191,12 +367,7 @@ def handler(event, context):
 
     if len(matched_images) == 0:
         # No matching images
-
-        campaign["image_references"] = []
-        campaignTable.put_item(Item=campaign)
-
-        lambda_response["statusCode"] = 200
-        lambda_response["body"] = []
+        answer = []
 
     else:
         #Sort images based on result score
@@ -209,11 +380,21 @@ def handler(event, context):
                    "description": matched_images_map[key][3], "img_elements":matched_images_map[key][2]} for key in
                   matched_images_map]
 
-        #Update dynamo table
-        campaign["image_references"] = answer
-        campaignTable.put_item(Item=campaign)
+    #Update dynamo table, the references are only valid for the description, node and objective they were searched for
+    try:
+        update_campaign(
+            campaignTable,
+            uid,
+            set_attributes={"image_references": answer},
+            unchanged_attributes={
+                "image_description": image_description,
+                "node": node,
+                "objective": objective,
+            }
+        )
+    except (CampaignNotFoundError, CampaignVersionConflictError) as e:
+        logger.error(f"Campaign {uid} changed while searching the references: {e}")
 
-        lambda_response["statusCode"] = 200
-        lambda_response["body"] = json.dumps(answer)
+        return build_response(409, {"message": "Campaign changed while searching the references"})
 
-    return lambda_response
+    return build_response(200, answer)
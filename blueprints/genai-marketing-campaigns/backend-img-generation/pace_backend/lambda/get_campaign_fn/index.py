@@ -16,18 +16,30 @@
 # SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 import os
+import base64
+import binascii
 import logging
 import boto3
 import json
 import decimal
 
+from boto3.dynamodb.conditions import Attr, Key
+
 logger = logging.getLogger()
 logger.setLevel(os.getenv("LOG_LEVEL"))
 
 CAMPAIGN_TABLE_NAME = os.getenv("CAMPAIGN_TABLE_NAME")
 HISTORIC_TABLE_NAME = os.getenv("HISTORIC_TABLE_NAME")
+CREATED_AT_INDEX_NAME = os.getenv("CREATED_AT_INDEX_NAME", "CreatedAtIndex")
+OBJECTIVE_CREATED_AT_INDEX_NAME = os.getenv("OBJECTIVE_CREATED_AT_INDEX_NAME", "ObjectiveCreatedAtIndex")
+NODE_CREATED_AT_INDEX_NAME = os.getenv("NODE_CREATED_AT_INDEX_NAME", "NodeCreatedAtIndex")
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", 25))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 100))
 campaignTable = boto3.resource("dynamodb").Table(CAMPAIGN_TABLE_NAME)
 
+# Partition key value of every campaign in CreatedAtIndex, set when the campaign is created
+CAMPAIGN_RECORD_TYPE = "CAMPAIGN"
+
 class DecimalEncoder(json.JSONEncoder):
     def default(self, o):
         if isinstance(o, decimal.Decimal):
@@ -44,6 +56,70 @@ lambda_response = {
     "body": {},
 }
 
+def _encode_next_token(last_evaluated_key):
+    if not last_evaluated_key:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(last_evaluated_key, cls=DecimalEncoder).encode("utf-8")).decode("utf-8")
+
+def _decode_next_token(next_token):
+    return json.loads(base64.urlsafe_b64decode(next_token.encode("utf-8")))
+
+def list_campaigns(query_parameters):
+    """
+    List a page of campaigns, newest first, with the attributes shown in the campaigns list only
+    @param query_parameters: Optional objective, node, limit and next_token (cursor returned by the previous page)
+    @return: Status code and body of the response
+    """
+
+    objective = query_parameters.get("objective")
+    node = query_parameters.get("node")
+
+    try:
+        limit = min(int(query_parameters.get("limit", DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError("limit must be positive")
+    except ValueError:
+        return 400, {"message": "Invalid limit"}
+
+    query_kwargs = {
+        "ScanIndexForward": False,  # Newest first
+        "Limit": limit,
+        "ProjectionExpression": "#id, #name, #objective, #node, created_at",
+        "ExpressionAttributeNames": {"#id": "id", "#name": "name", "#objective": "objective", "#node": "node"},
+    }
+
+    # Campaigns are stored with lowercase objective and node. Indexes not deployed yet (empty names) are replaced by
+    # filters on CreatedAtIndex
+    if objective and OBJECTIVE_CREATED_AT_INDEX_NAME:
+        query_kwargs["IndexName"] = OBJECTIVE_CREATED_AT_INDEX_NAME
+        query_kwargs["KeyConditionExpression"] = Key("objective").eq(objective.lower())
+        if node:
+            query_kwargs["FilterExpression"] = Attr("node").eq(node.lower())
+    elif node and NODE_CREATED_AT_INDEX_NAME:
+        query_kwargs["IndexName"] = NODE_CREATED_AT_INDEX_NAME
+        query_kwargs["KeyConditionExpression"] = Key("node").eq(node.lower())
+        if objective:
+            query_kwargs["FilterExpression"] = Attr("objective").eq(objective.lower())
+    else:
+        query_kwargs["IndexName"] = CREATED_AT_INDEX_NAME
+        query_kwargs["KeyConditionExpression"] = Key("record_type").eq(CAMPAIGN_RECORD_TYPE)
+        filters = [Attr(name).eq(value.lower()) for name, value in [("objective", objective), ("node", node)] if value]
+        if filters:
+            query_kwargs["FilterExpression"] = filters[0] if len(filters) == 1 else filters[0] & filters[1]
+
+    if query_parameters.get("next_token"):
+        try:
+            query_kwargs["ExclusiveStartKey"] = _decode_next_token(query_parameters["next_token"])
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            return 400, {"message": "Invalid next_token"}
+
+    ans = campaignTable.query(**query_kwargs)
+
+    return 200, {
+        "items": ans["Items"],
+        "next_token": _encode_next_token(ans.get("LastEvaluatedKey")),
+    }
+
 def handler(event, context):
     logger.debug("Received event: " + json.dumps(event))
     method = event["httpMethod"]
@@ -63,11 +139,12 @@ def handler(event, context):
 
     result = None
     if uid == None:
-      ans = campaignTable.scan()
-      result = ans['Items']
-      while "LastEvaluatedKey" in ans.keys() and ans['LastEvaluatedKey'] != []:
-        ans = campaignTable.scan(ExclusiveStartKey = ans['LastEvaluatedKey'])
-        result.extend(ans['Items'])
+      status_code, result = list_campaigns(event.get("queryStringParameters") or {})
+      if status_code != 200:
+        lambda_response["statusCode"] = status_code
+        lambda_response["body"] = json.dumps(result)
+
+        return lambda_response
 
     else:
       ans = campaignTable.get_item(Key={'id':uid})
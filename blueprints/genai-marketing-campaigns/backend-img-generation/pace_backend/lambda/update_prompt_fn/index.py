@@ -20,6 +20,8 @@ import logging
 import json
 import boto3
 
+from campaign_repository_layer.campaign_repository import update_campaign, CampaignNotFoundError
+
 logger = logging.getLogger()
 logger.setLevel(os.getenv("LOG_LEVEL"))
 
@@ -52,13 +54,11 @@ def handler(event, context):
 
     uid = pathParts[-1]
 
-    ans = campaignTable.get_item(Key={'id':uid})
     # Get attributes for campaign
 
     try:
         body = json.loads(event["body"])
         prompt = body["user_prompt"]
-        campaign = ans["Item"]
     except:
 
         lambda_response["statusCode"] = 200
@@ -70,10 +70,14 @@ def handler(event, context):
     answer = {"user_prompt": prompt}
 
     #Update dynamo table
-    if not "image_prompt" in campaign:
-      campaign["image_prompt"] = {}
-    campaign["image_prompt"]["user_prompt"] = prompt
-    campaignTable.put_item(Item=campaign)
+    try:
+        update_campaign(campaignTable, uid, set_attributes={"image_prompt.user_prompt": prompt})
+    except CampaignNotFoundError:
+
+        lambda_response["statusCode"] = 404
+        lambda_response["body"] = json.dumps({"message": "Campaign not found"})
+
+        return lambda_response
 
     lambda_response["statusCode"] = 200
     lambda_response["body"] = json.dumps(answer)
@@ -0,0 +1,215 @@
+# MIT No Attribution
+#
+# Copyright 2025 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from datetime import datetime, timezone
+
+from botocore.exceptions import ClientError
+
+# Campaign writes as partial UpdateItem requests: nested attributes are set by path and lists are extended with
+# list_append, so concurrent writers don't overwrite each other and no write pays for the whole item. Every write
+# increments the version of the campaign. Writers whose changes depend on what they read pass the attributes they read,
+# or the version, and are rejected if they changed in between
+
+VERSION_ATTRIBUTE = "version"
+
+# Partition key value of every campaign in the index used to list the campaigns by creation date
+CAMPAIGN_RECORD_TYPE = "CAMPAIGN"
+
+
+class CampaignNotFoundError(Exception):
+    """The campaign doesn't exist"""
+
+
+class CampaignVersionConflictError(Exception):
+    """The campaign was modified after it was read"""
+
+
+def get_campaign(table, campaign_id: str, attributes: list=None) -> dict:
+    """
+    Read a campaign
+    @param table: DynamoDB table of the campaigns
+    @param campaign_id: Id of the campaign
+    @param attributes: Top level attributes to read, all of them if not given
+    @return: The campaign, with its version (0 for campaigns created before versions were recorded)
+    """
+
+    get_kwargs = {"Key": {"id": campaign_id}}
+
+    if attributes:
+        names = {f"#attr{i}": attribute_name for i, attribute_name in enumerate(set(attributes) | {"id", VERSION_ATTRIBUTE})}
+        get_kwargs["ProjectionExpression"] = ", ".join(names.keys())
+        get_kwargs["ExpressionAttributeNames"] = names
+
+    ans = table.get_item(**get_kwargs)
+
+    if "Item" not in ans:
+        raise CampaignNotFoundError(campaign_id)
+
+    campaign = ans["Item"]
+    campaign.setdefault(VERSION_ATTRIBUTE, 0)
+
+    return campaign
+
+
+def create_campaign(table, campaign: dict) -> dict:
+    """
+    Store a new campaign, fails if a campaign with the same id exists
+    @param table: DynamoDB table of the campaigns
+    @param campaign: The campaign, with its id
+    @return: The stored campaign
+    """
+
+    campaign = {
+        **campaign,
+        VERSION_ATTRIBUTE: 1,
+        # Keys of the campaign listing indexes, ISO 8601 timestamps sort chronologically
+        "record_type": CAMPAIGN_RECORD_TYPE,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+    table.put_item(
+        Item=campaign,
+        ConditionExpression="attribute_not_exists(id)",
+    )
+
+    return campaign
+
+
+def _path_expression(path: str, names: dict, prefix: str) -> str:
+    """Expression of a dot separated attribute path, e.g. image_prompt.ai_prompt, using attribute name placeholders"""
+
+    parts = []
+    for i, part in enumerate(path.split(".")):
+        placeholder = f"#{prefix}_{i}"
+        names[placeholder] = part
+        parts.append(placeholder)
+
+    return ".".join(parts)
+
+
+def update_campaign(table, campaign_id: str, set_attributes: dict=None, append_attributes: dict=None, expected_version: int=None,
+                    unchanged_attributes: dict=None) -> int:
+    """
+    Update some attributes of a campaign in a single write
+    @param table: DynamoDB table of the campaigns
+    @param campaign_id: Id of the campaign
+    @param set_attributes: Attributes to set, keys can be paths of nested attributes like image_prompt.user_prompt. The
+    maps in the path are created if they don't exist
+    @param append_attributes: Lists to append to the list attributes, the attributes are created if they don't exist
+    @param expected_version: Version of the campaign the update is based on, the update is rejected with a
+    CampaignVersionConflictError if the campaign has a different version. Not checked if not given
+    @param unchanged_attributes: Top level attributes the update is based on, with the values read (None for missing
+    attributes). The update is rejected with a CampaignVersionConflictError if any of them changed, writes to other
+    attributes don't conflict
+    @return: New version of the campaign
+    """
+
+    names = {"#version": VERSION_ATTRIBUTE}
+    values = {":zero": 0, ":one": 1}
+    set_actions = ["#version = if_not_exists(#version, :zero) + :one"]
+    parent_paths = set()
+
+    for i, (path, value) in enumerate((set_attributes or {}).items()):
+        set_actions.append(f"{_path_expression(path, names, f'set{i}')} = :set{i}")
+        values[f":set{i}"] = value
+        if "." in path:
+            parent_paths.add(path.rsplit(".", 1)[0])
+
+    for i, (path, items) in enumerate((append_attributes or {}).items()):
+        expression = _path_expression(path, names, f"append{i}")
+        set_actions.append(f"{expression} = list_append(if_not_exists({expression}, :empty_list), :append{i})")
+        values[":empty_list"] = []
+        values[f":append{i}"] = list(items)
+
+    condition = "attribute_exists(id)"
+    if expected_version is not None:
+        condition += " AND " + ("attribute_not_exists(#version)" if expected_version == 0 else "#version = :expected_version")
+        if expected_version != 0:
+            values[":expected_version"] = expected_version
+
+    for i, (name, value) in enumerate((unchanged_attributes or {}).items()):
+        names[f"#unchanged{i}"] = name
+        if value is None:
+            condition += f" AND attribute_not_exists(#unchanged{i})"
+        else:
+            condition += f" AND #unchanged{i} = :unchanged{i}"
+            values[f":unchanged{i}"] = value
+
+    update_kwargs = {
+        "Key": {"id": campaign_id},
+        "UpdateExpression": "SET " + ", ".join(set_actions),
+        "ConditionExpression": condition,
+        "ExpressionAttributeNames": names,
+        "ExpressionAttributeValues": values,
+        "ReturnValues": "UPDATED_NEW",
+    }
+
+    try:
+        ans = table.update_item(**update_kwargs)
+    except ClientError as e:
+        error_code = e.response["Error"]["Code"]
+
+        if error_code == "ConditionalCheckFailedException":
+            _raise_condition_error(table, campaign_id)
+
+        # A map of a nested path doesn't exist yet, create the missing maps and try again
+        if error_code == "ValidationException" and parent_paths:
+            _create_parent_maps(table, campaign_id, parent_paths)
+            try:
+                ans = table.update_item(**update_kwargs)
+            except ClientError as retry_error:
+                if retry_error.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                    _raise_condition_error(table, campaign_id)
+                raise
+        else:
+            raise
+
+    return int(ans["Attributes"][VERSION_ATTRIBUTE])
+
+
+def _raise_condition_error(table, campaign_id: str):
+    ans = table.get_item(Key={"id": campaign_id}, ProjectionExpression="id")
+
+    if "Item" not in ans:
+        raise CampaignNotFoundError(campaign_id)
+
+    raise CampaignVersionConflictError(f"Campaign {campaign_id} changed after it was read")
+
+
+def _create_parent_maps(table, campaign_id: str, parent_paths: set):
+    """Create the maps of nested paths that don't exist, one level at a time, without changing the existing ones"""
+
+    for depth in range(1, max(len(path.split(".")) for path in parent_paths) + 1):
+        names = {}
+        set_actions = []
+
+        for i, path in enumerate(sorted({".".join(path.split(".")[:depth]) for path in parent_paths if len(path.split(".")) >= depth})):
+            expression = _path_expression(path, names, f"map{i}")
+            set_actions.append(f"{expression} = if_not_exists({expression}, :empty_map)")
+
+        try:
+            table.update_item(
+                Key={"id": campaign_id},
+                UpdateExpression="SET " + ", ".join(set_actions),
+                ConditionExpression="attribute_exists(id)",
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues={":empty_map": {}},
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                raise CampaignNotFoundError(campaign_id)
+            raise
@@ -0,0 +1,106 @@
+# MIT No Attribution
+#
+# Copyright 2025 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Set the keys of the campaign listing indexes (record_type and created_at) on the campaigns created before the indexes
+existed, which are not listed until then. The creation date of those campaigns is unknown, they get --created-at, by
+default the start of the epoch so they are listed after the campaigns created since. Safe to run more than once, the
+attributes already set are not changed. Run from the backend directory:
+
+    python scripts/backfill_campaign_index_keys.py --table-name <CampaignsTableName> [--created-at 2024-01-01T00:00:00+00:00] [--dry-run]
+"""
+
+import argparse
+import os
+import sys
+
+import boto3
+
+from botocore.exceptions import ClientError
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pace_backend", "shared"))
+
+from campaign_repository_layer.campaign_repository import CAMPAIGN_RECORD_TYPE
+
+LEGACY_CREATED_AT = "1970-01-01T00:00:00+00:00"
+
+
+def campaigns_without_index_keys(table):
+    """Ids of the campaigns missing record_type or created_at, scanning only the keys"""
+
+    scan_kwargs = {
+        "ProjectionExpression": "id",
+        "FilterExpression": "attribute_not_exists(record_type) OR attribute_not_exists(created_at)",
+    }
+
+    while True:
+        ans = table.scan(**scan_kwargs)
+        for item in ans["Items"]:
+            yield item["id"]
+
+        if "LastEvaluatedKey" not in ans:
+            return
+        scan_kwargs["ExclusiveStartKey"] = ans["LastEvaluatedKey"]
+
+
+def backfill(table, created_at: str, dry_run: bool=False) -> int:
+    """
+    Set the index keys of the campaigns that don't have them
+    @param table: DynamoDB table of the campaigns
+    @param created_at: Creation date given to the campaigns without one
+    @param dry_run: Only count the campaigns
+    @return: Number of campaigns updated
+    """
+
+    updated = 0
+
+    for campaign_id in campaigns_without_index_keys(table):
+        if not dry_run:
+            try:
+                table.update_item(
+                    Key={"id": campaign_id},
+                    UpdateExpression="SET record_type = if_not_exists(record_type, :record_type), "
+                                     "created_at = if_not_exists(created_at, :created_at)",
+                    # The campaign may have been deleted since the scan
+                    ConditionExpression="attribute_exists(id)",
+                    ExpressionAttributeValues={":record_type": CAMPAIGN_RECORD_TYPE, ":created_at": created_at},
+                )
+            except ClientError as e:
+                if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                    continue
+                raise
+
+        updated += 1
+
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--table-name", required=True, help="Name of the campaigns table, see the stack resources")
+    parser.add_argument("--created-at", default=LEGACY_CREATED_AT, help="ISO 8601 creation date of the campaigns")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the campaigns to update")
+    args = parser.parse_args()
+
+    table = boto3.resource("dynamodb").Table(args.table_name)
+    updated = backfill(table, args.created_at, args.dry_run)
+
+    print(f"{'Found' if args.dry_run else 'Updated'} {updated} campaigns without the index keys")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# MIT No Attribution
+#
+# Copyright 2025 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import importlib.util
+import os
+import sys
+
+import boto3
+import pytest
+from moto import mock_aws
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAMBDA_DIR = os.path.join(BACKEND_DIR, "pace_backend", "lambda")
+
+# Campaign repository layer, importable the same way as in the Lambda runtime
+sys.path.insert(0, os.path.join(BACKEND_DIR, "pace_backend", "shared"))
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+os.environ.setdefault("LOG_LEVEL", "INFO")
+os.environ.setdefault("REGION", "us-east-1")
+os.environ.setdefault("CAMPAIGN_TABLE_NAME", "campaigns")
+
+
+def load_lambda(function_dir, module="index"):
+    """
+    Import a module of a Lambda function, every function has its own index.py so they are imported under unique names
+    @param function_dir: Directory of the function
+    @param module: Name of the module in the directory
+    @return: Imported module
+    """
+
+    sys.path.insert(0, function_dir)
+    try:
+        spec = importlib.util.spec_from_file_location(
+            f"{os.path.basename(function_dir)}_{module}", os.path.join(function_dir, f"{module}.py")
+        )
+        lambda_module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(lambda_module)
+    finally:
+        sys.path.remove(function_dir)
+
+    return lambda_module
+
+
+def create_table(name):
+    return boto3.resource("dynamodb").create_table(
+        TableName=name,
+        KeySchema=[{"AttributeName": "id", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "id", "AttributeType": "S"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+
+
+@pytest.fixture
+def campaigns_table():
+    with mock_aws():
+        yield create_table(os.environ["CAMPAIGN_TABLE_NAME"])
@@ -0,0 +1,189 @@
+# MIT No Attribution
+#
+# Copyright 2025 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import json
+import os
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import boto3
+import pytest
+from moto.dynamodb.models import DynamoDBBackend
+
+from conftest import LAMBDA_DIR, load_lambda
+
+from campaign_repository_layer.campaign_repository import (
+    create_campaign, get_campaign, update_campaign, CampaignNotFoundError, CampaignVersionConflictError
+)
+
+
+@pytest.fixture
+def campaign(campaigns_table):
+    return create_campaign(campaigns_table, {
+        "id": "campaign",
+        "campaign_description": "Summer sale",
+        "image_description": "People on a beach",
+        "node": "followers",
+        "objective": "clicks",
+    })
+
+
+def test_concurrent_appends_are_all_kept(campaigns_table, campaign, monkeypatch):
+    writers = 16
+
+    # DynamoDB applies each UpdateItem atomically, moto doesn't when called from several threads
+    item_lock = threading.Lock()
+    moto_update_item = DynamoDBBackend.update_item
+
+    def atomic_update_item(*args, **kwargs):
+        with item_lock:
+            return moto_update_item(*args, **kwargs)
+
+    monkeypatch.setattr(DynamoDBBackend, "update_item", atomic_update_item)
+
+    def append_image(i):
+        # A table per writer, as separate Lambda invocations
+        table = boto3.session.Session().resource("dynamodb").Table(campaigns_table.name)
+        return update_campaign(table, "campaign", append_attributes={"generated_images": [{"url": f"s3://img{i}.png"}]})
+
+    with ThreadPoolExecutor(max_workers=writers) as executor:
+        versions = list(executor.map(append_image, range(writers)))
+
+    stored = get_campaign(campaigns_table, "campaign")
+    assert sorted(image["url"] for image in stored["generated_images"]) == sorted(f"s3://img{i}.png" for i in range(writers))
+    # Every write got its own version
+    assert sorted(versions) == list(range(2, writers + 2))
+    assert stored["version"] == writers + 1
+
+
+def test_stale_version_is_rejected(campaigns_table, campaign):
+    read = get_campaign(campaigns_table, "campaign")
+    update_campaign(campaigns_table, "campaign", set_attributes={"image_description": "People in the mountains"})
+
+    with pytest.raises(CampaignVersionConflictError):
+        update_campaign(campaigns_table, "campaign", set_attributes={"visual_concept": "Hiking"},
+                        expected_version=read["version"])
+
+    assert "visual_concept" not in get_campaign(campaigns_table, "campaign")
+
+
+def test_writes_to_other_attributes_do_not_conflict(campaigns_table, campaign):
+    read = get_campaign(campaigns_table, "campaign", ["campaign_description", "image_references"])
+    update_campaign(campaigns_table, "campaign", append_attributes={"generated_images": [{"url": "s3://img.png"}]})
+
+    update_campaign(
+        campaigns_table, "campaign",
+        set_attributes={"image_prompt.ai_prompt": "A beach at sunset"},
+        unchanged_attributes={
+            "campaign_description": read["campaign_description"],
+            "image_references": read.get("image_references"),
+        },
+    )
+
+    assert get_campaign(campaigns_table, "campaign")["image_prompt"] == {"ai_prompt": "A beach at sunset"}
+
+
+def test_changed_attribute_is_rejected(campaigns_table, campaign):
+    references = [{"url": "s3://ref.png", "score": 10}]
+    update_campaign(campaigns_table, "campaign", set_attributes={"image_references": references})
+    read = get_campaign(campaigns_table, "campaign", ["campaign_description", "image_references"])
+
+    update_campaign(campaigns_table, "campaign", set_attributes={"image_references": []})
+
+    with pytest.raises(CampaignVersionConflictError):
+        update_campaign(
+            campaigns_table, "campaign",
+            set_attributes={"image_prompt.ai_prompt": "A beach at sunset"},
+            unchanged_attributes={
+                "campaign_description": read["campaign_description"],
+                "image_references": read["image_references"],
+            },
+        )
+
+    assert "image_prompt" not in get_campaign(campaigns_table, "campaign")
+
+
+def test_missing_campaign(campaigns_table):
+    with pytest.raises(CampaignNotFoundError):
+        update_campaign(campaigns_table, "missing", set_attributes={"image_prompt.user_prompt": "A beach"},
+                        unchanged_attributes={"node": "followers"})
+
+
+def test_update_prompt_of_missing_campaign_is_not_found(campaigns_table, campaign):
+    update_prompt_fn = load_lambda(os.path.join(LAMBDA_DIR, "update_prompt_fn"))
+
+    def put_prompt(campaign_id):
+        return update_prompt_fn.handler({
+            "httpMethod": "PUT",
+            "path": f"/suggestion/{campaign_id}",
+            "body": json.dumps({"user_prompt": "A beach"}),
+        }, None)
+
+    assert put_prompt("campaign")["statusCode"] == 200
+    response = put_prompt("missing")
+    assert response["statusCode"] == 404
+    assert json.loads(response["body"]) == {"message": "Campaign not found"}
+
+
+@pytest.fixture
+def generate_recommendations_fn(monkeypatch):
+    monkeypatch.setenv("OSS_HOST", "https://localhost")
+    monkeypatch.setenv("HISTORIC_TABLE_NAME", "historic")
+    generate_recommendations_fn = load_lambda(os.path.join(LAMBDA_DIR, "generate_recommendations_fn"))
+    monkeypatch.setattr(generate_recommendations_fn, "encode_description_cached", lambda description: [0.1])
+    monkeypatch.setattr(generate_recommendations_fn, "search_images", lambda *args, **kwargs: [])
+    return generate_recommendations_fn
+
+
+@pytest.fixture
+def generate_prompt_fn(monkeypatch):
+    generate_prompt_fn = load_lambda(os.path.join(LAMBDA_DIR, "generate_prompt_fn"))
+    monkeypatch.setattr(generate_prompt_fn, "generate_text_to_image_meta_prompt",
+                        lambda **kwargs: SimpleNamespace(prompt="A beach at sunset", reasoning="The description"))
+    return generate_prompt_fn
+
+
+def changed_campaign(*args, **kwargs):
+    raise CampaignVersionConflictError("changed")
+
+
+@pytest.mark.parametrize("function, event", [
+    ("generate_recommendations_fn", {"httpMethod": "POST"}),
+    ("generate_prompt_fn", {"httpMethod": "POST", "body": {"references": []}}),
+])
+def test_campaign_errors_are_json_responses(request, campaigns_table, function, event, monkeypatch):
+    lambda_module = request.getfixturevalue(function)
+    create_campaign(campaigns_table, {
+        "id": "campaign", "campaign_description": "Summer sale", "visual_concept": "", "image_description": "A beach",
+        "node": "followers", "objective": "clicks", "image_references": [],
+    })
+
+    assert lambda_module.handler({**event, "uid": "campaign"}, None)["statusCode"] == 200
+
+    # Twice, a warm container serves the second request with the module state left by the first
+    for _ in range(2):
+        response = lambda_module.handler({**event, "uid": "missing"}, None)
+        assert response["statusCode"] == 404
+        assert json.loads(response["body"]) == {"message": "Campaign not found"}
+
+    monkeypatch.setattr(lambda_module, "update_campaign", changed_campaign)
+    for _ in range(2):
+        response = lambda_module.handler({**event, "uid": "campaign"}, None)
+        assert response["statusCode"] == 409
+        assert "changed" in json.loads(response["body"])["message"]
@@ -0,0 +1,161 @@
+# MIT No Attribution
+#
+# Copyright 2025 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import json
+import os
+import sys
+
+import boto3
+import pytest
+
+from conftest import BACKEND_DIR, LAMBDA_DIR, create_table, load_lambda
+
+from campaign_repository_layer.campaign_repository import create_campaign, get_campaign
+
+BUCKET_NAME = "processed"
+
+
+@pytest.fixture
+def generate_new_images_fn(campaigns_table, monkeypatch):
+    monkeypatch.setenv("JOBS_TABLE_NAME", "jobs")
+    monkeypatch.setenv("PROCESSED_BUCKET", BUCKET_NAME)
+    create_table("jobs")
+    boto3.client("s3").create_bucket(Bucket=BUCKET_NAME)
+
+    generate_new_images_fn = load_lambda(os.path.join(LAMBDA_DIR, "generate_new_images_fn"))
+    create_campaign(campaigns_table, {"id": "campaign"})
+
+    return generate_new_images_fn
+
+
+def put_job(generate_new_images_fn, status="PENDING"):
+    generate_new_images_fn.jobsTable.put_item(Item={
+        "id": "job", "campaign_id": "campaign", "prompt": "a beach", "number_of_images": 2, "status": status,
+    })
+
+
+def get_job(generate_new_images_fn):
+    return generate_new_images_fn.jobsTable.get_item(Key={"id": "job"})["Item"]
+
+
+def test_duplicate_invocation_appends_the_images_once(generate_new_images_fn, campaigns_table, monkeypatch):
+    calls = []
+    monkeypatch.setattr(generate_new_images_fn, "genImgsCanvas", lambda prompt, n: calls.append(prompt) or [b"png"] * n)
+    put_job(generate_new_images_fn)
+
+    first = generate_new_images_fn.worker_handler({"job_id": "job"}, None)
+    second = generate_new_images_fn.worker_handler({"job_id": "job"}, None)
+
+    assert first["status"] == "COMPLETED"
+    assert second["status"] == "COMPLETED"
+    assert len(calls) == 1
+    assert len(get_campaign(campaigns_table, "campaign")["generated_images"]) == 2
+    assert get_job(generate_new_images_fn)["urls"] == first["urls"]
+
+
+def test_failed_generation_marks_the_job_failed_without_raising(generate_new_images_fn, campaigns_table, monkeypatch):
+    def throttled(prompt, number_of_images):
+        raise RuntimeError("ThrottlingException")
+
+    monkeypatch.setattr(generate_new_images_fn, "genImgsCanvas", throttled)
+    put_job(generate_new_images_fn)
+
+    assert generate_new_images_fn.worker_handler({"job_id": "job"}, None) == {"job_id": "job", "status": "FAILED"}
+
+    job = get_job(generate_new_images_fn)
+    assert job["status"] == "FAILED"
+    assert job["message"] == "Could not generate images"
+    assert "generated_images" not in get_campaign(campaigns_table, "campaign")
+
+
+def test_running_job_is_not_started_again(generate_new_images_fn, monkeypatch):
+    monkeypatch.setattr(generate_new_images_fn, "genImgsCanvas", lambda prompt, n: pytest.fail("generated twice"))
+    put_job(generate_new_images_fn, status="RUNNING")
+
+    assert generate_new_images_fn.worker_handler({"job_id": "job"}, None) == {"job_id": "job", "status": "RUNNING"}
+
+
+def test_job_is_failed_when_the_worker_cannot_be_started(generate_new_images_fn, monkeypatch):
+    def invoke(**kwargs):
+        raise RuntimeError("TooManyRequestsException")
+
+    monkeypatch.setattr(generate_new_images_fn.lambda_client, "invoke", invoke)
+
+    response = generate_new_images_fn.handler({
+        "httpMethod": "POST", "path": "/generate_images/campaign", "body": json.dumps({"prompt": "a beach"}),
+    }, None)
+
+    body = json.loads(response["body"])
+    assert response["statusCode"] == 503
+    assert body["status"] == "FAILED"
+
+    job = generate_new_images_fn.jobsTable.get_item(Key={"id": body["job_id"]})["Item"]
+    assert job["status"] == "FAILED"
+    assert job["message"] == "Could not start the job"
+
+
+def failed_invocation(job_id):
+    # Invocation record sent to the on failure destination when the worker runs out of time or memory
+    return {
+        "requestContext": {"condition": "RetriesExhausted", "approximateInvokeCount": 1},
+        "requestPayload": {"job_id": job_id},
+        "responsePayload": {"errorMessage": "Task timed out after 300.00 seconds"},
+    }
+
+
+def test_failed_invocation_fails_the_running_job(generate_new_images_fn):
+    put_job(generate_new_images_fn, status="RUNNING")
+
+    assert generate_new_images_fn.failure_handler(failed_invocation("job"), None) == {"job_id": "job", "status": "FAILED"}
+    assert get_job(generate_new_images_fn)["status"] == "FAILED"
+
+
+def test_failed_invocation_keeps_completed_jobs(generate_new_images_fn):
+    put_job(generate_new_images_fn, status="COMPLETED")
+
+    assert generate_new_images_fn.failure_handler(failed_invocation("job"), None) == {"job_id": "job"}
+    assert get_job(generate_new_images_fn)["status"] == "COMPLETED"
+    # Unknown jobs are not created
+    generate_new_images_fn.failure_handler(failed_invocation("other"), None)
+    assert "Item" not in generate_new_images_fn.jobsTable.get_item(Key={"id": "other"})
+
+
+def test_failed_worker_invocations_go_to_the_failure_function():
+    cdk = pytest.importorskip("aws_cdk")
+    assertions = pytest.importorskip("aws_cdk.assertions")
+
+    sys.path.insert(0, BACKEND_DIR)
+    cwd = os.getcwd()
+    os.chdir(BACKEND_DIR)
+    try:
+        from pace_backend import PACEBackendStack
+
+        app = cdk.App(context={"aws:cdk:bundling-stacks": []})
+        stack = PACEBackendStack(app, "Test")
+        template = assertions.Template.from_stack(stack)
+    finally:
+        os.chdir(cwd)
+        sys.path.remove(BACKEND_DIR)
+
+    failure_function = stack.resolve(stack.generate_new_images_worker_failure_fn.node.default_child.logical_id)
+    template.has_resource_properties("AWS::Lambda::EventInvokeConfig", {
+        "MaximumRetryAttempts": 0,
+        "DestinationConfig": {"OnFailure": {"Destination": {"Fn::GetAtt": [failure_function, "Arn"]}}},
+    })
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "index.failure_handler",
+    })
@@ -0,0 +1,102 @@
+# MIT No Attribution
+#
+# Copyright 2025 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import json
+import os
+import sys
+import time
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from conftest import BACKEND_DIR, LAMBDA_DIR, load_lambda
+
+from campaign_repository_layer.campaign_repository import create_campaign
+
+sys.path.insert(0, os.path.join(BACKEND_DIR, "scripts"))
+
+from backfill_campaign_index_keys import LEGACY_CREATED_AT, backfill
+
+INDEXES = [
+    ("CreatedAtIndex", "record_type"),
+    ("ObjectiveCreatedAtIndex", "objective"),
+    ("NodeCreatedAtIndex", "node"),
+]
+
+
+@pytest.fixture
+def campaigns_table():
+    with mock_aws():
+        yield boto3.resource("dynamodb").create_table(
+            TableName=os.environ["CAMPAIGN_TABLE_NAME"],
+            KeySchema=[{"AttributeName": "id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": name, "AttributeType": "S"}
+                                  for name in ["id", "record_type", "objective", "node", "created_at"]],
+            GlobalSecondaryIndexes=[{
+                "IndexName": index_name,
+                "KeySchema": [{"AttributeName": partition_key, "KeyType": "HASH"},
+                              {"AttributeName": "created_at", "KeyType": "RANGE"}],
+                "Projection": {"ProjectionType": "ALL"},
+            } for index_name, partition_key in INDEXES],
+            BillingMode="PAY_PER_REQUEST",
+        )
+
+
+@pytest.fixture
+def get_campaign_fn(campaigns_table):
+    for i, (objective, node) in enumerate([("clicks", "followers"), ("likes", "followers"), ("clicks", "customers")]):
+        create_campaign(campaigns_table, {"id": f"campaign{i}", "name": f"Campaign {i}", "objective": objective, "node": node})
+        time.sleep(0.01)
+
+    # Created before the indexes, without their keys
+    campaigns_table.put_item(Item={"id": "legacy", "name": "Legacy", "objective": "clicks", "node": "followers"})
+
+    return load_lambda(os.path.join(LAMBDA_DIR, "get_campaign_fn"))
+
+
+def list_campaigns(get_campaign_fn, **query_parameters):
+    response = get_campaign_fn.handler(
+        {"httpMethod": "GET", "path": "/campaigns", "queryStringParameters": query_parameters}, None
+    )
+    assert response["statusCode"] == 200
+    return [campaign["id"] for campaign in json.loads(response["body"])["items"]]
+
+
+@pytest.mark.parametrize("stage", [1, 2, 3])
+def test_listing_with_the_deployed_indexes(get_campaign_fn, monkeypatch, stage):
+    deployed = [index_name for index_name, _ in INDEXES[:stage]]
+    for variable, index_name in [("OBJECTIVE_CREATED_AT_INDEX_NAME", "ObjectiveCreatedAtIndex"),
+                                 ("NODE_CREATED_AT_INDEX_NAME", "NodeCreatedAtIndex")]:
+        monkeypatch.setattr(get_campaign_fn, variable, index_name if index_name in deployed else "")
+
+    assert list_campaigns(get_campaign_fn) == ["campaign2", "campaign1", "campaign0"]
+    assert list_campaigns(get_campaign_fn, objective="Clicks") == ["campaign2", "campaign0"]
+    assert list_campaigns(get_campaign_fn, node="followers") == ["campaign1", "campaign0"]
+    assert list_campaigns(get_campaign_fn, objective="clicks", node="followers") == ["campaign0"]
+
+
+def test_backfill_lists_the_legacy_campaigns_last(get_campaign_fn, campaigns_table):
+    assert backfill(campaigns_table, LEGACY_CREATED_AT, dry_run=True) == 1
+    assert "legacy" not in list_campaigns(get_campaign_fn)
+
+    assert backfill(campaigns_table, LEGACY_CREATED_AT) == 1
+    # Nothing left to backfill, the keys of the other campaigns are unchanged
+    assert backfill(campaigns_table, LEGACY_CREATED_AT) == 0
+
+    assert list_campaigns(get_campaign_fn) == ["campaign2", "campaign1", "campaign0", "legacy"]
+    assert list_campaigns(get_campaign_fn, objective="clicks", node="followers") == ["campaign0", "legacy"]
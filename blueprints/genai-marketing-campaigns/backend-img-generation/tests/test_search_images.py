@@ -0,0 +1,84 @@
+# MIT No Attribution
+#
+# Copyright 2025 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import os
+
+import pytest
+
+from conftest import LAMBDA_DIR, load_lambda
+
+INDEX_NAME = "embeddings"
+
+
+class EmbeddingsIndex:
+    """Stand-in of the OpenSearch client, an index of the given engine where 10 images match the filter"""
+
+    def __init__(self, engine):
+        self.indices = self
+        self.engine = engine
+        self.mapping_requests = 0
+        self.searches = []
+
+    def get_mapping(self, index):
+        self.mapping_requests += 1
+        return {index: {"mappings": {"properties": {"embeddings": {
+            "type": "knn_vector", "method": {"name": "hnsw", "engine": self.engine},
+        }}}}}
+
+    def search(self, index, body):
+        if body.get("size") == 0:
+            return {"hits": {"total": {"value": 1000}}, "aggregations": {"matching": {"doc_count": 10}}}
+
+        self.searches.append(body)
+        return {"hits": {"hits": [{"_source": {
+            "results": 1, "image_s3_uri": f"s3://images/original/img{i}.jpg", "img_element_list": "",
+            "image_description": "",
+        }} for i in range(body["size"])]}}
+
+
+@pytest.fixture
+def generate_recommendations_fn(monkeypatch):
+    monkeypatch.setenv("OSS_HOST", "https://localhost")
+    monkeypatch.setenv("HISTORIC_TABLE_NAME", "historic")
+    return load_lambda(os.path.join(LAMBDA_DIR, "generate_recommendations_fn"))
+
+
+def test_lucene_index_filters_inside_the_knn_query(generate_recommendations_fn):
+    index = EmbeddingsIndex("lucene")
+
+    images = generate_recommendations_fn.search_images(INDEX_NAME, [0.1], index, "followers", "clicks", k=5)
+
+    assert len(images) == 5
+    knn = index.searches[0]["query"]["knn"]["embeddings"]
+    assert knn["filter"]["bool"]["filter"] == [{"term": {"node": "followers"}}, {"term": {"objective": "clicks"}}]
+    assert "post_filter" not in index.searches[0]
+
+
+def test_nmslib_index_falls_back_to_a_post_filter(generate_recommendations_fn):
+    index = EmbeddingsIndex("nmslib")
+
+    for _ in range(2):
+        images = generate_recommendations_fn.search_images(INDEX_NAME, [0.1], index, "followers", "clicks", k=5)
+
+    assert len(images) == 5
+    for body in index.searches:
+        assert "filter" not in body["query"]["knn"]["embeddings"]
+        assert body["query"]["knn"]["embeddings"]["k"] >= generate_recommendations_fn.MIN_KNN_K
+        assert body["post_filter"]["bool"]["filter"] == [{"term": {"node": "followers"}},
+                                                         {"term": {"objective": "clicks"}}]
+    # The mapping is read once per container
+    assert index.mapping_requests == 1
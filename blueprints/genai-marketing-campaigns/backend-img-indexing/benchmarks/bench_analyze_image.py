@@ -0,0 +1,255 @@
+# MIT No Attribution
+#
+# Copyright 2025 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Per image latency of the analysis of the images of a bulk indexing manifest, with the two variants of the workflow:
+  - sequential: prepare, describe and embed one after the other, as before BulkAnalyzeImage
+  - parallel: prepare, then describe and embed in the branches of BulkAnalyzeImage
+The prepare, describe and embeddings functions run in-process, S3 runs in moto and Bedrock is a stub with a fixed
+latency per model (and a random jitter), the images run concurrently as in BulkProcessImgsMap. The manifest is built
+from the images of a folder, or from synthetic images of several formats and sizes. Step Functions transitions and
+Lambda invocations are not included. Run from the backend directory:
+
+    python benchmarks/bench_analyze_image.py [--images-dir <folder>] [--images 20] [--describe-latency-ms 2500]
+"""
+
+import argparse
+import io
+import json
+import os
+import queue
+import random
+import statistics
+import threading
+import time
+import types
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from harness import WORKFLOW_DIR, load_lambda
+
+BUCKET_NAME = "images"
+BULK_INDEX_PREFIX = "bulk_index/"
+EXECUTION_NAME = "benchmark"
+EMBEDDING_DIMENSION = 1024
+# Formats and sizes of the synthetic images: most are JPEG photos within the model limits
+SYNTHETIC_IMAGES = [("JPEG", (1600, 1200))] * 6 + [("JPEG", (4000, 3000))] * 2 + [("PNG", (1200, 900))] * 2
+
+
+class BedrockStub:
+    """Converse (descriptions) and InvokeModel (embeddings) requests answered after a latency, on the boto3 clients"""
+
+    def __init__(self, describe_latency, embed_latency, jitter, seed):
+        self.describe_latency = describe_latency
+        self.embed_latency = embed_latency
+        self.jitter = jitter
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def attach(self, client):
+        client.meta.events.register("before-call.bedrock-runtime.Converse", self._converse)
+        client.meta.events.register("before-call.bedrock-runtime.InvokeModel", self._invoke_model)
+
+    def _sleep(self, latency):
+        with self._lock:
+            factor = 1 + self._rng.uniform(-self.jitter, self.jitter)
+        time.sleep(latency * factor)
+
+    def _converse(self, params, **_kwargs):
+        self._sleep(self.describe_latency)
+
+        # The serialized request, the structured output of the function is a tool
+        tool = json.loads(params["body"])["toolConfig"]["tools"][0]["toolSpec"]
+        return types.SimpleNamespace(status_code=200, headers={}), {
+            "output": {"message": {"role": "assistant", "content": [{"toolUse": {
+                "toolUseId": "benchmark",
+                "name": tool["name"],
+                "input": {"description": "People walking on a beach at sunset", "elements": ["person", "beach", "sun"]},
+            }}]}},
+            "stopReason": "tool_use",
+            "usage": {"inputTokens": 1500, "outputTokens": 60, "totalTokens": 1560},
+            "metrics": {"latencyMs": int(self.describe_latency * 1000)},
+            "ResponseMetadata": {"HTTPStatusCode": 200, "HTTPHeaders": {}},
+        }
+
+    def _invoke_model(self, params, **_kwargs):
+        from botocore.response import StreamingBody
+
+        self._sleep(self.embed_latency)
+
+        body = json.dumps({"embedding": [0.0] * EMBEDDING_DIMENSION, "inputTextTokenCount": 0}).encode("utf-8")
+        return types.SimpleNamespace(status_code=200, headers={}), {
+            "body": StreamingBody(io.BytesIO(body), len(body)),
+            "contentType": "application/json",
+            "ResponseMetadata": {"HTTPStatusCode": 200, "HTTPHeaders": {}},
+        }
+
+
+class Containers:
+    """
+    Warm containers of a Lambda function, each one a separate import of the function since the functions keep their
+    response in module state. An invocation takes an idle container for its duration
+    """
+
+    def __init__(self, function_dir, n, on_load=None):
+        self._idle = queue.Queue()
+        for _ in range(n):
+            function = load_lambda(function_dir)
+            if on_load:
+                on_load(function)
+            self._idle.put(function)
+
+    @contextmanager
+    def invoke(self):
+        function = self._idle.get()
+        try:
+            yield function
+        finally:
+            self._idle.put(function)
+
+
+def build_manifest(s3, images_dir, n_images, seed):
+    """Upload the images to the bucket and return the manifest, a list of img_key and metadata"""
+
+    from PIL import Image
+
+    manifest = []
+    metadata = {"results": 100, "node": "followers", "objective": "clicks"}
+
+    if images_dir:
+        for file_name in sorted(os.listdir(images_dir))[:n_images]:
+            with open(os.path.join(images_dir, file_name), "rb") as image_file:
+                s3.put_object(Bucket=BUCKET_NAME, Key=f"original/{file_name}", Body=image_file.read())
+            manifest.append({"img_key": f"original/{file_name}", "metadata": metadata})
+        return manifest
+
+    rng = random.Random(seed)
+    for i in range(n_images):
+        image_format, size = SYNTHETIC_IMAGES[i % len(SYNTHETIC_IMAGES)]
+        # A small noise image scaled up, compresses like a photo
+        small = Image.frombytes("RGB", (64, 48), bytes(rng.getrandbits(8) for _ in range(64 * 48 * 3)))
+        body = io.BytesIO()
+        small.resize(size, Image.BILINEAR).save(body, format=image_format)
+
+        img_key = f"original/img{i}.{image_format.lower()}"
+        s3.put_object(Bucket=BUCKET_NAME, Key=img_key, Body=body.getvalue())
+        manifest.append({"img_key": img_key, "metadata": metadata})
+
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images-dir", help="Folder with the images of the manifest, synthetic images if not given")
+    parser.add_argument("--images", type=int, default=20, help="Number of images of the manifest")
+    parser.add_argument("--concurrency", type=int, default=5, help="Concurrent images (bulk_max_concurrent_images)")
+    parser.add_argument("--describe-latency-ms", type=float, default=2500, help="Latency of the description model")
+    parser.add_argument("--embed-latency-ms", type=float, default=400, help="Latency of the embeddings model")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Random variation of the latencies, +-fraction")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.environ.update({
+        "IMG_BUCKET": BUCKET_NAME,
+        "MODEL_ID": "us.amazon.nova-pro-v1:0",
+        "REGION": os.environ["AWS_DEFAULT_REGION"],
+    })
+
+    import boto3
+    import langchain_core.globals
+    from moto import mock_aws
+
+    with mock_aws():
+        s3 = boto3.client("s3")
+        s3.create_bucket(Bucket=BUCKET_NAME)
+
+        bedrock = BedrockStub(args.describe_latency_ms / 1000, args.embed_latency_ms / 1000, args.jitter, args.seed)
+
+        prepare_image_fn = Containers(os.path.join(WORKFLOW_DIR, "prepare_image_fn"), args.concurrency)
+        describe_image_fn = Containers(os.path.join(WORKFLOW_DIR, "describe_image_fn"), args.concurrency,
+                                       lambda function: bedrock.attach(function.img_desc_llm.client))
+        get_img_embeddings_fn = Containers(os.path.join(WORKFLOW_DIR, "get_img_embeddings_fn"), args.concurrency,
+                                           lambda function: bedrock.attach(function.bedrock_runtime))
+        # The describe function enables the debug output of langchain on import
+        langchain_core.globals.set_debug(False)
+
+        manifest = build_manifest(s3, args.images_dir, args.images, args.seed)
+
+        def prepare(image):
+            with prepare_image_fn.invoke() as function:
+                return function.lambda_handler({"img_key": image["img_key"]}, None)["body"]["prepared_img_key"]
+
+        def describe(prepared_img_key):
+            with describe_image_fn.invoke() as function:
+                function.lambda_handler({"img_key": prepared_img_key}, None)
+
+        def embed(image, prepared_img_key):
+            with get_img_embeddings_fn.invoke() as function:
+                function.lambda_handler({
+                    "img_key": prepared_img_key,
+                    "embedding_key": f"{BULK_INDEX_PREFIX}{EXECUTION_NAME}/{image['img_key']}.json",
+                }, None)
+
+        # Branches of the parallel state
+        analysis_pool = ThreadPoolExecutor(max_workers=2 * args.concurrency)
+
+        def sequential(image):
+            prepared_img_key = prepare(image)
+            describe(prepared_img_key)
+            embed(image, prepared_img_key)
+
+        def parallel(image):
+            prepared_img_key = prepare(image)
+            description = analysis_pool.submit(describe, prepared_img_key)
+            embedding = analysis_pool.submit(embed, image, prepared_img_key)
+            description.result()
+            embedding.result()
+
+        print(f"{len(manifest)} images, {args.concurrency} concurrent images, describe {args.describe_latency_ms:.0f} ms, "
+              f"embed {args.embed_latency_ms:.0f} ms (+-{args.jitter:.0%})")
+
+        latencies = {}
+        elapsed = {}
+        for variant, analyze in [("sequential", sequential), ("parallel", parallel)]:
+            def timed(image):
+                started_at = time.perf_counter()
+                analyze(image)
+                return time.perf_counter() - started_at
+
+            started_at = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+                latencies[variant] = list(executor.map(timed, manifest))
+            elapsed[variant] = time.perf_counter() - started_at
+
+        analysis_pool.shutdown()
+
+    print(f"  {'image':32} {'sequential':>12} {'parallel':>12}")
+    for image, sequential_latency, parallel_latency in zip(manifest, latencies["sequential"], latencies["parallel"]):
+        print(f"  {image['img_key']:32} {sequential_latency * 1000:9.0f} ms {parallel_latency * 1000:9.0f} ms")
+
+    for name, summary in [
+        ("mean", statistics.mean),
+        ("p50", statistics.median),
+        ("p95", lambda values: statistics.quantiles(values, n=20)[-1] if len(values) > 1 else values[0]),
+    ]:
+        print(f"  {name:32} {summary(latencies['sequential']) * 1000:9.0f} ms {summary(latencies['parallel']) * 1000:9.0f} ms")
+    print(f"  {'manifest':32} {elapsed['sequential']:10.2f} s {elapsed['parallel']:10.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+# MIT No Attribution
+#
+# Copyright 2025 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Throughput of the indexing of images into OpenSearch: one index request per image, as the single image workflow does,
+against the _bulk requests of the bulk indexing workflow.
+
+index_data_fn runs in-process. OpenSearch and S3 are stubs served by another process, with a fixed latency per
+request (and per document for OpenSearch), so they don't compete with the function for the interpreter. Modes:
+  - single-new-client: a new OpenSearch client, with its own connections, per image (index_data_fn before the client
+    was reused across invocations)
+  - single: lambda_handler per image, with the client of the container
+  - bulk: bulk_lambda_handler per batch of images, reading the embeddings from S3
+The execution report of the bulk mode is built by report_lambda_handler from results in the format of the distributed
+map result writer. All the invocations share this process, which is CPU bound at about 150 images/s, so
+--concurrency 1 gives the throughput of each invocation. Run from the backend directory:
+
+    python benchmarks/bench_bulk_index.py [--images 1000] [--batch-size 25] [--concurrency 10] [--oss-latency-ms 20]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import re
+import socket
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from harness import WORKFLOW_DIR, load_lambda
+
+BUCKET_NAME = "images"
+INDEX_NAME = "embeddings"
+EMBEDDING_DIMENSION = 1024
+RESULTS_PREFIX = "bulk_index_results/benchmark"
+
+
+class ServiceStub(BaseHTTPRequestHandler):
+    """
+    OpenSearch index and _bulk requests, and S3 objects of a single bucket, answered after a fixed latency. The requests
+    and connections are counted, GET /_benchmark/stats returns and resets the counters
+    """
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body in a single write, separate small writes are delayed by the TCP acknowledgements
+    wbufsize = 1 << 16
+
+    oss_latency = 0.02
+    oss_document_latency = 0.0002
+    s3_latency = 0.015
+
+    objects = {}
+    stats = {"oss_requests": 0, "s3_requests": 0}
+    connections = set()
+
+    def log_message(self, *_args):
+        pass
+
+    def handle_expect_100(self):
+        # The interim response of the S3 uploads, sent before the body
+        self.send_response_only(100)
+        self.end_headers()
+        self.wfile.flush()
+        return True
+
+    def _respond(self, status, body=b"", content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", '"benchmark"')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def _is_s3(self):
+        return self.path.startswith(f"/{BUCKET_NAME}/") or self.path.startswith(f"/{BUCKET_NAME}?")
+
+    def _s3(self):
+        body = self._read_body()
+        self.stats["s3_requests"] += 1
+        time.sleep(self.s3_latency)
+
+        key = self.path.split("?")[0][len(BUCKET_NAME) + 2:]
+
+        if self.command == "PUT":
+            self.objects[key] = body
+            self._respond(200)
+        elif self.command == "GET":
+            self._respond(200, self.objects[key], "application/octet-stream")
+        elif self.command == "POST" and "delete" in self.path:
+            for deleted_key in re.findall(r"<Key>(.*?)</Key>", body.decode("utf-8")):
+                self.objects.pop(deleted_key, None)
+            self._respond(200, b'<?xml version="1.0" encoding="UTF-8"?><DeleteResult '
+                               b'xmlns="http://s3.amazonaws.com/doc/2006-03-01/"></DeleteResult>', "application/xml")
+
+    def _opensearch(self):
+        body = self._read_body()
+        self.stats["oss_requests"] += 1
+        self.connections.add(self.client_address)
+
+        if self.path.split("?")[0].endswith("/_bulk"):
+            # An action line and a source line per document
+            n_documents = len(body.splitlines()) // 2
+            response = {
+                "took": 1, "errors": False,
+                "items": [{"index": {"_id": str(i), "status": 201, "result": "created"}} for i in range(n_documents)],
+            }
+        else:
+            n_documents = 1
+            response = {"_id": "1", "result": "created", "_version": 1}
+
+        time.sleep(self.oss_latency + n_documents * self.oss_document_latency)
+        self._respond(201 if n_documents == 1 else 200, json.dumps(response).encode("utf-8"))
+
+    def do_GET(self):
+        if self.path == "/_benchmark/stats":
+            stats = {**self.stats, "oss_connections": len(self.connections)}
+            self.stats.update(oss_requests=0, s3_requests=0)
+            self.connections.clear()
+            self._respond(200, json.dumps(stats).encode("utf-8"))
+        else:
+            self._s3()
+
+    def do_POST(self):
+        self._s3() if self._is_s3() else self._opensearch()
+
+    def do_PUT(self):
+        self._s3() if self._is_s3() else self._opensearch()
+
+
+def serve_stubs(port, oss_latency, oss_document_latency, s3_latency):
+    ServiceStub.oss_latency = oss_latency
+    ServiceStub.oss_document_latency = oss_document_latency
+    ServiceStub.s3_latency = s3_latency
+    ThreadingHTTPServer(("127.0.0.1", port), ServiceStub).serve_forever()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get_stats(port):
+    import urllib.request
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/_benchmark/stats") as response:
+        return json.loads(response.read())
+
+
+def local_client(opensearchpy, port, pool_maxsize):
+    """Client with the configuration of index_data_fn, without TLS and request signing, for the local stub"""
+
+    return opensearchpy.OpenSearch(
+        hosts=[{"host": "127.0.0.1", "port": port}],
+        use_ssl=False,
+        connection_class=opensearchpy.RequestsHttpConnection,
+        pool_maxsize=pool_maxsize,
+        timeout=300,
+    )
+
+
+def processed_image(index, embedding_key=None):
+    """State of an image after the description and embeddings steps"""
+
+    image = {
+        "img_key": f"original/img{index}.jpg",
+        "metadata": {"results": random.randint(0, 1000), "node": "followers", "objective": "clicks"},
+        "img_desc": {"description": f"Description of the image {index}", "labels_list": ["person", "beach"]},
+    }
+    if embedding_key:
+        image["embedding"] = {"embedding_key": embedding_key}
+    return image
+
+
+def run_single(index_data_fn, n_images, concurrency, new_client=None):
+    """Index each image with its own request, as the single image workflow"""
+
+    embedding = [random.random() for _ in range(EMBEDDING_DIMENSION)]
+
+    def index_image(index):
+        if new_client:
+            index_data_fn.oss_client = new_client()
+
+        image = processed_image(index)
+        index_data_fn.lambda_handler({
+            "img_key": image["img_key"],
+            "metadata": image["metadata"],
+            "img_desc": image["img_desc"]["description"],
+            "labels_list": image["img_desc"]["labels_list"],
+            "embeddings": embedding,
+        }, None)
+
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(index_image, range(n_images)))
+
+    return time.perf_counter() - started_at
+
+
+def bulk_batches(s3, n_images, batch_size):
+    """Batches of the distributed map, with the embeddings stored as the embeddings function of the bulk workflow does"""
+
+    embedding = json.dumps([random.random() for _ in range(EMBEDDING_DIMENSION)])
+
+    batches = []
+    for first in range(0, n_images, batch_size):
+        batch = [processed_image(index, f"bulk_index/benchmark/img{index}.json")
+                 for index in range(first, min(first + batch_size, n_images))]
+        for image in batch:
+            s3.put_object(Bucket=BUCKET_NAME, Key=image["embedding"]["embedding_key"], Body=embedding)
+        batches.append(batch)
+
+    return batches
+
+
+def run_bulk(index_data_fn, batches, concurrency):
+    """Index the images in batches, as the batches of the distributed map of the bulk workflow"""
+
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda batch: index_data_fn.bulk_lambda_handler({"images": batch}, None), batches))
+    elapsed = time.perf_counter() - started_at
+
+    return elapsed, results
+
+
+def write_map_results(s3, batches, results):
+    """Write the results of the batches as the result writer of the distributed map does, in a single result file"""
+
+    executions = [
+        {"Input": json.dumps({"Items": batch}), "Output": json.dumps(result), "Status": "SUCCEEDED"}
+        for batch, result in zip(batches, results)
+    ]
+    s3.put_object(Bucket=BUCKET_NAME, Key=f"{RESULTS_PREFIX}/SUCCEEDED_0.json", Body=json.dumps(executions))
+
+    manifest_key = f"{RESULTS_PREFIX}/manifest.json"
+    s3.put_object(Bucket=BUCKET_NAME, Key=manifest_key, Body=json.dumps({
+        "DestinationBucket": BUCKET_NAME,
+        "ResultFiles": {"SUCCEEDED": [{"Key": f"{RESULTS_PREFIX}/SUCCEEDED_0.json"}], "FAILED": [], "PENDING": []},
+    }))
+
+    return {"Bucket": BUCKET_NAME, "Key": manifest_key}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=1000, help="Number of images to index in each mode")
+    parser.add_argument("--batch-size", type=int, default=25, help="Images per _bulk request (bulk_images_per_batch)")
+    parser.add_argument("--concurrency", type=int, default=10, help="Concurrent invocations of the indexing function")
+    parser.add_argument("--oss-latency-ms", type=float, default=20, help="Latency of every OpenSearch request")
+    parser.add_argument("--oss-document-latency-ms", type=float, default=0.2, help="Latency of every indexed document")
+    parser.add_argument("--s3-latency-ms", type=float, default=15, help="Latency of every S3 request")
+    args = parser.parse_args()
+
+    port = free_port()
+    stubs = multiprocessing.Process(
+        target=serve_stubs,
+        args=(port, args.oss_latency_ms / 1000, args.oss_document_latency_ms / 1000, args.s3_latency_ms / 1000),
+        daemon=True,
+    )
+    stubs.start()
+
+    try:
+        run_benchmark(args, port)
+    finally:
+        stubs.terminate()
+
+
+def run_benchmark(args, port):
+    os.environ.update({
+        "IMG_BUCKET": BUCKET_NAME,
+        "OSS_HOST": "https://localhost",
+        "OSS_EMBEDDINGS_INDEX_NAME": INDEX_NAME,
+        "OSS_POOL_MAXSIZE": "10",
+    })
+
+    import boto3
+    import opensearchpy
+    from botocore.config import Config
+
+    index_data_fn = load_lambda(os.path.join(WORKFLOW_DIR, "index_data_fn"))
+    # A pool per concurrent invocation, as each invocation of the function runs in its own container
+    index_data_fn.s3 = boto3.client("s3", endpoint_url=f"http://127.0.0.1:{port}", config=Config(
+        s3={"addressing_style": "path"},
+        max_pool_connections=index_data_fn.OSS_POOL_MAXSIZE * args.concurrency,
+        request_checksum_calculation="when_required",
+        response_checksum_validation="when_required",
+    ))
+
+    # Wait for the stubs
+    for _ in range(50):
+        try:
+            get_stats(port)
+            break
+        except OSError:
+            time.sleep(0.1)
+
+    print(f"{args.images} images, {args.concurrency} concurrent invocations, {args.oss_latency_ms} ms per OpenSearch "
+          f"request, {args.s3_latency_ms} ms per S3 request")
+    print(f"  {'mode':20} {'elapsed':>10} {'images/s':>10} {'OSS requests':>13} {'OSS connections':>16} {'S3 requests':>12}")
+
+    def report(mode, elapsed):
+        stats = get_stats(port)
+        print(f"  {mode:20} {elapsed:8.2f} s {args.images / elapsed:10.1f} {stats['oss_requests']:13} "
+              f"{stats['oss_connections']:16} {stats['s3_requests']:12}")
+
+    elapsed = run_single(index_data_fn, args.images, args.concurrency,
+                         new_client=lambda: local_client(opensearchpy, port, index_data_fn.OSS_POOL_MAXSIZE))
+    report("single-new-client", elapsed)
+
+    index_data_fn.oss_client = local_client(opensearchpy, port, index_data_fn.OSS_POOL_MAXSIZE)
+    report("single", run_single(index_data_fn, args.images, args.concurrency))
+
+    batches = bulk_batches(index_data_fn.s3, args.images, args.batch_size)
+    get_stats(port)
+    elapsed, results = run_bulk(index_data_fn, batches, args.concurrency)
+    report(f"bulk ({args.batch_size} per batch)", elapsed)
+
+    # The execution report of the bulk workflow, from the results written by the distributed map
+    started_at = datetime.fromtimestamp(time.time() - elapsed, timezone.utc).isoformat()
+    execution_report = index_data_fn.report_lambda_handler(
+        {"started_at": started_at, "results": write_map_results(index_data_fn.s3, batches, results)}, None
+    )
+    print(f"  bulk execution report: {execution_report}")
+
+
+if __name__ == "__main__":
+    main()
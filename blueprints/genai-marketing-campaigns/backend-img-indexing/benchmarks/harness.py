@@ -0,0 +1,61 @@
+# MIT No Attribution
+#
+# Copyright 2025 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Helpers shared by the benchmarks. The benchmarks run the Lambda functions in-process, without deploying the stack
+"""
+
+import importlib.util
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKFLOW_DIR = os.path.join(BACKEND_DIR, "pace_backend", "index_imgs_workflow")
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+
+def load_lambda(function_dir, module="index"):
+    """
+    Import a module of a Lambda function, every function has its own index.py so they are imported under unique names
+    @param function_dir: Directory of the function
+    @param module: Name of the module in the directory
+    @return: Imported module
+    """
+
+    cwd = os.getcwd()
+    sys.path.insert(0, function_dir)
+    # Some functions read files relative to their directory, as in the Lambda runtime
+    os.chdir(function_dir)
+    try:
+        spec = importlib.util.spec_from_file_location(
+            f"{os.path.basename(function_dir)}_{module}", os.path.join(function_dir, f"{module}.py")
+        )
+        lambda_module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(lambda_module)
+    finally:
+        os.chdir(cwd)
+        sys.path.remove(function_dir)
+
+        for name, loaded_module in list(sys.modules.items()):
+            if (getattr(loaded_module, "__file__", None) or "").startswith(function_dir + os.sep):
+                del sys.modules[name]
+
+    return lambda_module
@@ -25,7 +25,12 @@ from aws_cdk import (
 )
 from constructs import Construct
 
-from pace_backend.index_imgs_workflow import IndexImgWorkflow
+from pace_backend.index_imgs_workflow import (
+    IndexImgWorkflow,
+    PREPARED_IMGS_PREFIX,
+    BULK_INDEX_PREFIX,
+    BULK_INDEX_RESULTS_PREFIX,
+)
 from pace_backend.api import IndexImgAPI
 from pace_backend.oss_indexing_db import OpenSearchServerlessEmbeddingsIndex
 
@@ -85,6 +90,26 @@ class PACEBackendStack(Stack):
             "ImgsBucket"
         )
 
+        # The prepared copies of the images are only read while the images are being indexed
+        self.imgs_bucket.add_lifecycle_rule(
+            prefix=PREPARED_IMGS_PREFIX,
+            expiration=Duration.days(1),
+            noncurrent_version_expiration=Duration.days(1),
+        )
+
+        # The bulk indexing embeddings are deleted once indexed, the rule removes the ones of images that failed
+        self.imgs_bucket.add_lifecycle_rule(
+            prefix=BULK_INDEX_PREFIX,
+            expiration=Duration.days(1),
+            noncurrent_version_expiration=Duration.days(1),
+        )
+
+        self.imgs_bucket.add_lifecycle_rule(
+            prefix=BULK_INDEX_RESULTS_PREFIX,
+            expiration=Duration.days(30),
+            noncurrent_version_expiration=Duration.days(1),
+        )
+
         #Create OpenSearch Serverless collection
         self.oss_embeddings_index = OpenSearchServerlessEmbeddingsIndex(
             self,
@@ -103,6 +128,8 @@ class PACEBackendStack(Stack):
             oss_data_indexing_role=oss_data_indexing_role,
             oss_host=self.oss_embeddings_index.oss_embeddings_collection.attr_collection_endpoint,
             oss_index_name=oss_embeddings_index_name.value_as_string,
+            # The descriptions are embedded for hybrid searches when deployed with -c embed_descriptions=true
+            embed_descriptions=str(self.node.try_get_context("embed_descriptions")).lower() == "true",
         )
 
         #Create API to index images
@@ -154,3 +181,10 @@ class PACEBackendStack(Stack):
             value=oss_embeddings_index_name.value_as_string,
             export_name=f"{Stack.of(self).stack_name}EmbeddingsIndexName",
         )
+
+        CfnOutput(
+            self,
+            "BulkIndexStateMachineARN",
+            value=self.img_index_workflow.bulk_state_machine.state_machine_arn,
+            export_name=f"{Stack.of(self).stack_name}BulkIndexStateMachineARN",
+        )
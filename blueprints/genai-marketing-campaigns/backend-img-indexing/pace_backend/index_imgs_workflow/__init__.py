@@ -32,6 +32,13 @@ from constructs import Construct
 
 from cdk_nag import NagSuppressions
 
+# Prefix of the copies of the images prepared within the limits of the description and embeddings models
+PREPARED_IMGS_PREFIX = "prepared/"
+# Prefix of the embeddings stored by the bulk indexing until they are indexed
+BULK_INDEX_PREFIX = "bulk_index/"
+# Prefix of the results of the batches of the bulk indexing executions
+BULK_INDEX_RESULTS_PREFIX = "bulk_index_results/"
+
 
 class IndexImgWorkflow(Construct):
     """A Step Functions express workflow that takes an image file and indexes the image into Amazon OpenSearch"""
@@ -44,6 +51,11 @@ class IndexImgWorkflow(Construct):
         oss_data_indexing_role: iam.Role,
         oss_host: str,
         oss_index_name: str,
+        bulk_images_per_batch: int = 25,
+        bulk_max_concurrent_batches: int = 10,
+        bulk_max_concurrent_images: int = 5,
+        bulk_tolerated_failure_percentage: int = 10,
+        embed_descriptions: bool = False,
     ) -> None:
         super().__init__(scope, construct_id)
 
@@ -54,6 +66,42 @@ class IndexImgWorkflow(Construct):
             retention=logs.RetentionDays.ONE_MONTH,
         )
 
+        # A lambda function to fetch the image once and store a copy downscaled to the model limits
+        prepare_img_fn = lambda_python.PythonFunction(
+            self,
+            "PrepareImgFunction",
+            entry=f"{os.path.dirname(os.path.realpath(__file__))}/prepare_image_fn",
+            index="index.py",
+            handler="lambda_handler",
+            runtime=lambda_.Runtime.PYTHON_3_13,
+            timeout=Duration.seconds(30),
+            memory_size=1024,
+            environment={
+                "LOG_LEVEL": "INFO",
+                "IMG_BUCKET": imgs_bucket.bucket_name,
+                "PREPARED_IMGS_PREFIX": PREPARED_IMGS_PREFIX,
+                "MAX_IMG_DIMENSION": "2048",
+            },
+        )
+
+        imgs_bucket.grant_read(prepare_img_fn)
+        imgs_bucket.grant_put(prepare_img_fn, f"{PREPARED_IMGS_PREFIX}*")
+
+        NagSuppressions.add_resource_suppressions(
+            prepare_img_fn,
+            [
+                {
+                    "id": "AwsSolutions-IAM4",
+                    "reason": """Service role created by CDK""",
+                },
+                {
+                    "id": "AwsSolutions-IAM5",
+                    "reason": """Service role created by CDK""",
+                },
+            ],
+            True
+        )
+
         # A lambda function to extract the elements of the image
         describe_img_fn = lambda_python.PythonFunction(
             self,
@@ -123,6 +171,7 @@ class IndexImgWorkflow(Construct):
         )
 
         imgs_bucket.grant_read(embed_img_fn)
+        imgs_bucket.grant_put(embed_img_fn, f"{BULK_INDEX_PREFIX}*")
 
         NagSuppressions.add_resource_suppressions(
             embed_img_fn,
@@ -172,12 +221,87 @@ class IndexImgWorkflow(Construct):
             True
         )
 
+        # Lambda functions to index batches of images through the _bulk API and report the bulk indexing throughput
+        bulk_index_data_fn = lambda_python.PythonFunction(
+            self,
+            "BulkIndexDataFunction",
+            entry=f"{os.path.dirname(os.path.realpath(__file__))}/index_data_fn",
+            index="index.py",
+            handler="bulk_lambda_handler",
+            runtime=lambda_.Runtime.PYTHON_3_13,
+            timeout=Duration.seconds(120),
+            memory_size=512,
+            environment={
+                "LOG_LEVEL": "INFO",
+                "IMG_BUCKET": imgs_bucket.bucket_name,
+                "OSS_HOST": oss_host,
+                "OSS_EMBEDDINGS_INDEX_NAME": oss_index_name,
+                "OSS_POOL_MAXSIZE": "10",
+            },
+            role=oss_data_indexing_role,
+        )
+
+        imgs_bucket.grant_read(bulk_index_data_fn, f"{BULK_INDEX_PREFIX}*")
+        imgs_bucket.grant_delete(bulk_index_data_fn, f"{BULK_INDEX_PREFIX}*")
+
+        bulk_index_report_fn = lambda_python.PythonFunction(
+            self,
+            "BulkIndexReportFunction",
+            entry=f"{os.path.dirname(os.path.realpath(__file__))}/index_data_fn",
+            index="index.py",
+            handler="report_lambda_handler",
+            runtime=lambda_.Runtime.PYTHON_3_13,
+            timeout=Duration.seconds(10),
+            environment={
+                "LOG_LEVEL": "INFO",
+                "IMG_BUCKET": imgs_bucket.bucket_name,
+                "OSS_HOST": oss_host,
+                "OSS_EMBEDDINGS_INDEX_NAME": oss_index_name
+            },
+            role=oss_data_indexing_role,
+        )
+
+        imgs_bucket.grant_read(bulk_index_report_fn, f"{BULK_INDEX_RESULTS_PREFIX}*")
+
+        for fn in [bulk_index_data_fn, bulk_index_report_fn]:
+            NagSuppressions.add_resource_suppressions(
+                fn,
+                [
+                    {
+                        "id": "AwsSolutions-IAM4",
+                        "reason": """Service role created by CDK""",
+                    },
+                    {
+                        "id": "AwsSolutions-IAM5",
+                        "reason": """Service role created by CDK""",
+                    },
+                ],
+                True
+            )
+
         #Lambda step functions workflow definition
 
+        # The description and embeddings steps read the prepared image instead of the original
+        prepare_image_task = tasks.LambdaInvoke(
+            self,
+            "PrepareImageTask",
+            lambda_function=prepare_img_fn,
+            payload=sfn.TaskInput.from_object({
+              "img_key.$":"$.img_key"
+            }),
+            result_selector={
+              "prepared_img_key.$": "$.Payload.body.prepared_img_key"
+            },
+            result_path="$.prepared_img",
+        )
+
         describe_image_task = tasks.LambdaInvoke(
             self,
             "DescribeImageTask",
             lambda_function=describe_img_fn,
+            payload=sfn.TaskInput.from_object({
+              "img_key.$":"$.prepared_img.prepared_img_key"
+            }),
             result_selector={
               "labels_list.$": "$.Payload.body.labels_list",
               "description.$": "$.Payload.body.description"
@@ -190,7 +314,7 @@ class IndexImgWorkflow(Construct):
             "EmbedImgTask",
             lambda_function=embed_img_fn,
             payload=sfn.TaskInput.from_object({
-              "img_key.$":"$.img_key"
+              "img_key.$":"$.prepared_img.prepared_img_key"
             }),
             result_selector={
               "embedding.$": "$.Payload.body.embedding.embedding"
@@ -198,27 +322,65 @@ class IndexImgWorkflow(Construct):
             result_path="$.embedding",
         )
 
+        # The image embedding doesn't depend on the description, both models are invoked concurrently and the
+        # results of the branches are merged back into a single state
+        analysis_result_selector = {
+          "img_key.$": "$[0].img_key",
+          "metadata.$": "$[0].metadata",
+          "img_desc.$": "$[0].img_desc",
+          "embedding.$": "$[1].embedding"
+        }
+
+        index_img_payload = {
+          "metadata.$":"$.metadata",
+          "img_key.$":"$.img_key",
+          "img_desc.$": "$.img_desc.description",
+          "labels_list.$":"$.img_desc.labels_list",
+          "embeddings.$":"$.embedding.embedding"
+        }
+
+        # The description is embedded in the same space as the images for hybrid searches
+        if embed_descriptions:
+            embed_description_task = tasks.LambdaInvoke(
+                self,
+                "EmbedDescriptionTask",
+                lambda_function=embed_img_fn,
+                payload=sfn.TaskInput.from_object({
+                  "text.$":"$.img_desc.description"
+                }),
+                result_selector={
+                  "embedding.$": "$.Payload.body.embedding.embedding"
+                },
+                result_path="$.description_embedding",
+            )
+
+            describe_image_task.next(embed_description_task)
+            analysis_result_selector["description_embedding.$"] = "$[0].description_embedding"
+            index_img_payload["description_embeddings.$"] = "$.description_embedding.embedding"
+
+        analyze_image = sfn.Parallel(
+            self,
+            "AnalyzeImage",
+            result_selector=analysis_result_selector,
+        )
+        analyze_image.branch(describe_image_task)
+        analyze_image.branch(embed_img_task)
+
         index_img_task = tasks.LambdaInvoke(
             self,
             "IndexImgTask",
             lambda_function=index_data_fn,
-            payload=sfn.TaskInput.from_object({
-              "metadata.$":"$.metadata",
-              "img_key.$":"$.img_key",
-              "img_desc.$": "$.img_desc.description",
-              "labels_list.$":"$.img_desc.labels_list",
-              "embeddings.$":"$.embedding.embedding"
-            }),
+            payload=sfn.TaskInput.from_object(index_img_payload),
         )
 
-        describe_image_task.next(embed_img_task)
-        embed_img_task.next(index_img_task)
+        prepare_image_task.next(analyze_image)
+        analyze_image.next(index_img_task)
 
         # state machine
         self.state_machine = sfn.StateMachine(
             self,
             "StateMachine",
-            definition_body=sfn.DefinitionBody.from_chainable(describe_image_task),
+            definition_body=sfn.DefinitionBody.from_chainable(prepare_image_task),
             logs=sfn.LogOptions(
                 destination=workflow_log_group,
                 level=sfn.LogLevel.ALL,
@@ -243,6 +405,197 @@ class IndexImgWorkflow(Construct):
             True
         )
 
+        # Bulk indexing workflow, indexes the images listed in a manifest stored in the images bucket. The manifest
+        # is a JSON array of objects with the same format as the requests to the indexing API (img_key and metadata)
+
+        bulk_prepare_image_task = tasks.LambdaInvoke(
+            self,
+            "BulkPrepareImageTask",
+            lambda_function=prepare_img_fn,
+            payload=sfn.TaskInput.from_object({
+              "img_key.$": "$.img_key"
+            }),
+            result_selector={
+              "prepared_img_key.$": "$.Payload.body.prepared_img_key"
+            },
+            result_path="$.prepared_img",
+        )
+
+        bulk_describe_image_task = tasks.LambdaInvoke(
+            self,
+            "BulkDescribeImageTask",
+            lambda_function=describe_img_fn,
+            payload=sfn.TaskInput.from_object({
+              "img_key.$": "$.prepared_img.prepared_img_key"
+            }),
+            result_selector={
+              "labels_list.$": "$.Payload.body.labels_list",
+              "description.$": "$.Payload.body.description"
+            },
+            result_path="$.img_desc",
+        )
+
+        # Embeddings are stored in the bucket and deleted once indexed, a batch of them doesn't fit in the state
+        bulk_embed_img_task = tasks.LambdaInvoke(
+            self,
+            "BulkEmbedImgTask",
+            lambda_function=embed_img_fn,
+            payload=sfn.TaskInput.from_object({
+              "img_key.$": "$.prepared_img.prepared_img_key",
+              "embedding_key.$": f"States.Format('{BULK_INDEX_PREFIX}{{}}/{{}}.json', $$.Execution.Name, $.img_key)"
+            }),
+            result_selector={
+              "embedding_key.$": "$.Payload.body.embedding_key"
+            },
+            result_path="$.embedding",
+        )
+
+        bulk_analysis_result_selector = {
+          "img_key.$": "$[0].img_key",
+          "metadata.$": "$[0].metadata",
+          "img_desc.$": "$[0].img_desc",
+          "embedding.$": "$[1].embedding"
+        }
+
+        bulk_tasks = [bulk_prepare_image_task, bulk_describe_image_task, bulk_embed_img_task]
+
+        if embed_descriptions:
+            bulk_embed_description_task = tasks.LambdaInvoke(
+                self,
+                "BulkEmbedDescriptionTask",
+                lambda_function=embed_img_fn,
+                payload=sfn.TaskInput.from_object({
+                  "text.$": "$.img_desc.description",
+                  "embedding_key.$": f"States.Format('{BULK_INDEX_PREFIX}{{}}/{{}}.description.json', $$.Execution.Name, $.img_key)"
+                }),
+                result_selector={
+                  "embedding_key.$": "$.Payload.body.embedding_key"
+                },
+                result_path="$.description_embedding",
+            )
+
+            bulk_describe_image_task.next(bulk_embed_description_task)
+            bulk_analysis_result_selector["description_embedding.$"] = "$[0].description_embedding"
+            bulk_tasks.append(bulk_embed_description_task)
+
+        bulk_analyze_image = sfn.Parallel(
+            self,
+            "BulkAnalyzeImage",
+            result_selector=bulk_analysis_result_selector,
+        )
+        bulk_analyze_image.branch(bulk_describe_image_task)
+        bulk_analyze_image.branch(bulk_embed_img_task)
+
+        for task in bulk_tasks:
+            task.add_retry(
+                errors=["Lambda.TooManyRequestsException", "ThrottlingException"],
+                interval=Duration.seconds(5),
+                max_attempts=5,
+                backoff_rate=2,
+            )
+
+        # An image that can't be processed is counted as failed without failing the rest of the batch. The states of
+        # the branches can't transition outside of them, failures in the branches are caught by the parallel state
+        img_failed = sfn.Pass(self, "BulkImgFailed")
+
+        for state in [bulk_prepare_image_task, bulk_analyze_image]:
+            state.add_catch(img_failed, result_path="$.error")
+
+        bulk_prepare_image_task.next(bulk_analyze_image)
+
+        process_imgs_map = sfn.Map(
+            self,
+            "BulkProcessImgsMap",
+            items_path="$.Items",
+            max_concurrency=bulk_max_concurrent_images,
+            result_path="$.images",
+        )
+        process_imgs_map.item_processor(bulk_prepare_image_task)
+
+        bulk_index_imgs_task = tasks.LambdaInvoke(
+            self,
+            "BulkIndexImgsTask",
+            lambda_function=bulk_index_data_fn,
+            payload=sfn.TaskInput.from_object({
+              "images.$": "$.images",
+              "embeddings_prefix.$": f"States.Format('{BULK_INDEX_PREFIX}{{}}/', $$.Execution.Name)"
+            }),
+            result_selector={
+              "indexed.$": "$.Payload.indexed",
+              "failed.$": "$.Payload.failed",
+              "elapsed_ms.$": "$.Payload.elapsed_ms"
+            },
+        )
+
+        process_imgs_map.next(bulk_index_imgs_task)
+
+        # The results of the batches are written to the bucket, inline they would exceed the 256KB state limit for
+        # large manifests. Batches that fail as a whole (e.g. the _bulk request times out) don't fail the execution
+        # until they exceed the tolerated percentage, the report counts their images as failed
+        bulk_index_map = sfn.DistributedMap(
+            self,
+            "BulkIndexImgsMap",
+            item_reader=sfn.S3JsonItemReader(
+                bucket=imgs_bucket,
+                key=sfn.JsonPath.string_at("$.manifest_key"),
+            ),
+            item_batcher=sfn.ItemBatcher(max_items_per_batch=bulk_images_per_batch),
+            max_concurrency=bulk_max_concurrent_batches,
+            tolerated_failure_percentage=bulk_tolerated_failure_percentage,
+            result_writer_v2=sfn.ResultWriterV2(
+                bucket=imgs_bucket,
+                prefix=BULK_INDEX_RESULTS_PREFIX,
+            ),
+            result_path="$.map_run",
+        )
+        bulk_index_map.item_processor(
+            process_imgs_map,
+            mode=sfn.ProcessorMode.DISTRIBUTED,
+            execution_type=sfn.ProcessorType.EXPRESS,
+        )
+
+        bulk_index_report_task = tasks.LambdaInvoke(
+            self,
+            "BulkIndexReportTask",
+            lambda_function=bulk_index_report_fn,
+            payload=sfn.TaskInput.from_object({
+              "started_at.$": "$$.Execution.StartTime",
+              "results.$": "$.map_run.ResultWriterDetails"
+            }),
+            output_path="$.Payload",
+        )
+
+        bulk_index_map.next(bulk_index_report_task)
+
+        # Distributed maps run in standard workflows, each batch of images runs in an express child workflow
+        self.bulk_state_machine = sfn.StateMachine(
+            self,
+            "BulkStateMachine",
+            definition_body=sfn.DefinitionBody.from_chainable(bulk_index_map),
+            logs=sfn.LogOptions(
+                destination=workflow_log_group,
+                level=sfn.LogLevel.ERROR,
+                include_execution_data=False,
+            ),
+            tracing_enabled=True,
+            state_machine_type=sfn.StateMachineType.STANDARD,
+        )
+
+        NagSuppressions.add_resource_suppressions(
+            self.bulk_state_machine,
+            [
+                {
+                    "id": "AwsSolutions-IAM4",
+                    "reason": """Service role created by CDK""",
+                },
+                {
+                    "id": "AwsSolutions-IAM5",
+                    "reason": """Service role created by CDK""",
+                },
+            ],
+            True
+        )
+
 
 
 
@@ -19,7 +19,6 @@ import logging
 
 import boto3
 import os
-import base64
 
 #from PIL import Image
 
@@ -68,19 +67,10 @@ def lambda_handler(event, context):
 
         img_key = event['img_key']
 
-        #download image from S3 given bucket name and key
-        s3_response = s3_client.get_object(Bucket=IMG_BUCKET, Key=img_key)
+        # The image is read once, prepared within the model limits by the preparation step
+        image_bytes = s3_client.get_object(Bucket=IMG_BUCKET, Key=img_key)['Body'].read()
 
-        image_bytes = s3_response['Body'].read()
-
-        #transform image to base64
-        image_b64 = base64.b64encode(s3_response['Body'].read()).decode('utf8')
-
-        logger.info("image in bytes:\n")
-        logger.info(image_bytes)
-
-        logger.info("image in base64:\n")
-        logger.info(image_b64)
+        logger.info(f"Describing image {img_key} of {len(image_bytes)} bytes")
 
         # Ask the LLM to describe the image
         describe_image_prompt_template = DESCRIBE_IMAGE_PROMPT_SELECTOR.get_prompt(MODEL_ID)
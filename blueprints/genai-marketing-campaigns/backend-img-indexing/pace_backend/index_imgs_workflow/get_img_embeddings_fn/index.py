@@ -20,7 +20,6 @@ import boto3
 import os
 import json
 import logging
-import tempfile
 import base64
 
 logger = logging.getLogger()
@@ -29,6 +28,8 @@ logger.setLevel(os.getenv("LOG_LEVEL"))
 IMG_BUCKET = os.getenv("IMG_BUCKET")
 
 REGION = os.getenv("REGION")
+# The embeddings model accepts up to 128 tokens of text, longer descriptions are truncated
+MAX_TEXT_LENGTH = int(os.getenv("MAX_TEXT_LENGTH", 400))
 
 logger.info(f"REGION: {REGION}")
 
@@ -48,26 +49,18 @@ lambda_response = {
     "body": {},
 }
 
-def encode_image(image_path: str = None,  # maximum 2048 x 2048 pixels
+def invoke_embeddings_model(payload_body: dict,
             dimension: int = 1024,  # 1,024 (default), 384, 256
             model_id: str = "amazon.titan-embed-image-v1"
                  ):
-    "Get img embedding using embeddings model"
+    "Get the embedding of an image or a text using the multimodal embeddings model"
 
-    payload_body = {}
     embedding_config = {
         "embeddingConfig": {
             "outputEmbeddingLength": dimension
         }
     }
 
-    with open(image_path, "rb") as image_file:
-        input_image = base64.b64encode(image_file.read()).decode('utf8')
-    payload_body["inputImage"] = input_image
-
-    logger.debug("embedding image")
-    logger.debug(payload_body)
-
     response = bedrock_runtime.invoke_model(
         body=json.dumps({**payload_body, **embedding_config}),
         modelId=model_id,
@@ -77,32 +70,69 @@ def encode_image(image_path: str = None,  # maximum 2048 x 2048 pixels
 
     feature_vector = json.loads(response.get("body").read())
 
-    logger.debug("img embedding")
+    logger.debug("embedding")
     logger.debug(feature_vector)
 
     return feature_vector
 
-def lambda_handler(event, context):
+def encode_image(image_bytes: bytes = None,  # maximum 2048 x 2048 pixels
+            dimension: int = 1024,  # 1,024 (default), 384, 256
+            model_id: str = "amazon.titan-embed-image-v1"
+                 ):
+    "Get img embedding using embeddings model"
+
+    logger.debug(f"embedding image of {len(image_bytes)} bytes")
 
-    img_key = event["img_key"]
+    payload_body = {"inputImage": base64.b64encode(image_bytes).decode('utf8')}
+
+    return invoke_embeddings_model(payload_body, dimension=dimension, model_id=model_id)
+
+def encode_text(text: str,  # maximum 128 tokens
+            dimension: int = 1024,  # 1,024 (default), 384, 256
+            model_id: str = "amazon.titan-embed-image-v1"
+                 ):
+    "Get text embedding using embeddings model, in the same space as the img embeddings"
+
+    if len(text) > MAX_TEXT_LENGTH:
+        text = text[:MAX_TEXT_LENGTH].rsplit(' ', 1)[0]
+
+    logger.debug("embedding text")
+    logger.debug(text)
+
+    return invoke_embeddings_model({"inputText": text}, dimension=dimension, model_id=model_id)
+
+def lambda_handler(event, context):
 
     try:
-      
-        tmp_file = tempfile.mkdtemp() + '/img.jpg'
-        with open(tmp_file , 'wb') as f:
-            s3.download_fileobj(IMG_BUCKET, img_key, f)
 
-        feature_vector = encode_image(image_path=tmp_file, dimension=1024)
+        # The description of the image is embedded when a text is received, for hybrid searches
+        if "text" in event:
+            feature_vector = encode_text(text=event["text"], dimension=1024)
+        else:
+            # The image is read in memory, prepared within the model limits by the preparation step
+            image_bytes = s3.get_object(Bucket=IMG_BUCKET, Key=event["img_key"])['Body'].read()
+
+            feature_vector = encode_image(image_bytes=image_bytes, dimension=1024)
 
         lambda_response['statusCode'] = 201
-        lambda_response['body']['embedding'] = feature_vector
-        lambda_response['body']['msg'] = 'success'
+
+        # Bulk indexing stores the embedding in the bucket instead of passing it through the workflow state
+        if "embedding_key" in event:
+            s3.put_object(
+                Bucket=IMG_BUCKET,
+                Key=event["embedding_key"],
+                Body=json.dumps(feature_vector["embedding"]),
+                ContentType="application/json"
+            )
+            lambda_response['body'] = {'embedding_key': event["embedding_key"], 'msg': 'success'}
+        else:
+            lambda_response['body'] = {'embedding': feature_vector, 'msg': 'success'}
 
     except Exception as e:
         logger.error(e)
 
         lambda_response['statusCode'] = 500
-        lambda_response['body']['msg'] = 'Could not get image embeddings'
+        lambda_response['body']['msg'] = 'Could not get embeddings'
 
         raise e
 
@@ -17,9 +17,14 @@
 
 import boto3
 import os
+import json
 import logging
+import time
 
-from opensearchpy import OpenSearch, RequestsHttpConnection, AWSV4SignerAuth
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from opensearchpy import OpenSearch, RequestsHttpConnection, AWSV4SignerAuth, helpers
 
 logger = logging.getLogger()
 logger.setLevel(os.getenv("LOG_LEVEL"))
@@ -27,11 +32,31 @@ logger.setLevel(os.getenv("LOG_LEVEL"))
 IMG_BUCKET = os.getenv("IMG_BUCKET")
 
 client = boto3.client('opensearchserverless')
+s3 = boto3.client('s3')
 region = boto3.session.Session().region_name
 service = 'aoss'
 
 OSS_HOST = os.getenv("OSS_HOST").replace("https://", "")
 OSS_EMBEDDINGS_INDEX_NAME = os.getenv("OSS_EMBEDDINGS_INDEX_NAME")
+# Connections kept open by the OpenSearch client and embeddings read in parallel by the bulk indexing
+OSS_POOL_MAXSIZE = int(os.getenv("OSS_POOL_MAXSIZE", 10))
+
+credentials = boto3.Session().get_credentials()
+auth = AWSV4SignerAuth(credentials, region, service)
+
+# Build the OpenSearch client once per container so its connection pool is reused across invocations
+oss_client = OpenSearch(
+    hosts=[{'host': OSS_HOST, 'port': 443}],
+    http_auth=auth,
+    use_ssl=True,
+    verify_certs=True,
+    connection_class=RequestsHttpConnection,
+    pool_maxsize=OSS_POOL_MAXSIZE,
+    timeout=300
+)
+
+# k-NN fields of each index, read from the live mapping once per container
+knn_fields = {}
 
 lambda_response = {
     "statusCode": 200,
@@ -43,6 +68,56 @@ lambda_response = {
     "body": {},
 }
 
+def get_knn_fields(index_name):
+    """
+    Fields of the index mapped as k-NN vectors. Indexes created before the descriptions were embedded don't map the
+    description_embeddings field until the stack is updated, and the field is mapped dynamically as plain floats when
+    it's written before
+    @param index_name: Name of the embeddings index
+    @return: Names of the k-NN fields
+    """
+
+    if index_name not in knn_fields:
+        mapping = oss_client.indices.get_mapping(index=index_name)
+        properties = next(iter(mapping.values()))["mappings"]["properties"]
+        knn_fields[index_name] = {
+            field for field, field_mapping in properties.items() if field_mapping.get("type") == "knn_vector"
+        }
+
+        if "description_embeddings" not in knn_fields[index_name]:
+            logger.warning(f"Index {index_name} doesn't map description_embeddings as a k-NN field, the embeddings of "
+                           f"the descriptions are not indexed")
+
+    return knn_fields[index_name]
+
+def build_document(img_key, metadata, img_desc, labels_list, embedding, description_embedding=None):
+    """
+    Build the document of an image for the embeddings index
+    @param img_key: Key of the image in the images bucket
+    @param metadata: Campaign metadata of the image (results, node and objective)
+    @param img_desc: Description of the image
+    @param labels_list: Elements identified in the image
+    @param embedding: Embedding of the image
+    @param description_embedding: Embedding of the description of the image, for hybrid searches (optional)
+    @return: Document to be indexed
+    """
+
+    document = {
+        "id": img_key.split('/')[-1].split('.')[0],
+        "results": metadata['results'],
+        "node": metadata['node'].lower(),
+        "objective":  metadata['objective'].lower(),
+        "image_s3_uri": "s3://" + IMG_BUCKET + "/" + img_key,
+        "image_description": img_desc,
+        "img_element_list": ','.join(labels_list),
+        "embeddings": embedding
+    }
+
+    if description_embedding is not None and "description_embeddings" in get_knn_fields(OSS_EMBEDDINGS_INDEX_NAME):
+        document["description_embeddings"] = description_embedding
+
+    return document
+
 def lambda_handler(event, context):
 
     logger.debug("Received event")
@@ -50,33 +125,13 @@ def lambda_handler(event, context):
 
     try:
 
-        photo_img_url = "s3://" + IMG_BUCKET + "/" + event['img_key']
-        labels_list_str = ','.join(event['labels_list'])
-        embedding = event['embeddings']
-        metadata = event['metadata']
-
-        document = {
-            "id": event['img_key'].split('/')[-1].split('.')[0],
-            "results": metadata['results'],
-            "node": metadata['node'].lower(),
-            "objective":  metadata['objective'].lower(),
-            "image_s3_uri": photo_img_url,
-            "image_description": event["img_desc"],
-            "img_element_list": labels_list_str,
-            "embeddings": embedding
-        }
-
-        credentials = boto3.Session().get_credentials()
-        auth = AWSV4SignerAuth(credentials, region, service)
-
-        # Build the OpenSearch client
-        oss_client = OpenSearch(
-            hosts=[{'host': OSS_HOST, 'port': 443}],
-            http_auth=auth,
-            use_ssl=True,
-            verify_certs=True,
-            connection_class=RequestsHttpConnection,
-            timeout=300
+        document = build_document(
+            event['img_key'],
+            event['metadata'],
+            event["img_desc"],
+            event['labels_list'],
+            event['embeddings'],
+            event.get('description_embeddings')
         )
 
         oss_response = oss_client.index(
@@ -95,4 +150,145 @@ def lambda_handler(event, context):
 
         raise e
 
-    return lambda_response
\ No newline at end of file
+    return lambda_response
+
+def get_embedding(embedding_key):
+    """Read an embedding stored by the embeddings function in the images bucket"""
+
+    s3_response = s3.get_object(Bucket=IMG_BUCKET, Key=embedding_key)
+    return json.loads(s3_response['Body'].read())
+
+def list_keys(prefix):
+    """Keys of the objects under a prefix of the images bucket"""
+
+    keys = []
+    for page in s3.get_paginator('list_objects_v2').paginate(Bucket=IMG_BUCKET, Prefix=prefix):
+        keys += [s3_object['Key'] for s3_object in page.get('Contents', [])]
+    return keys
+
+def bulk_lambda_handler(event, context):
+    """
+    Index a batch of described and embedded images with a single request to the _bulk API. The embeddings are read
+    from the images bucket, where the embeddings function stores them to keep the workflow state small
+    @param event: Dictionary with the list of processed images, images that failed to be processed have an error key,
+    and the prefix of the embeddings of the batch
+    @return: Number of indexed and failed images and the indexing throughput
+    """
+
+    started_at = time.time()
+
+    images = [img for img in event['images'] if 'error' not in img]
+    failed = len(event['images']) - len(images)
+
+    embedding_keys = [img['embedding']['embedding_key'] for img in images]
+    # The descriptions are only embedded when the workflow is deployed for hybrid searches
+    description_embedding_keys = [
+        img['description_embedding']['embedding_key'] if 'description_embedding' in img else None
+        for img in images
+    ]
+
+    with ThreadPoolExecutor(max_workers=OSS_POOL_MAXSIZE) as executor:
+        embeddings = list(executor.map(get_embedding, embedding_keys))
+        description_embeddings = list(executor.map(
+            lambda key: get_embedding(key) if key else None, description_embedding_keys
+        ))
+
+    actions = [
+        {
+            "_index": OSS_EMBEDDINGS_INDEX_NAME,
+            "_source": build_document(
+                img['img_key'],
+                img['metadata'],
+                img['img_desc']['description'],
+                img['img_desc']['labels_list'],
+                embedding,
+                description_embedding
+            )
+        }
+        for img, embedding, description_embedding in zip(images, embeddings, description_embeddings)
+    ]
+
+    indexed, errors = helpers.bulk(oss_client, actions, raise_on_error=False, max_retries=3)
+
+    for error in errors:
+        logger.error(error)
+
+    failed += len(errors)
+
+    # The embeddings are only needed until they are indexed. Images that failed after being embedded (e.g. the
+    # embedding branch succeeded and the description failed) left theirs under the prefix of the batch too
+    embedding_keys += [key for key in description_embedding_keys if key]
+    if event.get('embeddings_prefix'):
+        embedding_keys = sorted(set(embedding_keys) | set(list_keys(event['embeddings_prefix'])))
+    for i in range(0, len(embedding_keys), 1000):
+        s3.delete_objects(
+            Bucket=IMG_BUCKET,
+            Delete={"Objects": [{"Key": key} for key in embedding_keys[i:i + 1000]], "Quiet": True}
+        )
+
+    elapsed = time.time() - started_at
+
+    logger.info(f"Indexed {indexed} images ({failed} failed) in {elapsed:.2f} seconds, "
+                f"{indexed / elapsed:.2f} images per second")
+
+    return {
+        "indexed": indexed,
+        "failed": failed,
+        "elapsed_ms": int(elapsed * 1000),
+    }
+
+def read_json_object(bucket, key):
+    """Read a JSON object from S3"""
+
+    s3_response = s3.get_object(Bucket=bucket, Key=key)
+    return json.loads(s3_response['Body'].read())
+
+def get_batch_results(results):
+    """
+    Read the results of the batches written by the distributed map
+    @param results: Bucket and key of the manifest of the results (ResultWriterDetails)
+    @return: Number of indexed and failed images of all the batches
+    """
+
+    manifest = read_json_object(results['Bucket'], results['Key'])
+    result_files = manifest['ResultFiles']
+
+    indexed = 0
+    failed = 0
+
+    # Each result file is a list of child executions, one per batch, with their input and output as JSON strings
+    for result_file in result_files.get('SUCCEEDED', []):
+        for execution in read_json_object(results['Bucket'], result_file['Key']):
+            batch = json.loads(execution['Output'])
+            indexed += batch['indexed']
+            failed += batch['failed']
+
+    # All the images of a batch that failed as a whole are failed
+    for result_file in result_files.get('FAILED', []) + result_files.get('PENDING', []):
+        for execution in read_json_object(results['Bucket'], result_file['Key']):
+            failed += len(json.loads(execution['Input'])['Items'])
+
+    return indexed, failed
+
+def report_lambda_handler(event, context):
+    """
+    Summarize a bulk indexing execution
+    @param event: Dictionary with the start time of the execution and the location of the results of the batches
+    @return: Number of indexed and failed images and the throughput of the execution in images per second
+    """
+
+    started_at = datetime.fromisoformat(event['started_at'].replace('Z', '+00:00'))
+    elapsed = (datetime.now(timezone.utc) - started_at).total_seconds()
+
+    indexed, failed = get_batch_results(event['results'])
+
+    report = {
+        "indexed": indexed,
+        "failed": failed,
+        "elapsed_seconds": round(elapsed, 2),
+        "images_per_second": round(indexed / elapsed, 2) if elapsed > 0 else 0,
+    }
+
+    logger.info(f"Bulk indexing report: {report}")
+
+    return report
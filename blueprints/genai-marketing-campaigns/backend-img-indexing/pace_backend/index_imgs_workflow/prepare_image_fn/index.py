@@ -0,0 +1,152 @@
+# MIT No Attribution
+#
+# Copyright 2025 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import io
+import logging
+import os
+
+import boto3
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger()
+logger.setLevel(os.getenv("LOG_LEVEL"))
+
+IMG_BUCKET = os.getenv("IMG_BUCKET")
+PREPARED_IMGS_PREFIX = os.getenv("PREPARED_IMGS_PREFIX", "prepared/")
+# Largest image accepted by the Titan multimodal embeddings model, also well within the Nova limits
+MAX_IMG_DIMENSION = int(os.getenv("MAX_IMG_DIMENSION", 2048))
+JPEG_QUALITY = int(os.getenv("JPEG_QUALITY", 90))
+# Bytes read to decide if the image is within the limits, JPEG size and EXIF segments are at the start of the file
+HEADER_BYTES = int(os.getenv("HEADER_BYTES", 64 * 1024))
+
+ORIENTATION_TAG = 0x0112
+
+s3_client = boto3.client('s3')
+
+lambda_response = {
+    "statusCode": 200,
+    "headers": {
+        "Content-Type": "application/json",
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Allow-Credentials": True,
+    },
+    "body": {},
+}
+
+def is_within_limits(image) -> bool:
+    """Whether an opened image can be used as is by the models: an RGB JPEG within the size limit, not rotated"""
+
+    return (image.format == "JPEG" and image.mode == "RGB"
+            and max(image.width, image.height) <= MAX_IMG_DIMENSION
+            and image.getexif().get(ORIENTATION_TAG, 1) == 1)
+
+def read_image_header(img_key: str):
+    """
+    Read the start of an image with a ranged request
+    @param img_key: Key of the image
+    @return: First HEADER_BYTES bytes of the image and whether they are the whole image
+    """
+
+    response = s3_client.get_object(Bucket=IMG_BUCKET, Key=img_key, Range=f"bytes=0-{HEADER_BYTES - 1}")
+    header = response['Body'].read()
+    # bytes 0-65535/1048576
+    size = int(response['ContentRange'].rsplit("/", 1)[1]) if 'ContentRange' in response else len(header)
+
+    return header, len(header) >= size
+
+def header_within_limits(header: bytes) -> bool:
+    """Whether the image of a header can be used as is, False if the header doesn't describe the image"""
+
+    try:
+        with Image.open(io.BytesIO(header)) as image:
+            within_limits = is_within_limits(image)
+            logger.info(f"Original image: {image.format} {image.width}x{image.height}")
+            return within_limits
+    except (OSError, SyntaxError) as e:
+        # Not a known format or the size is after the header, e.g. PNG metadata chunks
+        logger.info(f"Could not read the image from its first {len(header)} bytes: {e}")
+        return False
+
+def prepare_image(image_bytes: bytes):
+    """
+    Downscale an image to the model limits and re-encode it as JPEG, in memory
+    @param image_bytes: Original image
+    @return: Prepared JPEG image, None if the original image can be used as is
+    """
+
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        logger.info(f"Original image: {image.format} {image.width}x{image.height} {len(image_bytes)} bytes")
+
+        if is_within_limits(image):
+            return None
+
+        # JPEG images are decoded at a reduced scale by thumbnail, large originals are never fully loaded in memory
+        image.thumbnail((MAX_IMG_DIMENSION, MAX_IMG_DIMENSION))
+        # The orientation is applied to the pixels, the EXIF data is not kept in the prepared image
+        image = ImageOps.exif_transpose(image).convert("RGB")
+
+        prepared_image = io.BytesIO()
+        image.save(prepared_image, format="JPEG", quality=JPEG_QUALITY)
+
+    logger.info(f"Prepared image: {image.width}x{image.height} {prepared_image.getbuffer().nbytes} bytes")
+
+    return prepared_image.getvalue()
+
+"""
+Store a copy of the image within the limits of the description and embeddings models. Only the header of the images
+already within the limits is read, the others are fetched once
+"""
+def lambda_handler(event, context):
+
+    try:
+
+        img_key = event['img_key']
+
+        header, complete = read_image_header(img_key)
+
+        if complete:
+            prepared_image = prepare_image(header)
+        elif header_within_limits(header):
+            prepared_image = None
+        else:
+            image_bytes = s3_client.get_object(Bucket=IMG_BUCKET, Key=img_key)['Body'].read()
+            prepared_image = prepare_image(image_bytes)
+
+        if prepared_image is None:
+            prepared_img_key = img_key
+        else:
+            prepared_img_key = f"{PREPARED_IMGS_PREFIX}{img_key}.jpg"
+            s3_client.put_object(
+                Bucket=IMG_BUCKET,
+                Key=prepared_img_key,
+                Body=prepared_image,
+                ContentType="image/jpeg"
+            )
+
+        lambda_response['statusCode'] = 201
+        lambda_response['body'] = {'prepared_img_key': prepared_img_key, 'msg': 'success'}
+
+    except Exception as e:
+        logger.error(e)
+
+        lambda_response['statusCode'] = 500
+        lambda_response['body']['msg'] = 'Could not prepare image'
+
+        raise e
+
+    return lambda_response
@@ -81,11 +81,15 @@ def handler(event, context: LambdaContext):
     elif request_type == "Update":
         logger.info(f"Updating index {index_name}")
         try:
-            delete_index(oss_client, index_name)
-            create_index(
-                oss_client,
-                index_name,
-            )
+            # The index is never deleted on updates, it holds the indexed images. A new index name creates a new index
+            # with the current mapping and keeps the previous one, so its images can be migrated (see the README)
+            if not oss_client.indices.exists(index=index_name):
+                create_index(
+                    oss_client,
+                    index_name,
+                )
+            else:
+                add_missing_fields(oss_client, index_name)
             cfnresponse.send(event, context, cfnresponse.SUCCESS, {"ok": True})
         except Exception as e:
             logger.error(e)
@@ -132,11 +136,25 @@ def create_index(
                 "image_s3_uri": {"type": "text"},
                 "image_description": {"type": "text"},
                 "img_element_list": {"type": "text"},
+                # The lucene engine supports efficient filtering, the node and objective filters of the searches are
+                # applied during the k-NN search instead of after it
                 "embeddings": {
                     "type": "knn_vector",
                     "dimension": 1024,
                     "method": {
-                        "engine": "nmslib",
+                        "engine": "lucene",
+                        "space_type": "cosinesimil",
+                        "name": "hnsw",
+                        "parameters": {"ef_construction": 512, "m": 16}
+                    }
+                },
+                # Embedding of the image description, only indexed when the workflow embeds the descriptions for
+                # hybrid searches
+                "description_embeddings": {
+                    "type": "knn_vector",
+                    "dimension": 1024,
+                    "method": {
+                        "engine": "lucene",
                         "space_type": "cosinesimil",
                         "name": "hnsw",
                         "parameters": {"ef_construction": 512, "m": 16}
@@ -161,6 +179,30 @@ def create_index(
     logger.info(response)
 
 
+def add_missing_fields(opensearch, index_name):
+    """
+    Map the fields added to the index since it was created. The engine of the k-NN fields of an index can't be
+    changed, the embeddings of the descriptions use the engine of the embeddings of the images
+    @param opensearch: OpenSearch client
+    @param index_name: Name of the existing index
+    """
+
+    mapping = opensearch.indices.get_mapping(index=index_name)
+    properties = next(iter(mapping.values()))["mappings"]["properties"]
+
+    if "description_embeddings" not in properties:
+        logger.info(f"Adding the description_embeddings field to index {index_name}")
+        response = opensearch.indices.put_mapping(
+            index=index_name,
+            body={"properties": {"description_embeddings": properties["embeddings"]}}
+        )
+        logger.info(response)
+    elif properties["description_embeddings"].get("type") != "knn_vector":
+        # Mapped dynamically by documents indexed before the field was added, only a new index can fix it
+        logger.warning(f"The description_embeddings field of index {index_name} is not a knn_vector, migrate the "
+                       f"images to a new index to search the embeddings of the descriptions")
+
+
 def delete_index(opensearch, index_name):
     response = opensearch.indices.delete(index_name)
     logger.info(response)
\ No newline at end of file
@@ -0,0 +1,149 @@
+# MIT No Attribution
+#
+# Copyright 2025 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Migrate the images of an embeddings index created before the lucene engine (nmslib, which can't filter inside the k-NN
+query) or before the description_embeddings field to the new index created by the stack update, see the README. By
+default the documents are copied with their embeddings. With --manifest-key a manifest of the images is written to the
+images bucket instead, for the bulk indexing workflow to describe and embed them again, which also embeds the
+descriptions when the stack is deployed with -c embed_descriptions=true. Run from the backend directory:
+
+    python scripts/migrate_embeddings_index.py --endpoint <OSSEmbeddingsIndexCollectionURL> --source-index <old index> \\
+        --target-index <EmbeddingsIndexName> [--manifest-key manifests/migration.json --bucket <ImagesBucketName>] [--dry-run]
+"""
+
+import argparse
+import json
+import urllib.parse
+
+import boto3
+
+from opensearchpy import OpenSearch, RequestsHttpConnection, AWSV4SignerAuth, helpers
+
+PAGE_SIZE = 500
+
+
+def indexed_images(oss_client, index_name, page_size: int=PAGE_SIZE):
+    """
+    Documents of the index, paginated with search_after since OpenSearch Serverless doesn't support scroll
+    @param oss_client: OpenSearch client
+    @param index_name: Name of the index
+    @param page_size: Documents per request
+    @return: Generator of the sources of the documents
+    """
+
+    body = {"size": page_size, "sort": [{"_id": "asc"}], "query": {"match_all": {}}}
+
+    while True:
+        hits = oss_client.search(index=index_name, body=body)["hits"]["hits"]
+        for hit in hits:
+            yield hit["_source"]
+
+        if len(hits) < page_size:
+            return
+        body["search_after"] = hits[-1]["sort"]
+
+
+def copy_documents(oss_client, source_index, target_index, dry_run: bool=False) -> int:
+    """
+    Copy the documents of an index to another one with the _bulk API, the target index maps the embeddings again
+    @param oss_client: OpenSearch client
+    @param source_index: Name of the previous index
+    @param target_index: Name of the new index, must be empty since the document ids are assigned by the collection
+    @param dry_run: Only count the documents
+    @return: Number of documents copied
+    """
+
+    if dry_run:
+        return sum(1 for _ in indexed_images(oss_client, source_index))
+
+    if oss_client.count(index=target_index)["count"] > 0:
+        raise ValueError(f"Index {target_index} is not empty, the documents would be duplicated")
+
+    actions = ({"_index": target_index, "_source": document} for document in indexed_images(oss_client, source_index))
+    copied, errors = helpers.bulk(oss_client, actions, chunk_size=PAGE_SIZE, raise_on_error=False, max_retries=3)
+
+    for error in errors:
+        print(error)
+
+    return copied
+
+
+def write_manifest(oss_client, source_index, bucket, manifest_key, dry_run: bool=False) -> int:
+    """
+    Write a manifest of the images of an index for the bulk indexing workflow
+    @param oss_client: OpenSearch client
+    @param source_index: Name of the previous index
+    @param bucket: Images bucket, where the indexed images are stored
+    @param manifest_key: Key of the manifest in the images bucket
+    @param dry_run: Only count the images
+    @return: Number of images in the manifest
+    """
+
+    manifest = [
+        {
+            "img_key": urllib.parse.urlparse(document["image_s3_uri"]).path.lstrip("/"),
+            "metadata": {
+                "results": document["results"],
+                "node": document["node"],
+                "objective": document["objective"],
+            },
+        }
+        for document in indexed_images(oss_client, source_index)
+    ]
+
+    if not dry_run:
+        boto3.client("s3").put_object(Bucket=bucket, Key=manifest_key, Body=json.dumps(manifest))
+
+    return len(manifest)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoint", required=True, help="URL of the OpenSearch Serverless collection")
+    parser.add_argument("--source-index", required=True, help="Name of the previous index")
+    parser.add_argument("--target-index", help="Name of the new index, to copy the documents")
+    parser.add_argument("--manifest-key", help="Key of the manifest for the bulk indexing workflow")
+    parser.add_argument("--bucket", help="Name of the images bucket, to write the manifest")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the images to migrate")
+    args = parser.parse_args()
+
+    if bool(args.manifest_key) == bool(args.target_index):
+        parser.error("pass either --target-index or --manifest-key")
+    if args.manifest_key and not args.bucket:
+        parser.error("--manifest-key requires --bucket")
+
+    session = boto3.Session()
+    oss_client = OpenSearch(
+        hosts=[{'host': urllib.parse.urlparse(args.endpoint).hostname, 'port': 443}],
+        http_auth=AWSV4SignerAuth(session.get_credentials(), session.region_name, 'aoss'),
+        use_ssl=True,
+        verify_certs=True,
+        connection_class=RequestsHttpConnection,
+        timeout=300
+    )
+
+    if args.manifest_key:
+        migrated = write_manifest(oss_client, args.source_index, args.bucket, args.manifest_key, args.dry_run)
+        print(f"{'Found' if args.dry_run else 'Wrote the manifest of'} {migrated} images of {args.source_index}")
+    else:
+        migrated = copy_documents(oss_client, args.source_index, args.target_index, args.dry_run)
+        print(f"{'Found' if args.dry_run else 'Copied'} {migrated} images of {args.source_index}")
+
+
+if __name__ == "__main__":
+    main()
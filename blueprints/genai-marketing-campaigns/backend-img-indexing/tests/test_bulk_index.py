@@ -0,0 +1,135 @@
+# MIT No Attribution
+#
+# Copyright 2025 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+import json
+import os
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from conftest import WORKFLOW_DIR, load_lambda
+
+BUCKET_NAME = "images"
+EMBEDDINGS_PREFIX = "bulk_index/batch-1/"
+
+
+@pytest.fixture
+def index_data_fn(monkeypatch):
+    monkeypatch.setenv("IMG_BUCKET", BUCKET_NAME)
+    monkeypatch.setenv("OSS_HOST", "https://localhost")
+    monkeypatch.setenv("OSS_EMBEDDINGS_INDEX_NAME", "embeddings")
+
+    with mock_aws():
+        boto3.client("s3").create_bucket(Bucket=BUCKET_NAME)
+        index_data_fn = load_lambda(os.path.join(WORKFLOW_DIR, "index_data_fn"))
+
+        # Record the documents sent to the _bulk API instead of sending them
+        index_data_fn.indexed = []
+
+        def bulk(client, actions, **kwargs):
+            index_data_fn.indexed += [action["_source"] for action in actions]
+            return len(index_data_fn.indexed), []
+
+        monkeypatch.setattr(index_data_fn.helpers, "bulk", bulk)
+
+        yield index_data_fn
+
+
+def put_embedding(key):
+    boto3.client("s3").put_object(Bucket=BUCKET_NAME, Key=key, Body=json.dumps([0.1, 0.2, 0.3]))
+    return key
+
+
+def keys(prefix):
+    response = boto3.client("s3").list_objects_v2(Bucket=BUCKET_NAME, Prefix=prefix)
+    return [s3_object["Key"] for s3_object in response.get("Contents", [])]
+
+
+def processed_image(img_key, embedding_key):
+    return {
+        "img_key": img_key,
+        "metadata": {"results": 100, "node": "followers", "objective": "clicks"},
+        "img_desc": {"description": "A beach", "labels_list": ["beach"]},
+        "embedding": {"embedding_key": embedding_key},
+    }
+
+
+def test_bulk_index_deletes_embeddings_of_failed_images(index_data_fn):
+    indexed_key = put_embedding(f"{EMBEDDINGS_PREFIX}original/img1.jpg.json")
+    # Embedded, then the description branch failed: the workflow only keeps the error of the image
+    orphan_key = put_embedding(f"{EMBEDDINGS_PREFIX}original/img2.jpg.json")
+    other_batch_key = put_embedding("bulk_index/batch-2/original/img3.jpg.json")
+
+    response = index_data_fn.bulk_lambda_handler({
+        "images": [
+            processed_image("original/img1.jpg", indexed_key),
+            {"img_key": "original/img2.jpg", "error": {"Error": "States.TaskFailed"}},
+        ],
+        "embeddings_prefix": EMBEDDINGS_PREFIX,
+    }, None)
+
+    assert response["indexed"] == 1
+    assert response["failed"] == 1
+    assert [document["image_s3_uri"] for document in index_data_fn.indexed] == ["s3://images/original/img1.jpg"]
+    assert orphan_key not in keys(EMBEDDINGS_PREFIX)
+    assert keys("bulk_index/") == [other_batch_key]
+
+
+def test_bulk_index_without_prefix_deletes_embeddings_of_indexed_images(index_data_fn):
+    indexed_key = put_embedding(f"{EMBEDDINGS_PREFIX}original/img1.jpg.json")
+    orphan_key = put_embedding(f"{EMBEDDINGS_PREFIX}original/img2.jpg.json")
+
+    index_data_fn.bulk_lambda_handler({"images": [processed_image("original/img1.jpg", indexed_key)]}, None)
+
+    # Left to the lifecycle rule of the prefix
+    assert keys(EMBEDDINGS_PREFIX) == [orphan_key]
+
+
+class MappedIndex:
+    """Stand-in of the OpenSearch client that only answers the mapping of the index"""
+
+    def __init__(self, properties):
+        self.indices = self
+        self.properties = properties
+
+    def get_mapping(self, index):
+        return {index: {"mappings": {"properties": self.properties}}}
+
+
+@pytest.mark.parametrize("description_mapping, indexed", [
+    ({"type": "knn_vector", "dimension": 3}, True),
+    # Indexes created before the field was added, unmapped or mapped dynamically by a previous write
+    (None, False),
+    ({"type": "float"}, False),
+])
+def test_description_embeddings_are_only_indexed_as_knn_vectors(index_data_fn, monkeypatch, description_mapping,
+                                                                 indexed):
+    properties = {"embeddings": {"type": "knn_vector", "dimension": 3}}
+    if description_mapping:
+        properties["description_embeddings"] = description_mapping
+    monkeypatch.setattr(index_data_fn, "oss_client", MappedIndex(properties))
+
+    image = processed_image("original/img1.jpg", put_embedding(f"{EMBEDDINGS_PREFIX}original/img1.jpg.json"))
+    image["description_embedding"] = {"embedding_key": put_embedding(f"{EMBEDDINGS_PREFIX}description/img1.jpg.json")}
+
+    response = index_data_fn.bulk_lambda_handler({"images": [image]}, None)
+
+    assert response["indexed"] == 1
+    assert ("description_embeddings" in index_data_fn.indexed[0]) == indexed
+    assert index_data_fn.indexed[0]["embeddings"] == [0.1, 0.2, 0.3]
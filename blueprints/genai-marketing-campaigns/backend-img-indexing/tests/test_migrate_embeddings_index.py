@@ -0,0 +1,91 @@
+# MIT No Attribution
+#
+# Copyright 2025 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import json
+import os
+import sys
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from conftest import BACKEND_DIR
+
+sys.path.insert(0, os.path.join(BACKEND_DIR, "scripts"))
+
+import migrate_embeddings_index
+
+SOURCE_INDEX = "embeddings"
+TARGET_INDEX = "embeddings-v2"
+
+
+class PreviousIndex:
+    """Stand-in of the OpenSearch client, the previous index paginated with search_after on the document ids"""
+
+    def __init__(self, n_images):
+        self.documents = [(f"{i:04d}", {
+            "image_s3_uri": f"s3://images/original/img{i}.jpg", "results": i, "node": "followers",
+            "objective": "clicks", "embeddings": [0.1, 0.2],
+        }) for i in range(n_images)]
+        self.target = []
+
+    def search(self, index, body):
+        assert body["sort"] == [{"_id": "asc"}]
+        after = body.get("search_after", [""])[0]
+        page = [(doc_id, document) for doc_id, document in self.documents if doc_id > after][:body["size"]]
+        return {"hits": {"hits": [{"_source": document, "sort": [doc_id]} for doc_id, document in page]}}
+
+    def count(self, index):
+        return {"count": len(self.target)}
+
+
+@pytest.fixture
+def previous_index(monkeypatch):
+    index = PreviousIndex(1200)
+
+    def bulk(client, actions, **kwargs):
+        index.target += list(actions)
+        return len(index.target), []
+
+    monkeypatch.setattr(migrate_embeddings_index.helpers, "bulk", bulk)
+    return index
+
+
+def test_copy_documents_copies_every_page(previous_index):
+    copied = migrate_embeddings_index.copy_documents(previous_index, SOURCE_INDEX, TARGET_INDEX)
+
+    assert copied == 1200
+    assert [action["_source"] for action in previous_index.target] == [doc for _, doc in previous_index.documents]
+    assert {action["_index"] for action in previous_index.target} == {TARGET_INDEX}
+
+    # The new index assigns the document ids, a second run would duplicate the images
+    with pytest.raises(ValueError):
+        migrate_embeddings_index.copy_documents(previous_index, SOURCE_INDEX, TARGET_INDEX)
+
+
+def test_write_manifest_for_the_bulk_indexing_workflow(previous_index):
+    with mock_aws():
+        s3 = boto3.client("s3")
+        s3.create_bucket(Bucket="images")
+
+        written = migrate_embeddings_index.write_manifest(previous_index, SOURCE_INDEX, "images", "manifests/m.json")
+
+        manifest = json.loads(s3.get_object(Bucket="images", Key="manifests/m.json")["Body"].read())
+
+    assert written == 1200
+    assert manifest[7] == {"img_key": "original/img7.jpg",
+                           "metadata": {"results": 7, "node": "followers", "objective": "clicks"}}
@@ -0,0 +1,110 @@
+# MIT No Attribution
+#
+# Copyright 2025 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import io
+import os
+import random
+
+import boto3
+import pytest
+from moto import mock_aws
+from PIL import Image
+
+from conftest import WORKFLOW_DIR, load_lambda
+
+BUCKET_NAME = "images"
+
+
+@pytest.fixture
+def prepare_image_fn(monkeypatch):
+    monkeypatch.setenv("IMG_BUCKET", BUCKET_NAME)
+
+    with mock_aws():
+        boto3.client("s3").create_bucket(Bucket=BUCKET_NAME)
+        prepare_image_fn = load_lambda(os.path.join(WORKFLOW_DIR, "prepare_image_fn"))
+
+        # Record the GET requests of the function and the bytes they return
+        gets = []
+        get_object = prepare_image_fn.s3_client.get_object
+
+        def recording_get_object(**kwargs):
+            response = get_object(**kwargs)
+            gets.append({"range": kwargs.get("Range"), "bytes": response["ContentLength"]})
+            return response
+
+        monkeypatch.setattr(prepare_image_fn.s3_client, "get_object", recording_get_object)
+        prepare_image_fn.gets = gets
+
+        yield prepare_image_fn
+
+
+def put_image(key, size, image_format="JPEG", orientation=None):
+    # Noise doesn't compress, the images are larger than their header
+    rng = random.Random(0)
+    image = Image.frombytes("RGB", size, bytes(rng.getrandbits(8) for _ in range(size[0] * size[1] * 3)))
+
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+
+    body = io.BytesIO()
+    image.save(body, format=image_format, **({"exif": exif} if image_format == "JPEG" else {}))
+    boto3.client("s3").put_object(Bucket=BUCKET_NAME, Key=key, Body=body.getvalue())
+
+    return len(body.getvalue())
+
+
+def prepare(prepare_image_fn, key):
+    return prepare_image_fn.lambda_handler({"img_key": key}, None)["body"]["prepared_img_key"]
+
+
+def test_image_within_limits_is_not_downloaded(prepare_image_fn):
+    size = put_image("original/large.jpg", (1024, 768))
+    assert size > prepare_image_fn.HEADER_BYTES
+
+    assert prepare(prepare_image_fn, "original/large.jpg") == "original/large.jpg"
+    assert prepare_image_fn.gets == [{"range": f"bytes=0-{prepare_image_fn.HEADER_BYTES - 1}",
+                                      "bytes": prepare_image_fn.HEADER_BYTES}]
+
+
+@pytest.mark.parametrize("key, size, image_format, orientation", [
+    ("original/too_large.jpg", (2400, 300), "JPEG", None),
+    ("original/rotated.jpg", (800, 600), "JPEG", 6),
+    ("original/image.png", (600, 400), "PNG", None),
+])
+def test_image_outside_limits_is_downloaded_and_prepared(prepare_image_fn, key, size, image_format, orientation):
+    object_size = put_image(key, size, image_format, orientation)
+
+    prepared_key = prepare(prepare_image_fn, key)
+
+    assert prepared_key == f"{prepare_image_fn.PREPARED_IMGS_PREFIX}{key}.jpg"
+    assert [get["bytes"] for get in prepare_image_fn.gets] == [prepare_image_fn.HEADER_BYTES, object_size]
+
+    body = boto3.client("s3").get_object(Bucket=BUCKET_NAME, Key=prepared_key)["Body"].read()
+    with Image.open(io.BytesIO(body)) as prepared:
+        assert prepared.format == "JPEG"
+        assert max(prepared.size) <= prepare_image_fn.MAX_IMG_DIMENSION
+        expected = (size[1], size[0]) if orientation == 6 else size
+        assert prepared.size[0] / prepared.size[1] == pytest.approx(expected[0] / expected[1], rel=0.01)
+
+
+def test_small_image_is_read_once(prepare_image_fn):
+    object_size = put_image("original/small.png", (40, 30), "PNG")
+    assert object_size < prepare_image_fn.HEADER_BYTES
+
+    assert prepare(prepare_image_fn, "original/small.png") == f"{prepare_image_fn.PREPARED_IMGS_PREFIX}original/small.png.jpg"
+    assert [get["bytes"] for get in prepare_image_fn.gets] == [object_size]
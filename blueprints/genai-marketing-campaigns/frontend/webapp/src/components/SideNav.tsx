@@ -24,6 +24,12 @@ import { Skeleton } from "./ui/skeleton";
 type SideNavState = {
   loading: boolean;
   list: Campaign[];
+  nextToken?: string;
+};
+
+type CampaignsPage = {
+  items: Campaign[];
+  next_token?: string;
 };
 
 export default function SideNav() {
@@ -36,16 +42,23 @@ export default function SideNav() {
 
   const { toast } = useToast();
 
-  useEffect(() => {
-    const fetchItems = async () => {
-      try {
-        const campaigns = (await getCampaigns()) as Campaign[];
-        setItems((prev) => ({ ...prev, loading: false, list: campaigns }));
-      } catch (error) {
-        console.error(error);
-      }
-    };
+  const fetchItems = async (nextToken?: string) => {
+    try {
+      const page = (await getCampaigns({
+        next_token: nextToken,
+      })) as CampaignsPage;
+      setItems((prev) => ({
+        ...prev,
+        loading: false,
+        list: nextToken ? [...prev.list, ...page.items] : page.items,
+        nextToken: page.next_token ?? undefined,
+      }));
+    } catch (error) {
+      console.error(error);
+    }
+  };
 
+  useEffect(() => {
     fetchItems();
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, []);
@@ -138,6 +151,15 @@ export default function SideNav() {
               </a>
             );
           })}
+
+        {!items.loading && items.nextToken && (
+          <Button
+            variant={"secondary"}
+            onClick={() => fetchItems(items.nextToken)}
+          >
+            Load more
+          </Button>
+        )}
       </div>
     </div>
   );
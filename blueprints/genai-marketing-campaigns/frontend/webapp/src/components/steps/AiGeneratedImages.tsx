@@ -4,7 +4,7 @@
 import { useEffect, useState } from "react";
 import PresignedImage from "@/components/PresignedImage";
 import Spinner from "../Spinner";
-import { getGeneratedImage } from "@/lib/api";
+import { getGeneratedImage, getImageGenerationJob } from "@/lib/api";
 import { useCampaignContext } from "@/hooks";
 import { getErrorMessage } from "@/lib/utils";
 import { Button } from "../ui/button";
@@ -14,7 +14,29 @@ export function AiGeneratedImages() {
   const [stepLoading, setStepLoading] = useState(false);
   const { campaignState } = useCampaignContext();
 
-  const fetchImage = async () => {
+  const waitForJob = async (campaignId: string, jobId: string) => {
+    const pollingInterval = 3000; //miliseconds
+    const maxAttempts = 60;
+
+    for (let attempt = 1; attempt <= maxAttempts; attempt++) {
+      await new Promise((resolve) => setTimeout(resolve, pollingInterval));
+
+      const job = (await getImageGenerationJob(campaignId, jobId)) as {
+        status: string;
+        urls: string[];
+      };
+
+      if (job?.status === "COMPLETED") {
+        return job.urls;
+      } else if (job?.status === "FAILED") {
+        throw new Error("Image generation job failed");
+      }
+    }
+
+    throw new Error("Image generation job timed out");
+  };
+
+  const fetchImages = async (numberOfImages: number) => {
     setStepLoading(true);
     try {
       const prompt =
@@ -26,13 +48,18 @@ export function AiGeneratedImages() {
         const request = await getGeneratedImage(
           campaignState.campaign.id,
           prompt,
+          numberOfImages,
         );
 
-        if (request?.statusCode == 200) {
+        if (request?.statusCode == 202) {
+          const data = (await request.body.json()) as { job_id: string };
+          const urls = await waitForJob(
+            campaignState.campaign.id,
+            data.job_id,
+          );
           setStepLoading(false);
-          const data = (await request.body.json()) as { url: string };
           setGeneratedImages((prev) => {
-            return [...prev, data.url];
+            return [...prev, ...urls];
           });
         } else {
           throw new Error("Error asking generated image");
@@ -47,9 +74,8 @@ export function AiGeneratedImages() {
   };
 
   useEffect(() => {
-    for (let i = 0; i < 5; i++) {
-      setTimeout(fetchImage, 200);
-    }
+    // All the initial variants are generated by a single job
+    fetchImages(5);
 
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, []);
@@ -61,7 +87,7 @@ export function AiGeneratedImages() {
           disabled={stepLoading}
           className="flex gap-3"
           onClick={() => {
-            fetchImage();
+            fetchImages(1);
           }}
         >
           {stepLoading && <Spinner />}
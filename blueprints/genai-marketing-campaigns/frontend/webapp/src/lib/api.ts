@@ -45,11 +45,27 @@ const defaultRestInput = {
   },
 };
 
-export async function getCampaigns() {
+export type CampaignsQuery = {
+  objective?: string;
+  node?: string;
+  limit?: number;
+  next_token?: string;
+};
+
+export async function getCampaigns(query: CampaignsQuery = {}) {
   try {
+    const queryParams = Object.fromEntries(
+      Object.entries(query)
+        .filter(([, value]) => value !== undefined && value !== "")
+        .map(([key, value]) => [key, String(value)]),
+    );
     const restOperation = get({
       ...defaultRestInput,
       path: "/campaigns",
+      options: {
+        ...defaultRestInput.options,
+        queryParams,
+      },
     });
     const response = await restOperation.response;
     return response.body.json();
@@ -149,7 +165,11 @@ export async function getSuggestion(campaignId: string, references: string[]) {
   }
 }
 
-export async function getGeneratedImage(campaignId: string, prompt: string) {
+export async function getGeneratedImage(
+  campaignId: string,
+  prompt: string,
+  numberOfImages: number = 1,
+) {
   try {
     const restOperation = post({
       ...defaultRestInput,
@@ -158,6 +178,7 @@ export async function getGeneratedImage(campaignId: string, prompt: string) {
         ...defaultRestInput.options,
         body: {
           prompt: prompt,
+          number_of_images: numberOfImages,
         },
       },
     });
@@ -167,3 +188,16 @@ export async function getGeneratedImage(campaignId: string, prompt: string) {
     console.log("POST call failed: ", getErrorMessage(e));
   }
 }
+
+export async function getImageGenerationJob(campaignId: string, jobId: string) {
+  try {
+    const restOperation = get({
+      ...defaultRestInput,
+      path: `/generate_images/${campaignId}/${jobId}`,
+    });
+    const response = await restOperation.response;
+    return response.body.json();
+  } catch (e: unknown) {
+    console.log("GET call failed: ", getErrorMessage(e));
+  }
+}
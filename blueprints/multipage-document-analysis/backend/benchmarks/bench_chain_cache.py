@@ -0,0 +1,85 @@
+# MIT No Attribution
+#
+# Copyright 2024 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Per-call overhead of building the extraction and consolidation chains, with and without the warm start caches.
+
+Without the caches every model call built a new ChatBedrock client, prompt selector and structured output chain, and
+the few shot prompts read every example file again. Run from the backend directory:
+
+    python benchmarks/bench_chain_cache.py [--repeat 50]
+"""
+
+import argparse
+import os
+
+from harness import WORKFLOW_DIR, load_lambda, summarize, timeit
+
+os.environ.setdefault("DOCUMENTS_DYNAMO_DB_TABLE_NAME", "documents")
+os.environ.setdefault("BEDROCK_MODEL_ID", "anthropic.claude-3-haiku-20240307-v1:0")
+os.environ.setdefault("BEDROCK_REGION", "us-east-1")
+os.environ.setdefault("LANGUAGE_ID", "es")
+os.environ.setdefault("EXTRACTION_CONFIDENCE_LEVEL", "85")
+
+EXTRACT_DIR = os.path.join(WORKFLOW_DIR, "extract_data_to_schema_fn")
+CONSOLIDATE_DIR = os.path.join(WORKFLOW_DIR, "consolidate_report_fn")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=50, help="Calls per measurement")
+    args = parser.parse_args()
+
+    extract = load_lambda(EXTRACT_DIR)
+    consolidate = load_lambda(CONSOLIDATE_DIR)
+
+    language_id = os.environ["LANGUAGE_ID"]
+    model_id = os.environ["BEDROCK_MODEL_ID"]
+    section = extract.report_sections[0]
+
+    def extraction_chain(cached, n_examples):
+        if cached:
+            n = extract.get_section_examples_count(language_id, section) if n_examples else 0
+            return extract.get_information_extraction_chain(language_id, model_id, section if n else None, n)
+
+        # The work done by every model call before the caches
+        n = extract.get_section_examples_count.__wrapped__(language_id, section) if n_examples else 0
+        return extract.get_information_extraction_chain.__wrapped__(language_id, model_id, section if n else None, n)
+
+    def consolidation_chain(cached):
+        output_model = extract.info_to_output_mapping[section]
+        if cached:
+            return consolidate.get_information_consolidation_chain(language_id, model_id, output_model)
+        return consolidate.get_information_consolidation_chain.__wrapped__(language_id, model_id, output_model)
+
+    # The example files are read relative to the function directory, as in the Lambda runtime
+    os.chdir(EXTRACT_DIR)
+
+    print(f"Chain construction per model call ({args.repeat} calls)")
+    for name, function in [
+        ("extraction, zero shot", lambda cached: extraction_chain(cached, False)),
+        ("extraction, few shot", lambda cached: extraction_chain(cached, True)),
+        ("consolidation", consolidation_chain),
+    ]:
+        function(True)  # Cold start, fills the cache
+        uncached = timeit(lambda: function(False), args.repeat)
+        cached = timeit(lambda: function(True), args.repeat)
+        print(f"  {name:22} rebuilt: {summarize(uncached)} | cached: {summarize(cached)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# MIT No Attribution
+#
+# Copyright 2024 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""
+Latency and peak memory of the chunking of the Textract results of synthetic documents, by ingestion mode:
+  - textractor: every GetDocumentTextDetection page appended to one response and parsed to a Textractor Document
+  - streaming, buffered: the text of each page streamed into the chunker, every chunk kept until they are written
+  - streaming: the text of each page streamed into the chunker, each chunk written to S3 as soon as it is complete
+S3 keeps nothing in the process: the chunks are counted and dropped, as they would leave the Lambda. Each document and
+mode runs in its own process, so the peak RSS over the RSS after loading the function is the one of the chunking.
+Run from the backend directory:
+
+    python benchmarks/bench_ingestion.py [--pages 50 500 2000] [--chunking-strategy pages]
+"""
+
+import argparse
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from harness import WORKFLOW_DIR, load_lambda
+
+MODES = ["textractor", "streaming, buffered", "streaming"]
+JOB_ID = "benchmark-job"
+TEXTRACT_JOB_ID = "benchmark-textract-job"
+
+
+class DiscardingS3:
+    """S3 client that drops the objects it is sent, counting them"""
+
+    def __init__(self):
+        self.objects = 0
+        self.bytes = 0
+
+    def put_object(self, Bucket, Key, Body, **_kwargs):
+        self.objects += 1
+        self.bytes += len(Body)
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_ingestion(mode, pages, chunking_strategy):
+    """Chunk a synthetic document of pages pages and return the latency and memory of the chunking"""
+
+    from bench_pipeline import SyntheticTextract
+
+    os.environ.update({
+        "DOCUMENTS_DYNAMO_DB_TABLE_NAME": "documents",
+        "WORKFLOW_BUCKET_NAME": "workflow",
+        "CHUNKING_STRATEGY": chunking_strategy,
+    })
+    chunk_fn = load_lambda(os.path.join(WORKFLOW_DIR, "chunk_textract_document_fn"))
+    chunk_fn.textract_client = SyntheticTextract(pages)
+    chunk_fn.s3 = DiscardingS3()
+
+    handler = chunk_fn.TextractorHandler(logging.getLogger())
+    if chunking_strategy == "tokens":
+        chunking_args = {"max_tokens": chunk_fn.MAX_TOKENS, "overlap_tokens": chunk_fn.OVERLAP_TOKENS}
+    else:
+        chunking_args = {"chunk_size": chunk_fn.PAGE_CHUNK_SIZE, "page_overlap": 1}
+
+    baseline_rss = peak_rss_mb()
+    started_at = time.perf_counter()
+
+    if mode == "textractor":
+        document = chunk_fn.parse_textract_results(TEXTRACT_JOB_ID)
+        response = chunk_fn.offload_chunks(JOB_ID, handler.get_document_text(document, **chunking_args))
+    elif mode == "streaming, buffered":
+        page_texts = chunk_fn.stream_textract_page_texts(TEXTRACT_JOB_ID)
+        response = chunk_fn.offload_chunks(JOB_ID, handler.get_page_stream_text(page_texts, **chunking_args))
+    else:
+        page_texts = chunk_fn.stream_textract_page_texts(TEXTRACT_JOB_ID)
+        response, chunk_texts = handler.stream_page_text(page_texts, **chunking_args)
+        response = chunk_fn.offload_chunks(JOB_ID, response, chunk_texts=chunk_texts)
+
+    return {
+        "latency_ms": (time.perf_counter() - started_at) * 1000,
+        "chunks": len(response["results"]["chunks"]),
+        "chunk_mb": chunk_fn.s3.bytes / 2 ** 20,
+        "peak_rss_mb": peak_rss_mb() - baseline_rss,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[50, 500, 2000], help="Pages of the synthetic documents")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--chunking-strategy", choices=["tokens", "pages"], default="pages")
+    parser.add_argument("--single", nargs=2, metavar=("MODE", "PAGES"),
+                        help="Run a single mode and document and print the metrics as JSON")
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(run_ingestion(args.single[0], int(args.single[1]), args.chunking_strategy)))
+        return
+
+    print(f"{args.chunking_strategy} chunking, peak RSS over the RSS after loading the function")
+    print(f"  {'pages':>6} {'mode':22} {'latency':>11} {'chunks':>7} {'chunk text':>11} {'peak RSS':>10}")
+    for pages in args.pages:
+        for mode in args.modes:
+            command = [sys.executable, os.path.abspath(__file__), "--chunking-strategy", args.chunking_strategy,
+                       "--single", mode, str(pages)]
+            output = subprocess.run(command, check=True, stdout=subprocess.PIPE, text=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"  {pages:6} {mode:22} {result['latency_ms']:8.0f} ms {result['chunks']:7} "
+                  f"{result['chunk_mb']:8.1f} MB {result['peak_rss_mb']:7.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# MIT No Attribution
+#
+# Copyright 2024 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Time and peak memory of the PDF report generation for reports of growing size.
+
+The reports are synthetic, every table of the report (social objects, shareholders, managers and powers of the legal
+representative) has the given number of rows. The section tables (model validation and rows) are built sequentially
+and in a thread pool, then the whole PDF is rendered. Run from the backend directory:
+
+    python benchmarks/bench_pdf_render.py [--rows 5 50 500] [--repeat 3] [--threads 5]
+"""
+
+import argparse
+import os
+import tracemalloc
+
+from concurrent.futures import ThreadPoolExecutor
+
+from harness import WORKFLOW_DIR, load_lambda, summarize, timeit
+
+os.environ.setdefault("DOCUMENTS_DYNAMO_DB_TABLE_NAME", "documents")
+
+GENERATE_PDF_DIR = os.path.join(WORKFLOW_DIR, "generate_pdf_fn")
+
+
+def synthetic_report(rows):
+    """Consolidated report with rows rows in every table"""
+
+    powers = [f"Poder para actos de administración número {index}" for index in range(rows)]
+
+    return {
+        "general_information": {
+            "name": "Sociedad Anónima de Pruebas",
+            "expedition_date": "2024-01-01",
+            "expedition_city": "Ciudad de México",
+            "duration": "99 años",
+            "social_object": [f"Objeto social número {index} de la sociedad" for index in range(rows)],
+            "nationality": "Mexicana",
+            "open_to_foreigners": True,
+            "fixed_social_capital": "$50,000.00",
+            "total_stock": "500",
+        },
+        "shareholders": {
+            "shareholders": [
+                {"shareholder_name": f"Accionista {index}", "stock_units": "10", "stocks_value": "$1,000.00"}
+                for index in range(rows)
+            ]
+        },
+        "administration": {
+            "managers": [
+                {"name": f"Administrador {index}", "position": "Consejero", "powers": powers[:5]}
+                for index in range(rows)
+            ]
+        },
+        "legal_representative": {"name": "Representante Legal", "position": "Apoderado", "powers": powers},
+        "notary_information": {
+            "notary_name": "Notario Público",
+            "document_number": "1234",
+            "notary_number": "1",
+            "entity_of_creation": "Ciudad de México",
+        },
+    }
+
+
+def peak_memory_mb(function):
+    """Peak of the memory allocated by Python while the function runs, in MB"""
+
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[5, 50, 500], help="Rows of every table of the report")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement")
+    parser.add_argument("--threads", type=int, default=5, help="Threads to build the section tables concurrently")
+    args = parser.parse_args()
+
+    generate_pdf = load_lambda(GENERATE_PDF_DIR)
+
+    for rows in args.rows:
+        report = synthetic_report(rows)
+        sections = [section for section in generate_pdf.report_sections if section in report]
+
+        def build_tables_sequentially():
+            return [generate_pdf.build_section_table(section, report[section]) for section in sections]
+
+        def build_tables_concurrently():
+            with ThreadPoolExecutor(max_workers=args.threads) as executor:
+                return list(executor.map(lambda section: generate_pdf.build_section_table(section, report[section]), sections))
+
+        def render():
+            return generate_pdf.create_pdf(report).output()
+
+        print(f"{rows} rows per table")
+        for name, function in [
+            ("tables, sequential", build_tables_sequentially),
+            (f"tables, {args.threads} threads", build_tables_concurrently),
+            ("whole PDF", render),
+        ]:
+            function()  # Warm up, builds the cached adapters
+            durations = timeit(function, args.repeat)
+            print(f"  {name:18} {summarize(durations)}, peak memory {peak_memory_mb(function):7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
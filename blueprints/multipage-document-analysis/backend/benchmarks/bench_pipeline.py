@@ -0,0 +1,475 @@
+# MIT No Attribution
+#
+# Copyright 2024 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Offline benchmark of the whole document processing workflow: chunk, extract, consolidate, persist and PDF.
+
+The Lambda functions run in-process in the order of the state machine, with the Map states run in thread pools of
+their max concurrency. Nothing is deployed:
+  - Textract: the GetDocumentTextDetection responses are replayed, from a file saved from a real job (a JSON list with
+    the response of every NextToken page) or synthetic pages.
+  - Bedrock: InvokeModel calls are answered by a stub with a fixed latency. It throttles the calls over a requests per
+    minute quota of the model, and optionally a share of the calls at random. The answers are built from the tool schemas of the structured output, a share of the extracted values
+    differs between chunks so some fields need the LLM consolidation.
+  - DynamoDB and S3: emulated with moto.
+
+Every page count runs in its own process, reporting per stage latency, model calls, throttles, tokens and the peak
+RSS of the process. Run from the backend directory:
+
+    python benchmarks/bench_pipeline.py [--pages 10 100 1000] [--latency-ms 200] [--bedrock-requests-per-minute 0]
+                                        [--throttle-rate 0.0] [--textract-output textract.json]
+"""
+
+import argparse
+import collections
+import io
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+import types
+
+from concurrent.futures import ThreadPoolExecutor
+
+from harness import WORKFLOW_DIR, load_lambda
+
+STAGES = ["chunk", "extract", "consolidate", "persist", "pdf"]
+
+# Max concurrency of the ChunkIteratorMap state
+MAP_CONCURRENCY = 20
+# Retries of the extraction and consolidation tasks, the retry interval is not waited
+TASK_RETRIES = 3
+
+JOB_ID = "benchmark-job"
+TEXTRACT_JOB_ID = "benchmark-textract-job"
+WORDS = ("sociedad anonima capital social accionistas acciones administrador consejo poderes representante legal "
+         "notario publico escritura constitucion domicilio duracion objeto nacionalidad extranjeros clausula").split()
+
+
+def configure_environment(args):
+    """Configuration of the Lambda functions, as set by the stack"""
+
+    os.environ.update({
+        "DOCUMENTS_DYNAMO_DB_TABLE_NAME": "documents",
+        "EXTRACTION_CACHE_TABLE_NAME": "extraction-cache",
+        "BEDROCK_QUOTA_TABLE_NAME": "bedrock-quota",
+        "WORKFLOW_BUCKET_NAME": "workflow",
+        "OUTPUT_BUCKET_NAME": "reports",
+        "REGION": os.environ["AWS_DEFAULT_REGION"],
+        "BEDROCK_REGION": os.environ["AWS_DEFAULT_REGION"],
+        "BEDROCK_MODEL_ID": "us.anthropic.claude-3-haiku-20240307-v1:0",
+        "BEDROCK_REQUESTS_PER_MINUTE": str(args.requests_per_minute),
+        "BEDROCK_TOKENS_PER_MINUTE": str(args.tokens_per_minute),
+        "LANGUAGE_ID": "es",
+        "USE_EXAMPLES": "False",
+        "EXTRACTION_CONFIDENCE_LEVEL": "85",
+        "EXTRACTION_CONCURRENCY": "5",
+        "EXTRACTION_MODE": args.extraction_mode,
+        "CHUNKING_STRATEGY": args.chunking_strategy,
+        "STREAMING_INGESTION": "True" if args.ingestion == "streaming" else "False",
+        "CONSOLIDATION_GROUP_SIZE": "8",
+        "CONSOLIDATION_CONCURRENCY": "4",
+    })
+
+
+def create_resources():
+    """Tables and buckets of the stack, in moto"""
+
+    import boto3
+
+    dynamodb = boto3.resource("dynamodb")
+    for table_name in ["documents", "extraction-cache", "bedrock-quota"]:
+        dynamodb.create_table(
+            TableName=table_name,
+            KeySchema=[{"AttributeName": "id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+
+    s3 = boto3.client("s3")
+    for bucket in ["workflow", "reports"]:
+        s3.create_bucket(Bucket=bucket)
+
+
+def synthetic_page_blocks(page, lines_per_page=40, words_per_line=10):
+    """
+    PAGE, LINE and WORD blocks of a page of a synthetic document, with a blank line between paragraphs
+    @param page: Page number
+    @return: List of blocks
+    """
+
+    rng = random.Random(page)
+    page_block = {"BlockType": "PAGE", "Id": f"page-{page}", "Page": page, "Relationships": [{"Type": "CHILD", "Ids": []}],
+                  "Geometry": {"BoundingBox": {"Top": 0, "Left": 0, "Height": 1, "Width": 1}}}
+    blocks = [page_block]
+
+    for line in range(lines_per_page):
+        top = 0.05 + line * 0.022 + (line // 8) * 0.02
+        line_id = f"line-{page}-{line}"
+        page_block["Relationships"][0]["Ids"].append(line_id)
+
+        words = [rng.choice(WORDS) for _ in range(words_per_line)]
+        word_blocks = [{
+            "BlockType": "WORD", "Id": f"word-{page}-{line}-{index}", "Page": page, "Text": word,
+            "TextType": "PRINTED", "Confidence": 99.0,
+            "Geometry": {"BoundingBox": {"Top": top, "Left": 0.05 + index * 0.09, "Height": 0.015, "Width": 0.08}},
+        } for index, word in enumerate(words)]
+
+        blocks.append({
+            "BlockType": "LINE", "Id": line_id, "Page": page, "Text": " ".join(words), "Confidence": 99.0,
+            "Geometry": {"BoundingBox": {"Top": top, "Left": 0.05, "Height": 0.015, "Width": 0.9}},
+            "Relationships": [{"Type": "CHILD", "Ids": [word_block["Id"] for word_block in word_blocks]}],
+        })
+        blocks.extend(word_blocks)
+
+    return blocks
+
+
+class SyntheticTextract:
+    """
+    Textract client answering GetDocumentTextDetection with a synthetic document. The responses are built when they
+    are requested, as they arrive from Textract, so they do not add to the peak RSS of the benchmark
+    """
+
+    def __init__(self, pages, pages_per_response=2):
+        self.pages = pages
+        self.pages_per_response = pages_per_response
+
+    def get_document_text_detection(self, JobId, NextToken=None, **_kwargs):
+        first_page = int(NextToken or 1)
+        last_page = min(first_page + self.pages_per_response, self.pages + 1)
+
+        response = {
+            "JobStatus": "SUCCEEDED",
+            "DocumentMetadata": {"Pages": self.pages},
+            "Blocks": [block for page in range(first_page, last_page) for block in synthetic_page_blocks(page)],
+        }
+        if last_page <= self.pages:
+            response["NextToken"] = str(last_page)
+
+        return response
+
+
+class TextractReplay:
+    """
+    Textract client answering GetDocumentTextDetection with the responses saved from a real job, a JSON list with the
+    response of every NextToken in order
+    """
+
+    def __init__(self, responses):
+        self.pages = responses[0].get("DocumentMetadata", {}).get("Pages", 0)
+        # Each response is requested with the NextToken of the previous one
+        self.responses = {None: responses[0]}
+        for previous, response in zip(responses, responses[1:]):
+            self.responses[previous["NextToken"]] = response
+
+    def get_document_text_detection(self, JobId, NextToken=None, **_kwargs):
+        return self.responses[NextToken]
+
+
+class BedrockStub:
+    """
+    Answers the InvokeModel calls of a bedrock-runtime client with a fixed latency, before they are sent.
+    The answer is a tool use with an input generated from the tool schema
+    """
+
+    def __init__(self, latency_ms, requests_per_minute, throttle_rate, conflict_rate, section_schemas, seed=0):
+        self.latency = latency_ms / 1000
+        self.requests_per_minute = requests_per_minute
+        self.throttle_rate = throttle_rate
+        self.conflict_rate = conflict_rate
+        # Title of the JSON schema of each section model, to know which section a prompt extracts
+        self.section_schemas = section_schemas
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._call_times = collections.deque()
+        self.calls = 0
+        self.throttles = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def stats(self):
+        with self._lock:
+            return {"calls": self.calls, "throttles": self.throttles,
+                    "input_tokens": self.input_tokens, "output_tokens": self.output_tokens}
+
+    def attach(self, client):
+        client.meta.events.register("before-call.bedrock-runtime.InvokeModel", self._invoke_model)
+
+    def _throttled(self):
+        """A call is throttled over the requests per minute quota of the model, or at random"""
+
+        now = time.monotonic()
+        with self._lock:
+            while self._call_times and self._call_times[0] <= now - 60:
+                self._call_times.popleft()
+
+            if self.requests_per_minute and len(self._call_times) >= self.requests_per_minute:
+                return True
+            if self._rng.random() < self.throttle_rate:
+                return True
+
+            self._call_times.append(now)
+            return False
+
+    def _random(self):
+        with self._lock:
+            return self._rng.random()
+
+    def _fake_value(self, schema, defs, name, index=0):
+        if "$ref" in schema:
+            schema = defs[schema["$ref"].rsplit("/", 1)[-1]]
+        if "anyOf" in schema:
+            schema = next(option for option in schema["anyOf"] if option.get("type") != "null")
+
+        if "properties" in schema:
+            return {field: self._fake_value(field_schema, defs, field, index) for field, field_schema in schema["properties"].items()}
+
+        schema_type = schema.get("type")
+        if schema_type == "array":
+            return [self._fake_value(schema.get("items", {}), defs, name, item) for item in range(2)]
+        if schema_type == "integer":
+            return 95
+        if schema_type == "number":
+            return 95.0
+        if schema_type == "boolean":
+            return True
+
+        # Some chunks extract a different value, a conflict for the consolidation
+        if self._random() < self.conflict_rate:
+            return f"{name} {index} variant {int(self._random() * 3)}"
+        return f"{name} {index}"
+
+    def _information_extraction(self, section_schema):
+        return {
+            "thinking": "The text has the information of the section",
+            "confidence_level": 95,
+            "conclusion": True,
+            "extracted_information": json.dumps(self._fake_value(section_schema, section_schema.get("$defs", {}), "value")),
+        }
+
+    def _tool_input(self, tool, prompt):
+        schema = tool["input_schema"]
+        defs = schema.get("$defs", {})
+
+        if tool["name"] == "InformationExtraction":
+            section = next((section for section, section_schema in self.section_schemas.items()
+                            if section_schema["title"] in prompt), next(iter(self.section_schemas)))
+            return self._information_extraction(self.section_schemas[section])
+
+        if tool["name"] == "ReportInformationExtraction":
+            return {section: self._information_extraction(self.section_schemas[section]) for section in schema["properties"]}
+
+        return self._fake_value(schema, defs, "value")
+
+    def _invoke_model(self, params, **_kwargs):
+        from botocore.exceptions import ClientError
+        from botocore.response import StreamingBody
+
+        request_body = params["body"]
+        request = json.loads(request_body)
+        time.sleep(self.latency)
+
+        with self._lock:
+            self.calls += 1
+            self.input_tokens += len(request_body) // 4
+
+        if self._throttled():
+            with self._lock:
+                self.throttles += 1
+            raise ClientError({"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}}, "InvokeModel")
+
+        tool = request["tools"][0]
+        tool_input = self._tool_input(tool, json.dumps(request["messages"], ensure_ascii=False) + request.get("system", ""))
+
+        with self._lock:
+            self.output_tokens += len(json.dumps(tool_input)) // 4
+
+        response_body = json.dumps({
+            "id": "msg_benchmark", "type": "message", "role": "assistant", "model": request.get("model", ""),
+            "content": [{"type": "tool_use", "id": "toolu_benchmark", "name": tool["name"], "input": tool_input}],
+            "stop_reason": "tool_use", "usage": {"input_tokens": len(request_body) // 4, "output_tokens": 0},
+        }).encode("utf-8")
+
+        http_response = types.SimpleNamespace(status_code=200, headers={})
+        return http_response, {
+            "body": StreamingBody(io.BytesIO(response_body), len(response_body)),
+            "contentType": "application/json",
+            "ResponseMetadata": {"HTTPStatusCode": 200, "HTTPHeaders": {}},
+        }
+
+
+class LambdaContext:
+    function_name = "benchmark"
+    memory_limit_in_mb = 1024
+    invoked_function_arn = "arn:aws:lambda:us-east-1:123456789012:function:benchmark"
+    aws_request_id = "benchmark"
+
+
+def invoke_task(handler, event, retryable_error):
+    """Invoke a Lambda function as a state machine task, retrying the same errors as the state machine"""
+
+    for attempt in range(TASK_RETRIES + 1):
+        try:
+            return handler(event, LambdaContext())
+        except (retryable_error, TimeoutError):
+            if attempt == TASK_RETRIES:
+                raise
+
+
+def run_pipeline(args):
+    """Run the workflow for a document of args.pages pages and return the metrics of each stage"""
+
+    from moto import mock_aws
+
+    configure_environment(args)
+
+    with mock_aws():
+        create_resources()
+
+        from status_info_layer.StatusEnum import StatusEnum
+        from status_info_layer.job_status import initial_status_attributes
+
+        import boto3
+        boto3.resource("dynamodb").Table("documents").put_item(
+            Item={"id": TEXTRACT_JOB_ID, **initial_status_attributes(StatusEnum.TEXT_EXTRACTION)}
+        )
+
+        chunk_fn = load_lambda(os.path.join(WORKFLOW_DIR, "chunk_textract_document_fn"))
+        # Longest wait for Bedrock capacity of each function, as set by the stack
+        os.environ["BEDROCK_MAX_WAIT_SECONDS"] = "600"
+        extract_fn = load_lambda(os.path.join(WORKFLOW_DIR, "extract_data_to_schema_fn"))
+        os.environ["BEDROCK_MAX_WAIT_SECONDS"] = "180"
+        consolidate_fn = load_lambda(os.path.join(WORKFLOW_DIR, "consolidate_report_fn"))
+        persist_fn = load_lambda(os.path.join(WORKFLOW_DIR, "persist_results_fn"))
+        generate_pdf_fn = load_lambda(os.path.join(WORKFLOW_DIR, "generate_pdf_fn"))
+
+        if args.textract_output:
+            with open(args.textract_output) as textract_output:
+                chunk_fn.textract_client = TextractReplay(json.load(textract_output))
+            args.pages = chunk_fn.textract_client.pages
+        else:
+            chunk_fn.textract_client = SyntheticTextract(args.pages)
+
+        section_schemas = {
+            section: model.model_json_schema() for section, model in extract_fn.info_to_output_mapping.items()
+        }
+        bedrock = BedrockStub(args.latency_ms, args.bedrock_requests_per_minute, args.throttle_rate, args.conflict_rate, section_schemas)
+        bedrock.attach(extract_fn.bedrock_runtime)
+        bedrock.attach(consolidate_fn.bedrock_runtime)
+
+        # The functions enable the LangChain debug output, it floods the output of the benchmark
+        import langchain_core.globals
+        langchain_core.globals.set_debug(args.langchain_debug)
+
+        metrics = {}
+
+        def run_stage(stage, function):
+            bedrock_before = bedrock.stats()
+            started_at = time.perf_counter()
+            result = function()
+            bedrock_after = bedrock.stats()
+            metrics[stage] = {
+                "latency_ms": (time.perf_counter() - started_at) * 1000,
+                **{key: bedrock_after[key] - bedrock_before[key] for key in bedrock_after},
+                "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            }
+            return result
+
+        # Textract notification delivered by the EventBridge pipe
+        notification = {"body": json.dumps({
+            "Type": "Notification",
+            "Message": json.dumps({"JobId": TEXTRACT_JOB_ID, "Status": "SUCCEEDED"}),
+        })}
+        chunks = run_stage("chunk", lambda: chunk_fn.lambda_handler(notification, LambdaContext()))
+
+        def extract_chunk(chunk_index, chunk):
+            result = invoke_task(
+                extract_fn.lambda_handler,
+                {"chunk_index": chunk_index, "chunk": chunk, "job_id": chunks["job_id"]},
+                extract_fn.BedrockRetryableError,
+            )
+            return {"chunk_index": chunk_index, "chunk": chunk, "job_id": chunks["job_id"],
+                    "TaskResult": {"body": result["body"], "statusCode": result["statusCode"]}}
+
+        def extract():
+            with ThreadPoolExecutor(max_workers=MAP_CONCURRENCY) as executor:
+                return list(executor.map(extract_chunk, *zip(*enumerate(chunks["body"]["results"]["chunks"]))))
+
+        extraction_results = run_stage("extract", extract)
+
+        consolidation = run_stage("consolidate", lambda: invoke_task(
+            consolidate_fn.lambda_handler, extraction_results, consolidate_fn.BedrockRetryableError
+        ))
+        persisted = run_stage("persist", lambda: persist_fn.lambda_handler({"Payload": consolidation}, LambdaContext()))
+        run_stage("pdf", lambda: generate_pdf_fn.lambda_handler({"Payload": persisted}, LambdaContext()))
+
+        return {"pages": args.pages, "chunks": len(chunks["body"]["results"]["chunks"]), "stages": metrics}
+
+
+def print_metrics(result):
+    print(f"{result['pages']} pages, {result['chunks']} chunks")
+    print(f"  {'stage':12} {'latency':>12} {'calls':>7} {'throttles':>9} {'input tokens':>13} {'output tokens':>13} {'peak RSS':>10}")
+
+    total_latency = 0
+    for stage in STAGES:
+        stage_metrics = result["stages"][stage]
+        total_latency += stage_metrics["latency_ms"]
+        print(f"  {stage:12} {stage_metrics['latency_ms']:9.0f} ms {stage_metrics['calls']:7} {stage_metrics['throttles']:9} "
+              f"{stage_metrics['input_tokens']:13} {stage_metrics['output_tokens']:13} {stage_metrics['peak_rss_mb']:7.0f} MB")
+
+    print(f"  {'total':12} {total_latency:9.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 1000], help="Pages of the synthetic documents")
+    parser.add_argument("--textract-output", help="JSON file with the GetDocumentTextDetection responses of a job to replay")
+    parser.add_argument("--latency-ms", type=float, default=200, help="Latency of every Bedrock call")
+    parser.add_argument("--bedrock-requests-per-minute", type=int, default=0,
+                        help="Requests per minute quota of the Bedrock stub, calls over it are throttled (0 for no quota)")
+    parser.add_argument("--throttle-rate", type=float, default=0.0,
+                        help="Share of the Bedrock calls throttled at random. Every throttle halves the budget of the rate limiter")
+    parser.add_argument("--conflict-rate", type=float, default=0.05, help="Share of extracted values that differ between chunks")
+    parser.add_argument("--requests-per-minute", type=int, default=100000, help="Requests per minute budget of the rate limiter")
+    parser.add_argument("--tokens-per-minute", type=int, default=100000000, help="Tokens per minute budget of the rate limiter")
+    parser.add_argument("--extraction-mode", choices=["per_section", "multi_section"], default="per_section")
+    parser.add_argument("--chunking-strategy", choices=["tokens", "pages"], default="tokens")
+    parser.add_argument("--ingestion", choices=["streaming", "textractor"], default="streaming")
+    parser.add_argument("--langchain-debug", action="store_true", help="Keep the LangChain debug output of the functions")
+    parser.add_argument("--single", type=int, help="Run a single document of this many pages and print the metrics as JSON")
+    args = parser.parse_args()
+
+    if args.single is not None:
+        args.pages = args.single
+        print(json.dumps(run_pipeline(args)))
+        return
+
+    # A process per document, so the peak RSS is the one of that document
+    for pages in ([0] if args.textract_output else args.pages):
+        command = [sys.executable, os.path.abspath(__file__), *sys.argv[1:], "--single", str(pages)]
+        output = subprocess.run(command, check=True, stdout=subprocess.PIPE, text=True).stdout
+        print_metrics(json.loads(output.strip().splitlines()[-1]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# MIT No Attribution
+#
+# Copyright 2024 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Helpers shared by the benchmarks. The benchmarks run the Lambda functions in-process, without deploying the stack
+"""
+
+import importlib.util
+import os
+import statistics
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKFLOW_DIR = os.path.join(BACKEND_DIR, "pace_backend", "text_analysis_workflow")
+API_LAMBDA_DIR = os.path.join(BACKEND_DIR, "pace_backend", "api", "lambda")
+
+# Lambda layers, importable the same way as in the Lambda runtime
+sys.path.insert(0, os.path.join(BACKEND_DIR, "pace_backend", "shared"))
+sys.path.insert(0, os.path.join(WORKFLOW_DIR, "shared"))
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+os.environ.setdefault("POWERTOOLS_SERVICE_NAME", "benchmarks")
+os.environ.setdefault("POWERTOOLS_LOG_LEVEL", "WARNING")
+
+
+def load_lambda(function_dir, module="index"):
+    """
+    Import a module of a Lambda function, every function has its own index.py so they are imported under unique names.
+    Functions can have packages with the same name (e.g. prompt_selector), they are dropped from sys.modules once the
+    module is imported so the next function imports its own
+    @param function_dir: Directory of the function
+    @param module: Name of the module in the directory
+    @return: Imported module
+    """
+
+    cwd = os.getcwd()
+    sys.path.insert(0, function_dir)
+    # Some functions read files relative to their directory, as in the Lambda runtime
+    os.chdir(function_dir)
+    try:
+        spec = importlib.util.spec_from_file_location(
+            f"{os.path.basename(function_dir)}_{module}", os.path.join(function_dir, f"{module}.py")
+        )
+        lambda_module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(lambda_module)
+    finally:
+        os.chdir(cwd)
+        sys.path.remove(function_dir)
+
+        for name, loaded_module in list(sys.modules.items()):
+            if (getattr(loaded_module, "__file__", None) or "").startswith(function_dir + os.sep):
+                del sys.modules[name]
+
+    return lambda_module
+
+
+def timeit(function, repeat):
+    """
+    Time the calls to a function
+    @param function: Function without arguments
+    @param repeat: Number of calls
+    @return: List with the duration of each call in milliseconds
+    """
+
+    durations = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        function()
+        durations.append((time.perf_counter() - started_at) * 1000)
+
+    return durations
+
+
+def summarize(durations):
+    """Median and 95th percentile of a list of durations in milliseconds"""
+    durations = sorted(durations)
+    p95 = durations[min(int(len(durations) * 0.95), len(durations) - 1)]
+    return f"median {statistics.median(durations):9.3f} ms, p95 {p95:9.3f} ms"
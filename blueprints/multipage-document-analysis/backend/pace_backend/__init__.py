@@ -67,11 +67,20 @@ class PACEBackendStack(Stack):
             default="false"
         )
 
+        chunking_strategy = CfnParameter(
+            self,
+            "ChunkingStrategy",
+            type="String",
+            description="Split the documents in chunks of a number of pages or pack them up to a token budget",
+            allowed_values=["pages", "tokens"],
+            default="tokens"
+        )
+
         pages_chunk = CfnParameter(
             self,
             "PagesChunk",
             type="String",
-            description="The number of pages per chunk",
+            description="The number of pages per chunk, used with the pages chunking strategy",
             allowed_pattern="\d",
             default="5"
         )
@@ -85,6 +94,15 @@ class PACEBackendStack(Stack):
             default="85"
         )
 
+        extraction_mode = CfnParameter(
+            self,
+            "ExtractionMode",
+            type="String",
+            description="Extract each section of the report with its own model call or all of them in a single call",
+            allowed_values=["per_section", "multi_section"],
+            default="per_section"
+        )
+
         # KMS keys for this app
         self.sns_kms_key = kms.Key(self,
                                    "SNS-KMSKey",
@@ -103,10 +121,18 @@ class PACEBackendStack(Stack):
             "Documents-Bucket"
         )
 
-        # A S3 bucket to store the reports
+        # A S3 bucket to store the reports. The JSON and PDF reports are referenced by the job item and kept as long
+        # as the job, only the access logs of the bucket expire
         self.reports_bucket = pace.PACEBucket(
             self,
-            "Reports-Bucket"
+            "Reports-Bucket",
+            expiration_prefix="logs/"
+        )
+
+        # A S3 bucket to store the intermediate results of the workflow (chunks and extractions)
+        self.workflow_bucket = pace.PACEBucket(
+            self,
+            "Workflow-Bucket"
         )
 
         # A DynamoDB table to store the results of the processed documents
@@ -116,6 +142,45 @@ class PACEBackendStack(Stack):
             partition_key=dynamodb.Attribute(name="id", type=dynamodb.AttributeType.STRING),
         )
 
+        # Indexes to list the jobs newest first, all of them or by status, without scanning the table.
+        # Only the attributes shown in the jobs list are projected, the reports stay out of the indexes.
+        # DynamoDB creates one index per table update, an existing stack is updated in two deploys with the
+        # jobs_index_stage context: 1 adds CreatedAtIndex (status filtered on it), 2 (default) adds StatusCreatedAtIndex
+        jobs_index_stage = int(self.node.try_get_context("jobs_index_stage") or 2)
+
+        self.documents_table.add_global_secondary_index(
+            index_name="CreatedAtIndex",
+            partition_key=dynamodb.Attribute(name="record_type", type=dynamodb.AttributeType.STRING),
+            sort_key=dynamodb.Attribute(name="created_at", type=dynamodb.AttributeType.STRING),
+            projection_type=dynamodb.ProjectionType.INCLUDE,
+            non_key_attributes=["document_name", "document_key", "report_key", "status"],
+        )
+
+        if jobs_index_stage >= 2:
+            self.documents_table.add_global_secondary_index(
+                index_name="StatusCreatedAtIndex",
+                partition_key=dynamodb.Attribute(name="status", type=dynamodb.AttributeType.STRING),
+                sort_key=dynamodb.Attribute(name="created_at", type=dynamodb.AttributeType.STRING),
+                projection_type=dynamodb.ProjectionType.INCLUDE,
+                non_key_attributes=["document_name", "document_key", "report_key"],
+            )
+
+        # A DynamoDB table to cache the extractions of previously seen chunks
+        self.extraction_cache_table = pace.PACETable(
+            self,
+            "ExtractionCacheTable",
+            partition_key=dynamodb.Attribute(name="id", type=dynamodb.AttributeType.STRING),
+            time_to_live_attribute="expires_at",
+        )
+
+        # A DynamoDB table with the Bedrock request and token counters shared by the workflow Lambda functions
+        self.bedrock_quota_table = pace.PACETable(
+            self,
+            "BedrockQuotaTable",
+            partition_key=dynamodb.Attribute(name="id", type=dynamodb.AttributeType.STRING),
+            time_to_live_attribute="expires_at",
+        )
+
         # An Amazon SNS topic
         self.sns_topic = sns.Topic(
             self,
@@ -235,7 +300,8 @@ class PACEBackendStack(Stack):
             documents_table=self.documents_table,
             sns_textract_topic=self.sns_topic,
             sns_textract_role=self.textract_sns_role,
-            shared_status_lambda_layer=self.shared_status_lambda_layer
+            shared_status_lambda_layer=self.shared_status_lambda_layer,
+            status_created_at_index_name="StatusCreatedAtIndex" if jobs_index_stage >= 2 else ""
         )
 
         # Create step functions document analysis workflow
@@ -243,12 +309,19 @@ class PACEBackendStack(Stack):
             self,
             "DocAnalysisSFNPipeline",
             dynamo_docs_table=self.documents_table,
+            extraction_cache_table=self.extraction_cache_table,
+            bedrock_quota_table=self.bedrock_quota_table,
             output_s3_bucket=self.reports_bucket,
+            workflow_s3_bucket=self.workflow_bucket,
+            textract_queue=self.sqs_queue,
+            textract_dead_letter_queue=self.sqs_dead_letter_queue,
             shared_status_lambda_layer=self.shared_status_lambda_layer,
             language_code=language_code.value_as_string,
+            chunking_strategy=chunking_strategy.value_as_string,
             pages_chunk=pages_chunk.value_as_string,
             use_examples=True if include_examples.value_as_string == "true" else False,
-            extraction_confidence_level=extraction_confidence_level.value_as_string
+            extraction_confidence_level=extraction_confidence_level.value_as_string,
+            extraction_mode=extraction_mode.value_as_string
         )
 
         # Create Event Bridge pipes to initiate state machine on SQS message
@@ -261,7 +334,12 @@ class PACEBackendStack(Stack):
         self.event_bridge_pipe = pipes.Pipe(
             self,
             "SQS-SFN-DocAnalysisPipe",
-            source=pipes_sources.SqsSource(self.sqs_queue),
+            # Every notification of the batch is processed by the state machine, each one in its own branch
+            source=pipes_sources.SqsSource(
+                self.sqs_queue,
+                batch_size=10,
+                maximum_batching_window=Duration.seconds(10)
+            ),
             target=sfn_pipe_target
         )
 
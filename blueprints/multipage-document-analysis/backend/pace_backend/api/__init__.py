@@ -26,8 +26,10 @@ from aws_cdk import (
     aws_s3 as s3,
     aws_lambda_python_alpha as lambda_python,
     aws_lambda as lambda_,
+    aws_lambda_destinations as lambda_destinations,
     aws_wafv2 as waf,
     Duration,
+    Size,
 )
 from constructs import Construct
 from cdk_nag import NagSuppressions
@@ -51,6 +53,7 @@ class DocumentAPI(Construct):
             sns_textract_topic: sns.ITopic,
             sns_textract_role: iam.IRole,
             shared_status_lambda_layer: lambda_python.PythonLayerVersion,
+            status_created_at_index_name: str = "StatusCreatedAtIndex",
     ) -> None:
 
         super().__init__(scope, construct_id)
@@ -109,6 +112,92 @@ class DocumentAPI(Construct):
 
         ###### Lambda functions
 
+        # A Lambda function to fail the job of a document whose split function invocation failed without handling the
+        # error (out of memory or timeout), the on failure destination of the split function
+        self.split_document_failure_lambda = lambda_python.PythonFunction(
+            self,
+            "SplitDocumentFailureLambda",
+            entry="./pace_backend/api/lambda/split_document_fn",
+            index="index.py",
+            handler="failure_handler",
+            runtime=lambda_.Runtime.PYTHON_3_13,
+            layers=[shared_status_lambda_layer],
+            environment={
+                "DOCUMENTS_DYNAMO_DB_TABLE_NAME": documents_table.table_name,
+            },
+            timeout=Duration.seconds(30),
+        )
+        documents_table.grant_write_data(self.split_document_failure_lambda)
+
+        NagSuppressions.add_resource_suppressions(
+            self.split_document_failure_lambda,
+            [
+                {
+                    "id": "AwsSolutions-IAM4",
+                    "reason": """Service role created by CDK""",
+                },
+                {
+                    "id": "AwsSolutions-IAM5",
+                    "reason": """Service role created by CDK""",
+                },
+            ],
+            True
+        )
+
+        # A Lambda function to split large PDF documents and start their Textract jobs, invoked asynchronously by
+        # the start text extraction function
+        self.split_document_lambda = lambda_python.PythonFunction(
+            self,
+            "SplitDocumentLambda",
+            entry="./pace_backend/api/lambda/split_document_fn",
+            index="index.py",
+            handler="lambda_handler",
+            runtime=lambda_.Runtime.PYTHON_3_13,
+            layers=[shared_status_lambda_layer],
+            environment={
+                "DOCUMENTS_DYNAMO_DB_TABLE_NAME": documents_table.table_name,
+                "TEXTRACT_SNS_TOPIC_ARN": sns_textract_topic.topic_arn,
+                "TEXTRACT_SNS_ROLE_ARN": sns_textract_role.role_arn,
+                "DOCUMENTS_BUCKET_NAME": document_bucket.bucket_name,
+                "SPLIT_PAGES_THRESHOLD": "200",
+                "PAGES_PER_PART": "100",
+                "TEXTRACT_START_CONCURRENCY": "4",
+            },
+            timeout=Duration.seconds(300),
+            memory_size=1024,
+            # The document and each part are written to /tmp, up to the 500 MB accepted by Textract
+            ephemeral_storage_size=Size.mebibytes(1536),
+            # A retry would start the Textract jobs of the document again, the function fails the job instead. When
+            # the invocation fails before it can, e.g. out of memory or time, the on failure destination does
+            retry_attempts=0,
+            on_failure=lambda_destinations.LambdaDestination(self.split_document_failure_lambda, response_only=False),
+        )
+        self.split_document_lambda.add_to_role_policy(
+            iam.PolicyStatement(
+                actions=[
+                    "textract:StartDocumentTextDetection",
+                ],
+                resources=["*"],
+            )
+        )
+        document_bucket.grant_read_write(self.split_document_lambda)
+        documents_table.grant_write_data(self.split_document_lambda)
+
+        NagSuppressions.add_resource_suppressions(
+            self.split_document_lambda,
+            [
+                {
+                    "id": "AwsSolutions-IAM4",
+                    "reason": """Service role created by CDK""",
+                },
+                {
+                    "id": "AwsSolutions-IAM5",
+                    "reason": """Service role created by CDK""",
+                },
+            ],
+            True
+        )
+
         # A lambda function to start the text extraction process
         self.start_text_extraction_lambda = lambda_python.PythonFunction(
             self,
@@ -123,6 +212,8 @@ class DocumentAPI(Construct):
                 "TEXTRACT_SNS_TOPIC_ARN": sns_textract_topic.topic_arn,
                 "TEXTRACT_SNS_ROLE_ARN": sns_textract_role.role_arn,
                 "DOCUMENTS_BUCKET_NAME": document_bucket.bucket_name,
+                "SPLIT_LARGE_DOCUMENTS": "True",
+                "SPLIT_DOCUMENT_FUNCTION_NAME": self.split_document_lambda.function_name,
             },
             timeout=Duration.seconds(60),
         )
@@ -135,8 +226,9 @@ class DocumentAPI(Construct):
                 resources=["*"],
             )
         )
-        document_bucket.grant_read(self.start_text_extraction_lambda)
+        document_bucket.grant_read_write(self.start_text_extraction_lambda)
         documents_table.grant_write_data(self.start_text_extraction_lambda)
+        self.split_document_lambda.grant_invoke(self.start_text_extraction_lambda)
 
         NagSuppressions.add_resource_suppressions(
             self.start_text_extraction_lambda,
@@ -163,6 +255,8 @@ class DocumentAPI(Construct):
             runtime=lambda_.Runtime.PYTHON_3_13,
             environment={
                 "DOCUMENTS_DYNAMO_DB_TABLE_NAME": documents_table.table_name,
+                "CREATED_AT_INDEX_NAME": "CreatedAtIndex",
+                "STATUS_CREATED_AT_INDEX_NAME": status_created_at_index_name,
             },
             timeout=Duration.seconds(60),
         )
@@ -225,10 +319,12 @@ class DocumentAPI(Construct):
             layers=[shared_status_lambda_layer],
             environment={
                 "DOCUMENTS_DYNAMO_DB_TABLE_NAME": documents_table.table_name,
+                "REPORTS_BUCKET_NAME": report_bucket.bucket_name,
             },
             timeout=Duration.seconds(60),
         )
         documents_table.grant_read_data(self.lambda_get_results)
+        report_bucket.grant_read(self.lambda_get_results)
 
         NagSuppressions.add_resource_suppressions(
             self.lambda_get_results,
@@ -100,7 +100,12 @@ def lambda_handler(event, _context: LambdaContext):
 def _get_item_by_id(id: str):
     """Given the ID of an item retrieve from DynamoDb and return it"""
 
-    item = table.get_item(Key={"id": id})
+    # Only the attributes of the job details, legacy items may still carry the whole report
+    item = table.get_item(
+        Key={"id": id},
+        ProjectionExpression="document_name, document_key, report_key, #status",
+        ExpressionAttributeNames={"#status": "status"},
+    )
 
     logger.info("Received item")
     logger.info(item)
@@ -23,6 +23,7 @@ import functools
 import boto3
 
 from status_info_layer.StatusEnum import StatusEnum
+from report_info_layer.report_storage import get_report, get_report_presigned_url, REPORT_KEY_ATTRIBUTE, LEGACY_REPORT_ATTRIBUTE
 
 from aws_lambda_powertools.utilities.typing import LambdaContext
 from aws_lambda_powertools import Logger
@@ -32,7 +33,9 @@ from botocore.exceptions import ClientError
 logger = Logger()
 
 TABLE_NAME = os.getenv("DOCUMENTS_DYNAMO_DB_TABLE_NAME")
+REPORTS_BUCKET_NAME = os.getenv("REPORTS_BUCKET_NAME")
 table = boto3.resource("dynamodb").Table(TABLE_NAME)
+s3 = boto3.client("s3")
 
 GET_TABLE_RESULTS_BY_ID_PATTERN = re.compile("(/[a-zA-Z0-9-]*)*/jobs/results/[A-Za-z0-9-]*")
 
@@ -56,7 +59,12 @@ def _format_response(handler):
 
         logger.info(lambda_response)
 
-        if lambda_response["statusCode"] == 200:
+        if lambda_response["statusCode"] == 200 and "presigned_url" in lambda_response:
+            response["body"] = json.dumps({
+                "job_id": lambda_response["job_id"],
+                "presigned_url": lambda_response["presigned_url"],
+            })
+        elif lambda_response["statusCode"] == 200:
             response["body"] = json.dumps({
                 "job_id": lambda_response["job_id"],
                 "json_report":  lambda_response["json_report"],
@@ -83,18 +91,28 @@ def lambda_handler(event, _context: LambdaContext):
     method = event["httpMethod"]
     path = event["path"]
     id = event["pathParameters"]["id"]
+    # ?format=url returns a presigned URL of the report instead of the report itself
+    query_parameters = event.get("queryStringParameters") or {}
     if method == "GET" and GET_TABLE_RESULTS_BY_ID_PATTERN.match(path):
-        return _get_item_by_id(id)
+        return _get_item_by_id(id, presigned_url=query_parameters.get("format") == "url")
     else:
         return {
             "statusCode": 500,
             "items": "Not implemented"
         }
 
-def _get_item_by_id(id: str):
-    """Given the ID of an item retrieve from DynamoDb and return it"""
+def _get_item_by_id(id: str, presigned_url: bool=False):
+    """Given the ID of an item retrieve from DynamoDb and return its report, or a presigned URL of the report"""
 
-    item = table.get_item(Key={"id": id})
+    item = table.get_item(
+        Key={"id": id},
+        ProjectionExpression="#status, #report_s3_key, #json_report",
+        ExpressionAttributeNames={
+            "#status": "status",
+            "#report_s3_key": REPORT_KEY_ATTRIBUTE,
+            "#json_report": LEGACY_REPORT_ATTRIBUTE,
+        },
+    )
 
     logger.info("Received item")
     logger.info(item)
@@ -112,10 +130,27 @@ def _get_item_by_id(id: str):
             "message": "Report unavailable",
             "job_id":  id,
         }
-    else:
+
+    if presigned_url and REPORT_KEY_ATTRIBUTE in item["Item"]:
         return {
             "statusCode": 200,
             "job_id": id,
-            "json_report": json.loads(item["Item"]["json_report"])
+            "presigned_url": get_report_presigned_url(s3, REPORTS_BUCKET_NAME, item["Item"])
+        }
+
+    try:
+        json_report = get_report(s3, REPORTS_BUCKET_NAME, item["Item"])
+    except (ClientError, KeyError) as e:
+        logger.error(f"Error reading report of job {id}: {e}")
+        return {
+            "statusCode": 500,
+            "message": "Report unavailable",
+            "job_id":  id,
         }
 
+    return {
+        "statusCode": 200,
+        "job_id": id,
+        "json_report": json_report
+    }
+
@@ -15,6 +15,8 @@
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
 # SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
+import base64
+import binascii
 import json
 import os
 import logging
@@ -22,6 +24,8 @@ import re
 import functools
 import boto3
 
+from boto3.dynamodb.conditions import Attr, Key
+
 from aws_lambda_powertools.utilities.typing import LambdaContext
 from aws_lambda_powertools import Logger
 
@@ -30,8 +34,15 @@ from botocore.exceptions import ClientError
 logger = Logger()
 
 TABLE_NAME = os.getenv("DOCUMENTS_DYNAMO_DB_TABLE_NAME")
+CREATED_AT_INDEX_NAME = os.getenv("CREATED_AT_INDEX_NAME", "CreatedAtIndex")
+STATUS_CREATED_AT_INDEX_NAME = os.getenv("STATUS_CREATED_AT_INDEX_NAME", "StatusCreatedAtIndex")
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", 25))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 100))
 table = boto3.resource("dynamodb").Table(TABLE_NAME)
 
+# Partition key value of every job in CreatedAtIndex, set when the job is created
+JOB_RECORD_TYPE = "JOB"
+
 GET_TABLE_ITEMS_PATTERN = re.compile("(/[a-zA-Z0-9-]*)*/jobs/query")
 
 # TODO: use aws_lambda_powertools.event_handler import APIGatewayRestResolver and CORSConfig to avoid having to
@@ -67,12 +78,18 @@ def _format_response(handler):
                     "id": item["id"],
                     "report_key": item.get("report_key", ""),
                     "status": item["status"],
+                    "created_at": item.get("created_at", ""),
                 }
 
                 items.append(item_response)
 
             response["body"] = json.dumps({
                 "items": items,
+                "next_token": lambda_response.get("next_token"),
+            })
+        elif lambda_response["statusCode"] == 400:
+            response["body"] = json.dumps({
+                "message": lambda_response["message"]
             })
         else:
             response["body"] = json.dumps({
@@ -103,7 +120,7 @@ def lambda_handler(event, _context: LambdaContext):
     logger.info(path)
 
     if method == "GET" and GET_TABLE_ITEMS_PATTERN.match(path):
-        return _get_items()
+        return _get_items(event.get("queryStringParameters") or {})
     else:
         return {
             "statusCode": 500,
@@ -111,9 +128,94 @@ def lambda_handler(event, _context: LambdaContext):
         }
 
 
-def _get_items():
-    items = table.scan()
+def _encode_next_token(last_evaluated_key):
+    if not last_evaluated_key:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(last_evaluated_key).encode("utf-8")).decode("utf-8")
+
+
+def _decode_next_token(next_token):
+    return json.loads(base64.urlsafe_b64decode(next_token.encode("utf-8")))
+
+
+def _get_items(query_parameters):
+    """
+    List a page of jobs, newest first
+    @param query_parameters: Optional status, created_from and created_to (ISO 8601 dates or timestamps),
+    limit and next_token (cursor returned by the previous page)
+    @return: Page of jobs and the cursor of the next page, None on the last page
+    """
+
+    status = query_parameters.get("status")
+    created_from = query_parameters.get("created_from")
+    created_to = query_parameters.get("created_to")
+
+    try:
+        limit = min(int(query_parameters.get("limit", DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError("limit must be positive")
+    except ValueError:
+        return {
+            "statusCode": 400,
+            "message": "Invalid limit"
+        }
+
+    # A date without time includes the whole day
+    if created_to and len(created_to) == len("YYYY-MM-DD"):
+        created_to += "T23:59:59.999999+00:00"
+
+    filter_expression = None
+
+    if status and STATUS_CREATED_AT_INDEX_NAME:
+        index_name = STATUS_CREATED_AT_INDEX_NAME
+        key_condition = Key("status").eq(status)
+    else:
+        index_name = CREATED_AT_INDEX_NAME
+        key_condition = Key("record_type").eq(JOB_RECORD_TYPE)
+
+        # Until the status index is created (see jobs_index_stage) the status is filtered, pages can be shorter
+        if status:
+            filter_expression = Attr("status").eq(status)
+
+    if created_from and created_to:
+        key_condition = key_condition & Key("created_at").between(created_from, created_to)
+    elif created_from:
+        key_condition = key_condition & Key("created_at").gte(created_from)
+    elif created_to:
+        key_condition = key_condition & Key("created_at").lte(created_to)
+
+    query_kwargs = {
+        "IndexName": index_name,
+        "KeyConditionExpression": key_condition,
+        "ScanIndexForward": False,  # Newest first
+        "Limit": limit,
+        "ProjectionExpression": "#id, document_name, document_key, report_key, #status, created_at",
+        "ExpressionAttributeNames": {"#id": "id", "#status": "status"},
+    }
+
+    if filter_expression is not None:
+        query_kwargs["FilterExpression"] = filter_expression
+
+    if query_parameters.get("next_token"):
+        try:
+            query_kwargs["ExclusiveStartKey"] = _decode_next_token(query_parameters["next_token"])
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            return {
+                "statusCode": 400,
+                "message": "Invalid next_token"
+            }
+
+    try:
+        response = table.query(**query_kwargs)
+    except ClientError as e:
+        logger.error(f"Error querying jobs: {e}")
+        return {
+            "statusCode": 500,
+            "items": []
+        }
+
     return {
         "statusCode": 200,
-        "items": items.get("Items", [])
+        "items": response.get("Items", []),
+        "next_token": _encode_next_token(response.get("LastEvaluatedKey"))
     }
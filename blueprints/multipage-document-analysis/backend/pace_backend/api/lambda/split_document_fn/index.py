@@ -0,0 +1,223 @@
+# MIT No Attribution
+#
+# Copyright 2024 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import gc
+import os
+import tempfile
+
+import boto3
+import secrets
+
+from concurrent.futures import ThreadPoolExecutor
+
+from pypdf import PdfReader, PdfWriter
+
+from status_info_layer.StatusEnum import StatusEnum
+from status_info_layer.job_status import update_job_status
+
+from aws_lambda_powertools.utilities.typing import LambdaContext
+from aws_lambda_powertools import Logger
+
+logger = Logger()
+
+bucket_name = os.environ.get("DOCUMENTS_BUCKET_NAME")
+sns_topic_arn = os.environ.get("TEXTRACT_SNS_TOPIC_ARN")
+sns_role_arn = os.environ.get("TEXTRACT_SNS_ROLE_ARN")
+dynamo_db_table_name = os.environ.get("DOCUMENTS_DYNAMO_DB_TABLE_NAME")
+# PDFs with more pages than the threshold are split in parts processed by parallel Textract jobs
+SPLIT_PAGES_THRESHOLD = int(os.environ.get("SPLIT_PAGES_THRESHOLD", 200))
+PAGES_PER_PART = int(os.environ.get("PAGES_PER_PART", 100))
+TEXTRACT_START_CONCURRENCY = int(os.environ.get("TEXTRACT_START_CONCURRENCY", 4))
+
+client_textract = boto3.client('textract')
+s3 = boto3.client('s3')
+table = boto3.resource("dynamodb").Table(dynamo_db_table_name)
+
+
+def start_text_detection(document_file_key):
+    """
+    Start an asynchronous text detection job in Textract, its completion is notified to the SNS topic
+    @param document_file_key: Key of the document in the documents bucket
+    @return: Textract job id
+    """
+
+    request_token = secrets.token_urlsafe(16)
+
+    # Start Async text detection
+    response = client_textract.start_document_text_detection(
+        DocumentLocation={
+            "S3Object": {"Bucket": bucket_name, "Name": document_file_key}
+        },
+        NotificationChannel={
+            "SNSTopicArn": sns_topic_arn,
+            "RoleArn": sns_role_arn,
+        },
+        ClientRequestToken=request_token,
+    )
+    job_id = response["JobId"]
+    logger.info(
+        "Started text detection job %s on %s.", job_id, document_file_key
+    )
+
+    return job_id
+
+
+def split_document(document_file_key):
+    """
+    Split a large PDF in parts of PAGES_PER_PART pages stored next to the document. The document and its parts go
+    through files in /tmp instead of memory, PDFs can be as large as the 500 MB accepted by Textract
+    @param document_file_key: Key of the document in the documents bucket
+    @return: Keys of the parts, None if the document is not large enough to be split
+    """
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        document_path = os.path.join(work_dir, "document.pdf")
+        s3.download_file(bucket_name, document_file_key, document_path)
+
+        return split_pdf(document_file_key, document_path, work_dir)
+
+
+def split_pdf(document_file_key, document_path, work_dir):
+    """
+    Write the parts of a PDF to the documents bucket
+    @param document_file_key: Key of the document in the documents bucket
+    @param document_path: Path of the downloaded document
+    @param work_dir: Directory where each part is written before it is uploaded
+    @return: Keys of the parts, None if the document is not large enough to be split
+    """
+
+    # Given a path, pypdf reads the whole file into memory. Given a file, it reads the objects as they are needed
+    with open(document_path, "rb") as document:
+        n_pages = len(PdfReader(document).pages)
+
+    if n_pages <= SPLIT_PAGES_THRESHOLD:
+        return None
+
+    logger.info(f"Splitting document {document_file_key} of {n_pages} pages in parts of {PAGES_PER_PART} pages")
+
+    part_keys = []
+
+    for part_index, first_page in enumerate(range(0, n_pages, PAGES_PER_PART)):
+        # A reader keeps every object it reads, a reader per part only holds the pages of the part
+        with open(document_path, "rb") as document:
+            writer = PdfWriter()
+            for page in PdfReader(document).pages[first_page:first_page + PAGES_PER_PART]:
+                writer.add_page(page)
+
+            part_path = os.path.join(work_dir, f"{part_index:03d}.pdf")
+            writer.write(part_path)
+
+        part_key = f"{document_file_key}.parts/{part_index:03d}.pdf"
+        s3.upload_file(part_path, bucket_name, part_key)
+        os.remove(part_path)
+        part_keys.append(part_key)
+
+        # The reader and writer of the part reference each other, collect them before the next part is read
+        del writer
+        gc.collect()
+
+    return part_keys
+
+
+def start_parts_text_extraction(job_id, part_keys):
+    """
+    Start a Textract job per part of the document, in parallel, tracked under the job. The workflow chunks and
+    extracts each part as soon as its Textract job completes and consolidates once all parts are done
+    @param job_id: Id of the job of the document
+    @param part_keys: Keys of the parts of the document, a single part is the whole document
+    @return: Ids of the Textract jobs
+    """
+
+    with ThreadPoolExecutor(max_workers=TEXTRACT_START_CONCURRENCY) as executor:
+        part_job_ids = list(executor.map(start_text_detection, part_keys))
+
+    # A reference from each Textract job to the job. A notification that arrives before it is stored is retried
+    with table.batch_writer() as batch:
+        for part_index, (part_key, part_job_id) in enumerate(zip(part_keys, part_job_ids)):
+            batch.put_item(
+                Item={
+                    "id": part_job_id,
+                    "parent_job_id": job_id,
+                    "part_index": part_index,
+                    "parts_total": len(part_keys),
+                    "document_key": part_key,
+                    "record_type": "JOB_PART",
+                }
+            )
+
+    table.update_item(
+        Key={"id": job_id},
+        UpdateExpression="SET #parts_total = :parts_total, #part_job_ids = :part_job_ids",
+        ExpressionAttributeNames={"#parts_total": "parts_total", "#part_job_ids": "part_job_ids"},
+        ExpressionAttributeValues={":parts_total": len(part_keys), ":part_job_ids": part_job_ids},
+    )
+
+    return part_job_ids
+
+
+@logger.inject_lambda_context(log_event=True)
+def lambda_handler(event, _context: LambdaContext):
+    """
+    Lambda function invoked asynchronously by start_text_extraction_fn to split a PDF document and start its Textract
+    jobs, out of the API request. Documents up to SPLIT_PAGES_THRESHOLD pages are processed by a single Textract job
+    @param event: Job id, key and name of the document
+    @param context:
+    @return:
+    """
+
+    job_id = event["job_id"]
+    document_file_key = event["document_key"]
+
+    try:
+        part_keys = split_document(document_file_key)
+    except Exception as e:
+        # The document is still processed by a single Textract job
+        logger.warning(f"Couldn't split document {document_file_key}: {e}")
+        part_keys = None
+
+    # The invocation is not retried, a retry would start the Textract jobs again. The job is failed instead
+    try:
+        part_job_ids = start_parts_text_extraction(job_id, part_keys or [document_file_key])
+    except Exception as e:
+        logger.exception(f"Couldn't start text detection of job {job_id}: {e}")
+        update_job_status(table, job_id, StatusEnum.ERROR)
+        return {"job_id": job_id, "statusCode": 500}
+
+    logger.info(f"Started {len(part_job_ids)} text detection jobs for job {job_id}")
+
+    return {"job_id": job_id, "statusCode": 200}
+
+
+@logger.inject_lambda_context(log_event=True)
+def failure_handler(event, _context: LambdaContext):
+    """
+    On failure destination of the asynchronous invocations of lambda_handler. An invocation that ran out of memory or
+    time never reaches the error handling of lambda_handler, the job is failed here instead of waiting in
+    TEXT_EXTRACTION forever
+    @param event: Invocation record of the failed invocation, with the original event in requestPayload
+    @param context:
+    @return:
+    """
+
+    job_id = event["requestPayload"]["job_id"]
+    condition = event.get("requestContext", {}).get("condition")
+    error_message = (event.get("responsePayload") or {}).get("errorMessage")
+
+    logger.error(f"Splitting the document of job {job_id} failed ({condition}): {error_message}")
+    update_job_status(table, job_id, StatusEnum.ERROR)
+
+    return {"job_id": job_id, "statusCode": 200}
@@ -21,8 +21,12 @@ import boto3
 import json
 import functools
 import secrets
+import uuid
+
+from datetime import datetime, timezone
 
 from status_info_layer.StatusEnum import StatusEnum
+from status_info_layer.job_status import initial_status_attributes, update_job_status
 
 from aws_lambda_powertools.utilities.typing import LambdaContext
 from aws_lambda_powertools import Logger
@@ -35,8 +39,12 @@ bucket_name = os.environ.get("DOCUMENTS_BUCKET_NAME")
 sns_topic_arn = os.environ.get("TEXTRACT_SNS_TOPIC_ARN")
 sns_role_arn = os.environ.get("TEXTRACT_SNS_ROLE_ARN")
 dynamo_db_table_name = os.environ.get("DOCUMENTS_DYNAMO_DB_TABLE_NAME")
+# PDFs are split in parts processed by parallel Textract jobs by the split function, out of the API request
+SPLIT_LARGE_DOCUMENTS = os.environ.get("SPLIT_LARGE_DOCUMENTS", "False") == "True"
+SPLIT_DOCUMENT_FUNCTION_NAME = os.environ.get("SPLIT_DOCUMENT_FUNCTION_NAME")
 
 client_textract = boto3.client('textract')
+client_lambda = boto3.client('lambda')
 table = boto3.resource("dynamodb").Table(dynamo_db_table_name)
 
 # TODO: use aws_lambda_powertools.event_handler import APIGatewayRestResolver and CORSConfig to avoid having to
@@ -76,6 +84,34 @@ def _format_response(handler):
     return wrapper
 
 
+def start_text_detection(document_file_key):
+    """
+    Start an asynchronous text detection job in Textract, its completion is notified to the SNS topic
+    @param document_file_key: Key of the document in the documents bucket
+    @return: Textract job id
+    """
+
+    request_token = secrets.token_urlsafe(16)
+
+    # Start Async text detection
+    response = client_textract.start_document_text_detection(
+        DocumentLocation={
+            "S3Object": {"Bucket": bucket_name, "Name": document_file_key}
+        },
+        NotificationChannel={
+            "SNSTopicArn": sns_topic_arn,
+            "RoleArn": sns_role_arn,
+        },
+        ClientRequestToken=request_token,
+    )
+    job_id = response["JobId"]
+    logger.info(
+        "Started text detection job %s on %s.", job_id, document_file_key
+    )
+
+    return job_id
+
+
 @_format_response
 @logger.inject_lambda_context(log_event=True)
 def lambda_handler(event, _context: LambdaContext):
@@ -90,40 +126,18 @@ def lambda_handler(event, _context: LambdaContext):
 
     event_body = json.loads(event["body"])
 
-    print("The payload")
-    print(type(event_body))
-    print(event_body)
+    document_file_key = event_body["key"]
+    document_file_name = event_body["metadata"]["filename"]
 
-    print("The sns topic")
-    print(sns_topic_arn)
+    logger.info("Processing document %s", document_file_name)
 
-    print("The IAM role")
-    print(sns_role_arn)
+    # Reading and splitting a large PDF takes longer than the API Gateway timeout
+    if SPLIT_LARGE_DOCUMENTS and document_file_key.lower().endswith(".pdf"):
+        return _start_document_split(document_file_key, document_file_name)
 
     # Execute Textract Job
     try:
-        document_file_key = event_body["key"]
-        document_file_name = event_body["metadata"]["filename"]
-
-        logger.info("Processing document %s", document_file_name)
-
-        request_token = secrets.token_urlsafe(16)
-
-        # Start Async text detection
-        response = client_textract.start_document_text_detection(
-            DocumentLocation={
-                "S3Object": {"Bucket": bucket_name, "Name": document_file_key}
-            },
-            NotificationChannel={
-                "SNSTopicArn": sns_topic_arn,
-                "RoleArn": sns_role_arn,
-            },
-            ClientRequestToken=request_token,
-        )
-        job_id = response["JobId"]
-        logger.info(
-            "Started text detection job %s on %s.", job_id, document_file_key
-        )
+        job_id = start_text_detection(document_file_key)
     except ClientError:
         logger.warning("Couldn't detect text in document.")
         raise
@@ -146,7 +160,10 @@ def lambda_handler(event, _context: LambdaContext):
                 "id": job_id,
                 "document_name": document_file_name,
                 "document_key": document_file_key,
-                "status": StatusEnum.TEXT_EXTRACTION.name,
+                **initial_status_attributes(StatusEnum.TEXT_EXTRACTION),
+                # Keys of the job listing indexes, ISO 8601 timestamps sort chronologically
+                "record_type": "JOB",
+                "created_at": datetime.now(timezone.utc).isoformat(),
             }
         )
     except Exception as e:
@@ -157,3 +174,41 @@ def lambda_handler(event, _context: LambdaContext):
         return {"job_id": job_id, "statusCode": 200, "job_status": job_status}
 
 
+def _start_document_split(document_file_key, document_file_name):
+    """
+    Store the job and invoke the split function asynchronously, it splits the document and starts its Textract jobs
+    (see split_document_fn). The job id is returned right away
+    """
+
+    job_id = str(uuid.uuid4())
+
+    try:
+        table.put_item(
+            Item={
+                "id": job_id,
+                "document_name": document_file_name,
+                "document_key": document_file_key,
+                **initial_status_attributes(StatusEnum.TEXT_EXTRACTION),
+                # Keys of the job listing indexes, ISO 8601 timestamps sort chronologically
+                "record_type": "JOB",
+                "created_at": datetime.now(timezone.utc).isoformat(),
+            }
+        )
+    except Exception as e:
+        logger.warning("Error while updating DynamoDB table for job_id {}".format(job_id))
+        raise
+
+    try:
+        client_lambda.invoke(
+            FunctionName=SPLIT_DOCUMENT_FUNCTION_NAME,
+            InvocationType="Event",
+            Payload=json.dumps({"job_id": job_id, "document_key": document_file_key}),
+        )
+    except ClientError:
+        logger.warning("Couldn't start the split of document %s.", document_file_key)
+        update_job_status(table, job_id, StatusEnum.ERROR)
+        raise
+
+    logger.info(f"Started the split of document {document_file_key} for job {job_id}")
+
+    return {"job_id": job_id, "statusCode": 200, "job_status": "IN_PROGRESS"}
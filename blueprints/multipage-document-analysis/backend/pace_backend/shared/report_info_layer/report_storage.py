@@ -0,0 +1,106 @@
+# MIT No Attribution
+#
+# Copyright 2024 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import gzip
+import json
+
+# Reports are stored as gzip compressed JSON in the reports bucket, the DynamoDB item of the job only keeps the
+# S3 key of the report and a summary. Items written before the reports were moved to S3 have a json_report attribute
+
+REPORT_KEY_ATTRIBUTE = "report_s3_key"
+REPORT_SUMMARY_ATTRIBUTE = "report_summary"
+LEGACY_REPORT_ATTRIBUTE = "json_report"
+
+
+def get_report_s3_key(job_id: str) -> str:
+    return f"json_reports/{job_id}.json.gz"
+
+
+def summarize_report(report: dict, compressed_size: int) -> dict:
+    """
+    Summary of a report stored in the DynamoDB item of the job
+    @param report: Consolidated report, a dict of sections
+    @param compressed_size: Size in bytes of the compressed report
+    @return: Dict with the sections of the report and its compressed size
+    """
+    return {
+        "sections": sorted(report.keys()),
+        "compressed_size": compressed_size,
+    }
+
+
+def put_report(s3_client, bucket: str, job_id: str, report: dict) -> dict:
+    """
+    Write a report to S3 as gzip compressed JSON
+    @param s3_client: boto3 S3 client
+    @param bucket: Reports bucket
+    @param job_id: Id of the job
+    @param report: Consolidated report
+    @return: Attributes to set in the DynamoDB item of the job (S3 key and summary of the report)
+    """
+
+    body = gzip.compress(json.dumps(report).encode("utf-8"))
+    s3_key = get_report_s3_key(job_id)
+
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=s3_key,
+        Body=body,
+        ContentType="application/json",
+        ContentEncoding="gzip",
+    )
+
+    return {
+        REPORT_KEY_ATTRIBUTE: s3_key,
+        REPORT_SUMMARY_ATTRIBUTE: summarize_report(report, len(body)),
+    }
+
+
+def get_report(s3_client, bucket: str, item: dict) -> dict:
+    """
+    Read the report of a job, from S3 or from the item for jobs processed before the reports were moved to S3
+    @param s3_client: boto3 S3 client
+    @param bucket: Reports bucket
+    @param item: DynamoDB item of the job, only the report attributes are needed
+    @return: Consolidated report
+    """
+
+    if REPORT_KEY_ATTRIBUTE in item:
+        s3_object = s3_client.get_object(Bucket=bucket, Key=item[REPORT_KEY_ATTRIBUTE])
+        return json.loads(gzip.decompress(s3_object["Body"].read()))
+
+    return json.loads(item[LEGACY_REPORT_ATTRIBUTE])
+
+
+def get_report_presigned_url(s3_client, bucket: str, item: dict, expires_in: int=3600) -> str:
+    """
+    Presigned URL to download the report of a job, clients decompress it as it is served with gzip content encoding
+    @param s3_client: boto3 S3 client
+    @param bucket: Reports bucket
+    @param item: DynamoDB item of the job
+    @param expires_in: Validity of the URL in seconds
+    @return: Presigned URL or None if the report is not stored in S3
+    """
+
+    if REPORT_KEY_ATTRIBUTE not in item:
+        return None
+
+    return s3_client.generate_presigned_url(
+        "get_object",
+        Params={"Bucket": bucket, "Key": item[REPORT_KEY_ATTRIBUTE]},
+        ExpiresIn=expires_in,
+    )
@@ -0,0 +1,126 @@
+# MIT No Attribution
+#
+# Copyright 2024 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import time
+
+from botocore.exceptions import ClientError
+
+from status_info_layer.StatusEnum import StatusEnum
+
+# Status updates of a job as a single conditional UpdateItem per stage. Besides the status, each update records
+# when the job reached the status ({status}_at) and how long the stage that led to it took ({status}_duration_ms),
+# measured from the previous status update. Statuses only move forward, an ERROR status is final
+
+STATUS_ORDER_ATTRIBUTE = "status_order"
+STATUS_UPDATED_AT_ATTRIBUTE = "status_updated_at"
+
+# Order of the ERROR status, no other status can follow it
+ERROR_STATUS_ORDER = 1000
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def _status_order(status: StatusEnum) -> int:
+    return ERROR_STATUS_ORDER if status == StatusEnum.ERROR else status.value
+
+
+def initial_status_attributes(status: StatusEnum) -> dict:
+    """
+    Status attributes of a new job item
+    @param status: First status of the job
+    @return: Attributes to add to the item
+    """
+
+    now = _now_ms()
+
+    return {
+        "status": status.name,
+        STATUS_ORDER_ATTRIBUTE: _status_order(status),
+        STATUS_UPDATED_AT_ATTRIBUTE: now,
+        f"{status.name.lower()}_at": now,
+    }
+
+
+def update_job_status(table, job_id: str, status: StatusEnum, attributes: dict=None, remove: list=None, restart: bool=False) -> bool:
+    """
+    Update the status of a job together with other attributes in a single write
+    @param table: DynamoDB table of the jobs
+    @param job_id: Id of the job
+    @param status: New status
+    @param attributes: Other attributes to set in the same write
+    @param remove: Attributes to remove in the same write
+    @param restart: Allow moving the job back to an earlier status, e.g. when a failed document is processed again
+    @return: True if the job was updated, False if the transition was rejected because the job is already at the
+    same or a later status (the other attributes are not written either)
+    """
+
+    now = _now_ms()
+    status_key = status.name.lower()
+
+    names = {
+        "#status": "status",
+        "#status_order": STATUS_ORDER_ATTRIBUTE,
+        "#status_updated_at": STATUS_UPDATED_AT_ATTRIBUTE,
+        "#status_at": f"{status_key}_at",
+        "#status_duration_ms": f"{status_key}_duration_ms",
+    }
+    values = {
+        ":status": status.name,
+        ":status_order": _status_order(status),
+        ":now": now,
+    }
+    set_actions = [
+        "#status = :status",
+        "#status_order = :status_order",
+        "#status_at = :now",
+        "#status_duration_ms = :now - if_not_exists(#status_updated_at, :now)",
+        "#status_updated_at = :now",
+    ]
+
+    for i, (attribute_name, attribute_value) in enumerate((attributes or {}).items()):
+        names[f"#attr{i}"] = attribute_name
+        values[f":attr{i}"] = attribute_value
+        set_actions.append(f"#attr{i} = :attr{i}")
+
+    update_expression = "SET " + ", ".join(set_actions)
+
+    if remove:
+        for i, attribute_name in enumerate(remove):
+            names[f"#remove{i}"] = attribute_name
+        update_expression += " REMOVE " + ", ".join(f"#remove{i}" for i in range(len(remove)))
+
+    update_kwargs = {
+        "Key": {"id": job_id},
+        "UpdateExpression": update_expression,
+        "ExpressionAttributeNames": names,
+        "ExpressionAttributeValues": values,
+    }
+
+    # Items created before the status order was recorded accept any transition
+    if not restart and status != StatusEnum.ERROR:
+        update_kwargs["ConditionExpression"] = "attribute_not_exists(#status_order) OR #status_order < :status_order"
+
+    try:
+        table.update_item(**update_kwargs)
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return False
+        raise
+
+    return True
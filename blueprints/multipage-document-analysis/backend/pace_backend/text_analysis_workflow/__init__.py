@@ -30,6 +30,7 @@ from aws_cdk import (
     aws_lambda as lambda_,
     aws_iam as iam,
     aws_s3 as s3,
+    aws_sqs as sqs,
     aws_dynamodb as dynamodb,
 )
 from constructs import Construct
@@ -41,25 +42,37 @@ class DocAnalysisSFNPipeline(NestedStack):
             scope: Construct,
             construct_id: str,
             dynamo_docs_table: dynamodb.Table,
+            extraction_cache_table: dynamodb.Table,
+            bedrock_quota_table: dynamodb.Table,
             output_s3_bucket: s3.Bucket,
+            workflow_s3_bucket: s3.Bucket,
+            textract_queue: sqs.Queue,
+            textract_dead_letter_queue: sqs.Queue,
             shared_status_lambda_layer: lambda_python.PythonLayerVersion,
             language_code: str,
+            chunking_strategy: str,
             pages_chunk: str,
             use_examples: bool,
             extraction_confidence_level: str,
+            extraction_mode: str,
             **kwargs,
     ):
         super().__init__(scope, construct_id, **kwargs)
         #
         '''
         ---- Workflow definition ---
+        For each Textract notification of the SQS batch (Map state):
         0. Chunk file (Task state)
         1. Data extraction to custom schema (Task State)
         2. Data consolidation (Task State)
         3. Data persist (Task State)
         4. PDF report generation (Task State)
+        A failed notification is sent back to the queue, only that document is processed again
         '''
 
+        # Times a notification is sent back to the queue before moving it to the dead letter queue
+        max_message_retries = 3
+
         # Shared Lambda layer with Python packaging for text information extraction
         self.shared_doc_info_layer = lambda_python.PythonLayerVersion(
             self,
@@ -82,7 +95,13 @@ class DocAnalysisSFNPipeline(NestedStack):
                 "POWERTOOLS_LOG_LEVEL": "DEBUG",
                 "POWERTOOLS_SERVICE_NAME": "chunk_document_lambda",
                 "PAGE_CHUNK_SIZE":  pages_chunk,
+                "STREAMING_INGESTION": "True",
+                "CHUNKING_STRATEGY": chunking_strategy,
+                "MAX_TOKENS": "4000",
+                "OVERLAP_TOKENS": "400",
+                "TOKEN_WORD_RATE": "1.3",
                 "DOCUMENTS_DYNAMO_DB_TABLE_NAME": dynamo_docs_table.table_name,
+                "WORKFLOW_BUCKET_NAME": workflow_s3_bucket.bucket_name,
             },
             timeout=Duration.seconds(60),
             memory_size=512
@@ -97,6 +116,7 @@ class DocAnalysisSFNPipeline(NestedStack):
             )
         )
         dynamo_docs_table.grant_read_write_data(self.chunk_document_lambda)
+        workflow_s3_bucket.grant_write(self.chunk_document_lambda)
 
         NagSuppressions.add_resource_suppressions(
             self.chunk_document_lambda,
@@ -132,6 +152,16 @@ class DocAnalysisSFNPipeline(NestedStack):
                 "LANGUAGE_ID": language_code,
                 "DOCUMENTS_DYNAMO_DB_TABLE_NAME": dynamo_docs_table.table_name,
                 "EXTRACTION_CONFIDENCE_LEVEL": extraction_confidence_level,
+                "EXTRACTION_CONCURRENCY": "5",
+                "EXTRACTION_MODE": extraction_mode,
+                "EXTRACTION_CACHE_TABLE_NAME": extraction_cache_table.table_name,
+                "EXTRACTION_CACHE_TTL_DAYS": "30",
+                "PROMPT_VERSION": "2",
+                "WORKFLOW_BUCKET_NAME": workflow_s3_bucket.bucket_name,
+                "BEDROCK_QUOTA_TABLE_NAME": bedrock_quota_table.table_name,
+                "BEDROCK_REQUESTS_PER_MINUTE": "200",
+                "BEDROCK_TOKENS_PER_MINUTE": "400000",
+                "BEDROCK_MAX_WAIT_SECONDS": "600",
             },
             timeout=Duration.minutes(15),  # MAX VALUE, DO NOT INCREASE
         )
@@ -146,6 +176,9 @@ class DocAnalysisSFNPipeline(NestedStack):
         )
 
         dynamo_docs_table.grant_read_write_data(self.extract_information_from_chunk_lambda)
+        extraction_cache_table.grant_read_write_data(self.extract_information_from_chunk_lambda)
+        workflow_s3_bucket.grant_read_write(self.extract_information_from_chunk_lambda)
+        bedrock_quota_table.grant_read_write_data(self.extract_information_from_chunk_lambda)
 
         NagSuppressions.add_resource_suppressions(
             self.extract_information_from_chunk_lambda,
@@ -179,6 +212,13 @@ class DocAnalysisSFNPipeline(NestedStack):
                 "BEDROCK_MODEL_ID": "us.anthropic.claude-3-5-sonnet-20240620-v1:0",
                 "LANGUAGE_ID": language_code,
                 "DOCUMENTS_DYNAMO_DB_TABLE_NAME": dynamo_docs_table.table_name,
+                "CONSOLIDATION_GROUP_SIZE": "8",
+                "CONSOLIDATION_CONCURRENCY": "4",
+                "WORKFLOW_BUCKET_NAME": workflow_s3_bucket.bucket_name,
+                "BEDROCK_QUOTA_TABLE_NAME": bedrock_quota_table.table_name,
+                "BEDROCK_REQUESTS_PER_MINUTE": "50",
+                "BEDROCK_TOKENS_PER_MINUTE": "200000",
+                "BEDROCK_MAX_WAIT_SECONDS": "180",
             },
             timeout=Duration.seconds(300),
         )
@@ -193,6 +233,8 @@ class DocAnalysisSFNPipeline(NestedStack):
         )
 
         dynamo_docs_table.grant_read_write_data(self.consolidate_report_lambda)
+        workflow_s3_bucket.grant_read(self.consolidate_report_lambda)
+        bedrock_quota_table.grant_read_write_data(self.consolidate_report_lambda)
 
         NagSuppressions.add_resource_suppressions(
             self.consolidate_report_lambda,
@@ -222,11 +264,13 @@ class DocAnalysisSFNPipeline(NestedStack):
                 "POWERTOOLS_LOG_LEVEL": "DEBUG",
                 "POWERTOOLS_SERVICE_NAME": "persist_results_lambda",
                 "DOCUMENTS_DYNAMO_DB_TABLE_NAME": dynamo_docs_table.table_name,
+                "OUTPUT_BUCKET_NAME": output_s3_bucket.bucket_name,
             },
             timeout=Duration.seconds(30),
         )
 
         dynamo_docs_table.grant_write_data(self.persist_results_lambda)
+        output_s3_bucket.grant_write(self.persist_results_lambda)
 
         NagSuppressions.add_resource_suppressions(
             self.persist_results_lambda,
@@ -282,7 +326,8 @@ class DocAnalysisSFNPipeline(NestedStack):
 
         # Create step functions tasks
 
-        # Task to chunk documents
+        # Task to chunk documents. The function fails when a document can't be chunked, the error is caught by the
+        # ProcessDocument state and the notification is sent back to the queue
         chunk_document_task = sfn_tasks.LambdaInvoke(
             self,
             'ChunkDocumentTask',
@@ -308,15 +353,36 @@ class DocAnalysisSFNPipeline(NestedStack):
             result_path="$.TaskResult"
         )
 
+        # Calls still throttled after the client retries fail the task, which is retried once the rate limiter
+        # backed off. The sections extracted before the failure are read from the extraction cache
+        extract_data_task.add_retry(
+            errors=["BedrockRetryableError", "TimeoutError"],
+            interval=Duration.seconds(30),
+            backoff_rate=2,
+            max_attempts=3,
+        )
+
+        # The extraction could not be stored (job status or S3), once the retries are exhausted the error reaches the
+        # ProcessDocument catch and the notification is sent back to the queue
+        extract_data_task.add_retry(
+            errors=["ExtractDataError"],
+            interval=Duration.seconds(5),
+            backoff_rate=2,
+            max_attempts=2,
+        )
+
         sfn_map = sfn.Map(self,
                           'ChunkIteratorMap',
-                          items_path='$.body.results.text',
+                          items_path='$.body.results.chunks',
                           item_selector={
                               'chunk_index.$': '$$.Map.Item.Index',
-                              'text.$': '$$.Map.Item.Value',
+                              # Either a reference to the chunk in S3 (claim check) or the chunk text inline
+                              'chunk.$': '$$.Map.Item.Value',
                               'job_id.$': '$.job_id'
                           },
-                          max_concurrency=5,
+                          # Bedrock throughput is governed by the shared rate limiter, not by the Map concurrency
+                          max_concurrency=20,
+                          result_path='$.extraction_results',
                           )
         sfn_map.item_processor(extract_data_task)
 
@@ -325,8 +391,70 @@ class DocAnalysisSFNPipeline(NestedStack):
             self,
             'ConsolidateReport',
             lambda_function=self.consolidate_report_lambda,
+            payload=sfn.TaskInput.from_json_path_at("$.consolidation_input"),
+        )
+
+        consolidate_report_task.add_retry(
+            errors=["BedrockRetryableError", "TimeoutError"],
+            interval=Duration.seconds(30),
+            backoff_rate=2,
+            max_attempts=3,
+        )
+
+        # A document is consolidated with the results of its chunks. The parts of a split document are extracted in
+        # different executions, each one records its part and the last one consolidates all the parts from S3
+        single_document_extractions = sfn.Pass(
+            self,
+            'SingleDocumentExtractions',
+            parameters={"consolidation_input.$": "$.extraction_results"},
+        ).next(consolidate_report_task)
+
+        split_document_extractions = sfn.Pass(
+            self,
+            'SplitDocumentExtractions',
+            parameters={"consolidation_input": {"job_id.$": "$.job_id"}},
+        ).next(consolidate_report_task)
+
+        part_set = sfn.Pass(
+            self,
+            'ExtractedPartSet',
+            parameters={"part_set.$": "States.Array($.body.part_key)"},
+            result_path="$.part",
+        )
+
+        record_extracted_part = sfn_tasks.DynamoUpdateItem(
+            self,
+            'RecordExtractedPart',
+            table=dynamo_docs_table,
+            key={"id": sfn_tasks.DynamoAttributeValue.from_string(sfn.JsonPath.string_at("$.job_id"))},
+            update_expression="ADD extracted_parts :part",
+            expression_attribute_values={
+                ":part": sfn_tasks.DynamoAttributeValue.from_string_set(sfn.JsonPath.list_at("$.part.part_set"))
+            },
+            return_values=sfn_tasks.DynamoReturnValues.UPDATED_NEW,
+            result_path="$.part.record",
+        )
+
+        count_extracted_parts = sfn.Pass(
+            self,
+            'CountExtractedParts',
+            parameters={"extracted.$": "States.ArrayLength($.part.record.Attributes.extracted_parts.SS)"},
+            result_path="$.part.count",
         )
 
+        all_parts_extracted = sfn.Choice(self, 'AllPartsExtracted') \
+            .when(
+                sfn.Condition.number_equals_json_path("$.part.count.extracted", "$.body.parts_total"),
+                split_document_extractions
+            ) \
+            .otherwise(sfn.Succeed(self, 'WaitForOtherParts'))
+
+        part_set.next(record_extracted_part).next(count_extracted_parts).next(all_parts_extracted)
+
+        is_split_document = sfn.Choice(self, 'IsSplitDocument') \
+            .when(sfn.Condition.number_greater_than("$.body.parts_total", 1), part_set) \
+            .otherwise(single_document_extractions)
+
         # Task to persist report to DynamoDB
         persist_results_task = sfn_tasks.LambdaInvoke(
             self,
@@ -343,8 +471,83 @@ class DocAnalysisSFNPipeline(NestedStack):
 
         # Create step functions state machine
 
-        chunk_document_task.next(sfn_map).next(consolidate_report_task).next(persist_results_task).next(generate_pdf_report_task)
-        definition = chunk_document_task
+        chunk_document_task.next(sfn_map).next(is_split_document)
+        consolidate_report_task.next(persist_results_task).next(generate_pdf_report_task)
+
+        # Each document of the batch runs in its own branch, a failure only affects the message of that document
+        process_document = sfn.Parallel(
+            self,
+            'ProcessDocument',
+            result_path=sfn.JsonPath.DISCARD
+        )
+        process_document.branch(chunk_document_task)
+
+        # Send the failed notification back to the queue counting the retries, or to the dead letter queue
+        requeue_message_task = sfn_tasks.SqsSendMessage(
+            self,
+            'RequeueFailedMessage',
+            queue=textract_queue,
+            message_body=sfn.TaskInput.from_json_path_at("$.retry_message"),
+            delay=Duration.seconds(60),
+            result_path=sfn.JsonPath.DISCARD
+        )
+
+        dead_letter_message_task = sfn_tasks.SqsSendMessage(
+            self,
+            'DeadLetterFailedMessage',
+            queue=textract_dead_letter_queue,
+            message_body=sfn.TaskInput.from_json_path_at("$.body"),
+            result_path=sfn.JsonPath.DISCARD
+        )
+
+        first_retry = sfn.Pass(
+            self,
+            'FirstRetry',
+            parameters={
+                "Type.$": "$.message.Type",
+                "Message.$": "$.message.Message",
+                "RetryCount": 1
+            },
+            result_path="$.retry_message"
+        ).next(requeue_message_task)
+
+        increment_retry_count = sfn.Pass(
+            self,
+            'IncrementRetryCount',
+            parameters={
+                "Type.$": "$.message.Type",
+                "Message.$": "$.message.Message",
+                "RetryCount.$": "States.MathAdd($.message.RetryCount, 1)"
+            },
+            result_path="$.retry_message"
+        ).next(requeue_message_task)
+
+        check_message_retries = sfn.Choice(self, 'CheckMessageRetries') \
+            .when(
+                sfn.Condition.and_(
+                    sfn.Condition.is_present("$.message.RetryCount"),
+                    sfn.Condition.number_greater_than_equals("$.message.RetryCount", max_message_retries)
+                ),
+                dead_letter_message_task
+            ) \
+            .when(sfn.Condition.is_present("$.message.RetryCount"), increment_retry_count) \
+            .otherwise(first_retry)
+
+        process_document.add_catch(check_message_retries, result_path="$.error")
+
+        # Fan out one branch per Textract notification of the EventBridge pipe batch
+        messages_map = sfn.Map(self,
+                               'TextractMessagesMap',
+                               items_path='$',
+                               item_selector={
+                                   'body.$': '$$.Map.Item.Value.body',
+                                   'message.$': 'States.StringToJson($$.Map.Item.Value.body)'
+                               },
+                               max_concurrency=5,
+                               )
+        messages_map.item_processor(process_document)
+
+        definition = messages_map
 
         sfn_log_group = logs.LogGroup(
             self,
@@ -16,12 +16,18 @@
 # SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 import logging
+import math
 import os
 
+from typing import Iterable
+
 from textractor.entities.document import Document
 
-TOKEN_WORD_RATE = os.getenv('TOKEN_WORD_RATE', 1)
-MAX_TOKENS = os.getenv('MAX_TOKENS', 400)
+TOKEN_WORD_RATE = float(os.getenv('TOKEN_WORD_RATE', 1.3))
+MAX_TOKENS = int(os.getenv('MAX_TOKENS', 4000))
+OVERLAP_TOKENS = int(os.getenv('OVERLAP_TOKENS', 400))
+# Largest share of the token budget of a chunk taken by the overlap with the previous chunk
+MAX_OVERLAP_RATE = float(os.getenv('MAX_OVERLAP_RATE', 0.25))
 
 
 class TextractorHandler:
@@ -29,34 +35,159 @@ class TextractorHandler:
         self.logger = logger
 
     def _extract_doc_chunks(self, document: Document, chunk_size: int, page_overlap: int):
-        pages_doc = len(document.pages)
-        self.logger.info(f'Document has {pages_doc} pages')
+        _, doc_chunks = self._chunk_page_stream((page.text for page in document.pages), chunk_size, page_overlap)
+        return doc_chunks
+
+    def _chunk_page_stream(self, page_texts: Iterable[str], chunk_size: int, page_overlap: int):
+        """
+        Chunk a stream of page texts as they arrive, only holding the pages of the current chunk in memory
+        @param page_texts: Iterable with the text of each page, ordered by page number
+        @param chunk_size: Number of (new) pages per chunk
+        @param page_overlap: Number of pages from the previous chunk to prepend to each chunk
+        @return: Tuple with the total number of pages and the list of chunks
+        """
+        pages = {'total_pages': 0}
+        doc_chunks = list(self._iter_page_chunks(self._count_pages(page_texts, pages), chunk_size, page_overlap))
+
+        return pages['total_pages'], doc_chunks
+
+    def _iter_page_chunks(self, page_texts: Iterable[str], chunk_size: int, page_overlap: int):
+        """
+        Same as _chunk_page_stream, yielding each chunk as soon as its last page arrives
+        @return: Generator of chunks
+        """
         self.logger.info(f'Split into {chunk_size} chunk')
-        doc_chunks = []
+        chunk_pages = []
+        total_pages = 0
+        total_chunks = 0
 
-        for i in range(0, len(document.pages), chunk_size):
+        for page_text in page_texts:
+            total_pages += 1
+            chunk_pages.append(page_text)
 
-            chunk = ''
+            overlap = page_overlap if total_chunks else 0
 
-            if i + chunk_size <= pages_doc:
+            if len(chunk_pages) == chunk_size + overlap:
+                yield ''.join(chunk_pages)
+                total_chunks += 1
+                chunk_pages = chunk_pages[-page_overlap:] if page_overlap > 0 else []
 
-                if i == 0:
-                    chunk_pages = document.pages[i:i + chunk_size]
-                else:
-                    chunk_pages = document.pages[i - page_overlap:i + chunk_size]  # Page overlap
+        # Remaining pages that were not yet part of any chunk
+        if len(chunk_pages) > (page_overlap if total_chunks else 0):
+            yield ''.join(chunk_pages)
+
+        self.logger.info(f'Document has {total_pages} pages')
+
+    def _count_pages(self, page_texts: Iterable[str], pages: dict):
+        """Pass the page texts through, counting them in pages['total_pages']"""
+        for page_text in page_texts:
+            pages['total_pages'] += 1
+            yield page_text
+
+    def _count_tokens(self, text: str) -> int:
+        """Estimate the number of tokens of a text from its number of words"""
+        return math.ceil(len(text.split()) * TOKEN_WORD_RATE)
+
+    def _split_words(self, text: str, max_tokens: int):
+        """
+        Split a text without line breaks that does not fit in the token budget into runs of words
+        @return: List of (text, tokens) tuples
+        """
+        words = text.split()
+        words_per_unit = max(int(max_tokens / TOKEN_WORD_RATE), 1)
+
+        units = []
+        for i in range(0, len(words), words_per_unit):
+            unit_text = ' '.join(words[i:i + words_per_unit])
+            units.append((unit_text, self._count_tokens(unit_text)))
 
-            else:
-                if i == 0:
-                    chunk_pages = document.pages[i:pages_doc]
+        return units
+
+    def _split_page(self, page_text: str, max_tokens: int):
+        """
+        Split a page that does not fit in the token budget into paragraphs, lines when a paragraph is still too large
+        and runs of words when a line is still too large
+        @return: List of (text, tokens) tuples
+        """
+        page_tokens = self._count_tokens(page_text)
+        if page_tokens <= max_tokens:
+            return [(page_text, page_tokens)]
+
+        units = []
+        for paragraph in page_text.split('\n\n'):
+            paragraph_tokens = self._count_tokens(paragraph)
+            if paragraph_tokens <= max_tokens:
+                units.append((paragraph, paragraph_tokens))
+                continue
+
+            for line in paragraph.split('\n'):
+                line_tokens = self._count_tokens(line)
+                if line_tokens <= max_tokens:
+                    units.append((line, line_tokens))
                 else:
-                    chunk_pages = document.pages[i - page_overlap:pages_doc]  # Page overlap
+                    units.extend(self._split_words(line, max_tokens))
 
-            for page in chunk_pages:
-                chunk = chunk + page.text
+        return units
 
-            doc_chunks.append(chunk)
+    def _extract_token_chunks(self, page_texts: Iterable[str], max_tokens: int, overlap_tokens: int):
+        """
+        Pack pages (or paragraphs of pages too large) into chunks of at most max_tokens
+        @param page_texts: Iterable with the text of each page, ordered by page number
+        @param max_tokens: Token budget per chunk
+        @param overlap_tokens: Tokens from the end of the previous chunk to prepend to each chunk, capped at
+            MAX_OVERLAP_RATE of the budget
+        @return: Tuple with the total number of pages and the list of chunks
+        """
+        pages = {'total_pages': 0}
+        doc_chunks = list(self._iter_token_chunks(self._count_pages(page_texts, pages), max_tokens, overlap_tokens))
 
-        return doc_chunks
+        return pages['total_pages'], doc_chunks
+
+    def _iter_token_chunks(self, page_texts: Iterable[str], max_tokens: int, overlap_tokens: int):
+        """
+        Same as _extract_token_chunks, yielding each chunk as soon as it is full
+        @return: Generator of chunks
+        """
+        overlap_tokens = min(overlap_tokens, int(max_tokens * MAX_OVERLAP_RATE))
+        self.logger.info(f'Split into chunks of {max_tokens} tokens with {overlap_tokens} tokens of overlap')
+        chunk_units = []
+        chunk_tokens = 0
+        # Number of units at the start of the chunk that were already sent in the previous chunk
+        overlap_units = 0
+        total_pages = 0
+        total_chunks = 0
+
+        for page_text in page_texts:
+            total_pages += 1
+
+            for unit in self._split_page(page_text, max_tokens):
+                unit_text, unit_tokens = unit
+
+                if chunk_tokens + unit_tokens > max_tokens and len(chunk_units) > overlap_units:
+                    yield '\n'.join(text for text, _ in chunk_units)
+                    total_chunks += 1
+
+                    # Carry the trailing units of the chunk that fit in the overlap budget
+                    overlap = []
+                    overlap_budget = min(overlap_tokens, max_tokens - unit_tokens)
+                    for previous_unit in reversed(chunk_units):
+                        if previous_unit[1] > overlap_budget:
+                            break
+                        overlap.insert(0, previous_unit)
+                        overlap_budget -= previous_unit[1]
+
+                    chunk_units = overlap
+                    chunk_tokens = sum(tokens for _, tokens in overlap)
+                    overlap_units = len(overlap)
+
+                chunk_units.append(unit)
+                chunk_tokens += unit_tokens
+
+        if len(chunk_units) > overlap_units:
+            yield '\n'.join(text for text, _ in chunk_units)
+            total_chunks += 1
+
+        self.logger.info(f'Document has {total_pages} pages split into {total_chunks} chunks')
 
     def _extract_doc_text(self, document: Document):
         response_base = {
@@ -70,7 +201,7 @@ class TextractorHandler:
 
         return response_base
 
-    def get_document_text(self, document: Document, chunk_size=0, page_overlap=0):
+    def get_document_text(self, document: Document, chunk_size=0, page_overlap=0, max_tokens=0, overlap_tokens=0):
         response_base = {
             'total_pages': len(document.pages),
             'is_in_chunks': False,
@@ -79,7 +210,12 @@ class TextractorHandler:
                 'text': []
             }
         }
-        if chunk_size != 0:
+        if max_tokens != 0:
+            self.logger.info('Result is returned chunked by tokens')
+            response_base['is_in_chunks'] = True
+            _, doc_chunks = self._extract_token_chunks((page.text for page in document.pages), max_tokens, overlap_tokens)
+            response_base['results']['text'] = doc_chunks
+        elif chunk_size != 0:
             self.logger.info('Result is returned chunked')
             response_base['is_in_chunks'] = True
             response_base['results']['text'] = self._extract_doc_chunks(document, chunk_size, page_overlap)
@@ -88,3 +224,47 @@ class TextractorHandler:
             response_base['is_by_page'] = True
             response_base['results'] = self._extract_doc_text(document)
         return response_base
+
+    def get_page_stream_text(self, page_texts: Iterable[str], chunk_size=0, page_overlap=0, max_tokens=0, overlap_tokens=0):
+        """
+        Same as get_document_text but consuming the text of each page as it arrives instead of a Textractor Document
+        @param page_texts: Iterable with the text of each page, ordered by page number
+        @param chunk_size: Number of pages per chunk, 0 to return the text by page
+        @param page_overlap: Number of overlapping pages between chunks
+        @param max_tokens: Token budget per chunk, takes precedence over chunk_size when not 0
+        @param overlap_tokens: Number of overlapping tokens between chunks
+        @return: Document text, chunked or by page
+        """
+        response_base, texts = self.stream_page_text(page_texts, chunk_size, page_overlap, max_tokens, overlap_tokens)
+        response_base['results']['text'] = list(texts)
+        return response_base
+
+    def stream_page_text(self, page_texts: Iterable[str], chunk_size=0, page_overlap=0, max_tokens=0, overlap_tokens=0):
+        """
+        Same as get_page_stream_text, returning the chunks (or pages) as a generator so each one can be written out
+        before the next one is built. The total pages of the response are counted as the generator is consumed
+        @return: Tuple with the document text response, without results, and the generator of chunks (or pages)
+        """
+        response_base = {
+            'total_pages': 0,
+            'is_in_chunks': False,
+            'is_by_page': False,
+            'results': {
+                'text': []
+            }
+        }
+        page_texts = self._count_pages(page_texts, response_base)
+
+        if max_tokens != 0:
+            self.logger.info('Result is returned chunked by tokens')
+            response_base['is_in_chunks'] = True
+            texts = self._iter_token_chunks(page_texts, max_tokens, overlap_tokens)
+        elif chunk_size != 0:
+            self.logger.info('Result is returned chunked')
+            response_base['is_in_chunks'] = True
+            texts = self._iter_page_chunks(page_texts, chunk_size, page_overlap)
+        else:
+            self.logger.info('Result is by page')
+            response_base['is_by_page'] = True
+            texts = page_texts
+        return response_base, texts
@@ -20,7 +20,7 @@ import os
 import json
 import boto3
 import functools
-from TextractorHandler import TextractorHandler
+from TextractorHandler import TextractorHandler, MAX_TOKENS, OVERLAP_TOKENS
 from textractor.parsers import response_parser
 
 from aws_lambda_powertools.utilities.typing import LambdaContext
@@ -29,15 +29,31 @@ from aws_lambda_powertools import Logger
 from botocore.exceptions import ClientError
 
 from status_info_layer.StatusEnum import StatusEnum
+from status_info_layer.job_status import update_job_status
 
 logger = Logger()
 
 PAGE_CHUNK_SIZE = int(os.environ.get("PAGE_CHUNK_SIZE", 5))
+STREAMING_INGESTION = os.environ.get("STREAMING_INGESTION", "False") == "True"
+CHUNKING_STRATEGY = os.environ.get("CHUNKING_STRATEGY", "pages")  # pages | tokens
+# Vertical gap between two lines, relative to the line height, that starts a new paragraph
+PARAGRAPH_GAP_RATE = float(os.environ.get("PARAGRAPH_GAP_RATE", 1.0))
 dynamo_db_table_name = os.environ.get("DOCUMENTS_DYNAMO_DB_TABLE_NAME")
+WORKFLOW_BUCKET_NAME = os.environ.get("WORKFLOW_BUCKET_NAME")
 
 textract_client = boto3.client('textract')
+s3 = boto3.client('s3')
 table = boto3.resource("dynamodb").Table(dynamo_db_table_name)
 
+
+class ChunkDocumentError(Exception):
+    """Class to identify a document that could not be chunked, fails the task so the workflow catches it"""
+
+    def __init__(self, msg):
+        super().__init__(msg)
+
+        self.message = msg
+
 # TODO: use aws_lambda_powertools.event_handler import APIGatewayRestResolver and CORSConfig to avoid having to
 #  know about API GW response formats
 def _format_response(handler):
@@ -46,8 +62,8 @@ def _format_response(handler):
         response = handler(event, context)
         return {
             "statusCode": response["statusCode"],
-            "job_id": response["job_id"],
-            "pages_chunk_size": response["pages_chunk_size"],
+            "job_id": response.get("job_id", None),
+            "pages_chunk_size": response.get("pages_chunk_size", None),
             "isBase64Encoded": False,
             "headers": {
                 "Content-Type": "application/json",
@@ -97,11 +113,8 @@ def parse_textract_results(job_id):
     while "NextToken" in detection_job:
         logger.debug(f"Getting next token for job {job_id}")
         detection_job = textract_get_detection_job(job_id, detection_job["NextToken"])
-        print(detection_job["DocumentMetadata"])
-        print(detection_job["JobStatus"])
-        print(detection_job.get("NextToken", ""))
+        logger.debug(f"Document metadata {detection_job['DocumentMetadata']}, job status {detection_job['JobStatus']}")
         textract_results["Blocks"].extend(detection_job["Blocks"])
-        print(detection_job.get("Block appended", ""))
 
     logger.debug(f"Textract results for job {job_id} parsed")
 
@@ -111,72 +124,238 @@ def parse_textract_results(job_id):
 
     return textractor_document
 
+def iter_textract_results(job_id):
+    """
+    Iterate over the result pages (NextToken) of a text detection job as they are retrieved
+    @param job_id: Textract job id
+    @return: Generator of GetDocumentTextDetection responses
+    """
+
+    next_token = None
+
+    while True:
+        detection_job = textract_get_detection_job(job_id, next_token)
+        yield detection_job
+
+        next_token = detection_job.get("NextToken")
+        if not next_token:
+            break
+
+def stream_textract_page_texts(job_id):
+    """
+    Stream the text of each page of a Textract job without materializing the whole document.
+    Textract returns the blocks ordered by page, so a page is emitted as soon as a block of a later page arrives
+    @param job_id: Textract job id
+    @return: Generator with the text of each page, ordered by page number
+    """
+
+    logger.debug(f"Streaming Textract results for job {job_id}")
+
+    document_pages = 0
+    current_page = 1
+    page_lines = []
+    previous_box = None
+
+    for detection_job in iter_textract_results(job_id):
+        document_pages = detection_job.get("DocumentMetadata", {}).get("Pages", document_pages)
+
+        for block in detection_job["Blocks"]:
+            # WORD blocks are children of LINE blocks, the text of the lines is enough
+            if block["BlockType"] != "LINE":
+                continue
+
+            page = block.get("Page", 1)
+
+            # Blank pages produce no LINE blocks, they are emitted empty to keep the page numbering consistent
+            while current_page < page:
+                yield "\n".join(page_lines)
+                page_lines = []
+                previous_box = None
+                current_page += 1
+
+            # Textract has no paragraph blocks, paragraphs are separated by a blank line when the gap between two
+            # lines is larger than PARAGRAPH_GAP_RATE lines, so the token chunker can split pages by paragraph
+            box = block.get("Geometry", {}).get("BoundingBox")
+            if box and previous_box:
+                gap = box["Top"] - (previous_box["Top"] + previous_box["Height"])
+                if gap > PARAGRAPH_GAP_RATE * previous_box["Height"]:
+                    page_lines.append("")
+            previous_box = box
+
+            page_lines.append(block["Text"])
+
+    yield "\n".join(page_lines)
+
+    # Blank pages at the end of the document
+    for _ in range(current_page, document_pages):
+        yield ""
+
+    logger.debug(f"Textract results for job {job_id} streamed")
+
+
+def get_job_part(textract_job_id):
+    """
+    Job of the document processed by a Textract job. Large documents are split in parts, each one with its own
+    Textract job tracked under a parent job (see start_text_extraction_fn)
+    @param textract_job_id: Textract job id
+    @return: Tuple with the job id, the index of the part and the number of parts of the document
+    """
+
+    try:
+        item = table.get_item(
+            Key={"id": textract_job_id},
+            ProjectionExpression="parent_job_id, part_index, parts_total",
+        ).get("Item")
+    except ClientError as e:
+        logger.error(f"Error reading job of Textract job {textract_job_id}: {e}")
+        raise ChunkDocumentError(f"Failed to read job of Textract job {textract_job_id}") from e
+
+    # The job is stored right after the Textract jobs are started, fail so the message is requeued and retried
+    if item is None:
+        logger.error(f"No job found for Textract job {textract_job_id}")
+        raise ChunkDocumentError(f"No job found for Textract job {textract_job_id}")
+
+    if "parent_job_id" in item:
+        return item["parent_job_id"], int(item["part_index"]), int(item["parts_total"])
+
+    return textract_job_id, 0, 1
+
+
+def offload_chunks(job_id, response, part_prefix="", chunk_texts=None):
+    """
+    Claim check for the Step Functions state. Each chunk is written to S3, together with a JSONL manifest, and the
+    chunk texts in the response are replaced by references to the S3 objects
+    @param job_id: Job id
+    @param response: Chunked document text (see TextractorHandler)
+    @param part_prefix: Prefix of the chunk keys of a part of a split document
+    @param chunk_texts: Iterable with the chunks, written as they are produced. The chunks of the response if not given
+    @return: Response with the chunk references in results.chunks
+    """
+
+    chunk_refs = []
+
+    if chunk_texts is None:
+        chunk_texts = response["results"]["text"]
+
+    for chunk_index, chunk_text in enumerate(chunk_texts):
+        s3_key = f"{job_id}/chunks/{part_prefix}{chunk_index:05d}.txt"
+        s3.put_object(Bucket=WORKFLOW_BUCKET_NAME, Key=s3_key, Body=chunk_text.encode("utf-8"))
+        chunk_refs.append({"chunk_index": chunk_index, "s3_key": s3_key})
+
+    manifest_key = f"{job_id}/chunks/{part_prefix}manifest.jsonl"
+    s3.put_object(
+        Bucket=WORKFLOW_BUCKET_NAME,
+        Key=manifest_key,
+        Body="\n".join(json.dumps(chunk_ref) for chunk_ref in chunk_refs).encode("utf-8")
+    )
+
+    logger.info(f"{len(chunk_refs)} chunks written to s3://{WORKFLOW_BUCKET_NAME}/{job_id}/chunks/")
+
+    response["results"] = {
+        "chunks": chunk_refs,
+        "manifest_key": manifest_key
+    }
+
+    return response
+
 
 @_format_response
 @logger.inject_lambda_context(log_event=True)
 def lambda_handler(event, _context: LambdaContext):
     """
     Lambda function to chunk a multipage text document
-    @param event:
+    @param event: A single SQS message of the pipe batch, the state machine fans out one invocation per message
     @param context:
     @return:
     """
 
     logger.info(f"Received event: {event}")
 
-    queue_message = json.loads(event[-1]["body"])  # Read only the last message
+    queue_message = json.loads(event["body"])
 
     logger.info(f"\n\nQueue message: {queue_message}")
 
     textract_result = json.loads(queue_message["Message"])
-    logger.info(f"\n\nTextract result: {textract_result}")
-
-    print("\n\nTextract result")
-    print(type(textract_result))
-    print(textract_result)
+    logger.debug(f"Textract result: {textract_result}")
 
     # Validate Textract Job Status
     if textract_result["Status"] == "SUCCEEDED":
-        job_id = textract_result["JobId"]
+        textract_job_id = textract_result["JobId"]
 
-        # Parse textract results to Textractor
-        try:
-            textractor_document = parse_textract_results(job_id)
-        except Exception as e:
-            logger.error(f"Error parsing Textract results: {e}")
-            return {
-                "statusCode": 500,
-                "error": "Failed to parse Textract response"
-            }
+        job_id, part_index, parts_total = get_job_part(textract_job_id)
+        logger.info(f"Textract job {textract_job_id} is part {part_index + 1} of {parts_total} of job {job_id}")
 
-        # Chunk document
-        try:
-            logger.info("Parsing document with textractor")
-            textractor_handler = TextractorHandler(logger)
-            logger.info("Chunking document")
-            response = textractor_handler.get_document_text(textractor_document, chunk_size=PAGE_CHUNK_SIZE, page_overlap=1)
-            logger.info("Document chunked")
-        except Exception as e:
-            logger.error(f"Error chunking document: {e}")
-            return {
-                "statusCode": 500,
-                "error": "Failed to chunk document"
+        textractor_handler = TextractorHandler(logger)
+
+        if CHUNKING_STRATEGY == "tokens":
+            chunking_args = {"max_tokens": MAX_TOKENS, "overlap_tokens": OVERLAP_TOKENS}
+        else:
+            chunking_args = {"chunk_size": PAGE_CHUNK_SIZE, "page_overlap": 1}
+
+        part_prefix = f"{part_index:03d}-" if parts_total > 1 else ""
+
+        if STREAMING_INGESTION:
+            # Chunk document as each page of Textract results arrives
+            try:
+                logger.info("Chunking streamed Textract results")
+                response, chunk_texts = textractor_handler.stream_page_text(
+                    stream_textract_page_texts(textract_job_id), **chunking_args
+                )
+                if WORKFLOW_BUCKET_NAME:
+                    # Each chunk is written to S3 once its last page arrives, only the pages of the chunk being built
+                    # are held in memory
+                    response = offload_chunks(job_id, response, part_prefix, chunk_texts)
+                else:
+                    response["results"]["text"] = list(chunk_texts)
+                logger.info("Document chunked")
+            except Exception as e:
+                logger.error(f"Error chunking streamed Textract results: {e}")
+                raise ChunkDocumentError("Failed to chunk document") from e
+        else:
+            # Parse textract results to Textractor
+            try:
+                textractor_document = parse_textract_results(textract_job_id)
+            except Exception as e:
+                logger.error(f"Error parsing Textract results: {e}")
+                raise ChunkDocumentError("Failed to parse Textract response") from e
+
+            # Chunk document
+            try:
+                logger.info("Parsing document with textractor")
+                logger.info("Chunking document")
+                response = textractor_handler.get_document_text(textractor_document, **chunking_args)
+                logger.info("Document chunked")
+            except Exception as e:
+                logger.error(f"Error chunking document: {e}")
+                raise ChunkDocumentError("Failed to chunk document") from e
+
+            # Keep large chunk texts out of the Step Functions state
+            if WORKFLOW_BUCKET_NAME:
+                try:
+                    response = offload_chunks(job_id, response, part_prefix)
+                except ClientError as e:
+                    logger.error(f"Error writing chunks to S3: {e}")
+                    raise ChunkDocumentError("Failed to write chunks to S3") from e
+
+        if not WORKFLOW_BUCKET_NAME:
+            # Same items as the claim check, with the chunk text instead of the reference
+            response["results"] = {
+                "chunks": [{"chunk_index": chunk_index, "text": chunk_text}
+                           for chunk_index, chunk_text in enumerate(response["results"]["text"])]
             }
 
+        # The parts of a split document are consolidated once all of them are extracted
+        response["part_key"] = f"{part_index:03d}"
+        response["parts_total"] = parts_total
+
         # Update status in DynamoDB table
         try:
-            table.update_item(
-                Key={"id": job_id},
-                UpdateExpression="SET #status = :status",
-                ExpressionAttributeNames={"#status": "status"},
-                ExpressionAttributeValues={":status": StatusEnum.PAGE_CHUNKING.name},
-            )
+            # Chunking starts the workflow, a document sent back to the queue after a failure is processed again.
+            # The parts of a split document are chunked at different times, the job only moves forward
+            update_job_status(table, job_id, StatusEnum.PAGE_CHUNKING, restart=parts_total == 1)
         except Exception as e:
             logger.error(f"Error updating DynamoDB: {e}")
-            return {
-                "statusCode": 500,
-                "error": "Failed to update DynamoDB"
-            }
+            raise ChunkDocumentError("Failed to update DynamoDB") from e
 
         return {
             "statusCode": 200,
@@ -185,7 +364,4 @@ def lambda_handler(event, _context: LambdaContext):
             "pages_chunk_size": PAGE_CHUNK_SIZE
         }
     else:
-        return {
-            "statusCode": 500,
-            "error": "Textract job failed"
-        }
+        raise ChunkDocumentError(f"Textract job {textract_result['JobId']} failed with status {textract_result['Status']}")
@@ -19,20 +19,27 @@ import boto3
 import os
 import langchain_core
 import functools
+import json
+import pydantic
+
+from concurrent.futures import ThreadPoolExecutor
 
 from aws_lambda_powertools import Logger
 
 from langchain_aws import ChatBedrock
 
-from retrying import retry
 
 from prompt_selector.report_consolidation_prompt_selector import get_information_consolidation_prompt_selector
 
 from doc_info_layer.section_definition import info_to_output_mapping
+from doc_info_layer.section_merge import parse_extractions, premerge_section, conflicting_versions, create_conflicts_model
+from rate_limit_layer.BedrockRateLimiter import BedrockRateLimiter
+from rate_limit_layer.ModelCallStats import ModelCallStats
 
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
 from status_info_layer.StatusEnum import StatusEnum
+from status_info_layer.job_status import update_job_status
 
 from botocore.exceptions import ClientError
 from botocore.config import Config
@@ -41,7 +48,7 @@ class BedrockRetryableError(Exception):
     """Class to identify a Bedrock throttling error"""
 
     def __init__(self, msg):
-        super().__init__(self)
+        super().__init__(msg)
 
         self.message = msg
 
@@ -52,6 +59,16 @@ BEDROCK_REGION = os.environ.get("BEDROCK_REGION")
 MODEL_ID = os.environ.get("BEDROCK_MODEL_ID")
 LANGUAGE_ID = os.environ.get("LANGUAGE_ID")
 DYNAMODB_TABLE_NAME = os.environ.get("DOCUMENTS_DYNAMO_DB_TABLE_NAME")
+# Number of chunk results merged per model call in the tree consolidation, 0 consolidates all of them in a single call
+CONSOLIDATION_GROUP_SIZE = int(os.environ.get("CONSOLIDATION_GROUP_SIZE", 0))
+CONSOLIDATION_CONCURRENCY = int(os.environ.get("CONSOLIDATION_CONCURRENCY", 4))
+WORKFLOW_BUCKET_NAME = os.environ.get("WORKFLOW_BUCKET_NAME")
+# Budgets shared by every concurrent consolidation of the model, the limiter is disabled when no table is configured
+BEDROCK_QUOTA_TABLE_NAME = os.environ.get("BEDROCK_QUOTA_TABLE_NAME")
+BEDROCK_REQUESTS_PER_MINUTE = int(os.environ.get("BEDROCK_REQUESTS_PER_MINUTE", 50))
+BEDROCK_TOKENS_PER_MINUTE = int(os.environ.get("BEDROCK_TOKENS_PER_MINUTE", 200000))
+# Time an invocation waits for Bedrock capacity, below the timeout of the function
+BEDROCK_MAX_WAIT_SECONDS = int(os.environ.get("BEDROCK_MAX_WAIT_SECONDS", 240))
 
 logger = Logger()
 
@@ -61,38 +78,72 @@ REPORT_CONSOLIDATION_MODEL_PARAMETERS = {
     "top_k": 20,
 }
 
+# With the shared limiter the client retries stay short, backoff is coordinated by the limiter instead of each call
 bedrock_runtime = boto3.client(
     service_name="bedrock-runtime",
     region_name=BEDROCK_REGION,
-    config=Config(retries={'max_attempts': 20})
+    config=Config(retries={'max_attempts': 3 if BEDROCK_QUOTA_TABLE_NAME else 20})
 )
 
 table = boto3.resource("dynamodb").Table(DYNAMODB_TABLE_NAME)
+s3 = boto3.client("s3")
 
-@retry(wait_exponential_multiplier=10000, wait_exponential_max=60000, stop_max_attempt_number=10,
-       retry_on_exception=lambda ex: isinstance(ex, BedrockRetryableError))
-def consolidate_section(section_name, section):
+model_call_stats = ModelCallStats()
 
-    logger.debug(f"Consolidating section: {section_name}")
-    logger.info(section)
+rate_limiter = BedrockRateLimiter(
+    logger,
+    table=boto3.resource("dynamodb").Table(BEDROCK_QUOTA_TABLE_NAME),
+    model_id=MODEL_ID,
+    requests_per_minute=BEDROCK_REQUESTS_PER_MINUTE,
+    tokens_per_minute=BEDROCK_TOKENS_PER_MINUTE,
+    max_wait_seconds=BEDROCK_MAX_WAIT_SECONDS
+) if BEDROCK_QUOTA_TABLE_NAME else None
 
-    section_information_as_text = "\n\n".join([str(extracted_information) for extracted_information in section])
-    logger.info("Information as text")
-    logger.info(section_information_as_text)
+@functools.lru_cache(maxsize=None)
+def get_information_consolidation_chain(language_id: str, model_id: str, output_model):
+    """
+    Build (once per Lambda container) the structured output chain to consolidate a section of the report
+    @param language_id: Language of the prompts
+    @param model_id: Bedrock model id
+    @param output_model: Pydantic model of the section (or of its conflicting fields)
+    @return: Prompt template piped into a structured output LLM
+    """
 
-    INFORMATION_CONSOLIDATION_PROMPT_SELECTOR = get_information_consolidation_prompt_selector(LANGUAGE_ID)
+    logger.info(f"Building information consolidation chain for {language_id}, {model_id}, {output_model.__name__}")
+
+    INFORMATION_CONSOLIDATION_PROMPT_SELECTOR = get_information_consolidation_prompt_selector(language_id)
 
     bedrock_llm = ChatBedrock(
-        model_id=MODEL_ID,
+        model_id=model_id,
         model_kwargs=REPORT_CONSOLIDATION_MODEL_PARAMETERS,
         client=bedrock_runtime,
     )
 
-    claude_information_consolidation_prompt_template = INFORMATION_CONSOLIDATION_PROMPT_SELECTOR.get_prompt(MODEL_ID)
+    claude_information_consolidation_prompt_template = INFORMATION_CONSOLIDATION_PROMPT_SELECTOR.get_prompt(model_id)
+
+    structured_llm = bedrock_llm.with_structured_output(output_model)
+
+    return claude_information_consolidation_prompt_template | structured_llm
+
+
+def consolidate_section(section_name, section, output_model=None):
+
+    logger.debug(f"Consolidating section: {section_name}")
+    logger.info(section)
+
+    section_information_as_text = "\n\n".join([str(extracted_information) for extracted_information in section])
+    logger.info("Information as text")
+    logger.info(section_information_as_text)
+
+    structured_chain = get_information_consolidation_chain(LANGUAGE_ID, MODEL_ID, output_model or info_to_output_mapping[section_name])
+
+    # Rough estimate of 4 characters per input token
+    estimated_input_tokens = len(section_information_as_text) // 4
 
-    structured_llm = bedrock_llm.with_structured_output(info_to_output_mapping[section_name])
+    if rate_limiter:
+        rate_limiter.acquire(estimated_input_tokens + REPORT_CONSOLIDATION_MODEL_PARAMETERS["max_tokens"])
 
-    structured_chain = claude_information_consolidation_prompt_template | structured_llm
+    model_call_stats.record_call(estimated_input_tokens, REPORT_CONSOLIDATION_MODEL_PARAMETERS["max_tokens"])
 
     # Retry mechanism to workaround Bedrock Throttling
     try:
@@ -102,6 +153,9 @@ def consolidate_section(section_name, section):
     except ClientError as exc:
         if exc.response['Error']['Code'] == 'ThrottlingException':
             logger.error("Bedrock throttling. To try again")
+            model_call_stats.record_throttle()
+            if rate_limiter:
+                rate_limiter.on_throttle()
             raise BedrockRetryableError(str(exc))
         elif exc.response['Error']['Code'] == 'ModelTimeoutException':
             logger.error("Bedrock ModelTimeoutException. To try again")
@@ -110,6 +164,9 @@ def consolidate_section(section_name, section):
             raise
     except bedrock_runtime.exceptions.ThrottlingException as throttlingExc:
         logger.error("Bedrock ThrottlingException. To try again")
+        model_call_stats.record_throttle()
+        if rate_limiter:
+            rate_limiter.on_throttle()
         raise BedrockRetryableError(str(throttlingExc))
     except bedrock_runtime.exceptions.ModelTimeoutException as timeoutExc:
         logger.error("Bedrock ModelTimeoutException. To try again")
@@ -121,9 +178,112 @@ def consolidate_section(section_name, section):
         logger.error(message)
         raise
 
+    if rate_limiter:
+        rate_limiter.on_success()
+
     return information_consolidation_obj
 
 
+def tree_consolidate_section(section_name, section, output_model=None):
+    """
+    Consolidate a section merging groups of CONSOLIDATION_GROUP_SIZE results, and then merging the merged results,
+    until they fit in a single group. Prompt size and latency grow logarithmically with the number of chunks
+    @param section_name: Name of the section
+    @param section: List with the section information extracted from each chunk
+    @param output_model: Pydantic model of the consolidated result, defaults to the model of the section
+    @return: Consolidated section object
+    """
+
+    level = 0
+
+    while CONSOLIDATION_GROUP_SIZE > 1 and len(section) > CONSOLIDATION_GROUP_SIZE:
+        groups = [section[i:i + CONSOLIDATION_GROUP_SIZE] for i in range(0, len(section), CONSOLIDATION_GROUP_SIZE)]
+        logger.info(f"Consolidating {len(section)} results of {section_name} in {len(groups)} groups (level {level})")
+
+        with ThreadPoolExecutor(max_workers=CONSOLIDATION_CONCURRENCY) as executor:
+            merged_groups = list(executor.map(lambda group: consolidate_section(section_name, group, output_model), groups))
+
+        section = [merged_group.model_dump_json() for merged_group in merged_groups]
+        level += 1
+
+    return consolidate_section(section_name, section, output_model)
+
+
+def merge_section(section_name, section):
+    """
+    Merge the results of a section deterministically (deduplicated values, united lists) and only use the LLM
+    to consolidate the fields that have different values between chunks
+    @param section_name: Name of the section
+    @param section: List with the section information extracted from each chunk
+    @return: Consolidated section object
+    """
+
+    section_model = info_to_output_mapping[section_name]
+
+    extractions = parse_extractions(section)
+    if extractions is None:
+        logger.info(f"Results of {section_name} are not JSON objects, consolidating all of them with the LLM")
+        return tree_consolidate_section(section_name, section)
+
+    premerged = premerge_section(section_model, extractions)
+    if premerged is None:
+        logger.info(f"Results of {section_name} have fields that don't match the section, consolidating all of them with the LLM")
+        return tree_consolidate_section(section_name, section)
+
+    merged, conflicts = premerged
+
+    if conflicts:
+        logger.info(f"Consolidating conflicting fields {list(conflicts.keys())} of {section_name} with the LLM")
+        conflicts_model = create_conflicts_model(section_model, tuple(conflicts.keys()))
+        consolidated_conflicts = tree_consolidate_section(section_name, conflicting_versions(extractions, conflicts.keys()), conflicts_model)
+        merged.update(consolidated_conflicts.model_dump())
+    else:
+        logger.info(f"No conflicting fields in {section_name}, skipping the LLM consolidation")
+
+    try:
+        return section_model.model_validate(merged)
+    except pydantic.ValidationError as e:
+        logger.warning(f"Merged {section_name} is not valid, consolidating all the results with the LLM: {e}")
+        return tree_consolidate_section(section_name, section)
+
+
+def get_extracted_information(task_result_body):
+    """
+    Get the information extracted from a chunk, either inline or from S3 when it was offloaded (claim check)
+    @param task_result_body: Body of the extraction task result
+    @return: Dict with the extracted information per section
+    """
+
+    if "extracted_information_s3_key" in task_result_body:
+        s3_object = s3.get_object(Bucket=WORKFLOW_BUCKET_NAME, Key=task_result_body["extracted_information_s3_key"])
+        return json.loads(s3_object["Body"].read())
+
+    return task_result_body["extracted_information"]
+
+
+def list_extraction_results(job_id):
+    """
+    Extraction results of all the chunks of a split document, whose parts are extracted in different executions
+    @param job_id: Parent job id of the document
+    @return: List of extraction results in the format of the ChunkIteratorMap output, ordered by part and chunk
+    """
+
+    extraction_keys = []
+
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=WORKFLOW_BUCKET_NAME, Prefix=f"{job_id}/extractions/"):
+        extraction_keys.extend(s3_object["Key"] for s3_object in page.get("Contents", []))
+
+    return [
+        {
+            "job_id": job_id,
+            "chunk_index": extraction_key.rsplit("/", 1)[-1].rsplit(".", 1)[0],
+            "TaskResult": {"body": {"extracted_information_s3_key": extraction_key}}
+        }
+        for extraction_key in sorted(extraction_keys)
+    ]
+
+
 # TODO: use aws_lambda_powertools.event_handler import APIGatewayRestResolver and CORSConfig to avoid having to
 #  know about API GW response formats
 def _format_response(handler):
@@ -160,6 +320,12 @@ def lambda_handler(event, _context: LambdaContext):
 
     logger.info(f"Received event: {event}")
 
+    model_call_stats.reset()
+
+    # The parts of a split document are read from S3 once all of them are extracted
+    if isinstance(event, dict):
+        event = list_extraction_results(event["job_id"])
+
     job_id = event[0]["job_id"]
 
     # Loop through the results
@@ -172,12 +338,7 @@ def lambda_handler(event, _context: LambdaContext):
 
             # Update status in DynamoDB table
             try:
-                table.update_item(
-                    Key={"id": job_id},
-                    UpdateExpression="SET #status = :status",
-                    ExpressionAttributeNames={"#status": "status"},
-                    ExpressionAttributeValues={":status": StatusEnum.ERROR.name},
-                )
+                update_job_status(table, job_id, StatusEnum.ERROR)
             except Exception as e:
                 logger.error(f"Error updating DynamoDB: {e}")
                 return {
@@ -189,34 +350,39 @@ def lambda_handler(event, _context: LambdaContext):
 
         logger.info(f"Processing elements for chunk: {element['chunk_index']}")
 
+        extracted_information = get_extracted_information(element["TaskResult"]["body"])
+
         # Add each section to its corresponding key
-        for section_name in element["TaskResult"]["body"]["extracted_information"].keys():
+        for section_name in extracted_information.keys():
 
             if section_name not in results_per_section:
                 results_per_section[section_name] = []
 
-            results_per_section[section_name].append(element["TaskResult"]["body"]["extracted_information"][section_name])
+            results_per_section[section_name].append(extracted_information[section_name])
 
     logger.info(f"Retrieved the following sections {results_per_section.keys()}")
     logger.debug(f"Results per section: {results_per_section}")
 
-    # Obtain a consolidated result per section
+    # Obtain a consolidated result per section, all the sections are consolidated concurrently
+    with ThreadPoolExecutor(max_workers=max(len(results_per_section), 1)) as executor:
+        section_futures = {
+            section: executor.submit(merge_section, section, results_per_section[section])
+            for section in results_per_section
+        }
+
     for section in results_per_section:
 
-        consolidated_section = consolidate_section(section, results_per_section[section])
+        consolidated_section = section_futures[section].result()
         logger.debug(f"Consolidated section: {section}")
         logger.debug(consolidated_section)
 
         consolidated_report[section] = consolidated_section.model_dump()
 
+    logger.info("Consolidation model call statistics", extra={"job_id": job_id, **model_call_stats.stats()})
+
     # Update status in DynamoDB table
     try:
-        table.update_item(
-            Key={"id": job_id},
-            UpdateExpression="SET #status = :status",
-            ExpressionAttributeNames={"#status": "status"},
-            ExpressionAttributeValues={":status": StatusEnum.INFORMATION_CONSOLIDATION.name},
-        )
+        update_job_status(table, job_id, StatusEnum.INFORMATION_CONSOLIDATION)
     except Exception as e:
         logger.error(f"Error updating DynamoDB: {e}")
         return {
@@ -0,0 +1,131 @@
+# MIT No Attribution
+#
+# Copyright 2024 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from collections import OrderedDict
+
+from botocore.exceptions import ClientError
+
+
+class ExtractionCache:
+    """
+    Content addressed cache for the extraction results of a chunk.
+    Results are kept in an in-memory LRU tier for the warm Lambda container and in a DynamoDB table, both expire after a TTL
+    """
+
+    def __init__(self, logger: logging.Logger, table=None, ttl_seconds: int=30 * 24 * 3600, max_memory_items: int=256):
+        self.logger = logger
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_items = max_memory_items
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.table_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def build_key(*key_parts) -> str:
+        """Hash of the chunk text and every parameter that changes the extraction (section, model id, prompt version, ...)"""
+        return hashlib.sha256(json.dumps(key_parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def _count(self, counter: str):
+        """Increment a hit or miss counter, the cache is shared by the threads of the extraction"""
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _memory_get(self, key: str):
+        with self._lock:
+            if key not in self._memory:
+                return None
+
+            value, expires_at = self._memory[key]
+            if expires_at <= time.time():
+                del self._memory[key]
+                return None
+
+            self._memory.move_to_end(key)
+            return value
+
+    def _memory_put(self, key: str, value: str, expires_at: int):
+        with self._lock:
+            self._memory[key] = (value, expires_at)
+            self._memory.move_to_end(key)
+
+            while len(self._memory) > self.max_memory_items:
+                self._memory.popitem(last=False)
+
+    def get(self, key: str):
+        """
+        Get a cached value
+        @param key: Cache key, see build_key
+        @return: The cached value or None on a miss
+        """
+
+        value = self._memory_get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return value
+
+        if self.table is not None:
+            try:
+                item = self.table.get_item(Key={"id": key}).get("Item")
+            except ClientError as e:
+                self.logger.warning(f"Error reading extraction cache: {e}")
+                item = None
+
+            # DynamoDB TTL deletion is not immediate, expired items must be ignored
+            if item and int(item["expires_at"]) > time.time():
+                self._count("table_hits")
+                self._memory_put(key, item["value"], int(item["expires_at"]))
+                return item["value"]
+
+        self._count("misses")
+        return None
+
+    def put(self, key: str, value: str):
+        """
+        Cache a value in both tiers
+        @param key: Cache key, see build_key
+        @param value: Serialized value
+        """
+
+        expires_at = int(time.time()) + self.ttl_seconds
+
+        self._memory_put(key, value, expires_at)
+
+        if self.table is not None:
+            try:
+                self.table.put_item(Item={"id": key, "value": value, "expires_at": expires_at})
+            except ClientError as e:
+                self.logger.warning(f"Error writing extraction cache: {e}")
+
+    def stats(self) -> dict:
+        """Hit and miss counters since the Lambda container started"""
+        with self._lock:
+            return {
+                "cache_memory_hits": self.memory_hits,
+                "cache_table_hits": self.table_hits,
+                "cache_misses": self.misses,
+            }
@@ -20,9 +20,11 @@ import os
 import langchain_core
 import re
 import functools
+import json
 import pydantic
 
-from retrying import retry
+from concurrent.futures import ThreadPoolExecutor
+
 
 from aws_lambda_powertools import Logger
 
@@ -30,11 +32,16 @@ from langchain_aws import ChatBedrock
 
 from pydantic import BaseModel
 
-from prompt_selector.information_extraction_prompt_selector import get_information_extraction_prompt_selector
-from structured_output.InformationExtraction import InformationExtraction
+from prompt_selector.information_extraction_prompt_selector import get_information_extraction_prompt_selector, \
+    get_report_information_extraction_prompt_selector
+from ExtractionCache import ExtractionCache
+from structured_output.InformationExtraction import InformationExtraction, create_report_information_extraction
 
 from doc_info_layer.section_definition import info_to_output_mapping, report_sections
+from rate_limit_layer.BedrockRateLimiter import BedrockRateLimiter
+from rate_limit_layer.ModelCallStats import ModelCallStats
 from status_info_layer.StatusEnum import StatusEnum
+from status_info_layer.job_status import update_job_status
 
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
@@ -45,7 +52,15 @@ class BedrockRetryableError(Exception):
     """Class to identify a Bedrock throttling error"""
 
     def __init__(self, msg):
-        super().__init__(self)
+        super().__init__(msg)
+
+        self.message = msg
+
+class ExtractDataError(Exception):
+    """Class to identify a chunk whose extraction could not be stored, fails the task so the workflow retries it"""
+
+    def __init__(self, msg):
+        super().__init__(msg)
 
         self.message = msg
 
@@ -62,6 +77,19 @@ MODEL_ID = os.environ.get("BEDROCK_MODEL_ID")
 LANGUAGE_ID = os.environ.get("LANGUAGE_ID")
 DYNAMODB_TABLE_NAME = os.environ.get("DOCUMENTS_DYNAMO_DB_TABLE_NAME")
 EXTRACTION_CONFIDENCE_LEVEL = int(os.environ.get("EXTRACTION_CONFIDENCE_LEVEL"))
+EXTRACTION_CONCURRENCY = int(os.environ.get("EXTRACTION_CONCURRENCY", len(report_sections)))
+EXTRACTION_MODE = os.environ.get("EXTRACTION_MODE", "per_section")  # per_section | multi_section
+EXTRACTION_CACHE_TABLE_NAME = os.environ.get("EXTRACTION_CACHE_TABLE_NAME")
+EXTRACTION_CACHE_TTL_DAYS = int(os.environ.get("EXTRACTION_CACHE_TTL_DAYS", 30))
+# Bump when prompts or schemas change to invalidate the cached extractions
+PROMPT_VERSION = os.environ.get("PROMPT_VERSION", "1")
+WORKFLOW_BUCKET_NAME = os.environ.get("WORKFLOW_BUCKET_NAME")
+# Budgets shared by every concurrent extraction of the model, the limiter is disabled when no table is configured
+BEDROCK_QUOTA_TABLE_NAME = os.environ.get("BEDROCK_QUOTA_TABLE_NAME")
+BEDROCK_REQUESTS_PER_MINUTE = int(os.environ.get("BEDROCK_REQUESTS_PER_MINUTE", 200))
+BEDROCK_TOKENS_PER_MINUTE = int(os.environ.get("BEDROCK_TOKENS_PER_MINUTE", 400000))
+# Time an invocation waits for Bedrock capacity, below the timeout of the function
+BEDROCK_MAX_WAIT_SECONDS = int(os.environ.get("BEDROCK_MAX_WAIT_SECONDS", 240))
 
 INFORMATION_EXTRACTION_MODEL_PARAMETERS = {
     "max_tokens": 1500,
@@ -69,19 +97,47 @@ INFORMATION_EXTRACTION_MODEL_PARAMETERS = {
     "top_k": 20,
 }
 
+# The composite extraction generates the output of every section in a single response
+REPORT_EXTRACTION_MODEL_PARAMETERS = {
+    "max_tokens": 4096,
+    "temperature": 0.1,
+    "top_k": 20,
+}
+
 FORMAT_RESPONSES_CLAUDE_PARAMETERS = {
     "max_tokens": 1500,
     "temperature": 0,
     "top_k": 20,
 }
 
+# With the shared limiter the client retries stay short, backoff is coordinated by the limiter instead of each call
 bedrock_runtime = boto3.client(
     service_name="bedrock-runtime",
     region_name=BEDROCK_REGION,
-    config=Config(retries={'max_attempts': 20})
+    config=Config(retries={'max_attempts': 3 if BEDROCK_QUOTA_TABLE_NAME else 20})
 )
 
 table = boto3.resource("dynamodb").Table(DYNAMODB_TABLE_NAME)
+s3 = boto3.client("s3")
+
+ReportInformationExtraction = create_report_information_extraction(report_sections)
+
+extraction_cache = ExtractionCache(
+    logger,
+    table=boto3.resource("dynamodb").Table(EXTRACTION_CACHE_TABLE_NAME) if EXTRACTION_CACHE_TABLE_NAME else None,
+    ttl_seconds=EXTRACTION_CACHE_TTL_DAYS * 24 * 3600
+)
+
+model_call_stats = ModelCallStats()
+
+rate_limiter = BedrockRateLimiter(
+    logger,
+    table=boto3.resource("dynamodb").Table(BEDROCK_QUOTA_TABLE_NAME),
+    model_id=MODEL_ID,
+    requests_per_minute=BEDROCK_REQUESTS_PER_MINUTE,
+    tokens_per_minute=BEDROCK_TOKENS_PER_MINUTE,
+    max_wait_seconds=BEDROCK_MAX_WAIT_SECONDS
+) if BEDROCK_QUOTA_TABLE_NAME else None
 
 # TODO: use aws_lambda_powertools.event_handler import APIGatewayRestResolver and CORSConfig to avoid having to
 #  know about API GW response formats
@@ -104,49 +160,32 @@ def _format_response(handler):
     return wrapper
 
 
-@retry(wait_exponential_multiplier=10000, wait_exponential_max=60000, stop_max_attempt_number=10,
-       retry_on_exception=lambda ex: isinstance(ex, BedrockRetryableError))
-def text_information_extraction(
-        text: str,
-        information_type: str,
-        n_examples: int=0
-) -> BaseModel:
-
-    bedrock_llm = ChatBedrock(
-        model_id=MODEL_ID,
-        model_kwargs=INFORMATION_EXTRACTION_MODEL_PARAMETERS,
-        client=bedrock_runtime,
-    )
-
-    if n_examples > 0:
-        INFORMATION_EXTRACTION_PROMPT_SELECTOR = get_information_extraction_prompt_selector(LANGUAGE_ID, information_type)
-    else:
-        INFORMATION_EXTRACTION_PROMPT_SELECTOR = get_information_extraction_prompt_selector(LANGUAGE_ID)
+def invoke_structured_chain(structured_chain, chain_input: dict, max_tokens: int) -> BaseModel:
+    """
+    Invoke a structured output chain translating Bedrock throttling and timeouts into retryable errors
+    @param structured_chain: Prompt template piped into a structured output LLM
+    @param chain_input: Input variables of the prompt template
+    @param max_tokens: Maximum output tokens of the chain, counted against the tokens per minute budget
+    @return: Structured output object
+    """
 
-    claude_information_extraction_prompt_template = INFORMATION_EXTRACTION_PROMPT_SELECTOR.get_prompt(MODEL_ID)
+    # Rough estimate of 4 characters per input token
+    estimated_input_tokens = len(json.dumps(chain_input, default=str)) // 4
 
-    structured_llm = bedrock_llm.with_structured_output(InformationExtraction)
+    if rate_limiter:
+        rate_limiter.acquire(estimated_input_tokens + max_tokens)
 
-    structured_chain = claude_information_extraction_prompt_template | structured_llm
+    model_call_stats.record_call(estimated_input_tokens, max_tokens)
 
     # Retry mechanism to workaround Bedrock Throttling
     try:
-        if  n_examples > 0:
-            logger.info(f"Extracting {information_type} information with {n_examples} examples")
-            information_extraction_obj = structured_chain.invoke({
-                "json_schema": info_to_output_mapping[information_type].model_json_schema(),
-                "text": text,
-                "n_examples": n_examples
-            })
-        else:
-            logger.info(f"Extracting {information_type} information without examples")
-            information_extraction_obj = structured_chain.invoke({
-                "json_schema": info_to_output_mapping[information_type].model_json_schema(),
-                "text": text
-            })
+        information_extraction_obj = structured_chain.invoke(chain_input)
     except ClientError as exc:
         if exc.response['Error']['Code'] == 'ThrottlingException':
             logger.error("Bedrock throttling. To try again")
+            model_call_stats.record_throttle()
+            if rate_limiter:
+                rate_limiter.on_throttle()
             raise BedrockRetryableError(str(exc))
         elif exc.response['Error']['Code'] == 'ModelTimeoutException':
             logger.error("Bedrock ModelTimeoutException. To try again")
@@ -155,6 +194,9 @@ def text_information_extraction(
             raise
     except bedrock_runtime.exceptions.ThrottlingException as throttlingExc:
         logger.error("Bedrock ThrottlingException. To try again")
+        model_call_stats.record_throttle()
+        if rate_limiter:
+            rate_limiter.on_throttle()
         raise BedrockRetryableError(str(throttlingExc))
     except bedrock_runtime.exceptions.ModelTimeoutException as timeoutExc:
         logger.error("Bedrock ModelTimeoutException. To try again")
@@ -166,9 +208,217 @@ def text_information_extraction(
         logger.error(message)
         raise
 
+    if rate_limiter:
+        rate_limiter.on_success()
+
+    return information_extraction_obj
+
+
+# Warm start caches. Chains, example sets and schemas are built once per Lambda container and reused across invocations
+
+@functools.lru_cache(maxsize=None)
+def get_information_extraction_chain(language_id: str, model_id: str, information_type: str=None, n_examples: int=0):
+    """
+    Build (once) the structured output chain to extract a section of the report
+    @param language_id: Language of the prompts
+    @param model_id: Bedrock model id
+    @param information_type: Section to extract, only relevant when using examples
+    @param n_examples: Number of examples for the few shot prompt
+    @return: Prompt template piped into a structured output LLM
+    """
+
+    logger.info(f"Building information extraction chain for {language_id}, {model_id}, {information_type}, {n_examples}")
+
+    bedrock_llm = ChatBedrock(
+        model_id=model_id,
+        model_kwargs=INFORMATION_EXTRACTION_MODEL_PARAMETERS,
+        client=bedrock_runtime,
+    )
+
+    if n_examples > 0:
+        INFORMATION_EXTRACTION_PROMPT_SELECTOR = get_information_extraction_prompt_selector(language_id, information_type)
+    else:
+        INFORMATION_EXTRACTION_PROMPT_SELECTOR = get_information_extraction_prompt_selector(language_id)
+
+    claude_information_extraction_prompt_template = INFORMATION_EXTRACTION_PROMPT_SELECTOR.get_prompt(model_id)
+
+    structured_llm = bedrock_llm.with_structured_output(InformationExtraction)
+
+    return claude_information_extraction_prompt_template | structured_llm
+
+
+@functools.lru_cache(maxsize=None)
+def get_report_information_extraction_chain(language_id: str, model_id: str, use_examples: bool=False):
+    """
+    Build (once) the structured output chain to extract all the sections of the report in a single call
+    @param language_id: Language of the prompts
+    @param model_id: Bedrock model id
+    @param use_examples: Whether to use the examples of every section for a few shot prompt
+    @return: Prompt template piped into a structured output LLM
+    """
+
+    logger.info(f"Building report information extraction chain for {language_id}, {model_id}, {use_examples}")
+
+    bedrock_llm = ChatBedrock(
+        model_id=model_id,
+        model_kwargs=REPORT_EXTRACTION_MODEL_PARAMETERS,
+        client=bedrock_runtime,
+    )
+
+    # The prompt describes the composite output, an information extraction per section
+    INFORMATION_EXTRACTION_PROMPT_SELECTOR = get_report_information_extraction_prompt_selector(
+        language_id, report_sections if use_examples else None)
+
+    claude_information_extraction_prompt_template = INFORMATION_EXTRACTION_PROMPT_SELECTOR.get_prompt(model_id)
+
+    structured_llm = bedrock_llm.with_structured_output(ReportInformationExtraction)
+
+    return claude_information_extraction_prompt_template | structured_llm
+
+
+@functools.lru_cache(maxsize=None)
+def get_section_json_schema(information_type: str) -> dict:
+    """JSON schema of the Pydantic model of a section"""
+    return info_to_output_mapping[information_type].model_json_schema()
+
+
+@functools.lru_cache(maxsize=None)
+def get_section_examples_count(language_id: str, information_type: str) -> int:
+    """Number of examples available for a section"""
+    all_files = os.listdir(os.path.join('prompt_selector/examples', language_id, information_type))
+    txt_example_files = [file for file in all_files if re.match("^.*\.txt$", file)]
+
+    return len(txt_example_files)
+
+
+@functools.lru_cache(maxsize=None)
+def get_report_examples_count(language_id: str) -> int:
+    """Number of examples available for the extraction of the whole report, the examples of every section"""
+    return sum(
+        get_section_examples_count(language_id, section) for section in report_sections
+        if os.path.isdir(os.path.join('prompt_selector/examples', language_id, section))
+    )
+
+
+def text_information_extraction(
+        text: str,
+        information_type: str,
+        n_examples: int=0
+) -> BaseModel:
+
+    if  n_examples > 0:
+        structured_chain = get_information_extraction_chain(LANGUAGE_ID, MODEL_ID, information_type, n_examples)
+
+        logger.info(f"Extracting {information_type} information with {n_examples} examples")
+        information_extraction_obj = invoke_structured_chain(structured_chain, {
+            "json_schema": get_section_json_schema(information_type),
+            "text": text,
+            "n_examples": n_examples
+        }, INFORMATION_EXTRACTION_MODEL_PARAMETERS["max_tokens"])
+    else:
+        structured_chain = get_information_extraction_chain(LANGUAGE_ID, MODEL_ID)
+
+        logger.info(f"Extracting {information_type} information without examples")
+        information_extraction_obj = invoke_structured_chain(structured_chain, {
+            "json_schema": get_section_json_schema(information_type),
+            "text": text
+        }, INFORMATION_EXTRACTION_MODEL_PARAMETERS["max_tokens"])
+
+    return information_extraction_obj
+
+
+def report_information_extraction(text: str, n_examples: int=0) -> BaseModel:
+    """
+    Extract all the sections of the report from a chunk with a single structured output call
+    @param text: Chunk text
+    @param n_examples: Number of examples for the few shot prompt
+    @return: ReportInformationExtraction object with an InformationExtraction per section
+    """
+
+    structured_chain = get_report_information_extraction_chain(LANGUAGE_ID, MODEL_ID, n_examples > 0)
+
+    logger.info(f"Extracting {report_sections} information in a single call with {n_examples} examples")
+
+    chain_input = {
+        "json_schema": {section: get_section_json_schema(section) for section in report_sections},
+        "text": text
+    }
+
+    if n_examples > 0:
+        chain_input["n_examples"] = n_examples
+
+    return invoke_structured_chain(structured_chain, chain_input, REPORT_EXTRACTION_MODEL_PARAMETERS["max_tokens"])
+
+
+def cached_text_information_extraction(text: str, information_type: str, n_examples: int=0) -> BaseModel:
+    """
+    text_information_extraction backed by the extraction cache, the model is only invoked on a cache miss
+    """
+
+    cache_key = ExtractionCache.build_key(text, information_type, MODEL_ID, PROMPT_VERSION, n_examples)
+
+    cached_extraction = extraction_cache.get(cache_key)
+    if cached_extraction is not None:
+        logger.info(f"Extraction cache hit for {information_type}")
+        return InformationExtraction.model_validate_json(cached_extraction)
+
+    information_extraction_obj = text_information_extraction(text, information_type, n_examples)
+
+    if information_extraction_obj:
+        extraction_cache.put(cache_key, information_extraction_obj.model_dump_json())
+
     return information_extraction_obj
 
 
+def cached_report_information_extraction(text: str, n_examples: int=0) -> BaseModel:
+    """
+    report_information_extraction backed by the extraction cache, the model is only invoked on a cache miss
+    """
+
+    cache_key = ExtractionCache.build_key(text, report_sections, MODEL_ID, PROMPT_VERSION, n_examples)
+
+    cached_extraction = extraction_cache.get(cache_key)
+    if cached_extraction is not None:
+        logger.info("Extraction cache hit for the report")
+        return ReportInformationExtraction.model_validate_json(cached_extraction)
+
+    report_information = report_information_extraction(text, n_examples)
+
+    if report_information:
+        extraction_cache.put(cache_key, report_information.model_dump_json())
+
+    return report_information
+
+
+def section_information_extraction(text: str, section: str):
+    """
+    Extract the information of a single section of the report from a chunk
+    @param text: Chunk text
+    @param section: Name of the section to extract
+    @return: InformationExtraction object or None if the model output could not be validated
+    """
+
+    try:
+        # Invoke the model to extract the information
+        logger.info(f"Extracting {section} information")
+
+        if USE_EXAMPLES:
+            # Use all the examples for the few shot prompt
+            return cached_text_information_extraction(text, section, get_section_examples_count(LANGUAGE_ID, section))
+        else:
+            return cached_text_information_extraction(text, section)  # Do not use examples
+    except pydantic.ValidationError as e:
+        logger.error(f"Pydantic Validation error: {e}")
+    except Exception as e:
+
+        template = "An exception of type {0} occurred. Arguments:\n{1!r}"
+        message = template.format(type(e).__name__, e.args)
+        logger.error(message)
+        raise
+
+    return None
+
+
 @_format_response
 @logger.inject_lambda_context(log_event=True)
 def lambda_handler(event, _context: LambdaContext):
@@ -181,7 +431,14 @@ def lambda_handler(event, _context: LambdaContext):
 
     logger.info(f"Received event: {event}")
 
-    doc_text = event["text"]
+    model_call_stats.reset()
+
+    # Chunks are either inline or a reference to an S3 object (claim check)
+    chunk = event["chunk"]
+    if "s3_key" in chunk:
+        doc_text = s3.get_object(Bucket=WORKFLOW_BUCKET_NAME, Key=chunk["s3_key"])["Body"].read().decode("utf-8")
+    else:
+        doc_text = chunk["text"]
     chunk_index = event["chunk_index"]
     job_id = event["job_id"]
 
@@ -192,68 +449,81 @@ def lambda_handler(event, _context: LambdaContext):
 
     #logger.info(f"Sections: {doc_sections}")
 
-    for section in report_sections:
-
+    if EXTRACTION_MODE == "multi_section":
+        # Extract all the sections of the chunk with a single model call
         try:
-            # Invoke the model to extract the information
-            logger.info(f"Extracting {section} information")
+            n_examples = get_report_examples_count(LANGUAGE_ID) if USE_EXAMPLES else 0
+            report_information = cached_report_information_extraction(doc_text, n_examples)
+            sections_information = {section: getattr(report_information, section) for section in report_sections} if report_information else {}
+        except pydantic.ValidationError as e:
+            logger.error(f"Pydantic Validation error: {e}")
+            sections_information = {}
+    else:
+        # Extract all the sections of the chunk concurrently, the chunk takes as long as the slowest section
+        with ThreadPoolExecutor(max_workers=EXTRACTION_CONCURRENCY) as executor:
+            section_futures = {
+                section: executor.submit(section_information_extraction, doc_text, section)
+                for section in report_sections
+            }
 
-            if USE_EXAMPLES:
-                # Use all the examples for the few shot prompt
-                all_files = os.listdir(os.path.join('prompt_selector/examples', LANGUAGE_ID, section))
-                txt_example_files = [file for file in all_files if re.match("^.*\.txt$", file)]
+        sections_information = {section: section_futures[section].result() for section in report_sections}
 
-                section_information = text_information_extraction(doc_text, section, len(txt_example_files))
-            else:
-                section_information = text_information_extraction(doc_text, section)  # Do not use examples
+    for section in report_sections:
 
-            if section_information:
-                # Only append sections for which data could be extracted
+        section_information = sections_information.get(section)
 
-                if section_information.confidence_level > EXTRACTION_CONFIDENCE_LEVEL:
-                    # Only save sections with a confidence level at least above a threshold
+        if section_information:
+            # Only append sections for which data could be extracted
 
-                    logger.info(f"Section {section} extracted")
-                    logger.info(section_information)
+            if section_information.confidence_level > EXTRACTION_CONFIDENCE_LEVEL:
+                # Only save sections with a confidence level at least above a threshold
 
-                    """
-                    formatted_information = format_extraction(
-                        section_information.extracted_information,
-                        section
-                    )
-                    extracted_information[section] = formatted_information.model_dump()
-                    """
+                logger.info(f"Section {section} extracted")
+                logger.info(section_information)
 
-                    extracted_information[section] = section_information.extracted_information
-                else:
-                    logger.info(f"Section {section} has a confidence level of {section_information.confidence_level} and will not be saved")
-                    logger.info(section_information)
-        except pydantic.ValidationError as e:
-            logger.error(f"Pydantic Validation error: {e}")
-        except Exception as e:
+                extracted_information[section] = section_information.extracted_information
+            else:
+                logger.info(f"Section {section} has a confidence level of {section_information.confidence_level} and will not be saved")
+                logger.info(section_information)
 
-            template = "An exception of type {0} occurred. Arguments:\n{1!r}"
-            message = template.format(type(e).__name__, e.args)
-            logger.error(message)
-            raise
+    logger.info(f"Extracted information: {extracted_information}")
+    logger.info("Extraction cache statistics", extra=extraction_cache.stats())
+    logger.info("Extraction model call statistics", extra={"job_id": job_id, "chunk_index": chunk_index, **model_call_stats.stats()})
 
+    # Update status in DynamoDB table once the whole chunk is processed
+    try:
+        # Only the first chunk to finish moves the job forward, for the others the transition is rejected
+        update_job_status(table, job_id, StatusEnum.INFORMATION_EXTRACTION)
+    except Exception as e:
+        logger.error(f"Error updating DynamoDB: {e}")
+        raise ExtractDataError("Failed to update DynamoDB") from e
+
+    # Keep the extracted information out of the Map state output, it grows with the number of chunks
+    if WORKFLOW_BUCKET_NAME:
+        # Named after the chunk, the chunks of the parts of a split document have a part prefix
+        if "s3_key" in chunk:
+            extracted_information_key = chunk["s3_key"].replace("/chunks/", "/extractions/", 1).rsplit(".", 1)[0] + ".json"
+        else:
+            extracted_information_key = f"{job_id}/extractions/{chunk_index:05d}.json"
 
-        # Update status in DynamoDB table
         try:
-            table.update_item(
-                Key={"id": job_id},
-                UpdateExpression="SET #status = :status",
-                ExpressionAttributeNames={"#status": "status"},
-                ExpressionAttributeValues={":status": StatusEnum.INFORMATION_EXTRACTION.name},
+            s3.put_object(
+                Bucket=WORKFLOW_BUCKET_NAME,
+                Key=extracted_information_key,
+                Body=json.dumps(extracted_information).encode("utf-8")
             )
-        except Exception as e:
-            logger.error(f"Error updating DynamoDB: {e}")
-            return {
-                "statusCode": 500,
-                "error": "Failed to update DynamoDB"
-            }
+        except ClientError as e:
+            logger.error(f"Error writing extracted information to S3: {e}")
+            raise ExtractDataError("Failed to write extracted information to S3") from e
 
-        logger.info(f"Extracted information: {extracted_information}")
+        return {
+            "statusCode": 200,
+            "body": {
+                "extracted_information_s3_key": extracted_information_key,
+                "chunk_index": chunk_index,
+                "job_id": job_id
+            }
+        }
 
     return {
         "statusCode": 200,
@@ -32,9 +32,13 @@ from .prompts import (
     CLAUDE_INFORMATION_EXTRACTION_USER_PROMPT_EN,
     CLAUDE_INFORMATION_EXTRACTION_WITH_EXAMPLES_SYSTEM_PROMPT_EN,
     CLAUDE_INFORMATION_EXTRACTION_WITH_EXAMPLES_USER_PROMPT_EN,
+    CLAUDE_REPORT_INFORMATION_EXTRACTION_SYSTEM_PROMPT_EN,
+    CLAUDE_REPORT_INFORMATION_EXTRACTION_WITH_EXAMPLES_SYSTEM_PROMPT_EN,
+    CLAUDE_REPORT_INFORMATION_EXTRACTION_SYSTEM_PROMPT_ES,
+    CLAUDE_REPORT_INFORMATION_EXTRACTION_WITH_EXAMPLES_SYSTEM_PROMPT_ES,
 )
 
-from .langchain_example_selector import CharterReportsExampleSelector
+from .langchain_example_selector import CharterReportsExampleSelector, ReportExamplesSelector
 
 from typing import Callable
 
@@ -150,3 +154,79 @@ def get_information_extraction_prompt_selector(lang: str, example_type: str=None
                 (is_es_titan(lang), CLAUDE_INFORMATION_EXTRACTION_PROMPT_TEMPLATE_ES),
             ]
         )
+
+
+def get_report_information_extraction_prompt_selector(lang: str, sections: list[str]=None) -> ConditionalPromptSelector:
+    """
+    Prompts to extract every section of the report in a single call. The JSON schema of the prompt maps each section to
+    its schema and the model answers with an information extraction per section
+    @param lang: Language of the prompts
+    @param sections: Sections of the report, the few shot prompt uses the examples of every section when given
+    """
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+
+    if sections:
+
+        # Prompt template for the examples
+        examples_prompt_template = ChatPromptTemplate.from_messages(
+            [
+                HumanMessagePromptTemplate.from_template("<text>{text}</text>", input_variables=["text"],
+                                                         validate_template=True),
+                AIMessagePromptTemplate.from_template("<extracted_information>{extraction}<extracted_information>",
+                                                      input_variables=["extraction"], validate_template=True)
+            ]
+        )
+
+        few_shot_chat_prompt_template = FewShotChatMessagePromptTemplate(
+            input_variables=[
+                "n_examples"
+            ],
+            example_selector=ReportExamplesSelector(
+                examples_location=os.path.join(dir_path, "examples", lang), sections=sections),
+            example_prompt=examples_prompt_template,
+        )
+
+        CLAUDE_REPORT_INFORMATION_EXTRACTION_WITH_EXAMPLES_PROMPT_TEMPLATE_EN = ChatPromptTemplate.from_messages([
+            SystemMessagePromptTemplate.from_template(CLAUDE_REPORT_INFORMATION_EXTRACTION_WITH_EXAMPLES_SYSTEM_PROMPT_EN, input_variables=["n_examples", "json_schema"],
+                                                      validate_template=True),
+            few_shot_chat_prompt_template,
+            HumanMessagePromptTemplate.from_template(CLAUDE_INFORMATION_EXTRACTION_WITH_EXAMPLES_USER_PROMPT_EN, input_variables=["text"],
+                                                     validate_template=True),
+        ])
+
+        CLAUDE_REPORT_INFORMATION_EXTRACTION_WITH_EXAMPLES_PROMPT_TEMPLATE_ES = ChatPromptTemplate.from_messages([
+            SystemMessagePromptTemplate.from_template(CLAUDE_REPORT_INFORMATION_EXTRACTION_WITH_EXAMPLES_SYSTEM_PROMPT_ES, input_variables=["n_examples", "json_schema"],
+                                                      validate_template=True),
+            few_shot_chat_prompt_template,
+            HumanMessagePromptTemplate.from_template(CLAUDE_INFORMATION_EXTRACTION_WITH_EXAMPLES_USER_PROMPT_ES,
+                                                     input_variables=["text"], validate_template=True),
+        ])
+
+        return ConditionalPromptSelector(
+            default_prompt=CLAUDE_REPORT_INFORMATION_EXTRACTION_WITH_EXAMPLES_PROMPT_TEMPLATE_EN,
+            conditionals=[
+                (is_es_claude(lang), CLAUDE_REPORT_INFORMATION_EXTRACTION_WITH_EXAMPLES_PROMPT_TEMPLATE_ES),
+                (is_es_titan(lang), CLAUDE_REPORT_INFORMATION_EXTRACTION_WITH_EXAMPLES_PROMPT_TEMPLATE_ES),
+                (is_en_titan(lang), CLAUDE_REPORT_INFORMATION_EXTRACTION_WITH_EXAMPLES_PROMPT_TEMPLATE_EN)
+            ]
+        )
+    else:
+
+        CLAUDE_REPORT_INFORMATION_EXTRACTION_PROMPT_TEMPLATE_EN = ChatPromptTemplate.from_messages([
+            SystemMessagePromptTemplate.from_template(CLAUDE_REPORT_INFORMATION_EXTRACTION_SYSTEM_PROMPT_EN, input_variables=["json_schema"], validate_template=True),
+            HumanMessagePromptTemplate.from_template(CLAUDE_INFORMATION_EXTRACTION_USER_PROMPT_EN, input_variables=["text"], validate_template=True),
+        ])
+
+        CLAUDE_REPORT_INFORMATION_EXTRACTION_PROMPT_TEMPLATE_ES = ChatPromptTemplate.from_messages([
+            SystemMessagePromptTemplate.from_template(CLAUDE_REPORT_INFORMATION_EXTRACTION_SYSTEM_PROMPT_ES, input_variables=["json_schema"], validate_template=True),
+            HumanMessagePromptTemplate.from_template(CLAUDE_INFORMATION_EXTRACTION_USER_PROMPT_ES, input_variables=["text"], validate_template=True),
+        ])
+
+        return ConditionalPromptSelector(
+            default_prompt=CLAUDE_REPORT_INFORMATION_EXTRACTION_PROMPT_TEMPLATE_EN,
+            conditionals=[
+                (is_es_claude(lang), CLAUDE_REPORT_INFORMATION_EXTRACTION_PROMPT_TEMPLATE_ES),
+                (is_en_titan(lang), CLAUDE_REPORT_INFORMATION_EXTRACTION_PROMPT_TEMPLATE_EN),
+                (is_es_titan(lang), CLAUDE_REPORT_INFORMATION_EXTRACTION_PROMPT_TEMPLATE_ES),
+            ]
+        )
@@ -85,3 +85,57 @@ class CharterReportsExampleSelector(BaseExampleSelector):
         # We dont care about input variables for now
 
         return self.examples[:input_variables["n_examples"]]
+
+
+class ReportExamplesSelector(BaseExampleSelector):
+    """
+    Examples of the extraction of every section of the report in a single call. The examples are defined per section,
+    each one is presented as a report where only its section has extracted information
+    """
+
+    def __init__(self, examples_location: str, sections: list[str]):
+
+        self.examples = []
+
+        for section in sections:
+            section_location = os.path.join(examples_location, section)
+
+            if not os.path.isdir(section_location):
+                continue
+
+            for section_example in CharterReportsExampleSelector(section_location).examples:
+                self.examples.append({
+                    "text": section_example["text"],
+                    "extraction": json.dumps(
+                        {report_section: section_example["extraction"] if report_section == section else {}
+                         for report_section in sections},
+                        ensure_ascii=False
+                    )
+                })
+
+        if len(self.examples) <= 0:
+            raise Exception("No examples found")
+
+    def aadd_example(self, example: dict[str, str]) -> any:
+        """Asynchronously insert an example"""
+
+        self.examples.append(example)
+
+        return None
+
+    def add_example(self, example: dict[str, str]) -> any:
+        """Synchronously insert an example"""
+
+        self.examples.append(example)
+
+        return None
+
+    def aselect_examples(self, input_variables: dict[str, str]) -> list[dict]:
+        """Asynchronously return a list of examples"""
+
+        return self.examples[:input_variables["n_examples"]]
+
+    def select_examples(self, input_variables: dict[str, str]) -> list[dict]:
+        """Synchronously return a list of examples"""
+
+        return self.examples[:input_variables["n_examples"]]
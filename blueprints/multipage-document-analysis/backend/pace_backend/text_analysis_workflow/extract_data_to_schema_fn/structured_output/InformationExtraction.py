@@ -15,12 +15,24 @@
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
 # SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
-from pydantic import BaseModel, Field
-from typing import List
+from pydantic import BaseModel, Field, create_model
+from typing import List, Type
 
 class InformationExtraction(BaseModel):
     """Details about the information extraction task the LLM performed"""
     thinking: str = Field(description="The reasoning of the LLM about the information to extract and the presented text")
     confidence_level: int = Field(0, description="The level of confidence the LLM shows about extracting the requested information")
     conclusion: bool = Field(False, description="Whether the LLM considers the requested information can be extracted from the presented text")
-    extracted_information: str = Field(description="The information extracted by the LLM")
\ No newline at end of file
+    extracted_information: str = Field(description="The information extracted by the LLM")
+
+
+def create_report_information_extraction(sections: List[str]) -> Type[BaseModel]:
+    """Composite model with the details of the information extraction of every section of the report"""
+    return create_model(
+        "ReportInformationExtraction",
+        __doc__="Details about the information extraction task the LLM performed for every section of the report",
+        **{
+            section: (InformationExtraction, Field(description=f"The information extraction for the {section} section, following its JSON schema"))
+            for section in sections
+        }
+    )
@@ -15,7 +15,7 @@
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
 # SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
-import tempfile
+import io
 import os
 import boto3
 import json
@@ -23,12 +23,16 @@ import uuid
 
 import functools
 
+from boto3.s3.transfer import TransferConfig
+
 from pydantic import TypeAdapter
 from fpdf import FPDF
 
 from doc_info_layer.section_definition import info_to_output_mapping, report_sections
 
 from status_info_layer.StatusEnum import StatusEnum
+from status_info_layer.job_status import update_job_status
+from report_info_layer.report_storage import get_report, REPORT_KEY_ATTRIBUTE, LEGACY_REPORT_ATTRIBUTE
 
 from aws_lambda_powertools import Logger
 from aws_lambda_powertools.utilities.typing import LambdaContext
@@ -42,15 +46,53 @@ REGION = os.getenv("REGION")
 table = boto3.resource("dynamodb").Table(TABLE_NAME)
 s3 = boto3.client('s3')
 
+# Large reports are uploaded in parts of 8 MB from memory
+pdf_transfer_config = TransferConfig(multipart_threshold=8 * 1024 * 1024, multipart_chunksize=8 * 1024 * 1024)
+
 def get_item_by_id(id: str):
-    item = table.get_item(Key={"id": id})
+    item = table.get_item(
+        Key={"id": id},
+        ProjectionExpression="#report_s3_key, #json_report",
+        ExpressionAttributeNames={"#report_s3_key": REPORT_KEY_ATTRIBUTE, "#json_report": LEGACY_REPORT_ATTRIBUTE},
+    )
     if "Item" not in item:
         raise KeyError("Item not found")
-    return json.loads(item["Item"]["json_report"])
+    return get_report(s3, S3_BUCKET, item["Item"])
+
+@functools.lru_cache(maxsize=None)
+def get_section_adapter(section: str) -> TypeAdapter:
+    """TypeAdapter of the model of a section, built once per Lambda container"""
+    return TypeAdapter(info_to_output_mapping[section])
+
+def build_section_table(section, section_report):
+    """
+    Validate a section of the report and build the rows of its table
+    @param section: Name of the section
+    @param section_report: Consolidated information of the section
+    @return: List of tuples, one per row of the table
+    """
+
+    logger.info(f"Creating section {section}")
+    logger.info(section_report)
+
+    pydantic_section = get_section_adapter(section).validate_python(section_report)
+
+    section_tuples = pydantic_section.to_tuples_table()
+
+    logger.info(f"Section tuples {section}")
+    logger.info(section_tuples)
+
+    return section_tuples
 
 def create_pdf(report):
     ### Create PDF
 
+    # Validating the sections takes well under a millisecond, drawing the tables dominates the render time
+    # (see benchmarks/bench_pdf_render.py), so the tables are built sequentially
+    section_tables = {
+        section: build_section_table(section, report[section]) for section in report_sections if section in report.keys()
+    }
+
     pdf = FPDF()
     pdf.set_font("Times", size=16)
 
@@ -60,22 +102,12 @@ def create_pdf(report):
 
     ### Create section table
     for i, section in zip(range(len(report_sections)), report_sections):
-        if section in report.keys():
+        if section in section_tables:
 
             pdf.cell(200, 10, txt="", ln=1, align="C")
 
-            logger.info(f"Creating section {section}")
-            logger.info(report[section])
-
-            pydantic_section = TypeAdapter(info_to_output_mapping[section]).validate_python(report[section])
-
-            section_tuples = pydantic_section.to_tuples_table()
-
-            logger.info(f"Section tuples {section}")
-            logger.info(section_tuples)
-
             with pdf.table() as table:
-                for data_row in section_tuples:
+                for data_row in section_tables[section]:
                     row = table.row()
                     for datum in data_row:
                         row.cell(datum)
@@ -125,12 +157,7 @@ def lambda_handler(event, _context: LambdaContext):
     except Exception as e:
         logger.error(f"Error retrieving item from DynamoDB: {e}")
 
-        table.update_item(
-            Key={"id": job_id},
-            UpdateExpression="SET #status = :status",
-            ExpressionAttributeNames={"#status": "status"},
-            ExpressionAttributeValues={":status": StatusEnum.ERROR.name},
-        )
+        update_job_status(table, job_id, StatusEnum.ERROR)
 
         return {
             "statusCode": 500,
@@ -141,22 +168,18 @@ def lambda_handler(event, _context: LambdaContext):
     try:
         report_pdf = create_pdf(doc_report)
 
-        #Save a file to the lambda local filesystem
-        tmpdir = tempfile.mkdtemp()
-        tmpfile_path = os.path.join(tmpdir,filename)
-        report_pdf.output(tmpfile_path)
-
-        #Upload the file to S3
-        s3.upload_file(tmpfile_path, S3_BUCKET, s3_key)
+        #Upload the PDF to S3 from memory, without a file in the lambda local filesystem
+        s3.upload_fileobj(
+            io.BytesIO(report_pdf.output()),
+            S3_BUCKET,
+            s3_key,
+            ExtraArgs={"ContentType": "application/pdf"},
+            Config=pdf_transfer_config
+        )
     except  Exception as e:
         logger.error(f"Error creating PDF: {e}")
 
-        table.update_item(
-            Key={"id": job_id},
-            UpdateExpression="SET #status = :status",
-            ExpressionAttributeNames={"#status": "status"},
-            ExpressionAttributeValues={":status": StatusEnum.ERROR.name},
-        )
+        update_job_status(table, job_id, StatusEnum.ERROR)
 
         return {
             "statusCode": 500,
@@ -165,19 +188,7 @@ def lambda_handler(event, _context: LambdaContext):
 
     # Update status in DynamoDB table
     try:
-        table.update_item(
-            Key={"id": job_id},
-            UpdateExpression="SET #status = :status",
-            ExpressionAttributeNames={"#status": "status"},
-            ExpressionAttributeValues={":status": StatusEnum.PDF_GENERATION.name},
-        )
-
-        table.update_item(
-            Key={"id": job_id},
-            UpdateExpression="SET #report_key = :report_key",
-            ExpressionAttributeNames={"#report_key": "report_key"},
-            ExpressionAttributeValues={":report_key": s3_key},
-        )
+        update_job_status(table, job_id, StatusEnum.PDF_GENERATION, attributes={"report_key": s3_key})
     except Exception as e:
         logger.error(f"Error updating DynamoDB: {e}")
         return {
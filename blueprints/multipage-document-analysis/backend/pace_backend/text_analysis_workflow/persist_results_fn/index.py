@@ -25,6 +25,8 @@ import functools
 import boto3
 
 from status_info_layer.StatusEnum import StatusEnum
+from status_info_layer.job_status import update_job_status
+from report_info_layer.report_storage import put_report, LEGACY_REPORT_ATTRIBUTE
 
 from aws_lambda_powertools import Logger
 from aws_lambda_powertools.utilities.typing import LambdaContext
@@ -32,8 +34,10 @@ from aws_lambda_powertools.utilities.typing import LambdaContext
 logger = Logger()
 
 TABLE_NAME = os.getenv("DOCUMENTS_DYNAMO_DB_TABLE_NAME")
+S3_BUCKET = os.getenv("OUTPUT_BUCKET_NAME")
 
 table = boto3.resource("dynamodb").Table(TABLE_NAME)
+s3 = boto3.client('s3')
 
 # TODO: use aws_lambda_powertools.event_handler import APIGatewayRestResolver and CORSConfig to avoid having to
 #  know about API GW response formats
@@ -71,20 +75,24 @@ def lambda_handler(event, _context: LambdaContext):
     job_id = event['Payload']['body']['job_id']
     report = event['Payload']['body']['report']
 
-    # Update status in DynamoDB table
+    # Store the report in S3, the DynamoDB item stays small for the status reads
     try:
-        table.update_item(
-            Key={"id": job_id},
-            UpdateExpression="SET #json_report = :json_report",
-            ExpressionAttributeNames={"#json_report": "json_report"},
-            ExpressionAttributeValues={":json_report": json.dumps(report)},
-        )
+        report_attributes = put_report(s3, S3_BUCKET, job_id, report)
+    except Exception as e:
+        logger.error(f"Error writing report to S3: {e}")
+        return {
+            "statusCode": 500,
+            "error": "Failed to write report to S3"
+        }
 
-        table.update_item(
-            Key={"id": job_id},
-            UpdateExpression="SET #status = :status",
-            ExpressionAttributeNames={"#status": "status"},
-            ExpressionAttributeValues={":status": StatusEnum.PDF_GENERATION.name},
+    # Update report pointer and status in DynamoDB table
+    try:
+        update_job_status(
+            table,
+            job_id,
+            StatusEnum.REPORT_PERSISTANCE,
+            attributes=report_attributes,
+            remove=[LEGACY_REPORT_ATTRIBUTE]
         )
     except Exception as e:
         logger.error(f"Error updating DynamoDB: {e}")
@@ -0,0 +1,200 @@
+# MIT No Attribution
+#
+# Copyright 2024 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import json
+
+from functools import lru_cache
+from typing import List, Optional, Tuple, Type, get_origin, get_args
+
+from pydantic import BaseModel, create_model
+
+# Deterministic merge of the information extracted from multiple chunks for the same section of the report.
+# Identical values are deduplicated and list fields are united, only fields with different values need the LLM
+
+
+def _is_empty(value) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+
+def _normalize(value) -> str:
+    """Comparable representation of a value"""
+    if isinstance(value, str):
+        return " ".join(value.split()).casefold()
+    return json.dumps(value, sort_keys=True, ensure_ascii=False).casefold()
+
+
+def _list_item_type(model: Type[BaseModel], field_name: str):
+    """Type of the elements of a list field, None if the field is not a list"""
+    annotation = model.model_fields[field_name].annotation
+    if get_origin(annotation) is list:
+        return get_args(annotation)[0]
+    return None
+
+
+def _is_model(annotation) -> bool:
+    return isinstance(annotation, type) and issubclass(annotation, BaseModel)
+
+
+def _list_item_identity(item_type, item) -> str:
+    """Items of a list that refer to the same entity (e.g. same shareholder) have the same identity"""
+    if _is_model(item_type) and isinstance(item, dict):
+        identity_field = next(iter(item_type.model_fields))
+        return _normalize(item.get(identity_field, item))
+    return _normalize(item)
+
+
+def _merge_values(value, other_value):
+    """
+    Merge two values of the same field or entity. Objects are merged field by field, so an entity that is a subset of
+    another one (e.g. a shareholder without stocks value) is merged into it
+    @return: Tuple with whether the values could be merged and the merged value
+    """
+    if _is_empty(value):
+        return True, other_value
+    if _is_empty(other_value):
+        return True, value
+
+    if isinstance(value, dict) and isinstance(other_value, dict):
+        merged = dict(value)
+        for key, field_value in other_value.items():
+            mergeable, merged[key] = _merge_values(merged.get(key), field_value)
+            if not mergeable:
+                return False, None
+        return True, merged
+
+    # Two non empty values only conflict when they are different
+    return _normalize(value) == _normalize(other_value), value
+
+
+def _unmatched_fields(model: Type[BaseModel], extraction: dict) -> List[str]:
+    """Fields with values in an extraction that are not part of the model (or of the models of its list items)"""
+    unmatched = [key for key, value in extraction.items() if key not in model.model_fields and not _is_empty(value)]
+
+    for field_name in model.model_fields:
+        value = extraction.get(field_name)
+        item_type = _list_item_type(model, field_name)
+
+        if _is_model(item_type) and isinstance(value, list):
+            unmatched += [f"{field_name}.{key}" for item in value if isinstance(item, dict)
+                          for key in _unmatched_fields(item_type, item)]
+        elif _is_model(model.model_fields[field_name].annotation) and isinstance(value, dict):
+            unmatched += [f"{field_name}.{key}" for key in _unmatched_fields(model.model_fields[field_name].annotation, value)]
+
+    return unmatched
+
+
+def parse_extractions(section: list) -> List[dict]:
+    """
+    Parse the information extracted from each chunk
+    @param section: List with the extracted information of each chunk, as JSON strings or dicts
+    @return: List of dicts or None if any of the extractions is not a JSON object
+    """
+    extractions = []
+
+    for extracted_information in section:
+        if isinstance(extracted_information, str):
+            try:
+                extracted_information = json.loads(extracted_information)
+            except json.JSONDecodeError:
+                return None
+
+        if not isinstance(extracted_information, dict):
+            return None
+
+        extractions.append(extracted_information)
+
+    return extractions
+
+
+def premerge_section(model: Type[BaseModel], extractions: List[dict]) -> Optional[Tuple[dict, dict]]:
+    """
+    Merge the values of each field of the section that do not conflict between chunks
+    @param model: Pydantic model of the section
+    @param extractions: Parsed information extracted from each chunk (see parse_extractions)
+    @return: Tuple with the merged fields and the conflicting fields with their distinct values. None when an
+        extraction has values that don't match the fields of the model, the LLM has to consolidate them or they are lost
+    """
+    if any(_unmatched_fields(model, extraction) for extraction in extractions):
+        return None
+
+    merged = {}
+    conflicts = {}
+
+    for field_name, field_info in model.model_fields.items():
+        item_type = _list_item_type(model, field_name)
+        values = [extraction.get(field_name) for extraction in extractions if not _is_empty(extraction.get(field_name))]
+
+        if item_type is not None:
+            # Union of the elements, an entity is merged with the information of every chunk. Only an entity with
+            # different non empty values for the same field in two chunks is a conflict
+            items_by_identity = {}
+            mergeable = True
+            for value in values:
+                for item in (value if isinstance(value, list) else [value]):
+                    if _is_empty(item):
+                        continue
+                    identity = _list_item_identity(item_type, item)
+                    item_mergeable, items_by_identity[identity] = _merge_values(items_by_identity.get(identity), item)
+                    mergeable = mergeable and item_mergeable
+
+            if mergeable:
+                merged[field_name] = list(items_by_identity.values())
+            else:
+                conflicts[field_name] = values
+        else:
+            merged_value = None
+            mergeable = True
+            for value in values:
+                value_mergeable, merged_value = _merge_values(merged_value, value)
+                if not value_mergeable:
+                    mergeable = False
+                    break
+
+            if not mergeable:
+                distinct_values = {}
+                for value in values:
+                    distinct_values.setdefault(_normalize(value), value)
+                conflicts[field_name] = list(distinct_values.values())
+            elif not _is_empty(merged_value):
+                merged[field_name] = merged_value
+            elif field_info.is_required():
+                # No chunk has a value for the field, leave it empty as the LLM would do
+                merged[field_name] = "" if field_info.annotation is str else None
+
+    return merged, conflicts
+
+
+def conflicting_versions(extractions: List[dict], conflict_fields) -> List[str]:
+    """The versions of the conflicting fields of each chunk, as JSON strings, to be consolidated by the LLM"""
+    versions = []
+
+    for extraction in extractions:
+        version = {field_name: extraction[field_name] for field_name in conflict_fields if not _is_empty(extraction.get(field_name))}
+        if version:
+            versions.append(json.dumps(version, ensure_ascii=False))
+
+    return versions
+
+
+@lru_cache(maxsize=None)
+def create_conflicts_model(model: Type[BaseModel], conflict_fields: Tuple[str, ...]) -> Type[BaseModel]:
+    """Model of a section restricted to its conflicting fields"""
+    return create_model(
+        model.__name__,
+        __doc__=model.__doc__,
+        **{field_name: (model.model_fields[field_name].annotation, model.model_fields[field_name]) for field_name in conflict_fields}
+    )
@@ -0,0 +1,208 @@
+# MIT No Attribution
+#
+# Copyright 2024 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import logging
+import math
+import random
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+
+class BedrockRateLimiter:
+    """
+    Rate limiter for the Bedrock calls of all the Lambda functions of the workflow, shared through a DynamoDB table.
+
+    Requests and tokens are counted per model in one minute windows. The requests per minute budget adapts with
+    AIMD: it grows by one request after each window with successful calls and is halved when Bedrock throttles,
+    which also makes every caller back off for a while.
+
+    The limit item is only written after the first throttling, until then the budget is the maximum. The time spent
+    waiting for capacity is bounded by max_wait_seconds, keep it below the timeout of the Lambda function.
+    """
+
+    WINDOW_SECONDS = 60
+
+    def __init__(
+            self,
+            logger: logging.Logger,
+            table,
+            model_id: str,
+            requests_per_minute: int,
+            tokens_per_minute: int,
+            min_requests_per_minute: int=1,
+            throttle_backoff_seconds: int=10,
+            max_wait_seconds: int=240,
+    ):
+        self.logger = logger
+        self.table = table
+        self.model_id = model_id
+        self.max_requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.min_requests_per_minute = min_requests_per_minute
+        self.throttle_backoff_seconds = throttle_backoff_seconds
+        self.max_wait_seconds = max_wait_seconds
+
+        self._lock = threading.Lock()
+        self._limit_state = None
+        self._limit_state_read_at = 0
+        self._last_increase_window = None
+
+    def _window(self, now: float) -> int:
+        return int(now // self.WINDOW_SECONDS)
+
+    def _limit_key(self) -> str:
+        return f"{self.model_id}#limit"
+
+    def _get_limit_state(self) -> dict:
+        """Current requests per minute budget and global backoff, cached for a few seconds"""
+
+        with self._lock:
+            if self._limit_state is not None and time.time() - self._limit_state_read_at < 5:
+                return self._limit_state
+
+        item = self.table.get_item(Key={"id": self._limit_key()}, ConsistentRead=True).get("Item", {})
+
+        limit_state = {
+            "requests_per_minute": int(item.get("requests_per_minute", self.max_requests_per_minute)),
+            "backoff_until": float(item.get("backoff_until", 0)),
+        }
+
+        with self._lock:
+            self._limit_state = limit_state
+            self._limit_state_read_at = time.time()
+
+        return limit_state
+
+    def acquire(self, estimated_tokens: int):
+        """
+        Block until the call fits in the requests and tokens budgets of the current window
+        @param estimated_tokens: Estimated number of tokens of the call (input and output)
+        """
+
+        started_at = time.time()
+        estimated_tokens = min(estimated_tokens, self.tokens_per_minute)
+
+        while True:
+            now = time.time()
+
+            if now - started_at > self.max_wait_seconds:
+                raise TimeoutError(f"Waited more than {self.max_wait_seconds} seconds for Bedrock capacity")
+
+            limit_state = self._get_limit_state()
+
+            if limit_state["backoff_until"] > now:
+                wait = limit_state["backoff_until"] - now + random.uniform(0, 1)
+                self.logger.info(f"Bedrock throttled recently, backing off {wait:.1f} seconds")
+                self._sleep(wait, started_at)
+                continue
+
+            window = self._window(now)
+
+            try:
+                self.table.update_item(
+                    Key={"id": f"{self.model_id}#{window}"},
+                    UpdateExpression="ADD #requests :one, #tokens :tokens SET #expires_at = :expires_at",
+                    ConditionExpression="attribute_not_exists(#requests) OR (#requests < :rpm AND #tokens <= :max_tokens)",
+                    ExpressionAttributeNames={
+                        "#requests": "requests",
+                        "#tokens": "tokens",
+                        "#expires_at": "expires_at",
+                    },
+                    ExpressionAttributeValues={
+                        ":one": 1,
+                        ":tokens": estimated_tokens,
+                        ":rpm": limit_state["requests_per_minute"],
+                        ":max_tokens": self.tokens_per_minute - estimated_tokens,
+                        ":expires_at": int(now) + 3600,
+                    },
+                )
+                return
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    raise
+
+            # Budget exhausted for this window, wait for the next one. Jitter spreads the callers over the window
+            wait = (window + 1) * self.WINDOW_SECONDS - now + random.uniform(0, 5)
+            self.logger.info(f"Bedrock budget for {self.model_id} exhausted, waiting {wait:.1f} seconds")
+            self._sleep(wait, started_at)
+
+    def _sleep(self, wait: float, started_at: float):
+        """Sleep without going past max_wait_seconds, so acquire fails before the Lambda function times out"""
+        time.sleep(max(0.0, min(wait, started_at + self.max_wait_seconds - time.time() + 0.1)))
+
+    def on_success(self):
+        """Additive increase of the requests per minute budget, at most once per window and container"""
+
+        window = self._window(time.time())
+
+        with self._lock:
+            if self._last_increase_window == window:
+                return
+            self._last_increase_window = window
+
+        # Without a limit item the budget is already the maximum, there is nothing to increase
+        try:
+            self.table.update_item(
+                Key={"id": self._limit_key()},
+                UpdateExpression="SET #rpm = #rpm + :one",
+                ConditionExpression="attribute_exists(#rpm) AND #rpm < :max_rpm",
+                ExpressionAttributeNames={"#rpm": "requests_per_minute"},
+                ExpressionAttributeValues={":one": 1, ":max_rpm": self.max_requests_per_minute},
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                self.logger.warning(f"Error increasing Bedrock budget: {e}")
+
+    def on_throttle(self):
+        """Multiplicative decrease of the requests per minute budget and global backoff for every caller"""
+
+        limit_state = self._get_limit_state()
+        requests_per_minute = max(self.min_requests_per_minute, limit_state["requests_per_minute"] // 2)
+        backoff_until = math.ceil(time.time() + self.throttle_backoff_seconds)
+
+        # Every throttling extends the backoff, also when the budget is already at its minimum
+        try:
+            self.table.update_item(
+                Key={"id": self._limit_key()},
+                UpdateExpression="SET #backoff_until = :backoff_until",
+                ConditionExpression="attribute_not_exists(#backoff_until) OR #backoff_until < :backoff_until",
+                ExpressionAttributeNames={"#backoff_until": "backoff_until"},
+                ExpressionAttributeValues={":backoff_until": backoff_until},
+            )
+        except ClientError as e:
+            # Another caller already backed off until later
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                self.logger.warning(f"Error setting Bedrock backoff: {e}")
+
+        try:
+            self.table.update_item(
+                Key={"id": self._limit_key()},
+                UpdateExpression="SET #rpm = :rpm",
+                ConditionExpression="attribute_not_exists(#rpm) OR #rpm > :rpm",
+                ExpressionAttributeNames={"#rpm": "requests_per_minute"},
+                ExpressionAttributeValues={":rpm": requests_per_minute},
+            )
+            self.logger.info(f"Bedrock budget for {self.model_id} decreased to {requests_per_minute} requests per minute")
+        except ClientError as e:
+            # Another caller already decreased the budget for this throttling
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                self.logger.warning(f"Error decreasing Bedrock budget: {e}")
+
+        with self._lock:
+            self._limit_state = None
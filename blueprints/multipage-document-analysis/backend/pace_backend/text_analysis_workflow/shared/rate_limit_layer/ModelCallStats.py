@@ -0,0 +1,60 @@
+# MIT No Attribution
+#
+# Copyright 2024 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import threading
+import time
+
+
+class ModelCallStats:
+    """
+    Model calls, throttles and estimated tokens of a Lambda invocation. Logged at the end of each stage of the
+    workflow so the cost and latency of a document can be followed stage by stage
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Start counting a new invocation"""
+        with self._lock:
+            self.model_calls = 0
+            self.throttled_calls = 0
+            self.estimated_input_tokens = 0
+            self.max_output_tokens = 0
+            self.started_at = time.time()
+
+    def record_call(self, estimated_input_tokens: int, max_output_tokens: int):
+        with self._lock:
+            self.model_calls += 1
+            self.estimated_input_tokens += estimated_input_tokens
+            self.max_output_tokens += max_output_tokens
+
+    def record_throttle(self):
+        with self._lock:
+            self.throttled_calls += 1
+
+    def stats(self) -> dict:
+        """Counters and elapsed time since the invocation started"""
+        with self._lock:
+            return {
+                "model_calls": self.model_calls,
+                "throttled_calls": self.throttled_calls,
+                "estimated_input_tokens": self.estimated_input_tokens,
+                "max_output_tokens": self.max_output_tokens,
+                "elapsed_ms": int((time.time() - self.started_at) * 1000),
+            }
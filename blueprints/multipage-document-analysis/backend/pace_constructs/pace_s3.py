@@ -29,6 +29,7 @@ class PACEBucket(s3.Bucket):
         self,
         scope: Construct,
         construct_id: str,
+        expiration_prefix: str = None,
         **kwargs,
     ):
         super().__init__(
@@ -46,8 +47,9 @@ class PACEBucket(s3.Bucket):
             ),
             encryption=s3.BucketEncryption.S3_MANAGED,
             enforce_ssl=True,
+            # Objects expire after 90 days, only those under expiration_prefix when given
             lifecycle_rules=[
-                s3.LifecycleRule(enabled=True, expiration=Duration.days(90)),
+                s3.LifecycleRule(enabled=True, expiration=Duration.days(90), prefix=expiration_prefix),
             ],
             server_access_logs_prefix="logs/",
             cors=[s3.CorsRule(
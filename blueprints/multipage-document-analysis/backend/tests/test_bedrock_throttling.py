@@ -0,0 +1,76 @@
+# MIT No Attribution
+#
+# Copyright 2024 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+
+import importlib.util
+
+import os
+
+import boto3
+import pytest
+from botocore.exceptions import ClientError
+from moto import mock_aws
+
+from conftest import WORKFLOW_DIR, load_lambda
+
+
+class ThrottledChain:
+    def invoke(self, _chain_input):
+        raise ClientError({"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}}, "InvokeModel")
+
+
+@pytest.fixture
+def extract_fn(monkeypatch):
+    monkeypatch.setenv("EXTRACTION_CONFIDENCE_LEVEL", "85")
+    monkeypatch.setenv("BEDROCK_REGION", "us-east-1")
+
+    with mock_aws():
+        extract_fn = load_lambda(os.path.join(WORKFLOW_DIR, "extract_data_to_schema_fn"))
+        monkeypatch.setattr(extract_fn, "rate_limiter", None)
+        yield extract_fn
+
+
+def test_throttling_fails_the_task_with_a_retryable_error(extract_fn, monkeypatch):
+    # The task is retried by the state machine on the error name, the error must get out of the handler as is
+    monkeypatch.setattr(
+        extract_fn, "cached_text_information_extraction",
+        lambda text, section: extract_fn.invoke_structured_chain(ThrottledChain(), {"text": text}, 100)
+    )
+
+    with pytest.raises(extract_fn.BedrockRetryableError, match="ThrottlingException"):
+        extract_fn.section_information_extraction("text", "general_information")
+
+
+@pytest.mark.parametrize("failing_call", ["update_item", "put_object"])
+def test_storage_failure_fails_the_task(extract_fn, monkeypatch, lambda_context, failing_call):
+    # A failed task is retried and then caught by ProcessDocument, a 500 without body fails the result selector instead
+    monkeypatch.setenv("WORKFLOW_BUCKET_NAME", "workflow")
+    monkeypatch.setattr(extract_fn, "WORKFLOW_BUCKET_NAME", "workflow")
+    monkeypatch.setattr(extract_fn, "report_sections", [])
+    boto3.client("s3").create_bucket(Bucket="workflow")
+    boto3.resource("dynamodb").create_table(
+        TableName="documents",
+        KeySchema=[{"AttributeName": "id", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "id", "AttributeType": "S"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+
+    def fail(**_kwargs):
+        raise ClientError({"Error": {"Code": "InternalServerError", "Message": "Service unavailable"}}, failing_call)
+
+    client = extract_fn.table.meta.client if failing_call == "update_item" else extract_fn.s3
+    monkeypatch.setattr(client, failing_call, fail)
+
+    with pytest.raises(extract_fn.ExtractDataError):
+        extract_fn.lambda_handler({"chunk": {"text": "text"}, "chunk_index": 0, "job_id": "job"}, lambda_context)
@@ -0,0 +1,83 @@
+# MIT No Attribution
+#
+# Copyright 2024 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+
+import importlib.util
+
+import json
+import os
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from conftest import WORKFLOW_DIR, load_lambda
+
+
+@pytest.fixture
+def chunk_fn():
+    with mock_aws():
+        boto3.resource("dynamodb").create_table(
+            TableName=os.environ["DOCUMENTS_DYNAMO_DB_TABLE_NAME"],
+            KeySchema=[{"AttributeName": "id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        ).put_item(Item={"id": "textract-job"})
+
+        yield load_lambda(os.path.join(WORKFLOW_DIR, "chunk_textract_document_fn"))
+
+
+def textract_notification(status):
+    return {"body": json.dumps({"Type": "Notification", "Message": json.dumps({"JobId": "textract-job", "Status": status})})}
+
+
+def test_failed_textract_job_fails_the_task(chunk_fn, lambda_context):
+    with pytest.raises(chunk_fn.ChunkDocumentError):
+        chunk_fn.lambda_handler(textract_notification("FAILED"), lambda_context)
+
+
+def test_chunking_error_fails_the_task(chunk_fn, lambda_context, monkeypatch):
+    def iter_textract_results(_job_id):
+        raise ValueError("Invalid Textract response")
+        yield
+
+    monkeypatch.setattr(chunk_fn, "STREAMING_INGESTION", True)
+    monkeypatch.setattr(chunk_fn, "iter_textract_results", iter_textract_results)
+
+    with pytest.raises(chunk_fn.ChunkDocumentError):
+        chunk_fn.lambda_handler(textract_notification("SUCCEEDED"), lambda_context)
+
+
+def test_missing_job_fails_the_task(chunk_fn, lambda_context):
+    notification = {"body": json.dumps({
+        "Type": "Notification", "Message": json.dumps({"JobId": "unknown-textract-job", "Status": "SUCCEEDED"})
+    })}
+
+    with pytest.raises(chunk_fn.ChunkDocumentError, match="No job found"):
+        chunk_fn.lambda_handler(notification, lambda_context)
+
+
+def test_streamed_pages(chunk_fn, monkeypatch):
+    def line(page, top, text):
+        return {"BlockType": "LINE", "Page": page, "Text": text,
+                "Geometry": {"BoundingBox": {"Top": top, "Left": 0.1, "Height": 0.02, "Width": 0.8}}}
+
+    def iter_textract_results(job_id):
+        assert job_id == "textract-job"
+        yield {"DocumentMetadata": {"Pages": 3}, "Blocks": [line(1, 0.1, "First page")]}
+        yield {"Blocks": [line(3, 0.1, "Third page")]}
+
+    monkeypatch.setattr(chunk_fn, "iter_textract_results", iter_textract_results)
+
+    assert list(chunk_fn.stream_textract_page_texts("textract-job")) == ["First page", "", "Third page"]
@@ -0,0 +1,98 @@
+# MIT No Attribution
+#
+# Copyright 2024 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import logging
+import os
+
+import pytest
+
+from conftest import WORKFLOW_DIR, load_lambda
+
+textractor_handler = load_lambda(os.path.join(WORKFLOW_DIR, "chunk_textract_document_fn"), "TextractorHandler")
+
+
+@pytest.fixture
+def handler():
+    return textractor_handler.TextractorHandler(logging.getLogger())
+
+
+def words(n, word="word"):
+    return " ".join([word] * n)
+
+
+def test_pages_are_packed_up_to_the_token_budget(handler):
+    pages = [words(10) for _ in range(10)]
+
+    total_pages, chunks = handler._extract_token_chunks(iter(pages), max_tokens=40, overlap_tokens=0)
+
+    # 13 tokens per page, 3 pages per chunk
+    assert total_pages == 10
+    assert len(chunks) == 4
+    assert all(handler._count_tokens(chunk) <= 40 for chunk in chunks)
+
+
+def test_large_pages_are_split_by_paragraph(handler):
+    page = "\n\n".join(words(20, f"p{i}") for i in range(3))
+
+    _, chunks = handler._extract_token_chunks(iter([page]), max_tokens=30, overlap_tokens=0)
+
+    assert chunks == [words(20, f"p{i}") for i in range(3)]
+
+
+def test_lines_larger_than_the_budget_are_split_by_words(handler):
+    line = words(100)
+
+    _, chunks = handler._extract_token_chunks(iter([line]), max_tokens=26, overlap_tokens=0)
+
+    assert len(chunks) == 5
+    assert all(handler._count_tokens(chunk) <= 26 for chunk in chunks)
+    assert " ".join(chunks) == line
+
+
+def test_overlap_is_capped_to_a_fraction_of_the_budget(handler):
+    pages = [words(10, f"page{i}") for i in range(6)]
+
+    # Without the cap every chunk would start with the whole previous page
+    _, chunks = handler._extract_token_chunks(iter(pages), max_tokens=26, overlap_tokens=26)
+
+    assert len(chunks) == 3
+    assert not any(chunk.startswith("page0") for chunk in chunks[1:])
+
+
+@pytest.mark.parametrize("chunking_args, pages_per_first_chunk", [
+    ({"chunk_size": 2, "page_overlap": 1}, 2),
+    # The chunk is full once a page does not fit, 13 tokens per page
+    ({"max_tokens": 26, "overlap_tokens": 0}, 3),
+])
+def test_streamed_chunks_are_produced_before_the_next_pages_are_read(handler, chunking_args, pages_per_first_chunk):
+    pages_read = []
+
+    def page_texts():
+        for i in range(6):
+            pages_read.append(i)
+            yield words(10, f"page{i}")
+
+    response, chunks = handler.stream_page_text(page_texts(), **chunking_args)
+
+    first_chunk = next(chunks)
+    assert first_chunk.startswith("page0")
+    assert len(pages_read) == pages_per_first_chunk
+
+    all_chunks = [first_chunk, *chunks]
+    assert response["total_pages"] == 6
+    expected = handler.get_page_stream_text((words(10, f"page{i}") for i in range(6)), **chunking_args)
+    assert all_chunks == expected["results"]["text"]
@@ -0,0 +1,50 @@
+# MIT No Attribution
+#
+# Copyright 2024 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import logging
+import os
+import sys
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from conftest import WORKFLOW_DIR, load_lambda
+
+extraction_cache = load_lambda(os.path.join(WORKFLOW_DIR, "extract_data_to_schema_fn"), "ExtractionCache")
+
+
+@pytest.fixture
+def frequent_thread_switches():
+    # Switch threads as often as possible so lost counter updates show up
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(switch_interval)
+
+
+def test_counters_are_exact_under_concurrent_lookups(frequent_thread_switches):
+    cache = extraction_cache.ExtractionCache(logging.getLogger())
+    cache.put("cached", "value")
+
+    def lookup(i):
+        return cache.get("cached" if i % 2 else f"missing-{i}")
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lookup, range(20000)))
+
+    assert cache.stats() == {"cache_memory_hits": 10000, "cache_table_hits": 0, "cache_misses": 10000}
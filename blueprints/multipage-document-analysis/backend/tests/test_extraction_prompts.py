@@ -0,0 +1,56 @@
+# MIT No Attribution
+#
+# Copyright 2024 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import json
+import os
+import sys
+
+from conftest import WORKFLOW_DIR
+
+sys.path.insert(0, os.path.join(WORKFLOW_DIR, "extract_data_to_schema_fn"))
+
+from prompt_selector.information_extraction_prompt_selector import get_report_information_extraction_prompt_selector
+from doc_info_layer.section_definition import info_to_output_mapping, report_sections
+
+JSON_SCHEMA = {section: info_to_output_mapping[section].model_json_schema() for section in report_sections}
+
+
+def test_report_prompt_describes_every_section():
+    prompt = get_report_information_extraction_prompt_selector("en").get_prompt("anthropic.claude-3")
+
+    system_message, user_message = prompt.format_messages(json_schema=JSON_SCHEMA, text="chunk text")
+
+    assert "one key per section" in system_message.content
+    assert all(section in system_message.content for section in report_sections)
+    assert "chunk text" in user_message.content
+
+
+def test_report_prompt_keeps_the_examples_of_every_section():
+    prompt = get_report_information_extraction_prompt_selector("es", report_sections).get_prompt("anthropic.claude-3")
+
+    messages = prompt.format_messages(json_schema=JSON_SCHEMA, text="chunk text", n_examples=len(report_sections))
+
+    # System prompt, a text and extraction pair per example and the chunk
+    assert len(messages) == 2 + 2 * len(report_sections)
+
+    example_extractions = [
+        json.loads(message.content.split("<extracted_information>")[1]) for message in messages[2:-1:2]
+    ]
+    for section, extraction in zip(report_sections, example_extractions):
+        assert set(extraction) == set(report_sections)
+        assert extraction[section]
+        assert not any(extraction[other] for other in report_sections if other != section)
@@ -0,0 +1,83 @@
+# MIT No Attribution
+#
+# Copyright 2024 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+
+import importlib.util
+
+import os
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from conftest import API_LAMBDA_DIR, load_lambda
+
+JOBS = [
+    {"id": f"job-{index}", "record_type": "JOB", "created_at": f"2024-01-0{index}T00:00:00+00:00",
+     "status": "COMPLETED" if index % 2 else "ERROR", "document_name": f"document-{index}.pdf"}
+    for index in range(1, 6)
+]
+
+
+def create_documents_table(status_index):
+    indexes = [("CreatedAtIndex", "record_type")] + ([("StatusCreatedAtIndex", "status")] if status_index else [])
+
+    table = boto3.resource("dynamodb").create_table(
+        TableName=os.environ["DOCUMENTS_DYNAMO_DB_TABLE_NAME"],
+        KeySchema=[{"AttributeName": "id", "KeyType": "HASH"}],
+        AttributeDefinitions=[
+            {"AttributeName": name, "AttributeType": "S"}
+            for name in ["id", "created_at"] + [partition_key for _, partition_key in indexes]
+        ],
+        GlobalSecondaryIndexes=[
+            {
+                "IndexName": index_name,
+                "KeySchema": [
+                    {"AttributeName": partition_key, "KeyType": "HASH"},
+                    {"AttributeName": "created_at", "KeyType": "RANGE"},
+                ],
+                "Projection": {"ProjectionType": "ALL"},
+            }
+            for index_name, partition_key in indexes
+        ],
+        BillingMode="PAY_PER_REQUEST",
+    )
+
+    for job in JOBS:
+        table.put_item(Item=job)
+
+
+@pytest.fixture(params=[True, False], ids=["status_index", "created_at_index_only"])
+def get_job_status_fn(request, monkeypatch):
+    monkeypatch.setenv("STATUS_CREATED_AT_INDEX_NAME", "StatusCreatedAtIndex" if request.param else "")
+
+    with mock_aws():
+        create_documents_table(request.param)
+        yield load_lambda(os.path.join(API_LAMBDA_DIR, "get_job_status_fn"))
+
+
+def test_jobs_are_listed_newest_first(get_job_status_fn):
+    response = get_job_status_fn._get_items({"limit": "2"})
+
+    assert [job["id"] for job in response["items"]] == ["job-5", "job-4"]
+
+    response = get_job_status_fn._get_items({"limit": "10", "next_token": response["next_token"]})
+
+    assert [job["id"] for job in response["items"]] == ["job-3", "job-2", "job-1"]
+
+
+def test_jobs_are_listed_by_status(get_job_status_fn):
+    response = get_job_status_fn._get_items({"status": "COMPLETED", "limit": "10"})
+
+    assert [job["id"] for job in response["items"]] == ["job-5", "job-3", "job-1"]
@@ -0,0 +1,94 @@
+# MIT No Attribution
+#
+# Copyright 2024 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+
+import importlib.util
+
+import logging
+import time
+from decimal import Decimal
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from rate_limit_layer.BedrockRateLimiter import BedrockRateLimiter
+
+MODEL_ID = "model"
+
+
+@pytest.fixture
+def quota_table():
+    with mock_aws():
+        table = boto3.resource("dynamodb").create_table(
+            TableName="quota",
+            KeySchema=[{"AttributeName": "id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        yield table
+
+
+def create_limiter(table, **kwargs):
+    return BedrockRateLimiter(logging.getLogger(), table, MODEL_ID, requests_per_minute=10, tokens_per_minute=1000, **kwargs)
+
+
+def get_limit_item(table):
+    return table.get_item(Key={"id": f"{MODEL_ID}#limit"}).get("Item")
+
+
+def test_success_without_throttling_keeps_the_maximum(quota_table):
+    create_limiter(quota_table).on_success()
+
+    assert get_limit_item(quota_table) is None
+
+
+def test_success_increases_up_to_the_maximum(quota_table):
+    quota_table.put_item(Item={"id": f"{MODEL_ID}#limit", "requests_per_minute": 9})
+
+    limiter = create_limiter(quota_table)
+    limiter.on_success()
+    limiter._last_increase_window = None
+    limiter.on_success()
+
+    assert get_limit_item(quota_table)["requests_per_minute"] == 10
+
+
+def test_throttle_halves_the_budget_and_backs_off(quota_table):
+    create_limiter(quota_table).on_throttle()
+
+    item = get_limit_item(quota_table)
+    assert item["requests_per_minute"] == 5
+    assert isinstance(item["backoff_until"], Decimal)
+    assert item["backoff_until"] > time.time()
+
+
+def test_throttle_at_the_minimum_still_backs_off(quota_table):
+    quota_table.put_item(Item={"id": f"{MODEL_ID}#limit", "requests_per_minute": 1, "backoff_until": 0})
+
+    create_limiter(quota_table).on_throttle()
+
+    item = get_limit_item(quota_table)
+    assert item["requests_per_minute"] == 1
+    assert item["backoff_until"] > time.time()
+
+
+def test_acquire_waits_at_most_max_wait_seconds(quota_table):
+    quota_table.put_item(Item={"id": f"{MODEL_ID}#limit", "requests_per_minute": 1, "backoff_until": int(time.time()) + 60})
+
+    started_at = time.time()
+    with pytest.raises(TimeoutError):
+        create_limiter(quota_table, max_wait_seconds=1).acquire(10)
+
+    assert time.time() - started_at < 3
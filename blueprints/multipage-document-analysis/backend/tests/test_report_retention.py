@@ -0,0 +1,49 @@
+# MIT No Attribution
+#
+# Copyright 2024 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+
+import importlib.util
+
+import os
+import sys
+
+import pytest
+
+from conftest import BACKEND_DIR
+
+cdk = pytest.importorskip("aws_cdk")
+assertions = pytest.importorskip("aws_cdk.assertions")
+
+
+def test_reports_are_kept_while_the_other_objects_expire():
+    sys.path.insert(0, BACKEND_DIR)
+    cwd = os.getcwd()
+    os.chdir(BACKEND_DIR)
+    try:
+        from pace_backend import PACEBackendStack
+
+        app = cdk.App(context={"aws:cdk:bundling-stacks": []})
+        stack = PACEBackendStack(app, "Test")
+        template = assertions.Template.from_stack(stack).to_json()
+    finally:
+        os.chdir(cwd)
+        sys.path.remove(BACKEND_DIR)
+
+    def expiration_rules(bucket):
+        bucket_id = stack.resolve(bucket.node.default_child.logical_id)
+        return template["Resources"][bucket_id]["Properties"]["LifecycleConfiguration"]["Rules"]
+
+    # The job item keeps the S3 key of the JSON report (json_reports/) and of the PDF report
+    assert expiration_rules(stack.reports_bucket) == [{"ExpirationInDays": 90, "Prefix": "logs/", "Status": "Enabled"}]
+    assert expiration_rules(stack.workflow_bucket) == [{"ExpirationInDays": 90, "Status": "Enabled"}]
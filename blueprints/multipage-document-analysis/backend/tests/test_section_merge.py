@@ -0,0 +1,71 @@
+# MIT No Attribution
+#
+# Copyright 2024 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from doc_info_layer.CharterReports import CapitalSocial, InformacionGeneral
+from doc_info_layer.section_merge import premerge_section
+
+
+def test_unmatched_extraction_needs_the_llm():
+    extractions = [
+        {"informacion_general": {"name": "ACME SA", "duration": "99 años"}},
+        {"name": "ACME SA"},
+    ]
+
+    assert premerge_section(InformacionGeneral, extractions) is None
+
+
+def test_subset_shareholder_is_merged():
+    extractions = [
+        {"shareholders": [{"shareholder_name": "Juan Perez", "stock_units": "100", "stocks_value": ""}]},
+        {"shareholders": [{"shareholder_name": "juan perez", "stock_units": "100", "stocks_value": "$1,000"},
+                          {"shareholder_name": "Ana Gomez", "stock_units": "50"}]},
+    ]
+
+    merged, conflicts = premerge_section(CapitalSocial, extractions)
+
+    assert conflicts == {}
+    assert merged["shareholders"] == [
+        {"shareholder_name": "Juan Perez", "stock_units": "100", "stocks_value": "$1,000"},
+        {"shareholder_name": "Ana Gomez", "stock_units": "50"},
+    ]
+    CapitalSocial.model_validate(merged)
+
+
+def test_different_values_are_a_conflict():
+    extractions = [
+        {"shareholders": [{"shareholder_name": "Juan Perez", "stock_units": "100"}]},
+        {"shareholders": [{"shareholder_name": "Juan Perez", "stock_units": "200"}]},
+    ]
+
+    merged, conflicts = premerge_section(CapitalSocial, extractions)
+
+    assert "shareholders" in conflicts
+    assert "shareholders" not in merged
+
+
+def test_scalar_fields_are_merged_ignoring_empty_values():
+    extractions = [
+        {"name": "ACME SA", "duration": "", "social_object": ["Comercio"]},
+        {"name": "acme sa", "duration": "99 años", "social_object": ["Comercio", "Servicios"]},
+    ]
+
+    merged, conflicts = premerge_section(InformacionGeneral, extractions)
+
+    assert conflicts == {}
+    assert merged["name"] == "ACME SA"
+    assert merged["duration"] == "99 años"
+    assert merged["social_object"] == ["Comercio", "Servicios"]
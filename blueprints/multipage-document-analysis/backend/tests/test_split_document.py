@@ -0,0 +1,167 @@
+# MIT No Attribution
+#
+# Copyright 2024 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+
+import importlib.util
+
+import io
+import json
+import os
+import sys
+
+import boto3
+import pytest
+from moto import mock_aws
+from pypdf import PdfWriter
+
+from conftest import API_LAMBDA_DIR, BACKEND_DIR, load_lambda
+
+BUCKET_NAME = "documents"
+
+
+@pytest.fixture
+def documents_table(monkeypatch):
+    monkeypatch.setenv("DOCUMENTS_BUCKET_NAME", BUCKET_NAME)
+
+    with mock_aws():
+        boto3.client("s3").create_bucket(Bucket=BUCKET_NAME)
+        yield boto3.resource("dynamodb").create_table(
+            TableName=os.environ["DOCUMENTS_DYNAMO_DB_TABLE_NAME"],
+            KeySchema=[{"AttributeName": "id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+
+
+@pytest.fixture
+def split_document_fn(documents_table, monkeypatch):
+    monkeypatch.setenv("SPLIT_PAGES_THRESHOLD", "2")
+    monkeypatch.setenv("PAGES_PER_PART", "2")
+
+    split_document_fn = load_lambda(os.path.join(API_LAMBDA_DIR, "split_document_fn"))
+    monkeypatch.setattr(split_document_fn, "start_text_detection", lambda document_key: f"textract-{document_key}")
+
+    return split_document_fn
+
+
+def put_document(key, pages):
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=100, height=100)
+
+    document = io.BytesIO()
+    writer.write(document)
+    boto3.client("s3").put_object(Bucket=BUCKET_NAME, Key=key, Body=document.getvalue())
+
+
+def test_pdf_is_split_out_of_the_api_request(documents_table, lambda_context, monkeypatch):
+    monkeypatch.setenv("SPLIT_LARGE_DOCUMENTS", "True")
+    monkeypatch.setenv("SPLIT_DOCUMENT_FUNCTION_NAME", "split-document")
+    start_text_extraction_fn = load_lambda(os.path.join(API_LAMBDA_DIR, "start_text_extraction_fn"))
+
+    invocations = []
+    monkeypatch.setattr(start_text_extraction_fn.client_lambda, "invoke", lambda **kwargs: invocations.append(kwargs))
+
+    # The document is not even uploaded, the API does not read it
+    response = start_text_extraction_fn.lambda_handler(
+        {"body": json.dumps({"key": "uploads/document.pdf", "metadata": {"filename": "document.pdf"}})}, lambda_context
+    )
+
+    job_id = json.loads(response["body"])["job_id"]
+    assert response["statusCode"] == 200
+    assert documents_table.get_item(Key={"id": job_id})["Item"]["status"] == "TEXT_EXTRACTION"
+    assert invocations == [{
+        "FunctionName": "split-document",
+        "InvocationType": "Event",
+        "Payload": json.dumps({"job_id": job_id, "document_key": "uploads/document.pdf"}),
+    }]
+
+
+def test_large_document_is_split_in_parts(split_document_fn, documents_table, lambda_context):
+    put_document("document.pdf", 5)
+    documents_table.put_item(Item={"id": "job", "status": "TEXT_EXTRACTION"})
+
+    split_document_fn.lambda_handler({"job_id": "job", "document_key": "document.pdf"}, lambda_context)
+
+    part_keys = [f"document.pdf.parts/{part_index:03d}.pdf" for part_index in range(3)]
+    assert documents_table.get_item(Key={"id": "job"})["Item"]["part_job_ids"] == [f"textract-{key}" for key in part_keys]
+
+    for part_index, part_key in enumerate(part_keys):
+        part = documents_table.get_item(Key={"id": f"textract-{part_key}"})["Item"]
+        assert (part["parent_job_id"], part["part_index"], part["parts_total"]) == ("job", part_index, 3)
+
+
+def test_small_document_is_a_single_part(split_document_fn, documents_table, lambda_context):
+    put_document("document.pdf", 2)
+    documents_table.put_item(Item={"id": "job", "status": "TEXT_EXTRACTION"})
+
+    split_document_fn.lambda_handler({"job_id": "job", "document_key": "document.pdf"}, lambda_context)
+
+    part = documents_table.get_item(Key={"id": "textract-document.pdf"})["Item"]
+    assert (part["parent_job_id"], part["part_index"], part["parts_total"]) == ("job", 0, 1)
+
+
+def test_textract_failure_fails_the_job(split_document_fn, documents_table, lambda_context, monkeypatch):
+    def start_text_detection(_document_key):
+        raise RuntimeError("Textract unavailable")
+
+    put_document("document.pdf", 2)
+    documents_table.put_item(Item={"id": "job", "status": "TEXT_EXTRACTION"})
+    monkeypatch.setattr(split_document_fn, "start_text_detection", start_text_detection)
+
+    # The asynchronous invocation is not failed, it would be retried
+    response = split_document_fn.lambda_handler({"job_id": "job", "document_key": "document.pdf"}, lambda_context)
+
+    assert response["statusCode"] == 500
+    assert documents_table.get_item(Key={"id": "job"})["Item"]["status"] == "ERROR"
+
+
+def test_failed_invocation_fails_the_job(split_document_fn, documents_table, lambda_context):
+    documents_table.put_item(Item={"id": "job", "status": "TEXT_EXTRACTION"})
+
+    # Invocation record sent to the on failure destination when the function runs out of memory or time
+    split_document_fn.failure_handler({
+        "requestContext": {"condition": "RetriesExhausted", "approximateInvokeCount": 1},
+        "requestPayload": {"job_id": "job", "document_key": "document.pdf"},
+        "responsePayload": {"errorMessage": "Task timed out after 300.00 seconds"},
+    }, lambda_context)
+
+    assert documents_table.get_item(Key={"id": "job"})["Item"]["status"] == "ERROR"
+
+
+def test_failed_invocations_go_to_the_failure_function():
+    cdk = pytest.importorskip("aws_cdk")
+    assertions = pytest.importorskip("aws_cdk.assertions")
+
+    sys.path.insert(0, BACKEND_DIR)
+    cwd = os.getcwd()
+    os.chdir(BACKEND_DIR)
+    try:
+        from pace_backend import PACEBackendStack
+
+        app = cdk.App(context={"aws:cdk:bundling-stacks": []})
+        stack = PACEBackendStack(app, "Test")
+        template = assertions.Template.from_stack(stack)
+    finally:
+        os.chdir(cwd)
+        sys.path.remove(BACKEND_DIR)
+
+    failure_function = stack.resolve(stack.api.split_document_failure_lambda.node.default_child.logical_id)
+    template.has_resource_properties("AWS::Lambda::EventInvokeConfig", {
+        "MaximumRetryAttempts": 0,
+        "DestinationConfig": {"OnFailure": {"Destination": {"Fn::GetAtt": [failure_function, "Arn"]}}},
+    })
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "index.failure_handler",
+    })
@@ -0,0 +1,102 @@
+# MIT No Attribution
+#
+# Copyright 2024 Amazon Web Services
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+
+import importlib.util
+
+import json
+import os
+import sys
+
+import pytest
+
+from conftest import BACKEND_DIR
+
+cdk = pytest.importorskip("aws_cdk")
+assertions = pytest.importorskip("aws_cdk.assertions")
+
+
+@pytest.fixture(scope="module")
+def states():
+    """States of the document processing state machine, the ProcessDocument branch included"""
+
+    sys.path.insert(0, BACKEND_DIR)
+    cwd = os.getcwd()
+    os.chdir(BACKEND_DIR)
+    try:
+        from pace_backend import PACEBackendStack
+
+        # Lambda functions are not bundled, only the state machine definition is needed
+        app = cdk.App(context={"aws:cdk:bundling-stacks": []})
+        stack = PACEBackendStack(app, "Test")
+        template = assertions.Template.from_stack(stack.sfn_doc_analysis).to_json()
+    finally:
+        os.chdir(cwd)
+        sys.path.remove(BACKEND_DIR)
+
+    state_machine = next(
+        resource for resource in template["Resources"].values() if resource["Type"] == "AWS::StepFunctions::StateMachine"
+    )
+    definition_parts = state_machine["Properties"]["DefinitionString"]["Fn::Join"][1]
+    definition = json.loads("".join(part if isinstance(part, str) else "token" for part in definition_parts))
+
+    document_states = definition["States"]["TextractMessagesMap"]["ItemProcessor"]["States"]
+    branch_states = document_states["ProcessDocument"]["Branches"][0]["States"]
+
+    return document_states, branch_states
+
+
+def catches(state, error):
+    return next(
+        (catcher["Next"] for catcher in state.get("Catch", [])
+         if error in catcher["ErrorEquals"] or "States.ALL" in catcher["ErrorEquals"]),
+        None
+    )
+
+
+def retries(state, error):
+    return any(error in retrier["ErrorEquals"] for retrier in state.get("Retry", []))
+
+
+def test_chunk_failure_requeues_the_message(states):
+    document_states, branch_states = states
+
+    # The chunk task fails instead of returning an error status, the error reaches the ProcessDocument catch
+    assert catches(branch_states["ChunkDocumentTask"], "ChunkDocumentError") is None
+    assert catches(document_states["ProcessDocument"], "ChunkDocumentError") == "CheckMessageRetries"
+
+    retry_choices = document_states["CheckMessageRetries"]
+    assert retry_choices["Default"] == "FirstRetry"
+    assert document_states["FirstRetry"]["Next"] == "RequeueFailedMessage"
+    assert {choice["Next"] for choice in retry_choices["Choices"]} == {"DeadLetterFailedMessage", "IncrementRetryCount"}
+
+
+def test_throttled_tasks_are_retried(states):
+    _, branch_states = states
+
+    extract_data_states = branch_states["ChunkIteratorMap"]["ItemProcessor"]["States"]
+
+    assert retries(extract_data_states["ExtractData2Schema"], "BedrockRetryableError")
+    assert retries(branch_states["ConsolidateReport"], "BedrockRetryableError")
+
+
+def test_extraction_storage_failure_is_retried_and_requeues_the_message(states):
+    document_states, branch_states = states
+
+    extract_data_state = branch_states["ChunkIteratorMap"]["ItemProcessor"]["States"]["ExtractData2Schema"]
+
+    assert retries(extract_data_state, "ExtractDataError")
+    assert catches(extract_data_state, "ExtractDataError") is None
+    assert catches(branch_states["ChunkIteratorMap"], "ExtractDataError") is None
+    assert catches(document_states["ProcessDocument"], "ExtractDataError") == "CheckMessageRetries"
@@ -177,12 +177,26 @@ export type Job = {
 
 export type JobsResponse = {
   items: Job[];
+  next_token?: string | null;
 };
 
-export async function getJobs() {
+export type JobsQuery = {
+  status?: string;
+  created_from?: string;
+  created_to?: string;
+  limit?: string;
+  next_token?: string;
+};
+
+export async function getJobs(query: JobsQuery = {}) {
   const { body } = await get({
     apiName: "Backend",
     path: "/multipage-doc-analysis/jobs/query",
+    options: {
+      queryParams: Object.fromEntries(
+        Object.entries(query).filter(([, value]) => value !== undefined),
+      ) as Record<string, string>,
+    },
   }).response;
   return body.json() as Promise<JobsResponse>;
 }
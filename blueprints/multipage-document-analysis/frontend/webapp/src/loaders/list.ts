@@ -18,6 +18,9 @@
 import { LoaderFunction, defer } from "react-router-dom";
 import { getJobs } from "@/lib/api";
 
+// Jobs requested per page, the list loads the following pages on demand
+export const JOBS_PAGE_LIMIT = "50";
+
 export const listLoader: LoaderFunction = async () => {
-  return defer({ items: getJobs() });
+  return defer({ items: getJobs({ limit: JOBS_PAGE_LIMIT }) });
 };
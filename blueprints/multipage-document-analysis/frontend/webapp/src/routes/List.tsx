@@ -35,7 +35,7 @@ import {
   FileJson,
   FileType,
 } from "lucide-react";
-import { useState, Suspense } from "react";
+import { useState, useEffect, Suspense } from "react";
 import { useLoaderData, Await, useRevalidator } from "react-router-dom";
 
 import {
@@ -57,8 +57,10 @@ import {
   JobsResponse,
   downloadFile,
   getJobResults,
+  getJobs,
   JobResults,
 } from "@/lib/api";
+import { JOBS_PAGE_LIMIT } from "@/loaders/list";
 // import { JobStatus } from "@/types";
 import { v4 as uuidv4 } from "uuid";
 import { useToast } from "@/hooks/use-toast";
@@ -120,6 +122,14 @@ const List: React.FC = () => {
   );
   const [isSheetOpen, setIsSheetOpen] = useState(false);
   const [selectedJob, setSelectedJob] = useState<SelectedJob | null>(null);
+  // Pages of jobs loaded after the first one, which comes from the loader
+  const [morePages, setMorePages] = useState<JobsResponse[]>([]);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
+
+  // A refresh loads the first page again
+  useEffect(() => {
+    setMorePages([]);
+  }, [loaderData]);
 
   const { t } = useTranslation();
 
@@ -145,6 +155,21 @@ const List: React.FC = () => {
       });
   };
 
+  const handleLoadMore = async (nextToken: string) => {
+    setIsLoadingMore(true);
+    try {
+      const jobsPage = await getJobs({
+        limit: JOBS_PAGE_LIMIT,
+        next_token: nextToken,
+      });
+      setMorePages((prev) => [...prev, jobsPage]);
+    } catch (error) {
+      console.error("Failed to load more jobs", error);
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
+
   const handleFileSelect = (event: React.ChangeEvent<HTMLInputElement>) => {
     const file = event.target.files?.[0];
     if (!file) {
@@ -325,7 +350,11 @@ const List: React.FC = () => {
             <Await resolve={loaderData.items}>
               {(resolvedItems: JobsResponse) => (
                 <Badge className="bg-primary text-white">
-                  {resolvedItems.items.length}
+                  {resolvedItems.items.length +
+                    morePages.reduce(
+                      (count, jobsPage) => count + jobsPage.items.length,
+                      0,
+                    )}
                 </Badge>
               )}
             </Await>
@@ -436,7 +465,11 @@ const List: React.FC = () => {
         <Suspense fallback={<DataTableSkeleton />}>
           <Await resolve={loaderData.items}>
             {(resolvedItems: JobsResponse) => {
-              const filteredItems = filteredAndSortedItems(resolvedItems.items);
+              const loadedPages = [resolvedItems, ...morePages];
+              const nextToken = loadedPages[loadedPages.length - 1].next_token;
+              const filteredItems = filteredAndSortedItems(
+                loadedPages.flatMap((jobsPage) => jobsPage.items),
+              );
               const totalPages = Math.ceil(filteredItems.length / pageSize);
               const paginatedItems = filteredItems.slice(
                 (page - 1) * pageSize,
@@ -673,6 +706,19 @@ const List: React.FC = () => {
                         </PaginationItem>
                       </PaginationContent>
                     </Pagination>
+                    {nextToken && (
+                      <Button
+                        variant="secondary"
+                        className="ml-4"
+                        onClick={() => handleLoadMore(nextToken)}
+                        disabled={isLoadingMore}
+                      >
+                        {isLoadingMore && (
+                          <Loader2 className="mr-2 h-4 w-4 animate-spin" />
+                        )}
+                        {t("list.pagination.loadMore")}
+                      </Button>
+                    )}
                   </CardFooter>
                 </>
               );